@@ -0,0 +1,240 @@
+"""
+Módulo de Acceso a Características para CONVIVIR v4.0
+Capa de lectura para los modelos de ML: consultas select() de SQLAlchemy Core
+que proyectan solo las columnas necesarias y construyen DataFrames o arreglos
+NumPy directamente desde el cursor, sin hidratar objetos ORM
+
+- series_temporales_curso / series_temporales_cursos: indicadores semanales (LSTM)
+- matriz_series_cursos: todas las series en un solo arreglo float32 con offsets
+- aristas_grafo_social / atributos_estudiantes: grafo social (GNN)
+- comentarios_para_nlp: textos para el análisis de sentimientos
+- sentimientos_comentarios / evaluaciones_estudiantes: entradas del puntaje de riesgo
+"""
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from database import CursoTemporal, Interaccion, Comentario, Estudiante, EvaluacionSocioemocional
+
+
+# Indicadores semanales con el nombre que usan los modelos (alias: columna)
+INDICADORES_SEMANALES = {
+    'clima_escolar': CursoTemporal.clima_escolar_promedio,
+    'apoyo_docentes': CursoTemporal.apoyo_docentes_promedio,
+    'participacion': CursoTemporal.participacion_estudiantes_promedio,
+    'empatia': CursoTemporal.nivel_empatia_promedio,
+    'autoestima': CursoTemporal.nivel_autoestima_promedio,
+    'resolucion_conflictos': CursoTemporal.nivel_resolucion_conflictos_promedio,
+    'incidentes_bullying': CursoTemporal.incidentes_bullying,
+    'incidentes_violencia': CursoTemporal.incidentes_violencia_fisica,
+    'incidentes_discriminacion': CursoTemporal.incidentes_discriminacion,
+}
+
+TIPOS_INDICADORES = {alias: 'float64' for alias in INDICADORES_SEMANALES}
+
+
+def _conexion(origen):
+    """Acepta un engine o un DatabaseManager"""
+    return getattr(origen, 'engine', origen).connect()
+
+
+def _consulta_series(curso_ids=None, con_curso=False):
+    columnas = [CursoTemporal.fecha_registro.label('fecha')]
+    columnas += [columna.label(alias) for alias, columna in INDICADORES_SEMANALES.items()]
+    if con_curso:
+        columnas.insert(0, CursoTemporal.curso_id)
+
+    consulta = select(*columnas)
+    if curso_ids is not None:
+        consulta = consulta.where(CursoTemporal.curso_id.in_(list(curso_ids)))
+    if con_curso:
+        return consulta.order_by(CursoTemporal.curso_id, CursoTemporal.fecha_registro)
+    return consulta.order_by(CursoTemporal.fecha_registro)
+
+
+# ----------------------------------------------------------------------
+# Series temporales
+# ----------------------------------------------------------------------
+
+def series_temporales_curso(origen, curso_id):
+    """
+    Serie semanal de un curso (fecha + indicadores), ordenada por fecha
+
+    Returns:
+        DataFrame con las columnas 'fecha' y INDICADORES_SEMANALES (float64)
+    """
+    consulta = _consulta_series().where(CursoTemporal.curso_id == curso_id)
+    with _conexion(origen) as conn:
+        return pd.read_sql(consulta, conn, dtype=TIPOS_INDICADORES, parse_dates=['fecha'])
+
+
+def series_temporales_cursos(origen, curso_ids=None):
+    """
+    Series de varios cursos (todos por defecto) con una sola consulta
+
+    Returns:
+        dict {curso_id: DataFrame} con el mismo formato que series_temporales_curso
+    """
+    with _conexion(origen) as conn:
+        df = pd.read_sql(_consulta_series(curso_ids, con_curso=True), conn,
+                         dtype=TIPOS_INDICADORES, parse_dates=['fecha'])
+    return {
+        curso_id: grupo.drop(columns='curso_id').reset_index(drop=True)
+        for curso_id, grupo in df.groupby('curso_id', sort=False)
+    }
+
+
+def matriz_series_cursos(origen, curso_ids=None, dtype=np.float32):
+    """
+    Todas las series en un solo arreglo contiguo, ordenado por curso y fecha
+
+    Returns:
+        dict con:
+            cursos: arreglo de curso_id (en el orden de la matriz)
+            offsets: inicio de cada curso en la matriz (len(cursos) + 1 elementos)
+            fechas: datetime64[us] de cada fila
+            indicadores: nombres de las columnas de la matriz
+            matriz: arreglo (filas, indicadores) con NaN en los valores nulos
+
+        Las filas de cursos[i] son matriz[offsets[i]:offsets[i + 1]]
+    """
+    with _conexion(origen) as conn:
+        filas = conn.execute(_consulta_series(curso_ids, con_curso=True)).fetchall()
+
+    n = len(filas)
+    indicadores = list(INDICADORES_SEMANALES)
+    if n == 0:
+        return {
+            'cursos': np.array([], dtype=object),
+            'offsets': np.zeros(1, dtype=np.int64),
+            'fechas': np.array([], dtype='datetime64[us]'),
+            'indicadores': indicadores,
+            'matriz': np.empty((0, len(indicadores)), dtype=dtype)
+        }
+
+    columnas = list(zip(*filas))
+    cursos_fila = np.array(columnas[0], dtype=object)
+    fechas = np.array(columnas[1], dtype='datetime64[us]')
+    # None se convierte en NaN al construir el arreglo de punto flotante
+    matriz = np.array(columnas[2:], dtype=dtype).T.copy()
+
+    # Las filas vienen ordenadas por curso: cada cambio de curso abre un bloque
+    cambios = np.flatnonzero(cursos_fila[1:] != cursos_fila[:-1]) + 1
+    inicios = np.concatenate(([0], cambios))
+    offsets = np.append(inicios, n).astype(np.int64)
+
+    return {
+        'cursos': cursos_fila[inicios],
+        'offsets': offsets,
+        'fechas': fechas,
+        'indicadores': indicadores,
+        'matriz': matriz
+    }
+
+
+# ----------------------------------------------------------------------
+# Grafo social
+# ----------------------------------------------------------------------
+
+def aristas_grafo_social(origen):
+    """Interacciones como aristas: origen, destino, tipo, intensidad, fecha"""
+    consulta = select(
+        Interaccion.estudiante_origen_id.label('origen'),
+        Interaccion.estudiante_destino_id.label('destino'),
+        Interaccion.tipo_interaccion.label('tipo'),
+        Interaccion.intensidad,
+        Interaccion.fecha_interaccion.label('fecha')
+    )
+    with _conexion(origen) as conn:
+        return pd.read_sql(consulta, conn, parse_dates=['fecha'])
+
+
+def atributos_estudiantes(origen):
+    """Atributos de nodo del grafo social: estudiante_id, curso_id, cohorte_id, genero, edad"""
+    consulta = select(Estudiante.estudiante_id, Estudiante.curso_id, Estudiante.cohorte_id,
+                      Estudiante.genero, Estudiante.edad)
+    with _conexion(origen) as conn:
+        return pd.read_sql(consulta, conn)
+
+
+# ----------------------------------------------------------------------
+# Comentarios
+# ----------------------------------------------------------------------
+
+def comentarios_para_nlp(origen, estudiante_ids=None, desde_id=None):
+    """
+    Comentarios para el análisis de sentimientos: id, estudiante_id, fecha, texto, tema, tono_percibido
+
+    Con desde_id solo retorna los comentarios de id mayor (los nuevos para el modelo de temas)
+    """
+    consulta = select(
+        Comentario.id,
+        Comentario.estudiante_id,
+        Comentario.fecha_comentario.label('fecha'),
+        Comentario.comentario_texto.label('texto'),
+        Comentario.tema_principal.label('tema'),
+        Comentario.tono_percibido
+    ).order_by(Comentario.id)
+    if estudiante_ids is not None:
+        consulta = consulta.where(Comentario.estudiante_id.in_(list(estudiante_ids)))
+    if desde_id is not None:
+        consulta = consulta.where(Comentario.id > desde_id)
+    with _conexion(origen) as conn:
+        return pd.read_sql(consulta, conn, parse_dates=['fecha'])
+
+
+def sentimientos_comentarios(origen, estudiante_ids=None, desde_id=None):
+    """
+    Comentarios con su sentimiento persistido (None si no se ha analizado):
+    id, estudiante_id, texto, sentimiento
+
+    Con desde_id solo retorna los comentarios de id mayor
+    """
+    consulta = select(
+        Comentario.id,
+        Comentario.estudiante_id,
+        Comentario.comentario_texto.label('texto'),
+        Comentario.sentimiento_analizado.label('sentimiento')
+    ).order_by(Comentario.id)
+    if estudiante_ids is not None:
+        consulta = consulta.where(Comentario.estudiante_id.in_(list(estudiante_ids)))
+    if desde_id is not None:
+        consulta = consulta.where(Comentario.id > desde_id)
+    with _conexion(origen) as conn:
+        return pd.read_sql(consulta, conn)
+
+
+# ----------------------------------------------------------------------
+# Evaluaciones socioemocionales
+# ----------------------------------------------------------------------
+
+# Puntajes de las evaluaciones con el nombre que usan los modelos (alias: columna)
+PUNTAJES_EVALUACION = {
+    'empatia': EvaluacionSocioemocional.empatia_score,
+    'autoestima': EvaluacionSocioemocional.autoestima_score,
+    'resolucion_conflictos': EvaluacionSocioemocional.resolucion_conflictos_score,
+    'ansiedad': EvaluacionSocioemocional.ansiedad_score,
+    'bienestar': EvaluacionSocioemocional.bienestar_general_score,
+}
+
+
+def evaluaciones_estudiantes(origen, estudiante_ids=None):
+    """
+    Evaluaciones socioemocionales ordenadas por estudiante y fecha
+
+    Returns:
+        DataFrame con estudiante_id, fecha, periodo y PUNTAJES_EVALUACION (float64)
+    """
+    consulta = select(
+        EvaluacionSocioemocional.estudiante_id,
+        EvaluacionSocioemocional.fecha_evaluacion.label('fecha'),
+        EvaluacionSocioemocional.periodo,
+        *[columna.label(alias) for alias, columna in PUNTAJES_EVALUACION.items()]
+    ).order_by(EvaluacionSocioemocional.estudiante_id, EvaluacionSocioemocional.fecha_evaluacion,
+               EvaluacionSocioemocional.id)
+    if estudiante_ids is not None:
+        consulta = consulta.where(EvaluacionSocioemocional.estudiante_id.in_(list(estudiante_ids)))
+    with _conexion(origen) as conn:
+        return pd.read_sql(consulta, conn, parse_dates=['fecha'],
+                           dtype={alias: 'float64' for alias in PUNTAJES_EVALUACION})
@@ -0,0 +1,249 @@
+"""
+Módulo de Almacén de Series Temporales para CONVIVIR v4.0
+Mantiene en memoria los indicadores semanales de todos los cursos como un único
+arreglo float32 contiguo, con un índice de bloques por curso y el mínimo/máximo
+de cada indicador por curso (lo que necesita el MinMaxScaler de los modelos)
+
+- Las lecturas (pronóstico, simulador, gráfico de evolución) reciben vistas de
+  solo lectura del arreglo, sin consultar la base ni copiar datos
+- Cada curso ocupa un bloque con capacidad de reserva: registrar una semana nueva
+  escribe una fila al final del bloque y actualiza mínimo/máximo en O(indicadores)
+- El almacén se versiona con VersionesDatos: cualquier otra escritura sobre
+  cursos_temporal lo invalida y se reconstruye con una sola consulta en la
+  siguiente lectura
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from acceso_caracteristicas import INDICADORES_SEMANALES, matriz_series_cursos
+from cache_respuestas import INCREMENTOS_POR_ESCRITURA_CONFIRMADA
+
+
+TABLA = 'cursos_temporal'
+
+
+class AlmacenSeries:
+    """
+    Almacén versionado de las series semanales de todos los cursos
+
+    Uso:
+        almacen = AlmacenSeries(db.engine, cache.versiones)
+        fechas, matriz = almacen.vista('1°A')        # vistas de solo lectura
+        df = almacen.dataframe('1°A')                  # mismo formato que obtener_series_temporales_curso
+        minimos, maximos = almacen.rango('1°A')
+    """
+
+    def __init__(self, engine, versiones=None, holgura=0.25, reserva_minima=8):
+        self.engine = engine
+        self.versiones = versiones
+        self.holgura = holgura
+        self.reserva_minima = reserva_minima
+        self.indicadores = list(INDICADORES_SEMANALES)
+        self.version = 0
+        self.reconstrucciones = 0
+        self._lock = threading.RLock()
+        self._vigente = False
+        self._version_tabla = None
+        self._bloques = {}  # curso_id -> [inicio, largo, capacidad]
+        self._minimos = {}
+        self._maximos = {}
+        self._matriz = np.empty((0, len(self.indicadores)), dtype=np.float32)
+        self._fechas = np.empty(0, dtype='datetime64[us]')
+        self._ocupado = 0
+
+    # ------------------------------------------------------------------
+    # Construcción y vigencia
+    # ------------------------------------------------------------------
+
+    def _version_actual(self):
+        return self.versiones.version(TABLA)[0] if self.versiones is not None else None
+
+    def _capacidad(self, largo):
+        return largo + max(self.reserva_minima, int(largo * self.holgura))
+
+    def _construir(self):
+        """Carga todas las series con una consulta y las reparte en bloques con reserva"""
+        version_tabla = self._version_actual()
+        datos = matriz_series_cursos(self.engine)
+        cursos, offsets, matriz, fechas = datos['cursos'], datos['offsets'], datos['matriz'], datos['fechas']
+
+        largos = np.diff(offsets)
+        capacidades = [self._capacidad(int(largo)) for largo in largos]
+        total = int(sum(capacidades))
+
+        nueva_matriz = np.full((total, len(self.indicadores)), np.nan, dtype=np.float32)
+        nuevas_fechas = np.full(total, np.datetime64('NaT'), dtype='datetime64[us]')
+        bloques, minimos, maximos = {}, {}, {}
+
+        inicio = 0
+        for i, curso_id in enumerate(cursos):
+            origen = slice(offsets[i], offsets[i + 1])
+            largo = int(largos[i])
+            nueva_matriz[inicio:inicio + largo] = matriz[origen]
+            nuevas_fechas[inicio:inicio + largo] = fechas[origen]
+            bloques[curso_id] = [inicio, largo, capacidades[i]]
+            with np.errstate(all='ignore'):
+                minimos[curso_id] = np.nanmin(matriz[origen], axis=0) if largo else None
+                maximos[curso_id] = np.nanmax(matriz[origen], axis=0) if largo else None
+            inicio += capacidades[i]
+
+        self._matriz, self._fechas = nueva_matriz, nuevas_fechas
+        self._bloques, self._minimos, self._maximos = bloques, minimos, maximos
+        self._ocupado = total
+        self._version_tabla = version_tabla
+        self._vigente = True
+        self.version += 1
+        self.reconstrucciones += 1
+
+    def _asegurar_vigente(self):
+        if not self._vigente or (self.versiones is not None and self._version_actual() != self._version_tabla):
+            self._construir()
+
+    def invalidar(self):
+        """Fuerza la reconstrucción en la próxima lectura"""
+        with self._lock:
+            self._vigente = False
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def cursos(self):
+        with self._lock:
+            self._asegurar_vigente()
+            return list(self._bloques)
+
+    def vista(self, curso_id):
+        """
+        Retorna (fechas, matriz) del curso como vistas de solo lectura
+
+        matriz tiene una columna por indicador (ver self.indicadores). Un curso
+        sin registros retorna arreglos vacíos.
+        """
+        with self._lock:
+            self._asegurar_vigente()
+            bloque = self._bloques.get(curso_id)
+            if bloque is None:
+                return self._fechas[:0], self._matriz[:0]
+            inicio, largo, _ = bloque
+            fechas = self._fechas[inicio:inicio + largo]
+            matriz = self._matriz[inicio:inicio + largo]
+        fechas.flags.writeable = False
+        matriz.flags.writeable = False
+        return fechas, matriz
+
+    def columna(self, curso_id, indicador):
+        """Vista (con paso) de un indicador del curso"""
+        fechas, matriz = self.vista(curso_id)
+        return fechas, matriz[:, self.indicadores.index(indicador)]
+
+    def rango(self, curso_id):
+        """(mínimos, máximos) por indicador del curso, o (None, None) si no tiene registros"""
+        with self._lock:
+            self._asegurar_vigente()
+            return self._minimos.get(curso_id), self._maximos.get(curso_id)
+
+    def dataframe(self, curso_id, indicadores=None):
+        """
+        DataFrame 'fecha' + indicadores sobre la vista del curso
+
+        Con todos los indicadores el bloque numérico comparte memoria con el
+        almacén (solo lectura); un subconjunto de columnas se copia.
+        """
+        fechas, matriz = self.vista(curso_id)
+        if indicadores is None:
+            df = pd.DataFrame(matriz, columns=self.indicadores, copy=False)
+        else:
+            df = pd.DataFrame(matriz[:, [self.indicadores.index(i) for i in indicadores]], columns=list(indicadores))
+        df.insert(0, 'fecha', fechas)
+        return df
+
+    # ------------------------------------------------------------------
+    # Actualización incremental
+    # ------------------------------------------------------------------
+
+    def _reubicar(self, curso_id, capacidad):
+        """Copia el bloque del curso al final del arreglo con más capacidad"""
+        inicio, largo, _ = self._bloques.get(curso_id, (0, 0, 0))
+        necesario = self._ocupado + capacidad
+        if necesario > len(self._matriz):
+            # Las vistas entregadas siguen apuntando al arreglo anterior
+            nuevo_total = max(necesario, int(len(self._matriz) * 1.5))
+            extra = nuevo_total - len(self._matriz)
+            self._matriz = np.concatenate(
+                [self._matriz, np.full((extra, len(self.indicadores)), np.nan, dtype=np.float32)]
+            )
+            self._fechas = np.concatenate(
+                [self._fechas, np.full(extra, np.datetime64('NaT'), dtype='datetime64[us]')]
+            )
+        nuevo_inicio = self._ocupado
+        self._matriz[nuevo_inicio:nuevo_inicio + largo] = self._matriz[inicio:inicio + largo]
+        self._fechas[nuevo_inicio:nuevo_inicio + largo] = self._fechas[inicio:inicio + largo]
+        self._bloques[curso_id] = [nuevo_inicio, largo, capacidad]
+        self._ocupado += capacidad
+
+    def registrar_semana(self, curso_id, fecha, valores, version_anterior):
+        """
+        Incorpora una fila recién confirmada en cursos_temporal
+
+        Args:
+            curso_id: Curso de la fila
+            fecha: Fecha del registro (str ISO, date o datetime)
+            valores: dict {indicador: valor} con las claves de self.indicadores
+            version_anterior: versión de cursos_temporal leída antes del INSERT
+
+        Returns:
+            True si se aplicó en memoria; False si el almacén quedó invalidado
+            (otra escritura concurrente) y se reconstruirá en la próxima lectura
+        """
+        with self._lock:
+            if (not self._vigente or self.versiones is None
+                    or self._version_tabla != version_anterior
+                    or self._version_actual() != version_anterior + INCREMENTOS_POR_ESCRITURA_CONFIRMADA):
+                self._vigente = False
+                return False
+
+            fila = np.array([valores.get(i, np.nan) for i in self.indicadores], dtype=np.float32)
+            fecha = np.datetime64(pd.Timestamp(fecha).to_datetime64(), 'us')
+
+            inicio, largo, capacidad = self._bloques.get(curso_id, (0, 0, 0))
+            posicion = int(np.searchsorted(self._fechas[inicio:inicio + largo], fecha, side='right'))
+
+            if largo == capacidad or posicion < largo:
+                # Sin reserva, o semana atrasada: se reubica el bloque para no
+                # modificar filas visibles a través de vistas ya entregadas
+                self._reubicar(curso_id, self._capacidad(largo + 1))
+                inicio, largo, capacidad = self._bloques[curso_id]
+
+            destino = inicio + posicion
+            if posicion < largo:
+                self._matriz[destino + 1:inicio + largo + 1] = self._matriz[destino:inicio + largo].copy()
+                self._fechas[destino + 1:inicio + largo + 1] = self._fechas[destino:inicio + largo].copy()
+            self._matriz[destino] = fila
+            self._fechas[destino] = fecha
+            self._bloques[curso_id][1] = largo + 1
+
+            minimos = self._minimos.get(curso_id)
+            self._minimos[curso_id] = fila.copy() if minimos is None else np.fmin(minimos, fila)
+            maximos = self._maximos.get(curso_id)
+            self._maximos[curso_id] = fila.copy() if maximos is None else np.fmax(maximos, fila)
+
+            self._version_tabla = self._version_actual()
+            self.version += 1
+            return True
+
+    def resumen(self):
+        """Tamaño y estado del almacén (para diagnóstico y métricas)"""
+        with self._lock:
+            return {
+                'vigente': self._vigente,
+                'version': self.version,
+                'reconstrucciones': self.reconstrucciones,
+                'cursos': len(self._bloques),
+                'filas': int(sum(b[1] for b in self._bloques.values())),
+                'capacidad': len(self._matriz),
+                'bytes': int(self._matriz.nbytes + self._fechas.nbytes)
+            }
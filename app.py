@@ -11,64 +11,132 @@ Versión Web con Datos Precargados
 - Dashboard interactivo con simulador de intervenciones
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, render_template, request, jsonify, redirect, url_for, Response, stream_with_context, send_file
 import os
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime, timedelta
 import json
-from sqlalchemy import text
+import io
+import queue
+import base64
+import shutil
+import zipfile
+import tempfile
+from sqlalchemy import text, bindparam
+from werkzeug.utils import secure_filename
 
 # Importar módulos propios
-from database import DatabaseManager
+from database import DatabaseManager, Estudiante
+from cache_respuestas import CacheRespuestas, ruta_versiones_compartidas
+from eventos import bus_eventos, formatear_sse, ruta_eventos_compartidos
+from metricas import registro_metricas, InstrumentacionFlask, instrumentar_engine, medir_etapa, ruta_metricas_compartidas
+from perfilador import PerfiladorPeticiones
+from almacen_series import AlmacenSeries
+from inspector_consultas import InspectorConsultas
+from serializacion_respuestas import ProveedorJSONRapido, CompresionRespuestas, ORJSON_AVAILABLE
 from modelo_lstm import predecir_riesgo_curso, ModeloLSTMPredictor
 from modelo_nlp import analizar_sentimientos_establecimiento, AnalizadorNLPAvanzado
 from modelo_gnn import analizar_red_social_establecimiento, AnalizadorRedesSociales
+from indice_embeddings import buscar_comentarios_similares, programar_indexacion
+from busqueda_texto import buscar_texto, TABLAS_BUSQUEDA
+from trayectorias_socioemocionales import MotorTrayectorias, TABLAS_FUENTE as TABLAS_TRAYECTORIAS
+from detector_temprano import DetectorTemprano
+from riesgo_estudiante import MotorRiesgo, TABLAS_FUENTE as TABLAS_RIESGO, COMPONENTES as COMPONENTES_RIESGO
 
 app = Flask(__name__)
 app.secret_key = 'convivir_v4_secret_key_2025'
 app.config['DEBUG'] = False
 app.config['ENV'] = 'production'
 
+# Latencia por ruta (se instala antes de la compresión para incluirla en la medición)
+InstrumentacionFlask(app)
+
+# Perfilado opcional de peticiones lentas (CONVIVIR_PERFILADO=header|on)
+perfilador = PerfiladorPeticiones(app)
+
+# Serialización JSON con orjson y compresión gzip/brotli de respuestas grandes
+app.json = ProveedorJSONRapido(app)
+CompresionRespuestas(app)
+if ORJSON_AVAILABLE:
+    import plotly.io as pio
+    pio.json.config.default_engine = 'orjson'
+
 # Inicializar base de datos
 db = DatabaseManager('convivir_v4.db')
 
-# Estado global
-estado_analisis = {
-    'archivo_cargado': False,
-    'nombre_archivo': 'Datos de Ejemplo Precargados',
-    'fecha_carga': None,
-    'total_estudiantes': 0,
-    'total_cursos': 0,
-    'total_interacciones': 0,
-    'analisis_completados': []
-}
+# Caché HTTP de endpoints de solo lectura (invalidada por escrituras en la BD).
+# Las versiones se comparten entre los workers de gunicorn a través de un archivo mapeado
+cache = CacheRespuestas(db.engine, archivo_versiones=ruta_versiones_compartidas(db.db_path))
+
+# Eventos SSE (alertas y progreso de trabajos) en un anillo mapeado en memoria:
+# un cliente conectado a cualquier worker recibe lo publicado en los demás
+bus_eventos.compartir(ruta_eventos_compartidos(db.db_path))
+
+# Cada worker escribe sus métricas en su propio archivo mapeado; /metrics las suma
+registro_metricas.compartir(ruta_metricas_compartidas(db.db_path))
+
+# Cada hilo usa su propia sesión; se libera al terminar la petición
+app.teardown_appcontext(lambda excepcion=None: db.cerrar_sesion())
+
+# Series semanales de todos los cursos en memoria (se invalidan con las versiones de la caché)
+almacen_series = AlmacenSeries(db.engine, cache.versiones)
+
+# Trayectorias socioemocionales de todos los estudiantes en memoria (se
+# reconstruyen tras escrituras en evaluaciones o estudiantes)
+motor_trayectorias = MotorTrayectorias(db.engine, cache.versiones)
+
+# Puntaje de riesgo por estudiante materializado en riesgo_estudiante (se
+# actualiza en la siguiente lectura tras escrituras en sus tablas de origen)
+motor_riesgo = MotorRiesgo(db.engine, cache.versiones, trayectorias=motor_trayectorias)
+
+# Detector EWMA/CUSUM de deterioro en los indicadores semanales (estado persistido)
+detector_temprano = DetectorTemprano(db)
+
+# Duración de cada sentencia SQL e indicadores expuestos en /metrics
+instrumentar_engine(db.engine)
+
+# Consultas lentas y patrones N+1 por petición
+inspector_consultas = InspectorConsultas(db.engine, app)
+registro_metricas.indicador('convivir_sse_suscriptores', 'Clientes conectados a /api/eventos',
+                            lambda: bus_eventos.total_suscriptores)
+registro_metricas.indicador('convivir_cache_aciertos', 'Aciertos acumulados de la caché de respuestas',
+                            lambda: cache.lru.aciertos)
+registro_metricas.indicador('convivir_cache_fallos', 'Fallos acumulados de la caché de respuestas',
+                            lambda: cache.lru.fallos)
+registro_metricas.indicador('convivir_almacen_series_bytes', 'Memoria del almacén de series temporales',
+                            lambda: almacen_series.resumen()['bytes'])
+
+# Formatos aceptados para listas de estudiantes
+EXTENSIONES_LISTA = ('.txt', '.csv', '.tsv', '.xlsx')
+
+# Máximo de valores por consulta IN (SQLite admite 999 parámetros en versiones antiguas)
+TAMANO_BLOQUE_IN = 500
+
+def sincronizar_detector_temprano():
+    """
+    Pone al día el detector temprano tras una carga masiva: las semanas
+    importadas no pasan por registrar_semana y /api/alertas_tempranas es de
+    solo lectura
+    """
+    try:
+        detector_temprano.sincronizar()
+    except Exception as e:
+        print(f"⚠️ No se pudo sincronizar el detector temprano: {e}")
 
 
 def inicializar_datos():
     """Carga datos de ejemplo automáticamente al iniciar"""
-    global estado_analisis
-    
     # Verificar si ya hay datos
     try:
         with db.engine.connect() as conn:
-            result = conn.execute(text("SELECT COUNT(*) FROM estudiantes"))
-            count = result.scalar()
+            resumen = db.obtener_resumen_establecimiento(conn)
+            count = resumen['total_estudiantes']
             
             if count > 0:
                 print("✅ Datos ya cargados en la base de datos")
-                estado_analisis['archivo_cargado'] = True
-                estado_analisis['total_estudiantes'] = count
-                
-                # Contar cursos
-                result = conn.execute(text("SELECT COUNT(DISTINCT curso_id) FROM cursos_temporal"))
-                estado_analisis['total_cursos'] = result.scalar()
-                
-                # Contar interacciones
-                result = conn.execute(text("SELECT COUNT(*) FROM interacciones_sociales"))
-                estado_analisis['total_interacciones'] = result.scalar()
-                
+                db.actualizar_estado_aplicacion(archivo_cargado=True)
                 return True
     except:
         pass
@@ -82,27 +150,18 @@ def inicializar_datos():
         return False
     
     try:
-        resultado = db.cargar_desde_excel(excel_path)
+        resultado = db.importar_excel_por_bloques(excel_path)
         
         if resultado['exito']:
             print("✅ Datos cargados exitosamente")
-            estado_analisis['archivo_cargado'] = True
-            estado_analisis['fecha_carga'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            db.actualizar_estado_aplicacion(archivo_cargado=True, fecha_carga=datetime.now())
+            sincronizar_detector_temprano()
             
             # Contar registros
-            with db.engine.connect() as conn:
-                result = conn.execute(text("SELECT COUNT(*) FROM estudiantes"))
-                estado_analisis['total_estudiantes'] = result.scalar()
-                
-                result = conn.execute(text("SELECT COUNT(DISTINCT curso_id) FROM cursos_temporal"))
-                estado_analisis['total_cursos'] = result.scalar()
-                
-                result = conn.execute(text("SELECT COUNT(*) FROM interacciones_sociales"))
-                estado_analisis['total_interacciones'] = result.scalar()
-            
-            print(f"   📚 Estudiantes: {estado_analisis['total_estudiantes']}")
-            print(f"   🎓 Cursos: {estado_analisis['total_cursos']}")
-            print(f"   🔗 Interacciones: {estado_analisis['total_interacciones']}")
+            estado = db.obtener_estado_aplicacion()
+            print(f"   📚 Estudiantes: {estado['total_estudiantes']}")
+            print(f"   🎓 Cursos: {estado['total_cursos']}")
+            print(f"   🔗 Interacciones: {estado['total_interacciones']}")
             return True
         else:
             print(f"❌ Error al cargar datos: {resultado['mensaje']}")
@@ -113,6 +172,29 @@ def inicializar_datos():
         return False
 
 
+def precargar_modelos():
+    """
+    Carga los pesos de solo lectura (BETO) en el proceso actual. Llamada desde el
+    maestro de gunicorn con preload_app, los workers los heredan copy-on-write.
+    TensorFlow ya queda importado al importar modelo_lstm.
+    Con el backend ONNX solo se exporta el modelo cuantizado: las sesiones de
+    onnxruntime no sobreviven al fork y cada worker abre la suya.
+    """
+    from modelo_nlp import obtener_pipeline_sentimiento, TRANSFORMERS_AVAILABLE, BACKEND_SENTIMIENTO, MODELO_SENTIMIENTO
+    from sentimiento_onnx import ONNXRUNTIME_AVAILABLE, preparar_modelo
+    
+    if not TRANSFORMERS_AVAILABLE:
+        return False
+    try:
+        if BACKEND_SENTIMIENTO == 'onnx' and ONNXRUNTIME_AVAILABLE:
+            preparar_modelo(MODELO_SENTIMIENTO)
+            return True
+        return obtener_pipeline_sentimiento() is not None
+    except Exception as e:
+        print(f"⚠️ No se pudo precargar el modelo transformer: {e}")
+        return False
+
+
 # ============================================================================
 # RUTAS PRINCIPALES
 # ============================================================================
@@ -120,52 +202,29 @@ def inicializar_datos():
 @app.route('/')
 def index():
     """Página principal con dashboard"""
-    return render_template('index.html', estado=estado_analisis)
+    return render_template('index.html', estado=db.obtener_estado_aplicacion())
 
 
 @app.route('/api/estadisticas_generales')
+@cache.cacheable('resumen_establecimiento', 'resumen_cursos', *TABLAS_RIESGO)
 def estadisticas_generales():
     """Obtiene estadísticas generales del establecimiento"""
     try:
+        motor_riesgo.asegurar_vigente()
         with db.engine.connect() as conn:
-            # Estadísticas de estudiantes
-            result = conn.execute(text("""
-                SELECT COUNT(*) as total
-                FROM estudiantes
-            """))
-            row = result.fetchone()
-            total_estudiantes = row[0] if row else 0
-            riesgo_promedio = 0
-            
-            # Estadísticas de cursos
-            result = conn.execute(text("""
-                SELECT 
-                    COUNT(DISTINCT curso_id) as total_cursos,
-                    AVG(clima_escolar_promedio) as clima_promedio
-                FROM cursos_temporal
-            """))
-            row = result.fetchone()
-            total_cursos = row[0] if row else 0
-            clima_promedio = row[1] if row and row[1] else 0
-            
-            # Alertas pendientes
-            result = conn.execute(text("""
-                SELECT COUNT(*) FROM alertas WHERE estado = 'pendiente'
-            """))
-            alertas_pendientes = result.scalar() or 0
-            
-            # Interacciones registradas
-            result = conn.execute(text("SELECT COUNT(*) FROM interacciones_sociales"))
-            total_interacciones = result.scalar() or 0
+            # Contadores materializados en resumen_establecimiento y riesgo_estudiante
+            resumen = db.obtener_resumen_establecimiento(conn)
+            riesgo = motor_riesgo.resumen_establecimiento(conn)
             
             return jsonify({
                 'exito': True,
-                'total_estudiantes': total_estudiantes,
-                'total_cursos': total_cursos,
-                'riesgo_promedio': round(float(riesgo_promedio), 2),
-                'clima_promedio': round(float(clima_promedio), 2),
-                'alertas_pendientes': alertas_pendientes,
-                'total_interacciones': total_interacciones
+                'total_estudiantes': resumen['total_estudiantes'],
+                'total_cursos': resumen['total_cursos'],
+                'riesgo_promedio': riesgo['riesgo_promedio'],
+                'estudiantes_riesgo': {nivel: riesgo[nivel] for nivel in ('alto', 'medio', 'bajo')},
+                'clima_promedio': round(float(resumen['clima_promedio']), 2),
+                'alertas_pendientes': resumen['alertas_pendientes'],
+                'total_interacciones': resumen['total_interacciones']
             })
     
     except Exception as e:
@@ -173,13 +232,14 @@ def estadisticas_generales():
 
 
 @app.route('/api/lista_cursos')
+@cache.cacheable('resumen_cursos')
 def lista_cursos():
     """Obtiene lista de cursos disponibles"""
     try:
         with db.engine.connect() as conn:
             result = conn.execute(text("""
-                SELECT DISTINCT curso_id
-                FROM cursos_temporal
+                SELECT curso_id
+                FROM resumen_cursos
                 ORDER BY curso_id
             """))
             
@@ -201,61 +261,262 @@ def lista_cursos():
         return jsonify({'exito': False, 'mensaje': str(e)})
 
 
+def _detalle_solicitado():
+    """Indica si la petición pide los arreglos detallados por ítem (por defecto sí)"""
+    return request.args.get('detalle', 'true').lower() not in ('false', '0', 'no')
+
+
 @app.route('/api/analisis_predictivo/<curso_id>')
 def analisis_predictivo_curso(curso_id):
     """Ejecuta análisis predictivo LSTM para un curso"""
     try:
-        resultado = predecir_riesgo_curso(db, curso_id, horizonte_semanas=4)
-        return jsonify(resultado)
+        resultado = predecir_riesgo_curso(db, curso_id, horizonte_semanas=4,
+                                          trabajo_id=request.args.get('trabajo'), almacen=almacen_series)
+        with medir_etapa('lstm', 'serializacion'):
+            return jsonify(resultado)
     except Exception as e:
         return jsonify({'exito': False, 'mensaje': str(e)})
 
 
 @app.route('/api/analisis_sentimientos')
 def analisis_sentimientos():
-    """Ejecuta análisis de sentimientos NLP"""
+    """
+    Ejecuta análisis de sentimientos NLP
+    
+    Con ?detalle=false se omite 'resultados_detallados' (el texto de cada comentario)
+    """
     try:
-        resultado = analizar_sentimientos_establecimiento(db)
-        return jsonify(resultado)
+        resultado = analizar_sentimientos_establecimiento(db, trabajo_id=request.args.get('trabajo'))
+        if not _detalle_solicitado():
+            resultado.pop('resultados_detallados', None)
+        with medir_etapa('nlp', 'serializacion'):
+            return jsonify(resultado)
     except Exception as e:
         return jsonify({'exito': False, 'mensaje': str(e)})
 
 
 @app.route('/api/analisis_red_social')
 def analisis_red_social():
-    """Ejecuta análisis de red social con GNN"""
+    """
+    Ejecuta análisis de red social con GNN
+    
+    Con ?detalle=false se omite el detalle de cada interacción de bullying
+    """
     try:
-        resultado = analizar_red_social_establecimiento(db)
-        return jsonify(resultado)
+        resultado = analizar_red_social_establecimiento(db, trabajo_id=request.args.get('trabajo'))
+        # El grafo NetworkX solo se usa internamente para la visualización
+        resultado.pop('grafo', None)
+        if not _detalle_solicitado():
+            resultado.get('analisis_bullying', {}).pop('interacciones_detalle', None)
+        with medir_etapa('red_social', 'serializacion'):
+            return jsonify(resultado)
     except Exception as e:
         return jsonify({'exito': False, 'mensaje': str(e)})
 
 
+@app.route('/metrics')
+def metricas_prometheus():
+    """
+    Histogramas de latencia (HTTP, etapas de ML y SQL) en formato de texto Prometheus,
+    sumados entre todos los workers (ver metricas.py para la agregación)
+    """
+    return app.response_class(
+        registro_metricas.exportar_prometheus(),
+        mimetype='text/plain; version=0.0.4; charset=utf-8',
+        headers={'Cache-Control': 'no-store'}
+    )
+
+
+@app.route('/api/diagnostico_consultas')
+def api_diagnostico_consultas():
+    """Consultas lentas y patrones N+1 detectados recientemente"""
+    return jsonify(dict(inspector_consultas.resumen(), exito=True))
+
+
+@app.route('/api/perfiles')
+def api_listar_perfiles():
+    """Lista los perfiles de peticiones lentas guardados por el perfilador"""
+    return jsonify({
+        'exito': True,
+        'activo': perfilador.activo,
+        'modo': perfilador.modo,
+        'umbral_ms': perfilador.umbral * 1000,
+        'perfiles': perfilador.listar()
+    })
+
+
+@app.route('/api/perfiles/<nombre>')
+def api_descargar_perfil(nombre):
+    """
+    Descarga un perfil en formato colapsado (flamegraph.pl, speedscope) o, con
+    ?formato=speedscope, como JSON de speedscope
+    """
+    ruta_perfil = perfilador.ruta_perfil(nombre)
+    if ruta_perfil is None:
+        return jsonify({'exito': False, 'mensaje': f'Perfil "{nombre}" no encontrado'}), 404
+    
+    if request.args.get('formato') == 'speedscope':
+        respuesta = jsonify(perfilador.exportar_speedscope(nombre))
+        respuesta.headers['Content-Disposition'] = f'attachment; filename={nombre[:-len(".collapsed")]}.speedscope.json'
+        return respuesta
+    
+    return send_file(ruta_perfil, mimetype='text/plain', as_attachment=True, download_name=nombre)
+
+
+@app.route('/api/eventos')
+def api_eventos():
+    """
+    Stream Server-Sent Events con alertas nuevas ('alerta') y el avance de los
+    análisis ('progreso'). Los análisis se siguen pasando ?trabajo=<id> al endpoint
+    correspondiente; al reconectar, el navegador envía Last-Event-ID y se reenvían
+    los eventos perdidos que sigan en el anillo. Los eventos se comparten entre
+    workers, así que el progreso llega aunque el trabajo corra en otro proceso.
+    """
+    try:
+        desde_id = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        desde_id = None
+    
+    suscripcion = bus_eventos.suscribir(desde_id)
+    
+    def generar():
+        try:
+            # Indica al navegador cuánto esperar antes de reconectar
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    evento = suscripcion.get(timeout=15)
+                except queue.Empty:
+                    # Comentario SSE para mantener viva la conexión a través de proxies
+                    yield ': ping\n\n'
+                    continue
+                yield formatear_sse(evento)
+        finally:
+            bus_eventos.desuscribir(suscripcion)
+    
+    return Response(
+        stream_with_context(generar()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def _codificar_cursor(fecha, comentario_id):
+    """Genera un token opaco con la última clave (fecha_comentario, id) entregada"""
+    if isinstance(fecha, datetime):
+        fecha = fecha.isoformat(sep=' ')
+    crudo = json.dumps([str(fecha), int(comentario_id)])
+    return base64.urlsafe_b64encode(crudo.encode('utf-8')).decode('ascii')
+
+
+def _decodificar_cursor(token):
+    """Recupera (fecha_comentario, id) desde un token generado por _codificar_cursor"""
+    try:
+        fecha, comentario_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return str(fecha), int(comentario_id)
+    except Exception:
+        raise ValueError('Cursor de paginación inválido')
+
+
+def _filtros_observaciones(args):
+    """Construye la cláusula WHERE y sus parámetros a partir de los filtros de la URL"""
+    condiciones = []
+    params = {}
+    
+    if args.get('curso'):
+        condiciones.append("e.curso_id = :curso")
+        params['curso'] = args['curso']
+    
+    if args.get('estudiante'):
+        condiciones.append("LOWER(c.estudiante_id) LIKE LOWER(:estudiante)")
+        params['estudiante'] = f"%{args['estudiante']}%"
+    
+    if args.get('sentimiento'):
+        condiciones.append("c.sentimiento_analizado = :sentimiento")
+        params['sentimiento'] = args['sentimiento']
+    
+    if args.get('tipo'):
+        condiciones.append("c.tipo_comentario = :tipo")
+        params['tipo'] = args['tipo']
+    
+    if args.get('desde'):
+        condiciones.append("c.fecha_comentario >= :desde")
+        params['desde'] = datetime.strptime(args['desde'], '%Y-%m-%d').strftime('%Y-%m-%d')
+    
+    if args.get('hasta'):
+        # Incluir el día completo indicado en 'hasta'
+        condiciones.append("c.fecha_comentario < :hasta")
+        hasta = datetime.strptime(args['hasta'], '%Y-%m-%d') + timedelta(days=1)
+        params['hasta'] = hasta.strftime('%Y-%m-%d')
+    
+    return condiciones, params
+
+
 @app.route('/api/observaciones_estudiantes')
+@cache.cacheable('comentarios', 'estudiantes', por_dia=True)
 def obtener_observaciones_estudiantes():
-    """Obtiene todas las observaciones (comentarios) de estudiantes con análisis NLP"""
+    """
+    Obtiene las observaciones (comentarios) de estudiantes con análisis NLP,
+    paginadas por cursor sobre (fecha_comentario, id) y filtradas en el servidor.
+    
+    Parámetros: limite, cursor, curso, estudiante, sentimiento, tipo,
+    desde y hasta (YYYY-MM-DD). Las estadísticas se calculan solo en la
+    primera página, sobre el conjunto filtrado completo.
+    """
     try:
+        limite = min(max(request.args.get('limite', 50, type=int), 1), 200)
+        condiciones, params = _filtros_observaciones(request.args)
+        
+        # La tabla estudiantes solo se une cuando se filtra por curso
+        join_estudiantes = "JOIN estudiantes e ON c.estudiante_id = e.estudiante_id" if 'curso' in params else ""
+        
+        condiciones_pagina = list(condiciones)
+        cursor = request.args.get('cursor')
+        if cursor:
+            fecha_cursor, id_cursor = _decodificar_cursor(cursor)
+            condiciones_pagina.append(
+                "(c.fecha_comentario < :fecha_cursor OR "
+                "(c.fecha_comentario = :fecha_cursor AND c.id < :id_cursor))"
+            )
+            params['fecha_cursor'] = fecha_cursor
+            params['id_cursor'] = id_cursor
+        
+        where_pagina = f"WHERE {' AND '.join(condiciones_pagina)}" if condiciones_pagina else ""
+        
         with db.engine.connect() as conn:
-            result = conn.execute(text("""
+            # Se pide un registro extra para saber si existe una página siguiente
+            result = conn.execute(text(f"""
                 SELECT 
-                    c.id,
-                    c.estudiante_id,
-                    c.estudiante_id as nombre_completo,
-                    e.curso_id,
-                    c.fecha_comentario,
-                    c.periodo,
-                    c.tipo_comentario,
-                    c.comentario_texto,
-                    c.tema_principal,
-                    c.sentimiento_analizado,
-                    c.confianza_sentimiento
-                FROM comentarios c
-                LEFT JOIN estudiantes e ON c.estudiante_id = e.estudiante_id
-                ORDER BY c.fecha_comentario DESC
-            """))
+                    p.id,
+                    p.estudiante_id,
+                    p.estudiante_id as nombre_completo,
+                    e2.curso_id,
+                    p.fecha_comentario,
+                    p.periodo,
+                    p.tipo_comentario,
+                    p.comentario_texto,
+                    p.tema_principal,
+                    p.sentimiento_analizado,
+                    p.confianza_sentimiento,
+                    p.tono_percibido
+                FROM (
+                    SELECT c.*
+                    FROM comentarios c
+                    {join_estudiantes}
+                    {where_pagina}
+                    ORDER BY c.fecha_comentario DESC, c.id DESC
+                    LIMIT :limite
+                ) p
+                LEFT JOIN estudiantes e2 ON p.estudiante_id = e2.estudiante_id
+                ORDER BY p.fecha_comentario DESC, p.id DESC
+            """), {**params, 'limite': limite + 1})
+            
+            filas = result.fetchall()
+            hay_mas = len(filas) > limite
+            filas = filas[:limite]
             
             observaciones = []
-            for row in result:
+            for row in filas:
                 observaciones.append({
                     'id': row[0],
                     'estudiante_id': row[1],
@@ -263,27 +524,77 @@ def obtener_observaciones_estudiantes():
                     'curso_id': row[3],
                     'fecha': str(row[4]),
                     'periodo': row[5],
-                    'tipo': row[6],
+                    'tipo': row[6] if row[6] else 'general',
                     'texto': row[7],
+                    'comentario': row[7],
                     'tema': row[8],
                     'sentimiento': row[9],
-                    'confianza': float(row[10]) if row[10] else 0.0
+                    'confianza': float(row[10]) if row[10] else 0.0,
+                    'autor': row[11] if row[11] else 'Docente'
                 })
             
-            return jsonify({
+            siguiente_cursor = _codificar_cursor(filas[-1][4], filas[-1][0]) if hay_mas else None
+            
+            respuesta = {
                 'exito': True,
                 'observaciones': observaciones,
-                'total': len(observaciones)
-            })
+                'total': len(observaciones),
+                'siguiente_cursor': siguiente_cursor,
+                'hay_mas': hay_mas
+            }
+            
+            if not cursor:
+                where_filtros = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+                filtros_params = {k: v for k, v in params.items() if k not in ('fecha_cursor', 'id_cursor')}
+                hace_una_semana = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+                
+                stats = conn.execute(text(f"""
+                    SELECT 
+                        COUNT(*),
+                        COUNT(DISTINCT c.estudiante_id),
+                        SUM(CASE WHEN c.fecha_comentario >= :hace_una_semana THEN 1 ELSE 0 END),
+                        SUM(CASE WHEN c.sentimiento_analizado = 'negativo' THEN 1 ELSE 0 END),
+                        SUM(CASE WHEN c.sentimiento_analizado = 'positivo' THEN 1 ELSE 0 END),
+                        SUM(CASE WHEN c.sentimiento_analizado = 'neutral' THEN 1 ELSE 0 END)
+                    FROM comentarios c
+                    {join_estudiantes}
+                    {where_filtros}
+                """), {**filtros_params, 'hace_una_semana': hace_una_semana}).fetchone()
+                
+                condiciones_riesgo = condiciones + ["c.sentimiento_analizado = 'negativo'"]
+                en_riesgo = conn.execute(text(f"""
+                    SELECT COUNT(*) FROM (
+                        SELECT c.estudiante_id
+                        FROM comentarios c
+                        {join_estudiantes}
+                        WHERE {' AND '.join(condiciones_riesgo)}
+                        GROUP BY c.estudiante_id
+                        HAVING COUNT(*) >= 2
+                    ) r
+                """), filtros_params).scalar()
+                
+                respuesta['estadisticas'] = {
+                    'total': stats[0] or 0,
+                    'estudiantes_unicos': stats[1] or 0,
+                    'ultima_semana': stats[2] or 0,
+                    'negativos': stats[3] or 0,
+                    'positivos': stats[4] or 0,
+                    'neutrales': stats[5] or 0,
+                    'estudiantes_en_riesgo': en_riesgo or 0
+                }
+            
+            return jsonify(respuesta)
     
     except Exception as e:
         return jsonify({'exito': False, 'mensaje': str(e)})
 
 
 @app.route('/api/observaciones_estudiante/<estudiante_id>')
+@cache.cacheable(*TABLAS_RIESGO)
 def obtener_observaciones_estudiante(estudiante_id):
     """Obtiene las observaciones de un estudiante específico"""
     try:
+        motor_riesgo.asegurar_vigente()
         with db.engine.connect() as conn:
             # Obtener datos del estudiante
             result_est = conn.execute(text("""
@@ -333,6 +644,7 @@ def obtener_observaciones_estudiante(estudiante_id):
             negativos = sentimientos.count('negativo')
             positivos = sentimientos.count('positivo')
             neutrales = sentimientos.count('neutral')
+            riesgo = motor_riesgo.estudiante(estudiante_id, conn) or {}
             
             return jsonify({
                 'exito': True,
@@ -347,7 +659,9 @@ def obtener_observaciones_estudiante(estudiante_id):
                     'negativos': negativos,
                     'positivos': positivos,
                     'neutrales': neutrales,
-                    'nivel_riesgo': 'alto' if negativos >= 3 else ('medio' if negativos >= 2 else 'bajo')
+                    'nivel_riesgo': riesgo.get('nivel', 'bajo'),
+                    'puntaje_riesgo': riesgo.get('puntaje', 0.0),
+                    'componentes_riesgo': {c: riesgo[c] for c in COMPONENTES_RIESGO if c in riesgo}
                 }
             })
     
@@ -355,7 +669,105 @@ def obtener_observaciones_estudiante(estudiante_id):
         return jsonify({'exito': False, 'mensaje': str(e)})
 
 
+@app.route('/api/riesgo_estudiantes')
+@cache.cacheable(*TABLAS_RIESGO)
+def riesgo_estudiantes():
+    """
+    Riesgo materializado: promedio y distribución por nivel del establecimiento
+    y de cada curso, y los estudiantes de mayor puntaje con sus componentes.
+    Parámetros: curso_id (opcional), limite (1-100)
+    """
+    try:
+        motor_riesgo.asegurar_vigente()
+        curso_id = request.args.get('curso_id') or None
+        limite = min(max(request.args.get('limite', 10, type=int), 1), 100)
+        with db.engine.connect() as conn:
+            return jsonify({
+                'exito': True,
+                'establecimiento': motor_riesgo.resumen_establecimiento(conn),
+                'cursos': motor_riesgo.resumen_cursos(conn),
+                'estudiantes': motor_riesgo.mayor_riesgo(limite, curso_id, conn)
+            })
+    except Exception as e:
+        return jsonify({'exito': False, 'mensaje': str(e)})
+
+
+@app.route('/api/tamizaje_socioemocional')
+@cache.cacheable(*TABLAS_TRAYECTORIAS)
+def tamizaje_socioemocional():
+    """
+    Tamizaje socioemocional del establecimiento: última evaluación, pendiente,
+    z respecto del curso y de la cohorte y señales de alerta de cada estudiante.
+    Parámetros: curso_id (opcional), solo_alertas (1/0)
+    """
+    try:
+        curso_id = request.args.get('curso_id') or None
+        solo_alertas = request.args.get('solo_alertas', '0') in ('1', 'true')
+        trayectorias = motor_trayectorias.obtener()
+        estudiantes = motor_trayectorias.tamizaje(curso_id, solo_alertas)
+        return jsonify({
+            'exito': True,
+            'periodos': trayectorias.periodos,
+            'dimensiones': trayectorias.dimensiones,
+            'total': len(estudiantes),
+            'estudiantes': estudiantes
+        })
+    except Exception as e:
+        return jsonify({'exito': False, 'mensaje': str(e)})
+
+
+@app.route('/api/trayectoria_socioemocional/<estudiante_id>')
+@cache.cacheable(*TABLAS_TRAYECTORIAS)
+def trayectoria_socioemocional(estudiante_id):
+    """Evaluaciones de un estudiante por periodo con sus z, caídas y pendientes"""
+    try:
+        trayectoria = motor_trayectorias.obtener().estudiante(estudiante_id)
+        if trayectoria is None:
+            return jsonify({'exito': False, 'mensaje': 'Estudiante no encontrado'})
+        return jsonify({'exito': True, **trayectoria})
+    except Exception as e:
+        return jsonify({'exito': False, 'mensaje': str(e)})
+
+
+@app.route('/api/comentarios_similares/<int:comentario_id>')
+def comentarios_similares(comentario_id):
+    """
+    Observaciones pasadas más parecidas a un comentario, en todo el establecimiento
+    (similitud coseno de embeddings, ver indice_embeddings.py). Parámetro: k (1-50)
+    
+    No usa la caché de respuestas: el índice avanza en segundo plano sin cambiar la
+    versión de las tablas
+    """
+    try:
+        k = min(max(request.args.get('k', 10, type=int), 1), 50)
+        return jsonify(buscar_comentarios_similares(db.engine, comentario_id, k))
+    except Exception as e:
+        return jsonify({'exito': False, 'mensaje': str(e)})
+
+
+@app.route('/api/buscar_texto')
+@cache.cacheable('comentarios', 'alertas')
+def api_buscar_texto():
+    """
+    Búsqueda de texto completo en observaciones o alertas, ordenada por relevancia
+    con los términos resaltados (ver busqueda_texto.py)
+    
+    Parámetros: q, tipo ('comentarios' o 'alertas'), limite (1-100) y pagina
+    """
+    try:
+        tipo = request.args.get('tipo', 'comentarios')
+        if tipo not in TABLAS_BUSQUEDA:
+            return jsonify({'exito': False, 'mensaje': f"Tipo de búsqueda no válido: {tipo}"}), 400
+        limite = min(max(request.args.get('limite', 20, type=int), 1), 100)
+        pagina = max(request.args.get('pagina', 1, type=int), 1)
+        resultado = buscar_texto(db, request.args.get('q', ''), tabla=tipo, limite=limite, pagina=pagina)
+        return jsonify({'exito': True, 'tipo': tipo, **resultado})
+    except Exception as e:
+        return jsonify({'exito': False, 'mensaje': str(e)})
+
+
 @app.route('/api/alertas')
+@cache.cacheable('alertas')
 def obtener_alertas():
     """Obtiene alertas pendientes"""
     try:
@@ -408,20 +820,12 @@ def simular_intervencion():
         tipo_intervencion = datos.get('tipo_intervencion', 'Taller de Convivencia')
         impacto_esperado = datos.get('impacto_esperado', 0.15)  # 15% de mejora por defecto
         
-        # Obtener datos históricos
-        with db.engine.connect() as conn:
-            result = conn.execute(text("""
-                SELECT fecha_registro, clima_escolar_promedio, nivel_empatia_promedio, nivel_resolucion_conflictos_promedio
-                FROM cursos_temporal
-                WHERE curso_id = :curso_id
-                ORDER BY fecha_registro
-            """), {'curso_id': curso_id})
-            
-            rows = result.fetchall()
-            if len(rows) < 4:
-                return jsonify({'exito': False, 'mensaje': 'Datos insuficientes para simulación'})
-            
-            data = pd.DataFrame(rows, columns=['fecha', 'clima_escolar', 'nivel_empatia', 'gestion_conflictos'])
+        # Obtener datos históricos desde el almacén en memoria
+        data = almacen_series.dataframe(curso_id, ['clima_escolar', 'empatia', 'resolucion_conflictos'])
+        if len(data) < 4:
+            return jsonify({'exito': False, 'mensaje': 'Datos insuficientes para simulación'})
+        
+        data.columns = ['fecha', 'clima_escolar', 'nivel_empatia', 'gestion_conflictos']
         
         # Crear modelo
         modelo = ModeloLSTMPredictor(sequence_length=4, horizonte_prediccion=4)
@@ -461,42 +865,36 @@ def simular_intervencion():
 
 
 @app.route('/api/grafico_evolucion/<curso_id>')
+@cache.cacheable('cursos_temporal')
 def grafico_evolucion(curso_id):
     """Genera gráfico de evolución temporal"""
     try:
-        with db.engine.connect() as conn:
-            result = conn.execute(text("""
-                SELECT fecha_registro, clima_escolar_promedio, nivel_empatia_promedio, nivel_resolucion_conflictos_promedio
-                FROM cursos_temporal
-                WHERE curso_id = :curso_id
-                ORDER BY fecha_registro
-            """), {'curso_id': curso_id})
-            
-            rows = result.fetchall()
-            data = pd.DataFrame(rows, columns=['fecha', 'clima_escolar', 'nivel_empatia', 'gestion_conflictos'])
+        # Vistas del almacén en memoria: sin consulta ni copia de la serie
+        fechas, matriz = almacen_series.vista(curso_id)
+        columna = almacen_series.indicadores.index
         
         # Crear figura
         fig = go.Figure()
         
         fig.add_trace(go.Scatter(
-            x=data['fecha'],
-            y=data['clima_escolar'],
+            x=fechas,
+            y=matriz[:, columna('clima_escolar')],
             mode='lines+markers',
             name='Clima Escolar',
             line=dict(color='#4CAF50', width=3)
         ))
         
         fig.add_trace(go.Scatter(
-            x=data['fecha'],
-            y=data['nivel_empatia'],
+            x=fechas,
+            y=matriz[:, columna('empatia')],
             mode='lines+markers',
             name='Nivel de Empatía',
             line=dict(color='#2196F3', width=3)
         ))
         
         fig.add_trace(go.Scatter(
-            x=data['fecha'],
-            y=data['gestion_conflictos'],
+            x=fechas,
+            y=matriz[:, columna('resolucion_conflictos')],
             mode='lines+markers',
             name='Gestión de Conflictos',
             line=dict(color='#FF9800', width=3)
@@ -511,7 +909,8 @@ def grafico_evolucion(curso_id):
             height=500
         )
         
-        return fig.to_json()
+        with medir_etapa('grafico', 'serializacion'):
+            return app.response_class(fig.to_json(), mimetype='application/json')
     
     except Exception as e:
         return jsonify({'error': str(e)})
@@ -591,7 +990,8 @@ def grafico_red_social():
             height=600
         )
         
-        return fig.to_json()
+        with medir_etapa('grafico', 'serializacion'):
+            return app.response_class(fig.to_json(), mimetype='application/json')
     
     except Exception as e:
         return jsonify({'error': str(e)})
@@ -643,17 +1043,13 @@ def pagina_observaciones_estudiantes():
 
 
 @app.route('/api/progreso_datos', methods=['GET'])
+@cache.cacheable('resumen_establecimiento')
 def api_progreso_datos():
     """Retorna el progreso de recolección de datos"""
     try:
         with db.get_session() as session:
-            # Contar semanas únicas registradas
-            query = text("""
-                SELECT COUNT(DISTINCT fecha_registro) as semanas
-                FROM cursos_temporal
-            """)
-            result = session.execute(query).fetchone()
-            semanas_registradas = result[0] if result else 0
+            # Semanas únicas registradas (resumen materializado)
+            semanas_registradas = db.obtener_resumen_establecimiento(session)['semanas_registradas']
             
             # Calcular confiabilidad
             confiabilidad = 'BAJA'
@@ -694,6 +1090,9 @@ def api_ingresar_datos_semanales():
                     'mensaje': f'Campo requerido faltante: {campo}'
                 })
         
+        # Versión de cursos_temporal antes de escribir, para actualizar el almacén en memoria
+        version_series = cache.versiones.version('cursos_temporal')[0]
+        
         # Insertar en base de datos
         with db.get_session() as session:
             query = text("""
@@ -733,8 +1132,33 @@ def api_ingresar_datos_semanales():
                 'promedio_notas': float(data['promedio_notas'])
             })
             
+            db.registrar_en_resumen_curso(
+                session, data['curso'], data['fecha'],
+                clima=float(data['clima_escolar']), total_estudiantes=30
+            )
+            
             session.commit()
             
+            valores_semana = {
+                'clima_escolar': float(data['clima_escolar']),
+                'apoyo_docentes': float(data['apoyo_docentes']),
+                'participacion': float(data['participacion']),
+                'empatia': float(data['empatia']),
+                'autoestima': float(data['autoestima']),
+                'resolucion_conflictos': float(data['resolucion_conflictos']),
+                'incidentes_bullying': int(data['incidentes_bullying']),
+                'incidentes_violencia': int(data['incidentes_violencia']),
+                'incidentes_discriminacion': int(data['incidentes_discriminacion'])
+            }
+            almacen_series.registrar_semana(data['curso'], data['fecha'], valores_semana, version_series)
+            
+            # Detector temprano: actualiza el estado EWMA/CUSUM del curso y alerta de inmediato
+            alertas_tempranas = []
+            try:
+                alertas_tempranas = detector_temprano.registrar_semana(data['curso'], data['fecha'], valores_semana)
+            except Exception as e:
+                print(f"⚠️ No se pudo actualizar el detector temprano: {e}")
+            
             # Si hay evento, registrarlo
             if data.get('tipo_evento') and data.get('tipo_evento') != '':
                 query_evento = text("""
@@ -797,14 +1221,10 @@ def api_ingresar_datos_semanales():
             if observaciones_guardadas > 0:
                 session.commit()
                 print(f"✅ {observaciones_guardadas} observaciones individuales guardadas")
+                programar_indexacion(db.engine)
             
             # Contar total de semanas
-            query_count = text("""
-                SELECT COUNT(DISTINCT fecha_registro) as semanas
-                FROM cursos_temporal
-            """)
-            result = session.execute(query_count).fetchone()
-            semanas_totales = result[0] if result else 0
+            semanas_totales = db.obtener_resumen_establecimiento(session)['semanas_registradas']
             
             # Si hay suficientes datos, reentrenar modelo
             if semanas_totales >= 12:
@@ -839,7 +1259,8 @@ def api_ingresar_datos_semanales():
                 'semanas_totales': semanas_totales,
                 'curso': data['curso'],
                 'fecha': data['fecha'],
-                'observaciones_guardadas': observaciones_guardadas
+                'observaciones_guardadas': observaciones_guardadas,
+                'alertas_tempranas': alertas_tempranas
             })
             
     except Exception as e:
@@ -849,57 +1270,42 @@ def api_ingresar_datos_semanales():
         })
 
 
-@app.route('/api/observaciones_estudiantes', methods=['GET'])
-def api_observaciones_estudiantes():
-    """Obtiene todas las observaciones individuales de estudiantes"""
+@app.route('/api/alertas_tempranas', methods=['GET'])
+@cache.cacheable('estado_detector_temprano')
+def api_alertas_tempranas():
+    """
+    Estado del detector temprano (línea base, EWMA, CUSUM y alerta activa por
+    curso e indicador). Parámetro: curso_id (opcional). Solo lectura: los
+    cursos cambiados por otra vía se ponen al día con POST
+    /api/sincronizar_alertas_tempranas
+    """
     try:
-        with db.get_session() as session:
-            # Obtener todas las observaciones
-            query = text("""
-                SELECT 
-                    estudiante_id,
-                    fecha_comentario,
-                    comentario_texto,
-                    tipo_comentario,
-                    tono_percibido
-                FROM comentarios
-                ORDER BY fecha_comentario DESC
-            """)
-            
-            resultados = session.execute(query).fetchall()
-            
-            observaciones = []
-            for row in resultados:
-                observaciones.append({
-                    'estudiante_id': row[0],
-                    'fecha': row[1],
-                    'comentario': row[2],
-                    'tipo': row[3] if row[3] else 'general',
-                    'autor': row[4] if row[4] else 'Docente'
-                })
-            
-            # Calcular estadísticas
-            estudiantes_unicos = len(set([obs['estudiante_id'] for obs in observaciones]))
-            
-            # Observaciones de la última semana
-            from datetime import datetime, timedelta
-            hace_una_semana = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-            obs_recientes = len([obs for obs in observaciones if obs['fecha'] >= hace_una_semana])
-            
-            return jsonify({
-                'exito': True,
-                'observaciones': observaciones,
-                'estadisticas': {
-                    'total': len(observaciones),
-                    'estudiantes_unicos': estudiantes_unicos,
-                    'ultima_semana': obs_recientes
-                }
-            })
+        estado = detector_temprano.estado(request.args.get('curso_id') or None)
+        return jsonify({'exito': True, **estado})
     except Exception as e:
         return jsonify({'exito': False, 'mensaje': str(e)})
 
 
+@app.route('/api/sincronizar_alertas_tempranas', methods=['POST'])
+def api_sincronizar_alertas_tempranas():
+    """
+    Reconstruye el estado del detector temprano de los cursos cuyo historial
+    cambió por otra vía (importaciones, cursos nuevos o eliminados), o de todos
+    con completo=true. Retorna las alertas creadas
+    """
+    try:
+        data = request.get_json(silent=True) or request.form
+        if str(data.get('completo', 'false')).lower() == 'true':
+            alertas = detector_temprano.reconstruir()
+        else:
+            alertas = detector_temprano.sincronizar()
+        return jsonify({'exito': True, 'alertas_nuevas': alertas, 'total_alertas_nuevas': len(alertas)})
+    except Exception as e:
+        return jsonify({'exito': False, 'mensaje': f'Error al sincronizar el detector temprano: {str(e)}'})
+
+
 @app.route('/api/estadisticas_recoleccion', methods=['GET'])
+@cache.cacheable('resumen_cursos')
 def api_estadisticas_recoleccion():
     """Estadísticas de recolección de datos por curso"""
     try:
@@ -907,12 +1313,11 @@ def api_estadisticas_recoleccion():
             query = text("""
                 SELECT 
                     curso_id,
-                    COUNT(*) as total_registros,
-                    MIN(fecha_registro) as fecha_inicio,
-                    MAX(fecha_registro) as fecha_ultima,
-                    AVG(clima_escolar_promedio) as clima_promedio
-                FROM cursos_temporal
-                GROUP BY curso_id
+                    total_registros,
+                    fecha_inicio,
+                    fecha_ultima,
+                    CASE WHEN registros_clima > 0 THEN suma_clima / registros_clima END as clima_promedio
+                FROM resumen_cursos
                 ORDER BY curso_id
             """)
             
@@ -965,6 +1370,7 @@ def gestionar_cohortes():
 
 
 @app.route('/api/listar_cursos', methods=['GET'])
+@cache.cacheable('resumen_cursos')
 def api_listar_cursos():
     """Lista todos los cursos configurados"""
     try:
@@ -973,10 +1379,9 @@ def api_listar_cursos():
             query = text("""
                 SELECT 
                     curso_id,
-                    MAX(total_estudiantes) as total_estudiantes,
-                    COUNT(DISTINCT fecha_registro) as semanas_registradas
-                FROM cursos_temporal
-                GROUP BY curso_id
+                    max_total_estudiantes as total_estudiantes,
+                    semanas_registradas
+                FROM resumen_cursos
                 ORDER BY curso_id
             """)
             
@@ -1016,7 +1421,7 @@ def api_agregar_curso():
         with db.get_session() as session:
             query_check = text("""
                 SELECT COUNT(*) as count
-                FROM cursos_temporal
+                FROM resumen_cursos
                 WHERE curso_id = :curso_id
             """)
             result = session.execute(query_check, {'curso_id': nombre_curso}).fetchone()
@@ -1044,12 +1449,17 @@ def api_agregar_curso():
                 )
             """)
             
+            fecha = datetime.now().strftime('%Y-%m-%d')
             session.execute(query_insert, {
-                'fecha': datetime.now().strftime('%Y-%m-%d'),
+                'fecha': fecha,
                 'curso_id': nombre_curso,
                 'total_estudiantes': total_estudiantes
             })
             
+            db.registrar_en_resumen_curso(
+                session, nombre_curso, fecha, clima=0.0, total_estudiantes=total_estudiantes
+            )
+            
             session.commit()
             
             return jsonify({
@@ -1091,6 +1501,9 @@ def api_eliminar_curso():
             """)
             session.execute(query_delete_intervenciones, {'curso_id': curso_id})
             
+            db.recalcular_resumen_curso(session, curso_id)
+            detector_temprano.eliminar_curso(session, curso_id)
+            
             session.commit()
             
             return jsonify({
@@ -1104,9 +1517,9 @@ def api_eliminar_curso():
 
 @app.route('/api/cargar_lista_estudiantes', methods=['POST'])
 def api_cargar_lista_estudiantes():
-    """Procesa un archivo .txt con lista de estudiantes y retorna los datos parseados"""
+    """Procesa una lista de estudiantes (.txt, .csv, .tsv o .xlsx) y retorna los datos parseados"""
     try:
-        from parser_lista_estudiantes import parsear_lista_estudiantes
+        from parser_lista_estudiantes import parsear_archivo_lista
         
         if 'archivo' not in request.files:
             return jsonify({'exito': False, 'mensaje': 'No se recibió ningún archivo'})
@@ -1116,14 +1529,11 @@ def api_cargar_lista_estudiantes():
         if archivo.filename == '':
             return jsonify({'exito': False, 'mensaje': 'Archivo vacío'})
         
-        if not archivo.filename.endswith('.txt'):
-            return jsonify({'exito': False, 'mensaje': 'El archivo debe ser .txt'})
+        if not archivo.filename.lower().endswith(EXTENSIONES_LISTA):
+            return jsonify({'exito': False, 'mensaje': 'El archivo debe ser .txt, .csv, .tsv o .xlsx'})
         
-        # Leer contenido del archivo
-        contenido = archivo.read().decode('utf-8', errors='ignore')
-        
-        # Parsear el archivo
-        resultado = parsear_lista_estudiantes(contenido)
+        # Parsear el archivo línea a línea directamente desde el stream de la carga
+        resultado = parsear_archivo_lista(archivo.stream, archivo.filename)
         
         return jsonify(resultado)
         
@@ -1131,6 +1541,139 @@ def api_cargar_lista_estudiantes():
         return jsonify({'exito': False, 'mensaje': f'Error al procesar archivo: {str(e)}'})
 
 
+@app.route('/api/importar_excel', methods=['POST'])
+def api_importar_excel():
+    """
+    Importa un Excel en formato mejorado por bloques (memoria acotada).
+    Si una importación previa del mismo archivo quedó inconclusa, se reanuda.
+    El avance se publica en /api/eventos con ?trabajo=<id>
+    """
+    try:
+        if 'archivo' not in request.files:
+            return jsonify({'exito': False, 'mensaje': 'No se recibió ningún archivo'})
+        
+        archivo = request.files['archivo']
+        
+        if archivo.filename == '':
+            return jsonify({'exito': False, 'mensaje': 'Archivo vacío'})
+        
+        if not archivo.filename.lower().endswith('.xlsx'):
+            return jsonify({'exito': False, 'mensaje': 'El archivo debe ser .xlsx'})
+        
+        # Se guarda en disco: openpyxl en modo read_only necesita un archivo con acceso aleatorio.
+        # Nombre único por subida (dos cargas simultáneas no se pisan); la reanudación
+        # se identifica por la huella del contenido, así que el archivo se borra al terminar
+        os.makedirs('uploads', exist_ok=True)
+        descriptor, ruta = tempfile.mkstemp(suffix='.xlsx', dir='uploads')
+        try:
+            with os.fdopen(descriptor, 'wb') as destino:
+                archivo.save(destino)
+            
+            resultado = db.importar_excel_por_bloques(
+                ruta,
+                reanudar=request.form.get('reanudar', 'true').lower() != 'false',
+                forzar=request.form.get('forzar', 'false').lower() == 'true',
+                trabajo_id=request.args.get('trabajo') or request.form.get('trabajo'),
+                nombre_archivo=secure_filename(archivo.filename) or 'importacion.xlsx'
+            )
+        finally:
+            os.remove(ruta)
+        
+        if resultado['exito']:
+            db.actualizar_estado_aplicacion(
+                archivo_cargado=True, nombre_archivo=archivo.filename, fecha_carga=datetime.now()
+            )
+            sincronizar_detector_temprano()
+            programar_indexacion(db.engine)
+        
+        return jsonify(resultado)
+        
+    except Exception as e:
+        return jsonify({'exito': False, 'mensaje': f'Error al importar archivo: {str(e)}'})
+
+
+@app.route('/api/exportar_columnar')
+def api_exportar_columnar():
+    """Descarga un .zip con las tablas de datos en Parquet (o Arrow IPC con ?formato=arrow)"""
+    try:
+        import exportacion_columnar
+        
+        formato = request.args.get('formato', 'parquet')
+        tablas = request.args.get('tablas')
+        
+        with tempfile.TemporaryDirectory() as directorio:
+            resultado = exportacion_columnar.exportar(
+                db, directorio, formato=formato, tablas=tablas.split(',') if tablas else None
+            )
+            if not resultado['exito']:
+                return jsonify(resultado)
+            
+            # Parquet ya viene comprimido: el zip solo agrupa los archivos
+            contenido = io.BytesIO()
+            with zipfile.ZipFile(contenido, 'w', zipfile.ZIP_STORED) as zf:
+                for archivo in sorted(os.listdir(directorio)):
+                    zf.write(os.path.join(directorio, archivo), archivo)
+        
+        contenido.seek(0)
+        nombre = f"convivir_{formato}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        return send_file(contenido, mimetype='application/zip', as_attachment=True, download_name=nombre)
+        
+    except Exception as e:
+        return jsonify({'exito': False, 'mensaje': f'Error al exportar datos: {str(e)}'})
+
+
+@app.route('/api/importar_columnar', methods=['POST'])
+def api_importar_columnar():
+    """
+    Restaura un .zip generado por /api/exportar_columnar (o un único .parquet/.arrow).
+    Por defecto reemplaza las tablas incluidas; con modo=agregar agrega las filas
+    """
+    try:
+        import exportacion_columnar
+        
+        if 'archivo' not in request.files:
+            return jsonify({'exito': False, 'mensaje': 'No se recibió ningún archivo'})
+        
+        archivo = request.files['archivo']
+        nombre = secure_filename(archivo.filename or '')
+        
+        if not nombre.lower().endswith(('.zip', '.parquet', '.arrow')):
+            return jsonify({'exito': False, 'mensaje': 'El archivo debe ser .zip, .parquet o .arrow'})
+        
+        with tempfile.TemporaryDirectory() as directorio:
+            if nombre.lower().endswith('.zip'):
+                with zipfile.ZipFile(archivo.stream) as zf:
+                    for miembro in zf.namelist():
+                        # Solo archivos planos de tablas conocidas (evita rutas arbitrarias)
+                        base, extension = os.path.splitext(os.path.basename(miembro))
+                        if base in exportacion_columnar.TABLAS_COLUMNARES and extension in ('.parquet', '.arrow'):
+                            with zf.open(miembro) as origen, open(os.path.join(directorio, base + extension), 'wb') as destino:
+                                shutil.copyfileobj(origen, destino)
+            else:
+                archivo.save(os.path.join(directorio, nombre))
+            
+            resultado = exportacion_columnar.importar(
+                db, directorio, reemplazar=request.form.get('modo', 'reemplazar') != 'agregar'
+            )
+        
+        if resultado['exito']:
+            with db.engine.begin() as conn:
+                resumen = db.obtener_resumen_establecimiento(conn)
+                db.actualizar_estado_aplicacion(
+                    conn, archivo_cargado=resumen['total_estudiantes'] > 0,
+                    nombre_archivo=archivo.filename, fecha_carga=datetime.now()
+                )
+            sincronizar_detector_temprano()
+            programar_indexacion(db.engine)
+        
+        return jsonify(resultado)
+        
+    except zipfile.BadZipFile:
+        return jsonify({'exito': False, 'mensaje': 'El archivo .zip no es válido'})
+    except Exception as e:
+        return jsonify({'exito': False, 'mensaje': f'Error al importar datos: {str(e)}'})
+
+
 @app.route('/api/guardar_estudiantes_curso', methods=['POST'])
 def api_guardar_estudiantes_curso():
     """Guarda múltiples estudiantes en la base de datos y los asigna a un curso"""
@@ -1144,11 +1687,12 @@ def api_guardar_estudiantes_curso():
         
         with db.get_session() as session:
             # Obtener información del curso para obtener la cohorte
+            # (resumen_cursos por clave primaria y cursos_anuales por índice)
             query_curso = text("""
-                SELECT c.curso_id, ca.cohorte_id
-                FROM cursos_temporal c
-                LEFT JOIN cursos_anuales ca ON c.curso_id = ca.nombre_curso AND ca.activo = 1
-                WHERE c.curso_id = :curso_id
+                SELECT r.curso_id, ca.cohorte_id
+                FROM resumen_cursos r
+                LEFT JOIN cursos_anuales ca ON ca.nombre_curso = r.curso_id AND ca.activo = 1
+                WHERE r.curso_id = :curso_id
             """)
             curso_info = session.execute(query_curso, {'curso_id': curso_id}).fetchone()
             
@@ -1185,32 +1729,42 @@ def api_guardar_estudiantes_curso():
                     'nombre_curso': nombre_curso
                 })
             
-            # Guardar cada estudiante
-            total_guardados = 0
+            # Generar todos los IDs de estudiante (el primero de cada RUN repetido gana)
+            por_id = {}
             for est in estudiantes:
-                # Generar ID de estudiante único
                 estudiante_id = f"EST_{est['run'].replace('.', '').replace('-', '')[:8]}"
-                
-                # Verificar si el estudiante ya existe
-                query_check = text("""
-                    SELECT estudiante_id FROM estudiantes WHERE estudiante_id = :estudiante_id
-                """)
-                existe = session.execute(query_check, {'estudiante_id': estudiante_id}).fetchone()
-                
-                if not existe:
-                    # Insertar estudiante
-                    query_insert = text("""
-                        INSERT INTO estudiantes (estudiante_id, curso_id, edad, genero, cohorte_id)
-                        VALUES (:estudiante_id, :curso_id, :edad, :genero, :cohorte_id)
-                    """)
-                    session.execute(query_insert, {
-                        'estudiante_id': estudiante_id,
-                        'curso_id': nombre_curso,
-                        'edad': est.get('edad', 14),
-                        'genero': est['genero'],
-                        'cohorte_id': cohorte_id
-                    })
-                    total_guardados += 1
+                por_id.setdefault(estudiante_id, est)
+            
+            # Verificar de una vez qué estudiantes ya existen (en bloques por el
+            # límite de parámetros de SQLite)
+            query_existentes = text("""
+                SELECT estudiante_id FROM estudiantes WHERE estudiante_id IN :ids
+            """).bindparams(bindparam('ids', expanding=True))
+            ids = list(por_id)
+            existentes = set()
+            for inicio in range(0, len(ids), TAMANO_BLOQUE_IN):
+                resultado = session.execute(query_existentes, {'ids': ids[inicio:inicio + TAMANO_BLOQUE_IN]})
+                existentes.update(fila[0] for fila in resultado)
+            
+            nuevos = [
+                {
+                    'estudiante_id': estudiante_id,
+                    'curso_id': nombre_curso,
+                    'edad': est.get('edad', 14),
+                    'genero': est['genero'],
+                    'cohorte_id': cohorte_id
+                }
+                for estudiante_id, est in por_id.items()
+                if estudiante_id not in existentes
+            ]
+            
+            # Insertar todos los nuevos en un solo executemany; ON CONFLICT cubre
+            # matrículas concurrentes del mismo estudiante, y RETURNING entrega
+            # solo los que realmente se insertaron
+            insertados = db.insertar_nuevos(session, Estudiante, nuevos, 'estudiante_id')
+            total_guardados = len(insertados)
+            
+            db.ajustar_resumen_establecimiento(session, total_estudiantes=total_guardados)
             
             session.commit()
             
@@ -1241,9 +1795,15 @@ def api_eliminar_estudiante():
                 WHERE estudiante_origen_id = :estudiante_id
                    OR estudiante_destino_id = :estudiante_id
             """)
-            session.execute(query_delete_interacciones, {'estudiante_id': estudiante_id})
+            result_interacciones = session.execute(query_delete_interacciones, {'estudiante_id': estudiante_id})
+            
+            # Eliminar alertas del estudiante (las pendientes por separado para el resumen)
+            query_delete_pendientes = text("""
+                DELETE FROM alertas
+                WHERE estudiante_id = :estudiante_id AND estado = 'pendiente'
+            """)
+            result_pendientes = session.execute(query_delete_pendientes, {'estudiante_id': estudiante_id})
             
-            # Eliminar alertas del estudiante
             query_delete_alertas = text("""
                 DELETE FROM alertas
                 WHERE estudiante_id = :estudiante_id
@@ -1264,6 +1824,13 @@ def api_eliminar_estudiante():
             """)
             result = session.execute(query_delete_estudiante, {'estudiante_id': estudiante_id})
             
+            db.ajustar_resumen_establecimiento(
+                session,
+                total_estudiantes=-result.rowcount,
+                total_interacciones=-result_interacciones.rowcount,
+                alertas_pendientes=-result_pendientes.rowcount
+            )
+            
             session.commit()
             
             if result.rowcount > 0:
@@ -1313,6 +1880,13 @@ def api_eliminar_todos_estudiantes():
             query_delete_estudiantes = text("DELETE FROM estudiantes")
             session.execute(query_delete_estudiantes)
             
+            # Todos los contadores afectados quedan en cero
+            session.execute(text("""
+                UPDATE resumen_establecimiento
+                SET total_estudiantes = 0, total_interacciones = 0, alertas_pendientes = 0
+                WHERE id = 1
+            """))
+            
             session.commit()
             
             return jsonify({
@@ -1369,6 +1943,7 @@ def api_editar_estudiante():
 
 
 @app.route('/api/listar_estudiantes', methods=['GET'])
+@cache.cacheable('estudiantes')
 def api_listar_estudiantes():
     """Lista todos los estudiantes registrados"""
     try:
@@ -1397,6 +1972,7 @@ def api_listar_estudiantes():
 
 
 @app.route('/api/listar_cohortes', methods=['GET'])
+@cache.cacheable('cohortes', 'cursos_anuales', 'estudiantes')
 def api_listar_cohortes():
     """Lista todas las cohortes con sus cursos actuales"""
     try:
@@ -1480,6 +2056,7 @@ def api_promover_cohorte():
 
 
 @app.route('/api/historial_cohorte/<int:cohorte_id>', methods=['GET'])
+@cache.cacheable('cursos_anuales')
 def api_historial_cohorte(cohorte_id):
     """Obtiene el historial completo de una cohorte a lo largo de los años"""
     try:
@@ -1514,13 +2091,14 @@ def api_historial_cohorte(cohorte_id):
 
 
 @app.route('/api/cursos_disponibles', methods=['GET'])
+@cache.cacheable('resumen_cursos')
 def api_cursos_disponibles():
     """Retorna lista de cursos para selectores"""
     try:
         with db.get_session() as session:
             query = text("""
-                SELECT DISTINCT curso_id
-                FROM cursos_temporal
+                SELECT curso_id
+                FROM resumen_cursos
                 ORDER BY curso_id
             """)
             
@@ -1536,27 +2114,33 @@ def api_cursos_disponibles():
 
 
 
+@app.route('/api/reconstruir_resumenes', methods=['POST'])
+def api_reconstruir_resumenes():
+    """Recalcula desde cero los resúmenes materializados de cursos y establecimiento"""
+    try:
+        with db.get_session() as session:
+            db.reconstruir_resumenes(session)
+            session.commit()
+        
+        return jsonify({'exito': True, 'mensaje': 'Resúmenes reconstruidos exitosamente'})
+    except Exception as e:
+        return jsonify({'exito': False, 'mensaje': f'Error al reconstruir resúmenes: {str(e)}'})
+
+
 @app.route('/api/generar_reporte', methods=['GET'])
 def api_generar_reporte():
     """Genera un reporte completo del establecimiento"""
     try:
         # Obtener estadísticas generales
         with db.get_session() as session:
-            # Contar registros
-            total_estudiantes = session.execute(text("SELECT COUNT(*) FROM estudiantes")).scalar()
-            total_cursos = session.execute(text("SELECT COUNT(DISTINCT curso_id) FROM cursos_temporal")).scalar()
-            total_interacciones = session.execute(text("SELECT COUNT(*) FROM interacciones_sociales")).scalar()
-            total_alertas = session.execute(text("SELECT COUNT(*) FROM alertas WHERE estado='pendiente'")).scalar()
-            
-            # Calcular promedios
-            clima_promedio = session.execute(text(
-                "SELECT AVG(clima_escolar_promedio) FROM cursos_temporal"
-            )).scalar() or 0
-            
-            # Contar semanas de datos
-            semanas_datos = session.execute(text(
-                "SELECT COUNT(DISTINCT fecha_registro) FROM cursos_temporal"
-            )).scalar() or 0
+            # Contadores y promedios materializados
+            resumen = db.obtener_resumen_establecimiento(session)
+            total_estudiantes = resumen['total_estudiantes']
+            total_cursos = resumen['total_cursos']
+            total_interacciones = resumen['total_interacciones']
+            total_alertas = resumen['alertas_pendientes']
+            clima_promedio = resumen['clima_promedio']
+            semanas_datos = resumen['semanas_registradas']
             
             reporte_resumen = {
                 'fecha_generacion': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
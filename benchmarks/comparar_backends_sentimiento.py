@@ -0,0 +1,230 @@
+"""
+Comparación de backends de sentimientos: PyTorch (pipeline BETO) vs ONNX Runtime int8
+Clasifica los comentarios de un establecimiento sintético con cada backend, en un
+proceso separado por backend para medir su memoria, y reporta:
+
+- Tiempo de carga y memoria residente máxima
+- Latencia por comentario (p50/p95), como la invoca analizar_sentimiento
+- Rendimiento en lotes (comentarios por segundo)
+- Concordancia de etiquetas con PyTorch, diferencia de confianza y exactitud
+  respecto al tono_percibido del generador
+
+Uso:
+    python benchmarks/comparar_backends_sentimiento.py
+    python benchmarks/comparar_backends_sentimiento.py --escala mediana --limite 1000 --hilos 2
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import subprocess
+from datetime import datetime
+
+import numpy as np
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIR_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, RAIZ_REPO)
+sys.path.insert(0, DIR_BENCHMARKS)
+
+from generador_datos import ESCALAS, generador_para_escala
+
+
+BACKENDS = ('torch', 'onnx')
+
+
+def textos_sinteticos(escala, semilla, limite):
+    """Comentarios del generador con su tono de referencia, en minúsculas como analizar_sentimiento"""
+    generador = generador_para_escala(escala, semilla=semilla)
+    df = generador.comentarios(generador.estudiantes())
+    if limite:
+        df = df.head(limite)
+    textos = [str(t).lower().strip()[:512] for t in df['comentario_texto']]
+    return textos, [str(t).lower() for t in df['tono_percibido']]
+
+
+def memoria_maxima_mb():
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 / 1024 if platform.system() == 'Darwin' else maxrss / 1024
+
+
+def cargar_backend(backend, hilos, modelo, directorio_onnx=None):
+    """
+    Se ejecuta en el proceso hijo. El hijo ONNX importa solo onnxruntime y el
+    tokenizador (no modelo_nlp, que carga torch): el modelo ya lo exportó el padre
+    """
+    if backend == 'onnx':
+        from sentimiento_onnx import ClasificadorSentimientoONNX
+        inicio = time.perf_counter()
+        clasificador = ClasificadorSentimientoONNX(directorio_onnx, hilos=hilos)
+        return clasificador, time.perf_counter() - inicio
+
+    import torch
+    from transformers import pipeline
+    if hilos:
+        torch.set_num_threads(hilos)
+    inicio = time.perf_counter()
+    clasificador = pipeline("sentiment-analysis", model=modelo, truncation=True, max_length=512)
+    return clasificador, time.perf_counter() - inicio
+
+
+def medir_backend(backend, textos, hilos, lote, modelo, directorio_onnx=None):
+    """Se ejecuta en el proceso hijo: retorna tiempos, memoria y predicciones"""
+    clasificador, carga = cargar_backend(backend, hilos, modelo, directorio_onnx)
+    memoria_carga = memoria_maxima_mb()
+
+    # Calentamiento
+    clasificador(textos[:min(8, len(textos))])
+
+    predicciones, latencias = [], []
+    for texto in textos:
+        inicio = time.perf_counter()
+        resultado = clasificador(texto)[0]
+        latencias.append(time.perf_counter() - inicio)
+        predicciones.append({'label': resultado['label'], 'score': float(resultado['score'])})
+
+    inicio = time.perf_counter()
+    for i in range(0, len(textos), lote):
+        clasificador(textos[i:i + lote])
+    duracion_lotes = time.perf_counter() - inicio
+
+    return {
+        'carga_s': carga,
+        'memoria_carga_mb': memoria_carga,
+        'memoria_maxima_mb': memoria_maxima_mb(),
+        'latencia_p50_ms': float(np.percentile(latencias, 50) * 1000),
+        'latencia_p95_ms': float(np.percentile(latencias, 95) * 1000),
+        'comentarios_por_segundo_lote': len(textos) / duracion_lotes if duracion_lotes else None,
+        'torch_cargado': 'torch' in sys.modules,
+        'predicciones': predicciones
+    }
+
+
+def ejecutar_en_subproceso(backend, args):
+    comando = [
+        sys.executable, os.path.abspath(__file__), '--backend-hijo', backend,
+        '--escala', args.escala, '--semilla', str(args.semilla),
+        '--limite', str(args.limite), '--hilos', str(args.hilos), '--lote', str(args.lote),
+        '--modelo', args.modelo
+    ]
+    if backend == 'onnx':
+        comando += ['--directorio-onnx', args.directorio_onnx]
+    salida = subprocess.run(comando, capture_output=True, text=True)
+    if salida.returncode != 0:
+        return {'error': salida.stderr.strip().splitlines()[-1] if salida.stderr.strip() else 'falló el proceso'}
+    # El resultado es la última línea; las anteriores son mensajes de carga
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def comparar_predicciones(resultados, tonos):
+    from modelo_nlp import ETIQUETAS_SENTIMIENTO
+
+    etiquetas = {
+        backend: [ETIQUETAS_SENTIMIENTO.get(p['label'].upper(), 'neutral') for p in datos['predicciones']]
+        for backend, datos in resultados.items() if 'predicciones' in datos
+    }
+    for backend, predichas in etiquetas.items():
+        resultados[backend]['exactitud_tono'] = float(np.mean([p == t for p, t in zip(predichas, tonos)]))
+
+    if set(BACKENDS) <= set(etiquetas):
+        referencia = resultados['torch']['predicciones']
+        cuantizado = resultados['onnx']['predicciones']
+        resultados['onnx']['concordancia_torch'] = float(np.mean(
+            [a == b for a, b in zip(etiquetas['torch'], etiquetas['onnx'])]
+        ))
+        diferencias = np.abs([a['score'] - b['score'] for a, b in zip(referencia, cuantizado)])
+        resultados['onnx']['diferencia_confianza_media'] = float(diferencias.mean())
+        resultados['onnx']['diferencia_confianza_max'] = float(diferencias.max())
+
+
+def imprimir(resultados):
+    filas = [
+        ('carga_s', 'Carga (s)', '{:.2f}'),
+        ('memoria_maxima_mb', 'Memoria máxima (MB)', '{:.0f}'),
+        ('latencia_p50_ms', 'Latencia p50 (ms)', '{:.2f}'),
+        ('latencia_p95_ms', 'Latencia p95 (ms)', '{:.2f}'),
+        ('comentarios_por_segundo_lote', 'Comentarios/s (lote)', '{:.1f}'),
+        ('exactitud_tono', 'Exactitud vs tono', '{:.1%}'),
+        ('concordancia_torch', 'Concordancia con torch', '{:.1%}'),
+        ('diferencia_confianza_media', 'Δ confianza media', '{:.4f}'),
+    ]
+    print(f"\n{'':<26}" + ''.join(f"{backend:>14}" for backend in BACKENDS))
+    for clave, titulo, formato in filas:
+        celdas = []
+        for backend in BACKENDS:
+            valor = resultados.get(backend, {}).get(clave)
+            celdas.append(formato.format(valor) if valor is not None else '-')
+        print(f"{titulo:<26}" + ''.join(f"{celda:>14}" for celda in celdas))
+    for backend in BACKENDS:
+        if 'error' in resultados.get(backend, {}):
+            print(f"⚠️ {backend}: {resultados[backend]['error']}")
+    if resultados.get('onnx', {}).get('torch_cargado'):
+        print("⚠️ onnx: torch quedó cargado en el proceso; su memoria no es representativa")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara los backends PyTorch y ONNX int8 del análisis de sentimientos')
+    parser.add_argument('--escala', choices=sorted(ESCALAS), default='pequena')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--limite', type=int, default=500, help='Máximo de comentarios (0 = todos)')
+    parser.add_argument('--hilos', type=int, default=0, help='Hilos de inferencia para ambos backends (0 = por defecto)')
+    parser.add_argument('--lote', type=int, default=32)
+    parser.add_argument('--modelo', help='Modelo de sentimientos (por defecto MODELO_SENTIMIENTO de modelo_nlp)')
+    parser.add_argument('--salida', help='Archivo JSON de resultados')
+    parser.add_argument('--backend-hijo', choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument('--directorio-onnx', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    textos, tonos = textos_sinteticos(args.escala, args.semilla, args.limite)
+
+    if args.backend_hijo:
+        print(json.dumps(medir_backend(args.backend_hijo, textos, args.hilos, args.lote,
+                                       args.modelo, args.directorio_onnx)))
+        return
+
+    if not args.modelo:
+        from modelo_nlp import MODELO_SENTIMIENTO
+        args.modelo = MODELO_SENTIMIENTO
+
+    # La exportación (una sola vez, con torch) se hace aquí y no en el hijo ONNX
+    resultados = {}
+    try:
+        from sentimiento_onnx import preparar_modelo
+        args.directorio_onnx = preparar_modelo(args.modelo)
+    except Exception as e:
+        resultados['onnx'] = {'error': f'No se pudo exportar el modelo ONNX: {e}'}
+
+    print(f"⏳ Clasificando {len(textos)} comentarios (escala {args.escala}) con cada backend...")
+    for backend in BACKENDS:
+        if backend not in resultados:
+            resultados[backend] = ejecutar_en_subproceso(backend, args)
+    comparar_predicciones(resultados, tonos)
+    imprimir(resultados)
+
+    from ejecutar_benchmarks import commit_actual
+    commit = commit_actual()
+    salida = args.salida or os.path.join(DIR_BENCHMARKS, 'resultados', f"{commit or 'sin-commit'}-sentimiento.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump({
+            'commit': commit,
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'parametros': {'escala': args.escala, 'semilla': args.semilla, 'comentarios': len(textos),
+                           'hilos': args.hilos, 'lote': args.lote},
+            'resultados': {
+                backend: {k: v for k, v in datos.items() if k != 'predicciones'}
+                for backend, datos in resultados.items()
+            }
+        }, f, indent=2, ensure_ascii=False)
+    print(f"\n✅ Resultados guardados en {salida}")
+
+
+if __name__ == '__main__':
+    main()
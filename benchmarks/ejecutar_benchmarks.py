@@ -0,0 +1,354 @@
+"""
+Suite de Benchmarks de CONVIVIR v4.0
+Mide las rutas críticas (carga Excel, series temporales, LSTM, NLP, grafo social
+y endpoints principales de Flask) sobre un establecimiento sintético y guarda
+los tiempos en JSON para compararlos entre commits
+
+Uso:
+    python benchmarks/ejecutar_benchmarks.py --escala pequena
+    python benchmarks/ejecutar_benchmarks.py --escala mediana --comparar benchmarks/resultados/abc1234-mediana.json
+    python benchmarks/ejecutar_benchmarks.py --solo endpoint_ --repeticiones 10
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIR_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, RAIZ_REPO)
+sys.path.insert(0, DIR_BENCHMARKS)
+
+from generador_datos import ESCALAS, generador_para_escala
+
+
+VERSION_FORMATO = 1
+
+# Registro de benchmarks: nombre -> (funcion, preparar)
+BENCHMARKS = {}
+
+
+def benchmark(nombre, preparar=None):
+    """
+    Registra un benchmark
+
+    Args:
+        nombre: Identificador estable (clave en el JSON de resultados)
+        preparar: Función opcional que se ejecuta antes de cada repetición, fuera
+            de la medición; su retorno se pasa a la función medida
+    """
+    def decorador(funcion):
+        BENCHMARKS[nombre] = (funcion, preparar)
+        return funcion
+    return decorador
+
+
+def medir(funcion, preparar, contexto, repeticiones, calentamiento=1):
+    """Ejecuta un benchmark y retorna estadísticas de tiempo en segundos"""
+    tiempos = []
+    for i in range(calentamiento + repeticiones):
+        argumento = preparar(contexto) if preparar else None
+        inicio = time.perf_counter()
+        resultado = funcion(contexto, argumento)
+        duracion = time.perf_counter() - inicio
+        if i >= calentamiento:
+            tiempos.append(duracion)
+
+    if isinstance(resultado, dict) and resultado.get('omitido'):
+        return resultado
+
+    return {
+        'repeticiones': repeticiones,
+        'min': min(tiempos),
+        'mediana': statistics.median(tiempos),
+        'media': statistics.mean(tiempos),
+        'desviacion': statistics.stdev(tiempos) if len(tiempos) > 1 else 0.0,
+        'max': max(tiempos)
+    }
+
+
+# ----------------------------------------------------------------------
+# Benchmarks de la capa de datos
+# ----------------------------------------------------------------------
+
+def _base_vacia(ctx):
+    from database import DatabaseManager
+    ruta = os.path.join(ctx['directorio'], f"carga_{time.time_ns()}.db")
+    return DatabaseManager(ruta)
+
+
+@benchmark('cargar_desde_excel', preparar=_base_vacia)
+def bench_cargar_desde_excel(ctx, db_vacia):
+    resultado = db_vacia.cargar_desde_excel(ctx['excel'])
+    assert resultado['exito'], resultado['mensaje']
+    db_vacia.session.close()
+    db_vacia.engine.dispose()
+
+
+@benchmark('obtener_series_temporales_curso')
+def bench_series_temporales(ctx, _):
+    ctx['db'].obtener_series_temporales_curso(ctx['curso_id'])
+
+
+# ----------------------------------------------------------------------
+# Benchmarks de modelos
+# ----------------------------------------------------------------------
+
+def _serie_curso(ctx):
+    return ctx['db'].obtener_series_temporales_curso(ctx['curso_id'])
+
+
+@benchmark('lstm_entrenar', preparar=_serie_curso)
+def bench_lstm_entrenar(ctx, data):
+    from modelo_lstm import ModeloLSTMPredictor, TENSORFLOW_AVAILABLE
+    if not TENSORFLOW_AVAILABLE:
+        return {'omitido': True, 'motivo': 'TensorFlow no disponible'}
+    modelo = ModeloLSTMPredictor(sequence_length=4, horizonte_prediccion=4)
+    modelo.entrenar(data, target_col='clima_escolar', epochs=ctx['epocas_lstm'])
+
+
+def _modelo_listo(ctx):
+    from modelo_lstm import ModeloLSTMPredictor, TENSORFLOW_AVAILABLE
+    if 'modelo_lstm' not in ctx:
+        data = _serie_curso(ctx)
+        modelo = ModeloLSTMPredictor(sequence_length=4, horizonte_prediccion=4)
+        if TENSORFLOW_AVAILABLE:
+            modelo.entrenar(data, target_col='clima_escolar', epochs=ctx['epocas_lstm'])
+        else:
+            # Sin TensorFlow predecir() usa el promedio móvil, pero necesita el escalador ajustado
+            modelo.preparar_secuencias(data, 'clima_escolar')
+        ctx['modelo_lstm'] = (modelo, data)
+    return ctx['modelo_lstm']
+
+
+@benchmark('lstm_predecir', preparar=_modelo_listo)
+def bench_lstm_predecir(ctx, modelo_y_datos):
+    modelo, data = modelo_y_datos
+    resultado = modelo.predecir(data, target_col='clima_escolar')
+    assert resultado['exito'], resultado.get('mensaje')
+
+
+def _comentarios(ctx):
+    if 'df_comentarios' not in ctx:
+        from modelo_nlp import AnalizadorNLPAvanzado
+        ctx['df_comentarios'] = ctx['db'].obtener_comentarios_para_nlp()
+        ctx['analizador_nlp'] = AnalizadorNLPAvanzado(usar_transformer=True)
+    return ctx['df_comentarios']
+
+
+@benchmark('analizar_comentarios_batch', preparar=_comentarios)
+def bench_comentarios_batch(ctx, df_comentarios):
+    ctx['analizador_nlp'].analizar_comentarios_batch(df_comentarios)
+
+
+def _datos_grafo(ctx):
+    if 'datos_grafo' not in ctx:
+        import pandas as pd
+        df_interacciones = ctx['db'].obtener_grafo_social()
+        df_estudiantes = pd.read_sql('SELECT estudiante_id, curso_id, genero, edad FROM estudiantes', ctx['db'].engine)
+        ctx['datos_grafo'] = (df_interacciones, df_estudiantes)
+    return ctx['datos_grafo']
+
+
+@benchmark('construir_grafo', preparar=_datos_grafo)
+def bench_construir_grafo(ctx, datos):
+    from modelo_gnn import AnalizadorRedesSociales
+    AnalizadorRedesSociales().construir_grafo(*datos)
+
+
+def _grafo_construido(ctx):
+    from modelo_gnn import AnalizadorRedesSociales
+    analizador = AnalizadorRedesSociales()
+    analizador.construir_grafo(*_datos_grafo(ctx))
+    return analizador
+
+
+@benchmark('calcular_metricas_centralidad', preparar=_grafo_construido)
+def bench_centralidad(ctx, analizador):
+    analizador.calcular_metricas_centralidad()
+
+
+# ----------------------------------------------------------------------
+# Benchmarks de endpoints (caché de respuestas vaciada en cada repetición)
+# ----------------------------------------------------------------------
+
+def _registrar_endpoint(nombre, url):
+    def preparar(ctx):
+        ctx['app'].cache.lru.limpiar()
+        return url.format(curso_id=ctx['curso_id'])
+
+    def funcion(ctx, url_final):
+        respuesta = ctx['cliente'].get(url_final)
+        assert respuesta.status_code == 200, f'{url_final}: HTTP {respuesta.status_code}'
+        cuerpo = respuesta.get_json(silent=True)
+        if isinstance(cuerpo, dict):
+            assert cuerpo.get('exito', True), f"{url_final}: {cuerpo.get('error', 'exito=false')}"
+
+    BENCHMARKS[nombre] = (funcion, preparar)
+
+
+ENDPOINTS = [
+    ('endpoint_estadisticas_generales', '/api/estadisticas_generales'),
+    ('endpoint_lista_cursos', '/api/lista_cursos'),
+    ('endpoint_alertas', '/api/alertas'),
+    ('endpoint_listar_estudiantes', '/api/listar_estudiantes'),
+    ('endpoint_observaciones_estudiantes', '/api/observaciones_estudiantes'),
+    ('endpoint_grafico_evolucion', '/api/grafico_evolucion/{curso_id}'),
+    ('endpoint_analisis_predictivo', '/api/analisis_predictivo/{curso_id}'),
+    ('endpoint_analisis_sentimientos', '/api/analisis_sentimientos?detalle=false'),
+    ('endpoint_analisis_red_social', '/api/analisis_red_social?detalle=false'),
+    ('endpoint_grafico_red_social', '/api/grafico_red_social'),
+]
+
+for _nombre, _url in ENDPOINTS:
+    _registrar_endpoint(_nombre, _url)
+
+
+# ----------------------------------------------------------------------
+# Ejecución y comparación
+# ----------------------------------------------------------------------
+
+def commit_actual():
+    try:
+        salida = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=RAIZ_REPO, capture_output=True, text=True, check=True
+        )
+        return salida.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Variables de entorno del estado en disco de la aplicación -> nombre dentro del temporal
+ESTADO_EN_DISCO = {
+    'CONVIVIR_TEMAS_DIR': 'modelos_temas',
+    'CONVIVIR_EMBEDDINGS_DIR': 'indices_embeddings',
+    'CONVIVIR_PERFILES_DIR': 'perfiles',
+    'CONVIVIR_VERSIONES_ARCHIVO': 'versiones.bin',
+    'CONVIVIR_EVENTOS_ARCHIVO': 'eventos.bin',
+    'CONVIVIR_METRICAS_DIR': 'metricas',
+}
+
+
+def preparar_contexto(escala, directorio, semilla):
+    """Genera el Excel sintético, lo carga en una base temporal e importa la app"""
+    generador = generador_para_escala(escala, semilla=semilla)
+    excel = os.path.join(directorio, 'datos_sinteticos.xlsx')
+    filas = generador.escribir_excel(excel)
+
+    # app.py abre convivir_v4.db en el directorio actual: se aísla en el temporal,
+    # junto con todo el estado en disco (modelo de temas, índice de embeddings,
+    # perfiles y versiones de caché) para no pisar el de la instalación real
+    os.environ.pop('DATABASE_URL', None)
+    for variable, nombre in ESTADO_EN_DISCO.items():
+        os.environ[variable] = os.path.join(directorio, nombre)
+    os.chdir(directorio)
+    import app as aplicacion
+
+    resultado = aplicacion.db.cargar_desde_excel(excel)
+    if not resultado['exito']:
+        raise RuntimeError(resultado['mensaje'])
+
+    return {
+        'directorio': directorio,
+        'excel': excel,
+        'filas': filas,
+        'app': aplicacion,
+        'db': aplicacion.db,
+        'cliente': aplicacion.app.test_client(),
+        'curso_id': generador.curso_ids[0],
+        'epocas_lstm': 10,
+    }
+
+
+def comparar(resultados, ruta_base, umbral=0.10):
+    """Imprime la variación de la mediana respecto a un archivo de resultados anterior"""
+    with open(ruta_base, encoding='utf-8') as f:
+        base = json.load(f)
+
+    print(f"\n📊 Comparación con {base.get('commit') or ruta_base} (escala {base.get('escala')})")
+    print(f"{'benchmark':<40} {'base (ms)':>12} {'actual (ms)':>12} {'cambio':>9}")
+    regresiones = 0
+    for nombre, actual in resultados['resultados'].items():
+        anterior = base.get('resultados', {}).get(nombre)
+        if not anterior or 'mediana' not in anterior or 'mediana' not in actual:
+            continue
+        cambio = actual['mediana'] / anterior['mediana'] - 1 if anterior['mediana'] else 0.0
+        marca = ''
+        if cambio > umbral:
+            marca = ' ⚠️'
+            regresiones += 1
+        elif cambio < -umbral:
+            marca = ' ✅'
+        print(f"{nombre:<40} {anterior['mediana'] * 1000:>12.2f} {actual['mediana'] * 1000:>12.2f} {cambio:>+8.1%}{marca}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks de rutas críticas de CONVIVIR')
+    parser.add_argument('--escala', choices=sorted(ESCALAS), default='pequena')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--solo', help='Ejecuta solo los benchmarks cuyo nombre contenga este texto')
+    parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto benchmarks/resultados/<commit>-<escala>.json)')
+    parser.add_argument('--comparar', help='Archivo JSON de una ejecución anterior')
+    args = parser.parse_args()
+
+    commit = commit_actual()
+    salida = args.salida or os.path.join(DIR_BENCHMARKS, 'resultados', f"{commit or 'sin-commit'}-{args.escala}.json")
+    salida = os.path.abspath(salida)
+    ruta_base = os.path.abspath(args.comparar) if args.comparar else None
+
+    directorio = tempfile.mkdtemp(prefix='convivir_bench_')
+    try:
+        print(f"⏳ Generando establecimiento sintético (escala {args.escala})...")
+        ctx = preparar_contexto(args.escala, directorio, args.semilla)
+
+        resultados = {
+            'version_formato': VERSION_FORMATO,
+            'commit': commit,
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'escala': args.escala,
+            'parametros': dict(ESCALAS[args.escala], semilla=args.semilla, epocas_lstm=ctx['epocas_lstm']),
+            'filas': ctx['filas'],
+            'resultados': {}
+        }
+
+        for nombre, (funcion, preparar) in BENCHMARKS.items():
+            if args.solo and args.solo not in nombre:
+                continue
+            try:
+                estadisticas = medir(funcion, preparar, ctx, args.repeticiones)
+            except Exception as e:
+                estadisticas = {'error': str(e)}
+            resultados['resultados'][nombre] = estadisticas
+
+            if 'mediana' in estadisticas:
+                print(f"  {nombre:<40} {estadisticas['mediana'] * 1000:>10.2f} ms (min {estadisticas['min'] * 1000:.2f})")
+            else:
+                print(f"  {nombre:<40} {estadisticas.get('motivo') or estadisticas.get('error')}")
+    finally:
+        os.chdir(RAIZ_REPO)
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(salida), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+    print(f"\n✅ Resultados guardados en {salida}")
+
+    if ruta_base:
+        comparar(resultados, ruta_base)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,348 @@
+"""
+Generador de Datos Sintéticos para CONVIVIR v4.0
+Produce establecimientos realistas a escala configurable (cursos, semanas,
+estudiantes, comentarios en español y redes de interacción con focos de bullying)
+en el mismo formato Excel que consume DatabaseManager.cargar_desde_excel
+
+Uso:
+    python benchmarks/generador_datos.py --cursos 12 --semanas 52 --estudiantes 30 \\
+        --salida datos_sinteticos.xlsx
+"""
+
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+# Escalas predefinidas para los benchmarks
+ESCALAS = {
+    'pequena': {'cursos': 4, 'semanas': 20, 'estudiantes_por_curso': 25, 'comentarios_por_estudiante': 4},
+    'mediana': {'cursos': 12, 'semanas': 52, 'estudiantes_por_curso': 30, 'comentarios_por_estudiante': 8},
+    'grande': {'cursos': 36, 'semanas': 104, 'estudiantes_por_curso': 35, 'comentarios_por_estudiante': 15},
+}
+
+NIVELES = ['1°', '2°', '3°', '4°', '5°', '6°', '7°', '8°']
+LETRAS = ['A', 'B', 'C', 'D']
+
+FRASES_POSITIVAS = [
+    'Me siento bien en el colegio y tengo buenos amigos',
+    'El profesor nos da mucho apoyo y confianza',
+    'Estoy contento con mi curso, el ambiente es agradable',
+    'Me gusta trabajar en grupo con mis compañeros',
+    'Me siento seguro y tranquilo en los recreos',
+    'Hay respeto entre todos y me siento valorado',
+    'Las actividades fueron divertidas y me sentí motivado',
+]
+
+FRASES_NEGATIVAS = [
+    'Me molestan en el recreo y me siento solo',
+    'Tengo miedo de venir al colegio por el acoso',
+    'Me insultan por redes sociales y nadie hace nada',
+    'Hubo una pelea en la sala y estoy preocupado',
+    'Siento rechazo de mi grupo y mucha ansiedad',
+    'Me siento triste porque se burlan de mí',
+    'Hay un conflicto con compañeros que me tiene estresado',
+]
+
+FRASES_NEUTRAS = [
+    'Hoy tuvimos clase de matemáticas y luego educación física',
+    'La semana pasada hubo reunión de apoderados',
+    'El curso está preparando la feria científica',
+    'No tengo nada especial que comentar esta semana',
+    'Cambiaron el horario de las clases de la tarde',
+]
+
+TIPOS_COMENTARIO = ['Encuesta semanal', 'Buzón anónimo', 'Entrevista', 'Observación docente']
+TIPOS_INTERVENCION = ['Taller de convivencia', 'Mediación escolar', 'Charla de prevención', 'Tutoría entre pares']
+ASIGNATURAS = ['Lenguaje', 'Matemáticas', 'Historia', 'Ciencias', 'Inglés', 'Educación Física', 'Artes']
+
+
+def _lunes_inicio(ano):
+    """Primer lunes de marzo del año indicado (inicio del año escolar)"""
+    fecha = datetime(ano, 3, 1)
+    return fecha + timedelta(days=(7 - fecha.weekday()) % 7)
+
+
+class GeneradorDatosSinteticos:
+    """
+    Genera un establecimiento sintético reproducible (semilla fija)
+
+    Cada curso tiene un perfil de clima latente que evoluciona como caminata
+    aleatoria; los indicadores semanales, el tono de los comentarios y la
+    frecuencia de interacciones negativas dependen de ese perfil, de modo que
+    los análisis encuentren señal y no solo ruido.
+    """
+
+    def __init__(self, cursos=12, semanas=52, estudiantes_por_curso=30,
+                 comentarios_por_estudiante=8, interacciones_por_estudiante=6,
+                 proporcion_bullying=0.15, ano_inicio=2024, semilla=42):
+        self.cursos = cursos
+        self.semanas = semanas
+        self.estudiantes_por_curso = estudiantes_por_curso
+        self.comentarios_por_estudiante = comentarios_por_estudiante
+        self.interacciones_por_estudiante = interacciones_por_estudiante
+        self.proporcion_bullying = proporcion_bullying
+        self.fecha_inicio = _lunes_inicio(ano_inicio)
+        self.rng = np.random.default_rng(semilla)
+        self.establecimiento_id = 'EST_SINT_001'
+
+        self.curso_ids = [
+            f'{NIVELES[i // len(LETRAS) % len(NIVELES)]}{LETRAS[i % len(LETRAS)]}'
+            + (f'-{i // (len(NIVELES) * len(LETRAS))}' if i >= len(NIVELES) * len(LETRAS) else '')
+            for i in range(cursos)
+        ]
+        # Clima base por curso: algunos cursos parten en situación de riesgo
+        self.clima_base = {c: self.rng.uniform(4.5, 8.5) for c in self.curso_ids}
+
+    # ------------------------------------------------------------------
+    # Hojas individuales
+    # ------------------------------------------------------------------
+
+    def metadata(self):
+        return pd.DataFrame([{
+            'establecimiento_id': self.establecimiento_id,
+            'nombre_establecimiento': 'Colegio Sintético de Prueba',
+            'region': 'Metropolitana',
+            'comuna': 'Santiago',
+            'tipo_establecimiento': 'Particular Subvencionado',
+            'total_estudiantes_establecimiento': self.cursos * self.estudiantes_por_curso,
+            'total_docentes': max(self.cursos * 2, 1)
+        }])
+
+    def cursos_temporal(self):
+        filas = []
+        for curso_id in self.curso_ids:
+            # Caminata aleatoria acotada para el clima latente del curso
+            pasos = self.rng.normal(0, 0.25, self.semanas)
+            clima = np.clip(self.clima_base[curso_id] + np.cumsum(pasos), 1, 10)
+            for semana in range(self.semanas):
+                c = clima[semana]
+                riesgo = (10 - c) / 10
+                filas.append({
+                    'fecha_registro': self.fecha_inicio + timedelta(weeks=semana),
+                    'periodo': f'Semana {semana + 1}',
+                    'curso_id': curso_id,
+                    'total_estudiantes': self.estudiantes_por_curso,
+                    'clima_escolar_promedio': round(float(c), 2),
+                    'apoyo_docentes_promedio': round(float(np.clip(c + self.rng.normal(0.3, 0.5), 1, 10)), 2),
+                    'participacion_estudiantes_promedio': round(float(np.clip(c + self.rng.normal(0, 0.7), 1, 10)), 2),
+                    'nivel_empatia_promedio': round(float(np.clip(c + self.rng.normal(-0.2, 0.6), 1, 10)), 2),
+                    'nivel_autoestima_promedio': round(float(np.clip(c + self.rng.normal(0, 0.6), 1, 10)), 2),
+                    'nivel_resolucion_conflictos_promedio': round(float(np.clip(c + self.rng.normal(-0.4, 0.6), 1, 10)), 2),
+                    'incidentes_bullying': int(self.rng.poisson(riesgo * 3)),
+                    'incidentes_violencia_fisica': int(self.rng.poisson(riesgo * 1.5)),
+                    'incidentes_discriminacion': int(self.rng.poisson(riesgo)),
+                    'reportes_anonimos': int(self.rng.poisson(riesgo * 2)),
+                    'asistencia_promedio_porcentaje': round(float(np.clip(85 + c * 1.2 + self.rng.normal(0, 2), 60, 100)), 1),
+                    'promedio_notas': round(float(np.clip(4.5 + c * 0.18 + self.rng.normal(0, 0.2), 1, 7)), 1)
+                })
+        return pd.DataFrame(filas)
+
+    def estudiantes(self):
+        filas = []
+        for i, curso_id in enumerate(self.curso_ids):
+            nivel = NIVELES.index(curso_id[:2]) if curso_id[:2] in NIVELES else 0
+            for j in range(self.estudiantes_por_curso):
+                filas.append({
+                    'estudiante_id': f'EST_{i:03d}_{j:03d}',
+                    'curso_id': curso_id,
+                    'genero': self.rng.choice(['M', 'F']),
+                    'edad': int(6 + nivel + self.rng.integers(0, 2)),
+                    'tiene_nee': bool(self.rng.random() < 0.1),
+                    'prioritario': bool(self.rng.random() < 0.3),
+                    'fecha_ingreso_establecimiento': self.fecha_inicio - timedelta(days=int(self.rng.integers(0, 365 * 3))),
+                    'nivel_socioeconomico': self.rng.choice(['Bajo', 'Medio-Bajo', 'Medio', 'Medio-Alto', 'Alto'])
+                })
+        return pd.DataFrame(filas)
+
+    def evaluaciones(self, df_estudiantes):
+        # Dos evaluaciones por año escolar
+        n_evaluaciones = max(1, round(self.semanas / 26))
+        filas = []
+        for _, est in df_estudiantes.iterrows():
+            base = self.clima_base[est['curso_id']]
+            for k in range(n_evaluaciones):
+                def puntaje(desplazamiento=0):
+                    return int(np.clip(round(base + desplazamiento + self.rng.normal(0, 1.2)), 1, 10))
+                filas.append({
+                    'estudiante_id': est['estudiante_id'],
+                    'fecha_evaluacion': self.fecha_inicio + timedelta(weeks=26 * k + 2),
+                    'periodo': f'Semestre {k + 1}',
+                    'empatia_score': puntaje(),
+                    'autoestima_score': puntaje(),
+                    'resolucion_conflictos_score': puntaje(-0.5),
+                    'ansiedad_score': int(np.clip(round(11 - base + self.rng.normal(0, 1.5)), 1, 10)),
+                    'bienestar_general_score': puntaje(),
+                    'instrumento_evaluacion': 'Encuesta DIA'
+                })
+        return pd.DataFrame(filas)
+
+    def comentarios(self, df_estudiantes):
+        filas = []
+        for _, est in df_estudiantes.iterrows():
+            prob_negativo = (10 - self.clima_base[est['curso_id']]) / 12
+            for _ in range(self.comentarios_por_estudiante):
+                r = self.rng.random()
+                if r < prob_negativo:
+                    texto, tono = self.rng.choice(FRASES_NEGATIVAS), 'Negativo'
+                elif r < prob_negativo + 0.25:
+                    texto, tono = self.rng.choice(FRASES_NEUTRAS), 'Neutral'
+                else:
+                    texto, tono = self.rng.choice(FRASES_POSITIVAS), 'Positivo'
+                semana = int(self.rng.integers(0, self.semanas))
+                filas.append({
+                    'estudiante_id': est['estudiante_id'],
+                    'fecha_comentario': self.fecha_inicio + timedelta(weeks=semana, days=int(self.rng.integers(0, 5))),
+                    'periodo': f'Semana {semana + 1}',
+                    'tipo_comentario': self.rng.choice(TIPOS_COMENTARIO),
+                    'comentario_texto': texto,
+                    'tema_principal': None,
+                    'tono_percibido': tono
+                })
+        return pd.DataFrame(filas)
+
+    def interacciones(self, df_estudiantes):
+        """
+        Red de interacciones dentro de cada curso: grupos de amistad densos y,
+        en una proporción de cursos, un foco de bullying (pocos agresores que
+        repiten agresiones sobre una o dos víctimas)
+        """
+        filas = []
+        for curso_id, grupo in df_estudiantes.groupby('curso_id', sort=False):
+            ids = grupo['estudiante_id'].tolist()
+            if len(ids) < 2:
+                continue
+            n_grupos = max(1, len(ids) // 6)
+            grupo_de = {e: int(self.rng.integers(0, n_grupos)) for e in ids}
+
+            for origen in ids:
+                for _ in range(self.interacciones_por_estudiante):
+                    companeros = [e for e in ids if e != origen and grupo_de[e] == grupo_de[origen]]
+                    if companeros and self.rng.random() < 0.75:
+                        destino = self.rng.choice(companeros)
+                        tipo = self.rng.choice(['Amistad', 'Colaboracion', 'Apoyo'], p=[0.5, 0.3, 0.2])
+                    else:
+                        destino = self.rng.choice([e for e in ids if e != origen])
+                        tipo = self.rng.choice(['Colaboracion', 'Conflicto'], p=[0.7, 0.3])
+                    filas.append(self._interaccion(origen, destino, tipo))
+
+            if self.rng.random() < self.proporcion_bullying * 3 and len(ids) >= 5:
+                victimas = list(self.rng.choice(ids, size=min(2, len(ids) // 5), replace=False))
+                posibles = [e for e in ids if e not in victimas]
+                agresores = self.rng.choice(posibles, size=min(3, len(posibles)), replace=False)
+                for agresor in agresores:
+                    for victima in victimas:
+                        for _ in range(int(self.rng.integers(2, 6))):
+                            filas.append(self._interaccion(agresor, victima, 'Bullying'))
+        return pd.DataFrame(filas)
+
+    def _interaccion(self, origen, destino, tipo):
+        semana = int(self.rng.integers(0, self.semanas))
+        return {
+            'fecha_interaccion': self.fecha_inicio + timedelta(weeks=semana, days=int(self.rng.integers(0, 5))),
+            'estudiante_origen_id': origen,
+            'estudiante_destino_id': destino,
+            'tipo_interaccion': tipo,
+            'intensidad': int(self.rng.integers(1, 6)),
+            'contexto': self.rng.choice(['Sala de clases', 'Recreo', 'Redes sociales', 'Comedor']),
+            'reportado_por': self.rng.choice(['Docente', 'Estudiante', 'Apoderado'])
+        }
+
+    def intervenciones(self):
+        filas = []
+        for curso_id in self.curso_ids:
+            for k in range(max(1, self.semanas // 13)):
+                filas.append({
+                    'fecha_intervencion': self.fecha_inicio + timedelta(weeks=13 * k + 4),
+                    'periodo': f'Semana {13 * k + 5}',
+                    'curso_id': curso_id,
+                    'tipo_intervencion': self.rng.choice(TIPOS_INTERVENCION),
+                    'duracion_horas': float(self.rng.choice([1.5, 2.0, 3.0])),
+                    'participantes': self.estudiantes_por_curso,
+                    'responsable': 'Encargado de Convivencia',
+                    'objetivo': self.rng.choice(['Prevención', 'Reparación', 'Formación']),
+                    'evaluacion_efectividad': int(self.rng.integers(1, 6))
+                })
+        return pd.DataFrame(filas)
+
+    def docentes(self):
+        filas = []
+        for i, curso_id in enumerate(self.curso_ids):
+            filas.append({
+                'docente_id': f'DOC_{i:03d}',
+                'nombre_docente': f'Docente {i + 1}',
+                'curso_jefatura': curso_id,
+                'asignaturas': ', '.join(self.rng.choice(ASIGNATURAS, size=2, replace=False)),
+                'años_experiencia': int(self.rng.integers(1, 30)),
+                'formacion_convivencia': bool(self.rng.random() < 0.5),
+                'carga_horaria_semanal': int(self.rng.choice([30, 38, 44]))
+            })
+        return pd.DataFrame(filas)
+
+    # ------------------------------------------------------------------
+    # Establecimiento completo
+    # ------------------------------------------------------------------
+
+    def generar(self):
+        """
+        Returns:
+            dict {nombre_hoja: DataFrame} con las hojas de cargar_desde_excel
+        """
+        df_estudiantes = self.estudiantes()
+        return {
+            'Metadata_Establecimiento': self.metadata(),
+            'Cursos_Temporal': self.cursos_temporal(),
+            'Estudiantes': df_estudiantes,
+            'Evaluaciones_Socioemocionales': self.evaluaciones(df_estudiantes),
+            'Comentarios_Estudiantes': self.comentarios(df_estudiantes),
+            'Interacciones_Sociales': self.interacciones(df_estudiantes),
+            'Intervenciones_Aplicadas': self.intervenciones(),
+            'Docentes': self.docentes(),
+        }
+
+    def escribir_excel(self, ruta, hojas=None):
+        """Escribe el establecimiento en un archivo Excel y retorna el conteo de filas por hoja"""
+        hojas = hojas or self.generar()
+        with pd.ExcelWriter(ruta, engine='openpyxl') as writer:
+            for nombre, df in hojas.items():
+                df.to_excel(writer, sheet_name=nombre, index=False)
+        return {nombre: len(df) for nombre, df in hojas.items()}
+
+
+def generador_para_escala(escala, semilla=42):
+    """Crea un generador con una de las escalas predefinidas"""
+    return GeneradorDatosSinteticos(semilla=semilla, **ESCALAS[escala])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera un establecimiento sintético en formato Excel')
+    parser.add_argument('--escala', choices=sorted(ESCALAS), help='Escala predefinida (ignora los demás tamaños)')
+    parser.add_argument('--cursos', type=int, default=12)
+    parser.add_argument('--semanas', type=int, default=52)
+    parser.add_argument('--estudiantes', type=int, default=30, help='Estudiantes por curso')
+    parser.add_argument('--comentarios', type=int, default=8, help='Comentarios por estudiante')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', default='datos_sinteticos.xlsx')
+    args = parser.parse_args()
+
+    if args.escala:
+        generador = generador_para_escala(args.escala, semilla=args.semilla)
+    else:
+        generador = GeneradorDatosSinteticos(
+            cursos=args.cursos,
+            semanas=args.semanas,
+            estudiantes_por_curso=args.estudiantes,
+            comentarios_por_estudiante=args.comentarios,
+            semilla=args.semilla
+        )
+
+    conteos = generador.escribir_excel(args.salida)
+    print(f"✅ Archivo generado: {args.salida}")
+    for hoja, filas in conteos.items():
+        print(f"   {hoja}: {filas} filas")
+
+
+if __name__ == '__main__':
+    main()
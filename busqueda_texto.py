@@ -0,0 +1,289 @@
+"""
+Módulo de Búsqueda de Texto Completo para CONVIVIR v4.0
+Índice de texto sobre comentarios.comentario_texto y sobre el mensaje y la
+recomendación de las alertas, con ranking, fragmentos resaltados y paginación
+
+- SQLite: tablas virtuales FTS5 de contenido externo (comentarios_fts,
+  alertas_fts) sin acentos ni mayúsculas, sincronizadas con triggers AFTER
+  INSERT/UPDATE/DELETE. FTS5 no trae un lematizador para español: cada palabra
+  buscada se reduce a su raíz (raiz_busqueda) y se consulta como prefijo
+  ("molestaron" → molest* → molestan, molestia)
+- PostgreSQL: índices GIN sobre to_tsvector('spanish', ...) (lematización en
+  español); PostgreSQL los mantiene al día en cada escritura
+- Sin FTS5 disponible se busca con LIKE sobre las raíces (recorrido completo),
+  comparando el texto normalizado por la función sin_acentos que se registra en
+  cada conexión SQLite
+
+Las tablas e índices se crean al iniciar DatabaseManager; los datos existentes se
+indexan una sola vez, cuando se crea la tabla virtual.
+"""
+
+import re
+import html
+
+from sqlalchemy import event, text
+
+from motor_palabras_clave import normalizar_texto
+
+
+# Marcas de resaltado que no aparecen en el texto; se reemplazan por <mark>
+# después de escapar el HTML del fragmento
+INICIO_MARCA = '\x02'
+FIN_MARCA = '\x03'
+
+# Tablas buscables: columna de texto a indexar y columnas retornadas
+TABLAS_BUSQUEDA = {
+    'comentarios': {
+        'texto': ('comentario_texto',),
+        'columnas': ('id', 'estudiante_id', 'fecha_comentario', 'tipo_comentario', 'sentimiento_analizado'),
+    },
+    'alertas': {
+        'texto': ('mensaje', 'recomendacion'),
+        'columnas': ('id', 'estudiante_id', 'curso_id', 'fecha_creacion', 'tipo_alerta', 'nivel_prioridad', 'estado'),
+    },
+}
+
+PALABRA_BUSQUEDA = re.compile(r'\w+')
+
+# Sufijos flexivos y derivativos frecuentes, de más largo a más corto
+SUFIJOS = sorted((
+    'amientos', 'imientos', 'amiento', 'imiento', 'aciones', 'iciones', 'adoras', 'adores',
+    'ancias', 'encias', 'mente', 'acion', 'icion', 'adora', 'ador', 'ancia', 'encia',
+    'istas', 'ista', 'ables', 'ibles', 'able', 'ible', 'ieron', 'aron', 'aban', 'iendo',
+    'ando', 'ados', 'idos', 'adas', 'idas', 'ado', 'ido', 'ada', 'ida', 'aba', 'ian',
+    'ar', 'er', 'ir', 'es', 'os', 'as', 'an', 'en', 'a', 'o', 'e', 's'
+), key=len, reverse=True)
+
+LARGO_MINIMO_RAIZ = 4
+
+
+def raiz_busqueda(palabra):
+    """
+    Raíz aproximada de una palabra en español para búsquedas por prefijo
+
+    Quita el sufijo más largo que deje al menos LARGO_MINIMO_RAIZ letras:
+    "molestaron" → "molest", "insultos" → "insult", "peleas" → "pele"
+    """
+    palabra = normalizar_texto(palabra)
+    for sufijo in SUFIJOS:
+        if palabra.endswith(sufijo) and len(palabra) - len(sufijo) >= LARGO_MINIMO_RAIZ:
+            return palabra[:-len(sufijo)]
+    return palabra
+
+
+def terminos_consulta(consulta):
+    """Palabras de la consulta del usuario, sin operadores ni comillas (máximo 10)"""
+    return PALABRA_BUSQUEDA.findall(normalizar_texto(consulta))[:10]
+
+
+def _consulta_fts5(terminos):
+    """Expresión MATCH de FTS5: todas las raíces, cada una como prefijo"""
+    partes = []
+    for termino in terminos:
+        raiz = raiz_busqueda(termino)
+        partes.append(f'"{raiz}"*' if len(raiz) >= LARGO_MINIMO_RAIZ else f'"{raiz}"')
+    return ' AND '.join(partes)
+
+
+def _resaltar(fragmento):
+    """Escapa el fragmento y convierte las marcas de coincidencia en <mark>"""
+    if fragmento is None:
+        return None
+    fragmento = html.escape(fragmento)
+    return fragmento.replace(INICIO_MARCA, '<mark>').replace(FIN_MARCA, '</mark>')
+
+
+# ----------------------------------------------------------------------
+# Creación de los índices
+# ----------------------------------------------------------------------
+
+def fts5_disponible(conn):
+    try:
+        return bool(conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+    except Exception:
+        return False
+
+
+def _instalar_sqlite(conn, tabla, columnas):
+    fts = f'{tabla}_fts'
+    existia = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nombre"), {'nombre': fts}
+    ).scalar()
+    lista = ', '.join(columnas)
+    nuevos = ', '.join(f'new.{c}' for c in columnas)
+    viejos = ', '.join(f'old.{c}' for c in columnas)
+
+    conn.execute(text(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {lista}, content='{tabla}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabla} BEGIN
+            INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {nuevos});
+        END
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabla} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {viejos});
+        END
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {lista} ON {tabla} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {viejos});
+            INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {nuevos});
+        END
+    """))
+    if not existia:
+        # Indexa las filas que ya existían antes del índice
+        conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+def _sin_acentos(valor):
+    return None if valor is None else normalizar_texto(valor)
+
+
+def _registrar_sin_acentos(conexion_dbapi, registro_conexion):
+    """Registra sin_acentos(texto) en una conexión SQLite (misma normalización que las consultas)"""
+    conexion_dbapi.create_function('sin_acentos', 1, _sin_acentos, deterministic=True)
+
+
+def _vector_postgres(columnas):
+    """Expresión tsvector de las columnas (la misma en el índice y en las consultas)"""
+    return "to_tsvector('spanish', " + " || ' ' || ".join(f"coalesce({c}, '')" for c in columnas) + ")"
+
+
+def instalar_indices_texto(engine, is_postgres):
+    """
+    Crea los índices de texto completo si no existen
+
+    Returns:
+        'tsvector', 'fts5' o 'like' (sin índice: SQLite compilado sin FTS5)
+    """
+    with engine.begin() as conn:
+        if is_postgres:
+            for tabla, config in TABLAS_BUSQUEDA.items():
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{tabla}_texto_completo ON {tabla} "
+                    f"USING GIN ({_vector_postgres(config['texto'])})"
+                ))
+            return 'tsvector'
+
+        motor = 'fts5' if fts5_disponible(conn) else 'like'
+        if motor == 'fts5':
+            for tabla, config in TABLAS_BUSQUEDA.items():
+                _instalar_sqlite(conn, tabla, config['texto'])
+
+    if motor == 'like':
+        print("⚠️ SQLite sin FTS5. La búsqueda de texto usará LIKE (sin índice).")
+        # Las conexiones ya abiertas en el pool no tienen la función: se descartan
+        event.listen(engine, 'connect', _registrar_sin_acentos)
+        engine.dispose()
+    return motor
+
+
+# ----------------------------------------------------------------------
+# Búsqueda
+# ----------------------------------------------------------------------
+
+def buscar_texto(db_manager, consulta, tabla='comentarios', limite=20, pagina=1):
+    """
+    Busca texto en comentarios o alertas
+
+    Args:
+        db_manager: DatabaseManager (usa su engine y su motor de búsqueda)
+        consulta: Texto libre del usuario; todas las palabras deben aparecer
+            (en SQLite, cualquier forma con la misma raíz)
+        tabla: 'comentarios' o 'alertas'
+        limite, pagina: Paginación (página desde 1)
+
+    Returns:
+        dict con 'resultados' (columnas de la fila, 'fragmento' con <mark> y
+        'puntaje'), 'total', 'pagina', 'hay_mas' y 'motor'
+    """
+    if tabla not in TABLAS_BUSQUEDA:
+        raise ValueError(f"Tabla de búsqueda desconocida: {tabla}")
+    config = TABLAS_BUSQUEDA[tabla]
+    terminos = terminos_consulta(consulta or '')
+    motor = db_manager.motor_busqueda
+    if not terminos:
+        return {'resultados': [], 'total': 0, 'pagina': pagina, 'hay_mas': False, 'motor': motor}
+
+    columnas = ', '.join(f't.{c}' for c in config['columnas'])
+    parametros = {'limite': limite, 'desplazamiento': (pagina - 1) * limite}
+
+    if motor == 'fts5':
+        fts = f'{tabla}_fts'
+        parametros['consulta'] = _consulta_fts5(terminos)
+        # bm25 es menor cuanto más relevante; snippet elige la mejor columna (-1)
+        sql = f"""
+            SELECT {columnas},
+                   snippet({fts}, -1, :inicio, :fin, '…', 32) AS fragmento,
+                   -bm25({fts}) AS puntaje
+            FROM {fts}
+            JOIN {tabla} t ON t.id = {fts}.rowid
+            WHERE {fts} MATCH :consulta
+            ORDER BY bm25({fts}), t.id DESC
+            LIMIT :limite OFFSET :desplazamiento
+        """
+        sql_total = f"SELECT COUNT(*) FROM {fts} WHERE {fts} MATCH :consulta"
+        parametros.update(inicio=INICIO_MARCA, fin=FIN_MARCA)
+
+    elif motor == 'tsvector':
+        vector = _vector_postgres([f't.{c}' for c in config['texto']])
+        texto = " || ' ' || ".join(f"coalesce(t.{c}, '')" for c in config['texto'])
+        # websearch_to_tsquery acepta cualquier texto (comillas, OR, -palabra) sin errores de sintaxis
+        parametros['consulta'] = consulta[:500]
+        sql = f"""
+            SELECT {columnas},
+                   ts_headline('spanish', {texto}, q, :opciones) AS fragmento,
+                   ts_rank_cd({vector}, q) AS puntaje
+            FROM {tabla} t, websearch_to_tsquery('spanish', :consulta) q
+            WHERE {vector} @@ q
+            ORDER BY puntaje DESC, t.id DESC
+            LIMIT :limite OFFSET :desplazamiento
+        """
+        sql_total = f"""
+            SELECT COUNT(*) FROM {tabla} t
+            WHERE {vector} @@ websearch_to_tsquery('spanish', :consulta)
+        """
+        parametros['opciones'] = f'StartSel={INICIO_MARCA}, StopSel={FIN_MARCA}, MaxWords=35, MinWords=15'
+
+    else:
+        # Sin índice: todas las raíces en alguna columna, sin acentos ni mayúsculas en ambos lados
+        condiciones = []
+        for i, termino in enumerate(terminos):
+            parametros[f'patron{i}'] = f'%{raiz_busqueda(termino)}%'
+            condiciones.append('(' + ' OR '.join(f"sin_acentos(t.{c}) LIKE :patron{i}" for c in config['texto']) + ')')
+        texto = " || ' ' || ".join(f"coalesce(t.{c}, '')" for c in config['texto'])
+        where = ' AND '.join(condiciones)
+        sql = f"""
+            SELECT {columnas}, {texto} AS fragmento, 0 AS puntaje
+            FROM {tabla} t WHERE {where}
+            ORDER BY t.id DESC
+            LIMIT :limite OFFSET :desplazamiento
+        """
+        sql_total = f"SELECT COUNT(*) FROM {tabla} t WHERE {where}"
+
+    with db_manager.engine.connect() as conn:
+        filas = conn.execute(text(sql), parametros).fetchall()
+        total = conn.execute(text(sql_total), parametros).scalar() or 0
+
+    resultados = []
+    for fila in filas:
+        registro = dict(zip(config['columnas'], fila))
+        for clave, valor in registro.items():
+            if clave.startswith('fecha') and valor is not None:
+                registro[clave] = str(valor)
+        registro['fragmento'] = _resaltar(fila[-2]) if motor != 'like' else html.escape(fila[-2] or '')
+        registro['puntaje'] = round(float(fila[-1] or 0), 4)
+        resultados.append(registro)
+
+    return {
+        'resultados': resultados,
+        'total': total,
+        'pagina': pagina,
+        'hay_mas': (pagina - 1) * limite + len(resultados) < total,
+        'motor': motor
+    }
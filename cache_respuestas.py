@@ -0,0 +1,308 @@
+"""
+Módulo de Caché de Respuestas HTTP para CONVIVIR v4.0
+ETags derivados de versiones por tabla, GET condicional (304) y LRU en memoria
+de las respuestas JSON ya serializadas
+"""
+
+import os
+import re
+import mmap
+import uuid
+import zlib
+import struct
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date
+from functools import wraps
+
+from flask import request, make_response, current_app
+from sqlalchemy import event
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+
+# Sentencias que modifican datos: INSERT INTO t, UPDATE t, DELETE FROM t
+PATRON_ESCRITURA = re.compile(
+    r'^\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|UPDATE|DELETE\s+FROM)\s+["`]?(\w+)',
+    re.IGNORECASE
+)
+
+# VersionesDatos incrementa la versión de una tabla al ejecutar cada sentencia
+# de escritura y otra vez al confirmar: una escritura de una sola sentencia,
+# confirmada en su propia transacción, avanza la versión en este valor
+INCREMENTOS_POR_ESCRITURA_CONFIRMADA = 2
+
+
+class ContadoresCompartidos:
+    """
+    Contadores int64 en un archivo mapeado en memoria, compartidos por todos los
+    procesos del mismo host (workers de gunicorn)
+
+    Cada tabla ocupa la ranura crc32(tabla) % RANURAS; una colisión solo provoca
+    invalidaciones de más, nunca una versión desactualizada. La ranura 0 guarda
+    el identificador de la instancia que forma parte de los ETags.
+    """
+
+    RANURAS = 512
+    FORMATO = '<q'
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        tamano = 8 * (self.RANURAS + 1)
+        self._fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._bloqueo():
+            if os.fstat(self._fd).st_size < tamano:
+                os.ftruncate(self._fd, tamano)
+                self._mmap = mmap.mmap(self._fd, tamano)
+                self._escribir_nonce()
+            else:
+                self._mmap = mmap.mmap(self._fd, tamano)
+
+    @contextmanager
+    def _bloqueo(self):
+        # lockf es por proceso: excluye a los otros workers; el Lock, a los otros hilos
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _escribir_nonce(self):
+        struct.pack_into(self.FORMATO, self._mmap, 0, uuid.uuid4().int & 0x7FFFFFFFFFFFFFFF)
+
+    def _ranura(self, tabla):
+        return 8 * (1 + zlib.crc32(tabla.encode('utf-8')) % self.RANURAS)
+
+    def reiniciar_nonce(self):
+        """Nuevo identificador de instancia (al arrancar el proceso maestro)"""
+        with self._bloqueo():
+            self._escribir_nonce()
+
+    @property
+    def nonce(self):
+        return format(struct.unpack_from(self.FORMATO, self._mmap, 0)[0], 'x')[:8]
+
+    def incrementar(self, *tablas):
+        with self._bloqueo():
+            for posicion in {self._ranura(tabla) for tabla in tablas}:
+                valor = struct.unpack_from(self.FORMATO, self._mmap, posicion)[0]
+                struct.pack_into(self.FORMATO, self._mmap, posicion, valor + 1)
+
+    def version(self, *tablas):
+        # Lecturas alineadas de 8 bytes: no requieren bloqueo
+        return tuple(struct.unpack_from(self.FORMATO, self._mmap, self._ranura(tabla))[0] for tabla in tablas)
+
+
+def ruta_versiones_compartidas(identificador):
+    """Archivo de contadores compartidos para una base de datos (CONVIVIR_VERSIONES_ARCHIVO lo reemplaza)"""
+    ruta = os.environ.get('CONVIVIR_VERSIONES_ARCHIVO')
+    if ruta:
+        return ruta
+    sufijo = hashlib.sha1(str(identificador).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f'convivir_versiones_{sufijo}.bin')
+
+
+class VersionesDatos:
+    """
+    Contadores de versión por tabla, incrementados en cada escritura confirmada
+
+    Se alimenta de los eventos del engine de SQLAlchemy, por lo que cubre tanto
+    las consultas text() de app.py como los flush del ORM.
+
+    Con archivo_compartido, los contadores viven en un archivo mapeado en memoria
+    y una escritura en cualquier worker invalida la caché de todos.
+    """
+
+    def __init__(self, archivo_compartido=None):
+        self._versiones = {}
+        self._lock = threading.Lock()
+        self.compartidos = None
+        if archivo_compartido is not None:
+            if FCNTL_AVAILABLE:
+                self.compartidos = ContadoresCompartidos(archivo_compartido)
+            else:
+                print("⚠️ fcntl no disponible. Versiones de caché locales a cada proceso.")
+
+    def registrar(self, engine):
+        """Conecta los eventos de escritura y commit del engine"""
+        event.listen(engine, 'after_cursor_execute', self._despues_de_ejecutar)
+        event.listen(engine, 'commit', self._al_confirmar)
+        event.listen(engine, 'rollback', self._al_revertir)
+
+    def _despues_de_ejecutar(self, conn, cursor, statement, parameters, context, executemany):
+        match = PATRON_ESCRITURA.match(statement)
+        if match:
+            tabla = match.group(1).lower()
+            conn.info.setdefault('tablas_modificadas', set()).add(tabla)
+            # Se incrementa también aquí para que ninguna lectura concurrente
+            # quede asociada a la versión anterior mientras dura la transacción
+            self.incrementar(tabla)
+
+    def _al_confirmar(self, conn):
+        tablas = conn.info.pop('tablas_modificadas', set())
+        if tablas:
+            self.incrementar(*tablas)
+
+    def _al_revertir(self, conn):
+        conn.info.pop('tablas_modificadas', None)
+
+    def incrementar(self, *tablas):
+        """Marca como modificadas una o más tablas"""
+        if self.compartidos is not None:
+            self.compartidos.incrementar(*tablas)
+            return
+        with self._lock:
+            for tabla in tablas:
+                self._versiones[tabla] = self._versiones.get(tabla, 0) + 1
+
+    def version(self, *tablas):
+        """Tupla con la versión actual de cada tabla indicada"""
+        if self.compartidos is not None:
+            return self.compartidos.version(*tablas)
+        with self._lock:
+            return tuple(self._versiones.get(tabla, 0) for tabla in tablas)
+
+
+class CacheLRU:
+    """Caché LRU acotada y segura entre hilos"""
+
+    def __init__(self, max_entradas=256):
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            valor = self._datos.get(clave)
+            if valor is None:
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class CacheRespuestas:
+    """
+    Capa de caché HTTP para endpoints JSON de solo lectura
+
+    Uso:
+        cache = CacheRespuestas(db.engine)
+
+        @app.route('/api/listar_estudiantes')
+        @cache.cacheable('estudiantes')
+        def api_listar_estudiantes(): ...
+    """
+
+    def __init__(self, engine=None, max_entradas=None, max_age=0, archivo_versiones=None):
+        """
+        Args:
+            engine: Engine de SQLAlchemy cuyas escrituras invalidan la caché
+            max_entradas: Tamaño del LRU (por defecto CONVIVIR_CACHE_ENTRADAS o 256)
+            max_age: Segundos que el navegador puede reutilizar la respuesta sin revalidar
+            archivo_versiones: Archivo de versiones compartido entre workers (ver ContadoresCompartidos)
+        """
+        if max_entradas is None:
+            max_entradas = int(os.environ.get('CONVIVIR_CACHE_ENTRADAS', 256))
+
+        self.versiones = VersionesDatos(archivo_versiones)
+        self.lru = CacheLRU(max_entradas)
+        self.max_age = max_age
+        # Distingue ETags entre reinicios del proceso (las versiones vuelven a cero)
+        self._nonce = uuid.uuid4().hex[:8]
+
+        if engine is not None:
+            self.versiones.registrar(engine)
+
+    def reiniciar_etags(self):
+        """Invalida los ETags emitidos antes de este arranque (los datos pudieron cambiar fuera de línea)"""
+        self._nonce = uuid.uuid4().hex[:8]
+        if self.versiones.compartidos is not None:
+            self.versiones.compartidos.reiniciar_nonce()
+
+    def _etag(self, clave):
+        # Con versiones compartidas, todos los workers deben generar el mismo ETag
+        compartidos = self.versiones.compartidos
+        nonce = compartidos.nonce if compartidos is not None else self._nonce
+        return hashlib.sha1(repr((nonce, clave)).encode('utf-8')).hexdigest()[:24]
+
+    @staticmethod
+    def _es_cacheable(respuesta):
+        """Solo se guardan respuestas 200 que no informan un error en el cuerpo"""
+        if respuesta.status_code != 200:
+            return False
+        if respuesta.is_json:
+            cuerpo = respuesta.get_json(silent=True)
+            if isinstance(cuerpo, dict) and (cuerpo.get('exito') is False or 'error' in cuerpo):
+                return False
+        return True
+
+    def _aplicar_cabeceras(self, respuesta, etag):
+        respuesta.set_etag(etag)
+        respuesta.headers['Cache-Control'] = f'private, max-age={self.max_age}, must-revalidate'
+        return respuesta
+
+    def cacheable(self, *tablas, por_dia=False):
+        """
+        Decorador para vistas GET cuyo resultado depende solo de las tablas indicadas
+        y de los argumentos de la URL. Con por_dia=True la fecha actual también forma
+        parte de la clave, para vistas que calculan ventanas relativas a hoy.
+        """
+        def decorador(vista):
+            @wraps(vista)
+            def envoltura(*args, **kwargs):
+                if request.method != 'GET':
+                    return vista(*args, **kwargs)
+
+                clave = (
+                    request.endpoint,
+                    tuple(sorted(kwargs.items())),
+                    tuple(sorted(request.args.items(multi=True))),
+                    self.versiones.version(*tablas),
+                    date.today().isoformat() if por_dia else None
+                )
+                etag = self._etag(clave)
+
+                # GET condicional: el cliente ya tiene esta versión (comparación débil,
+                # la compresión entrega la misma versión como ETag débil)
+                if request.if_none_match.contains_weak(etag):
+                    return self._aplicar_cabeceras(current_app.response_class(status=304), etag)
+
+                cacheado = self.lru.obtener(clave)
+                if cacheado is None:
+                    respuesta = make_response(vista(*args, **kwargs))
+                    if not self._es_cacheable(respuesta):
+                        return respuesta
+                    cacheado = (respuesta.get_data(), respuesta.mimetype)
+                    self.lru.guardar(clave, cacheado)
+
+                cuerpo, mimetype = cacheado
+                return self._aplicar_cabeceras(current_app.response_class(cuerpo, mimetype=mimetype), etag)
+
+            return envoltura
+        return decorador
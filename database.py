@@ -3,13 +3,18 @@ Módulo de Base de Datos SQLite para CONVIVIR v4.0
 Gestiona la persistencia de datos con esquema normalizado
 """
 
+import os
+import json
 import sqlite3
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, Index, text, insert
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship
 from datetime import datetime
 import pandas as pd
 
+from eventos import bus_eventos
+from busqueda_texto import instalar_indices_texto
+
 Base = declarative_base()
 
 # ============================================================================
@@ -33,6 +38,10 @@ class Cohorte(Base):
 class CursoAnual(Base):
     """Representa la asignación de un nombre de curso a una cohorte en un año específico"""
     __tablename__ = 'cursos_anuales'
+    __table_args__ = (
+        # Búsqueda de la cohorte activa de un curso al matricular estudiantes
+        Index('ix_cursos_anuales_nombre_activo', 'nombre_curso', 'activo'),
+    )
     
     curso_anual_id = Column(Integer, primary_key=True, autoincrement=True)
     cohorte_id = Column(Integer, ForeignKey('cohortes.cohorte_id'), nullable=False)
@@ -65,6 +74,11 @@ class Establecimiento(Base):
 
 class CursoTemporal(Base):
     __tablename__ = 'cursos_temporal'
+    __table_args__ = (
+        # Búsquedas de semanas ya registradas al mantener los resúmenes
+        Index('ix_cursos_temporal_curso_fecha', 'curso_id', 'fecha_registro'),
+        Index('ix_cursos_temporal_fecha', 'fecha_registro'),
+    )
     
     id = Column(Integer, primary_key=True)
     establecimiento_id = Column(String(50), ForeignKey('establecimientos.establecimiento_id'))
@@ -130,6 +144,11 @@ class EvaluacionSocioemocional(Base):
 
 class Comentario(Base):
     __tablename__ = 'comentarios'
+    __table_args__ = (
+        # Paginación keyset sobre (fecha_comentario, id) y filtros por estudiante
+        Index('ix_comentarios_fecha_id', 'fecha_comentario', 'id'),
+        Index('ix_comentarios_estudiante_fecha', 'estudiante_id', 'fecha_comentario'),
+    )
     
     id = Column(Integer, primary_key=True)
     estudiante_id = Column(String(50), ForeignKey('estudiantes.estudiante_id'))
@@ -221,6 +240,102 @@ class Alerta(Base):
     fecha_atencion = Column(DateTime)
 
 
+class ResumenCurso(Base):
+    """Resumen materializado por curso de los registros semanales de cursos_temporal"""
+    __tablename__ = 'resumen_cursos'
+    
+    curso_id = Column(String(20), primary_key=True)
+    total_registros = Column(Integer, default=0)
+    semanas_registradas = Column(Integer, default=0)  # Fechas de registro distintas
+    fecha_inicio = Column(DateTime)
+    fecha_ultima = Column(DateTime)
+    suma_clima = Column(Float, default=0.0)  # Para mantener el promedio incrementalmente
+    registros_clima = Column(Integer, default=0)
+    max_total_estudiantes = Column(Integer)
+    fecha_actualizacion = Column(DateTime, default=datetime.now)
+
+
+class ResumenEstablecimiento(Base):
+    """Contadores materializados a nivel de establecimiento (una sola fila, id=1)"""
+    __tablename__ = 'resumen_establecimiento'
+    
+    id = Column(Integer, primary_key=True)
+    total_estudiantes = Column(Integer, default=0)
+    total_interacciones = Column(Integer, default=0)
+    alertas_pendientes = Column(Integer, default=0)
+    semanas_registradas = Column(Integer, default=0)
+    suma_clima = Column(Float, default=0.0)
+    registros_clima = Column(Integer, default=0)
+    fecha_actualizacion = Column(DateTime, default=datetime.now)
+
+
+class RiesgoEstudiante(Base):
+    """Puntaje de riesgo materializado por estudiante (ver riesgo_estudiante.py)"""
+    __tablename__ = 'riesgo_estudiante'
+
+    estudiante_id = Column(String(50), primary_key=True)
+    curso_id = Column(String(20), index=True)
+    puntaje = Column(Float, default=0.0)  # 0-100
+    nivel = Column(String(10))  # 'bajo', 'medio', 'alto'
+    # Componentes normalizados a 0-1
+    negatividad = Column(Float, default=0.0)
+    victimizacion = Column(Float, default=0.0)
+    aislamiento = Column(Float, default=0.0)
+    socioemocional = Column(Float, default=0.0)
+    incidentes = Column(Float, default=0.0)
+    # Acumuladores de comentarios para la actualización incremental
+    comentarios_total = Column(Integer, default=0)
+    comentarios_negativos = Column(Integer, default=0)
+    ultimo_comentario_id = Column(Integer, default=0)
+    fecha_actualizacion = Column(DateTime, default=datetime.now)
+
+
+class EstadoDetectorTemprano(Base):
+    """Estado EWMA/CUSUM de cada indicador semanal de un curso (ver detector_temprano.py)"""
+    __tablename__ = 'estado_detector_temprano'
+
+    curso_id = Column(String(20), primary_key=True)
+    indicador = Column(String(50), primary_key=True)
+    registros = Column(Integer, default=0)  # Filas de cursos_temporal del curso ya procesadas
+    semanas = Column(Integer, default=0)  # Semanas con valor para el indicador
+    media = Column(Float, default=0.0)  # Línea base (media móvil exponencial)
+    varianza = Column(Float, default=0.0)
+    ewma = Column(Float, default=0.0)  # EWMA de las desviaciones estandarizadas
+    cusum = Column(Float, default=0.0)  # CUSUM unilateral hacia el deterioro
+    ultimo_valor = Column(Float)
+    alerta_activa = Column(Boolean, default=False)
+    fecha_ultima = Column(DateTime)
+    fecha_actualizacion = Column(DateTime, default=datetime.now)
+
+
+class ImportacionExcel(Base):
+    """Punto de control de una importación Excel por bloques (permite reanudarla)"""
+    __tablename__ = 'importaciones_excel'
+    
+    id = Column(Integer, primary_key=True)
+    huella = Column(String(40), nullable=False, index=True)  # SHA-1 del archivo
+    nombre_archivo = Column(String(255))
+    estado = Column(String(20), default='en_curso')  # 'en_curso', 'completada', 'error'
+    hoja_actual = Column(String(100))
+    filas_hoja = Column(Integer, default=0)  # Filas de datos ya confirmadas en hoja_actual
+    filas_importadas = Column(Integer, default=0)
+    mensaje = Column(Text)
+    fecha_inicio = Column(DateTime, default=datetime.now)
+    fecha_actualizacion = Column(DateTime, default=datetime.now)
+
+
+class EstadoAplicacion(Base):
+    """Estado de la carga de datos compartido por todos los workers (fila única id=1)"""
+    __tablename__ = 'estado_aplicacion'
+    
+    id = Column(Integer, primary_key=True)
+    archivo_cargado = Column(Boolean, default=False)
+    nombre_archivo = Column(String(255), default='Datos de Ejemplo Precargados')
+    fecha_carga = Column(DateTime)
+    analisis_completados = Column(Text, default='[]')  # Lista JSON
+    fecha_actualizacion = Column(DateTime, default=datetime.now)
+
+
 # ============================================================================
 # GESTOR DE BASE DE DATOS
 # ============================================================================
@@ -229,8 +344,6 @@ class DatabaseManager:
     """Gestiona todas las operaciones con la base de datos"""
     
     def __init__(self, db_path='convivir.db'):
-        import os
-        
         # Detectar si estamos en producción (Render) con PostgreSQL
         database_url = os.environ.get('DATABASE_URL')
         
@@ -251,9 +364,41 @@ class DatabaseManager:
             self.is_postgres = False
         
         Base.metadata.create_all(self.engine)
+        self._crear_indices()
+        # Búsqueda de texto en comentarios y alertas: 'fts5', 'tsvector' o 'like'
+        self.motor_busqueda = instalar_indices_texto(self.engine, self.is_postgres)
         Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+        # Una sesión por hilo: los hilos de un worker gthread no comparten transacción
+        self.session = scoped_session(Session)
         self.SessionFactory = Session
+        
+        # Las conexiones del pool no deben cruzar un fork (preload_app de gunicorn)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.reiniciar_tras_fork)
+        
+        # Bases creadas antes de existir los resúmenes se materializan al iniciar
+        with self.engine.begin() as conn:
+            if conn.execute(text("SELECT COUNT(*) FROM resumen_establecimiento")).scalar() == 0:
+                self.reconstruir_resumenes(conn)
+    
+    def reiniciar_tras_fork(self):
+        """
+        En el proceso hijo descarta las conexiones y sesiones heredadas del padre
+        sin cerrarlas (siguen siendo del padre); cada worker abre las suyas
+        """
+        self.engine.dispose(close=False)
+        self.session.registry.clear()
+    
+    def cerrar_sesion(self):
+        """Libera la sesión del hilo actual (al terminar cada petición)"""
+        self.session.remove()
+    
+    def _crear_indices(self):
+        """Crea los índices declarados en los modelos sobre tablas ya existentes"""
+        # create_all no agrega índices nuevos a tablas creadas en versiones anteriores
+        for tabla in Base.metadata.sorted_tables:
+            for indice in tabla.indexes:
+                indice.create(self.engine, checkfirst=True)
     
     def get_session(self):
         """Context manager para obtener una sesión de base de datos"""
@@ -273,6 +418,24 @@ class DatabaseManager:
         
         return session_scope()
     
+    def insertar_nuevos(self, conn, modelo, filas, clave):
+        """
+        INSERT ... ON CONFLICT (clave) DO NOTHING RETURNING clave, en un executemany
+        
+        Returns:
+            Lista con la clave de cada fila efectivamente insertada (las que
+            chocaron con una existente no aparecen)
+        """
+        if not filas:
+            return []
+        if self.is_postgres:
+            from sqlalchemy.dialects.postgresql import insert as insertar
+        else:
+            from sqlalchemy.dialects.sqlite import insert as insertar
+        columna = getattr(modelo, clave)
+        sentencia = insertar(modelo).on_conflict_do_nothing(index_elements=[clave]).returning(columna)
+        return conn.execute(sentencia, filas).scalars().all()
+    
     def cargar_desde_excel(self, excel_path):
         """Carga datos desde el archivo Excel mejorado a la base de datos"""
         try:
@@ -461,65 +624,48 @@ class DatabaseManager:
                         self.session.add(docente)
             
             self.session.commit()
+            self.reconstruir_resumenes()
             return {'exito': True, 'mensaje': 'Datos cargados exitosamente a la base de datos'}
         
         except Exception as e:
             self.session.rollback()
             return {'exito': False, 'mensaje': f'Error al cargar datos: {str(e)}'}
     
+    def importar_excel_por_bloques(self, excel_path, tamano_bloque=1000, reanudar=True,
+                                   forzar=False, trabajo_id=None, nombre_archivo=None):
+        """
+        Importa el Excel en modo streaming (memoria acotada, commit por bloque y
+        reanudable). Ver importacion_excel.ImportadorExcel
+        """
+        from importacion_excel import ImportadorExcel
+        
+        importador = ImportadorExcel(self, tamano_bloque=tamano_bloque)
+        return importador.importar(excel_path, reanudar=reanudar, forzar=forzar,
+                                   trabajo_id=trabajo_id, nombre_archivo=nombre_archivo)
+    
     def obtener_series_temporales_curso(self, curso_id):
         """Obtiene la serie temporal de un curso para análisis LSTM"""
-        cursos = self.session.query(CursoTemporal).filter_by(curso_id=curso_id).order_by(CursoTemporal.fecha_registro).all()
+        from acceso_caracteristicas import series_temporales_curso
         
-        data = []
-        for c in cursos:
-            data.append({
-                'fecha': c.fecha_registro,
-                'clima_escolar': c.clima_escolar_promedio,
-                'apoyo_docentes': c.apoyo_docentes_promedio,
-                'participacion': c.participacion_estudiantes_promedio,
-                'empatia': c.nivel_empatia_promedio,
-                'autoestima': c.nivel_autoestima_promedio,
-                'resolucion_conflictos': c.nivel_resolucion_conflictos_promedio,
-                'incidentes_bullying': c.incidentes_bullying,
-                'incidentes_violencia': c.incidentes_violencia_fisica,
-                'incidentes_discriminacion': c.incidentes_discriminacion
-            })
+        return series_temporales_curso(self.engine, curso_id)
+    
+    def obtener_series_temporales_cursos(self, curso_ids=None):
+        """Obtiene las series temporales de varios cursos en una sola consulta: {curso_id: DataFrame}"""
+        from acceso_caracteristicas import series_temporales_cursos
         
-        return pd.DataFrame(data)
+        return series_temporales_cursos(self.engine, curso_ids)
     
     def obtener_grafo_social(self):
         """Obtiene todas las interacciones para construir el grafo social"""
-        interacciones = self.session.query(Interaccion).all()
-        
-        edges = []
-        for i in interacciones:
-            edges.append({
-                'origen': i.estudiante_origen_id,
-                'destino': i.estudiante_destino_id,
-                'tipo': i.tipo_interaccion,
-                'intensidad': i.intensidad,
-                'fecha': i.fecha_interaccion
-            })
+        from acceso_caracteristicas import aristas_grafo_social
         
-        return pd.DataFrame(edges)
+        return aristas_grafo_social(self.engine)
     
     def obtener_comentarios_para_nlp(self):
         """Obtiene todos los comentarios para análisis NLP"""
-        comentarios = self.session.query(Comentario).all()
-        
-        data = []
-        for c in comentarios:
-            data.append({
-                'id': c.id,
-                'estudiante_id': c.estudiante_id,
-                'fecha': c.fecha_comentario,
-                'texto': c.comentario_texto,
-                'tema': c.tema_principal,
-                'tono_percibido': c.tono_percibido
-            })
+        from acceso_caracteristicas import comentarios_para_nlp
         
-        return pd.DataFrame(data)
+        return comentarios_para_nlp(self.engine)
     
     def guardar_prediccion(self, curso_id, tipo_prediccion, horizonte_semanas, valor_predicho, 
                           intervalo_inf, intervalo_sup, modelo):
@@ -539,17 +685,62 @@ class DatabaseManager:
     def crear_alerta(self, tipo_alerta, nivel_prioridad, mensaje, recomendacion, 
                     curso_id=None, estudiante_id=None):
         """Crea una nueva alerta en el sistema"""
-        alerta = Alerta(
-            tipo_alerta=tipo_alerta,
-            nivel_prioridad=nivel_prioridad,
-            curso_id=curso_id,
-            estudiante_id=estudiante_id,
-            mensaje=mensaje,
-            recomendacion=recomendacion
-        )
-        self.session.add(alerta)
+        return self.crear_alertas([{
+            'tipo_alerta': tipo_alerta,
+            'nivel_prioridad': nivel_prioridad,
+            'mensaje': mensaje,
+            'recomendacion': recomendacion,
+            'curso_id': curso_id,
+            'estudiante_id': estudiante_id
+        }])[0]
+    
+    def crear_alertas(self, alertas):
+        """
+        Crea varias alertas en una sola transacción
+        
+        Inserta todas las filas con un executemany (insertmanyvalues en
+        PostgreSQL) y ajusta alertas_pendientes del establecimiento una sola
+        vez, en lugar de una actualización y un commit por alerta.
+        
+        Args:
+            alertas: lista de dicts con tipo_alerta, nivel_prioridad, mensaje,
+                     recomendacion y opcionalmente curso_id / estudiante_id
+        
+        Returns:
+            Lista con el id de cada alerta, en el mismo orden
+        """
+        if not alertas:
+            return []
+        
+        ahora = datetime.now()
+        filas = [{
+            'fecha_creacion': ahora,
+            'tipo_alerta': a['tipo_alerta'],
+            'nivel_prioridad': a['nivel_prioridad'],
+            'curso_id': a.get('curso_id'),
+            'estudiante_id': a.get('estudiante_id'),
+            'mensaje': a['mensaje'],
+            'recomendacion': a['recomendacion'],
+            'estado': 'pendiente'
+        } for a in alertas]
+        ids = self.session.execute(
+            insert(Alerta).returning(Alerta.id, sort_by_parameter_order=True), filas
+        ).scalars().all()
+        self.ajustar_resumen_establecimiento(self.session, alertas_pendientes=len(filas))
         self.session.commit()
-        return alerta.id
+        
+        for alerta_id, fila in zip(ids, filas):
+            bus_eventos.publicar('alerta', {
+                'alerta_id': alerta_id,
+                'tipo': fila['tipo_alerta'],
+                'nivel_severidad': fila['nivel_prioridad'],
+                'estudiante_id': fila['estudiante_id'],
+                'curso_id': fila['curso_id'],
+                'descripcion': fila['mensaje'],
+                'fecha_creacion': str(ahora),
+                'estado': fila['estado']
+            })
+        return list(ids)
     
     def obtener_alertas_pendientes(self):
         """Obtiene todas las alertas pendientes"""
@@ -570,7 +761,242 @@ class DatabaseManager:
         
         return pd.DataFrame(data)
     
+    # ------------------------------------------------------------------------
+    # RESÚMENES MATERIALIZADOS
+    # ------------------------------------------------------------------------
+    
+    def reconstruir_resumenes(self, conn=None):
+        """
+        Recalcula desde cero los resúmenes por curso y del establecimiento
+        
+        Args:
+            conn: Conexión o sesión abierta. Si es None, se usa una transacción propia.
+        """
+        if conn is None:
+            with self.engine.begin() as conn:
+                return self.reconstruir_resumenes(conn)
+        
+        ahora = datetime.now()
+        conn.execute(text("DELETE FROM resumen_cursos"))
+        conn.execute(text("""
+            INSERT INTO resumen_cursos (
+                curso_id, total_registros, semanas_registradas, fecha_inicio, fecha_ultima,
+                suma_clima, registros_clima, max_total_estudiantes, fecha_actualizacion
+            )
+            SELECT
+                curso_id, COUNT(*), COUNT(DISTINCT fecha_registro),
+                MIN(fecha_registro), MAX(fecha_registro),
+                COALESCE(SUM(clima_escolar_promedio), 0), COUNT(clima_escolar_promedio),
+                MAX(total_estudiantes), :ahora
+            FROM cursos_temporal
+            GROUP BY curso_id
+        """), {'ahora': ahora})
+        
+        conn.execute(text("DELETE FROM resumen_establecimiento"))
+        conn.execute(text("""
+            INSERT INTO resumen_establecimiento (
+                id, total_estudiantes, total_interacciones, alertas_pendientes,
+                semanas_registradas, suma_clima, registros_clima, fecha_actualizacion
+            )
+            SELECT
+                1,
+                (SELECT COUNT(*) FROM estudiantes),
+                (SELECT COUNT(*) FROM interacciones_sociales),
+                (SELECT COUNT(*) FROM alertas WHERE estado = 'pendiente'),
+                (SELECT COUNT(DISTINCT fecha_registro) FROM cursos_temporal),
+                (SELECT COALESCE(SUM(clima_escolar_promedio), 0) FROM cursos_temporal),
+                (SELECT COUNT(clima_escolar_promedio) FROM cursos_temporal),
+                :ahora
+        """), {'ahora': ahora})
+    
+    def recalcular_resumen_curso(self, conn, curso_id):
+        """Recalcula el resumen de un curso (y los agregados semanales globales) tras borrar registros"""
+        ahora = datetime.now()
+        conn.execute(text("DELETE FROM resumen_cursos WHERE curso_id = :curso_id"), {'curso_id': curso_id})
+        conn.execute(text("""
+            INSERT INTO resumen_cursos (
+                curso_id, total_registros, semanas_registradas, fecha_inicio, fecha_ultima,
+                suma_clima, registros_clima, max_total_estudiantes, fecha_actualizacion
+            )
+            SELECT
+                curso_id, COUNT(*), COUNT(DISTINCT fecha_registro),
+                MIN(fecha_registro), MAX(fecha_registro),
+                COALESCE(SUM(clima_escolar_promedio), 0), COUNT(clima_escolar_promedio),
+                MAX(total_estudiantes), :ahora
+            FROM cursos_temporal
+            WHERE curso_id = :curso_id
+            GROUP BY curso_id
+        """), {'curso_id': curso_id, 'ahora': ahora})
+        
+        conn.execute(text("""
+            UPDATE resumen_establecimiento SET
+                semanas_registradas = (SELECT COUNT(DISTINCT fecha_registro) FROM cursos_temporal),
+                suma_clima = (SELECT COALESCE(SUM(clima_escolar_promedio), 0) FROM cursos_temporal),
+                registros_clima = (SELECT COUNT(clima_escolar_promedio) FROM cursos_temporal),
+                fecha_actualizacion = :ahora
+            WHERE id = 1
+        """), {'ahora': ahora})
+    
+    def registrar_en_resumen_curso(self, conn, curso_id, fecha_registro, clima=None, total_estudiantes=None):
+        """
+        Actualiza incrementalmente los resúmenes tras insertar un registro en cursos_temporal
+        
+        Debe llamarse después del INSERT y dentro de la misma transacción.
+        """
+        ahora = datetime.now()
+        
+        # ¿Es la primera vez que aparece esta fecha? (el registro recién insertado ya cuenta)
+        semana_nueva_curso = conn.execute(text("""
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM cursos_temporal
+                WHERE curso_id = :curso_id AND fecha_registro = :fecha
+                LIMIT 2
+            ) t
+        """), {'curso_id': curso_id, 'fecha': fecha_registro}).scalar() == 1
+        semana_nueva_global = conn.execute(text("""
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM cursos_temporal WHERE fecha_registro = :fecha LIMIT 2
+            ) t
+        """), {'fecha': fecha_registro}).scalar() == 1
+        
+        params = {
+            'curso_id': curso_id,
+            'fecha': fecha_registro,
+            'semana_nueva': 1 if semana_nueva_curso else 0,
+            'clima': float(clima) if clima is not None else 0.0,
+            'con_clima': 1 if clima is not None else 0,
+            'total_estudiantes': total_estudiantes,
+            'ahora': ahora
+        }
+        
+        result = conn.execute(text("""
+            UPDATE resumen_cursos SET
+                total_registros = total_registros + 1,
+                semanas_registradas = semanas_registradas + :semana_nueva,
+                fecha_inicio = CASE WHEN fecha_inicio IS NULL OR :fecha < fecha_inicio THEN :fecha ELSE fecha_inicio END,
+                fecha_ultima = CASE WHEN fecha_ultima IS NULL OR :fecha > fecha_ultima THEN :fecha ELSE fecha_ultima END,
+                suma_clima = suma_clima + :clima,
+                registros_clima = registros_clima + :con_clima,
+                max_total_estudiantes = CASE
+                    WHEN max_total_estudiantes IS NULL OR :total_estudiantes > max_total_estudiantes
+                    THEN :total_estudiantes ELSE max_total_estudiantes END,
+                fecha_actualizacion = :ahora
+            WHERE curso_id = :curso_id
+        """), params)
+        
+        if result.rowcount == 0:
+            conn.execute(text("""
+                INSERT INTO resumen_cursos (
+                    curso_id, total_registros, semanas_registradas, fecha_inicio, fecha_ultima,
+                    suma_clima, registros_clima, max_total_estudiantes, fecha_actualizacion
+                ) VALUES (
+                    :curso_id, 1, :semana_nueva, :fecha, :fecha,
+                    :clima, :con_clima, :total_estudiantes, :ahora
+                )
+            """), params)
+        
+        conn.execute(text("""
+            UPDATE resumen_establecimiento SET
+                semanas_registradas = semanas_registradas + :semana_nueva_global,
+                suma_clima = suma_clima + :clima,
+                registros_clima = registros_clima + :con_clima,
+                fecha_actualizacion = :ahora
+            WHERE id = 1
+        """), {**params, 'semana_nueva_global': 1 if semana_nueva_global else 0})
+    
+    def ajustar_resumen_establecimiento(self, conn, **deltas):
+        """
+        Suma deltas a los contadores del establecimiento
+        
+        Ejemplo: ajustar_resumen_establecimiento(session, total_estudiantes=-1, alertas_pendientes=-2)
+        """
+        permitidos = {'total_estudiantes', 'total_interacciones', 'alertas_pendientes'}
+        deltas = {k: int(v) for k, v in deltas.items() if k in permitidos and v}
+        if not deltas:
+            return
+        
+        asignaciones = ', '.join(f"{col} = {col} + :{col}" for col in deltas)
+        conn.execute(text(f"""
+            UPDATE resumen_establecimiento
+            SET {asignaciones}, fecha_actualizacion = :ahora
+            WHERE id = 1
+        """), {**deltas, 'ahora': datetime.now()})
+    
+    def obtener_resumen_establecimiento(self, conn):
+        """Lee los contadores materializados del establecimiento como dict"""
+        row = conn.execute(text("""
+            SELECT total_estudiantes, total_interacciones, alertas_pendientes,
+                   semanas_registradas, suma_clima, registros_clima,
+                   (SELECT COUNT(*) FROM resumen_cursos) as total_cursos
+            FROM resumen_establecimiento
+            WHERE id = 1
+        """)).fetchone()
+        
+        if not row:
+            return {
+                'total_estudiantes': 0, 'total_interacciones': 0, 'alertas_pendientes': 0,
+                'semanas_registradas': 0, 'clima_promedio': 0.0, 'total_cursos': 0
+            }
+        
+        return {
+            'total_estudiantes': row[0] or 0,
+            'total_interacciones': row[1] or 0,
+            'alertas_pendientes': row[2] or 0,
+            'semanas_registradas': row[3] or 0,
+            'clima_promedio': (row[4] / row[5]) if row[5] else 0.0,
+            'total_cursos': row[6] or 0
+        }
+    
+    # ------------------------------------------------------------------------
+    # ESTADO DE LA APLICACIÓN (compartido entre workers)
+    # ------------------------------------------------------------------------
+    
+    def obtener_estado_aplicacion(self, conn=None):
+        """Estado de la carga de datos más los contadores del resumen materializado"""
+        if conn is None:
+            with self.engine.connect() as conn:
+                return self.obtener_estado_aplicacion(conn)
+        
+        row = conn.execute(text("""
+            SELECT archivo_cargado, nombre_archivo, fecha_carga, analisis_completados
+            FROM estado_aplicacion
+            WHERE id = 1
+        """)).fetchone()
+        resumen = self.obtener_resumen_establecimiento(conn)
+        
+        fecha_carga = row[2] if row else None
+        if isinstance(fecha_carga, str):
+            fecha_carga = datetime.fromisoformat(fecha_carga)
+        
+        return {
+            'archivo_cargado': bool(row[0]) if row else False,
+            'nombre_archivo': (row[1] if row else None) or 'Datos de Ejemplo Precargados',
+            'fecha_carga': fecha_carga.strftime('%Y-%m-%d %H:%M:%S') if fecha_carga else None,
+            'total_estudiantes': resumen['total_estudiantes'],
+            'total_cursos': resumen['total_cursos'],
+            'total_interacciones': resumen['total_interacciones'],
+            'analisis_completados': json.loads(row[3]) if row and row[3] else []
+        }
+    
+    def actualizar_estado_aplicacion(self, conn=None, **valores):
+        """
+        Actualiza el estado compartido (archivo_cargado, nombre_archivo, fecha_carga,
+        analisis_completados)
+        """
+        if conn is None:
+            with self.engine.begin() as conn:
+                return self.actualizar_estado_aplicacion(conn, **valores)
+        
+        if 'analisis_completados' in valores:
+            valores['analisis_completados'] = json.dumps(valores['analisis_completados'], ensure_ascii=False)
+        valores['fecha_actualizacion'] = datetime.now()
+        
+        tabla = EstadoAplicacion.__table__
+        actualizadas = conn.execute(tabla.update().where(tabla.c.id == 1).values(**valores)).rowcount
+        if not actualizadas:
+            conn.execute(tabla.insert().values(id=1, **valores))
+    
     def close(self):
         """Cierra la sesión de base de datos"""
-        self.session.close()
+        self.session.remove()
 
@@ -0,0 +1,438 @@
+"""
+Módulo de Detección Temprana para CONVIVIR v4.0
+Detector en línea de deterioro sobre los indicadores semanales de cursos_temporal
+(clima, empatía, resolución de conflictos, incidentes), complementario a los
+pronósticos LSTM: no entrena modelos y cada semana nueva cuesta O(indicadores)
+
+Por curso e indicador se mantiene:
+- una línea base (media y varianza móviles exponenciales) que se congela
+  mientras hay una alerta activa, para no absorber el deterioro que se reporta
+- la desviación estandarizada de cada semana, orientada hacia el deterioro
+  (baja de clima/empatía, alza de incidentes)
+- un EWMA y un CUSUM unilateral de esas desviaciones: el EWMA detecta cambios
+  bruscos; el CUSUM, deterioros pequeños pero sostenidos
+
+El estado vive en la tabla estado_detector_temprano. registrar_semana lo
+actualiza al ingresar cada semana y crea una alerta solo cuando un indicador
+entra en alerta (mientras siga en alerta no se repite). reconstruir recorre el
+historial de todos los cursos a la vez: un paso por semana con operaciones de
+NumPy sobre la matriz (cursos, indicadores).
+
+Uso:
+    python detector_temprano.py reconstruir
+    python detector_temprano.py estado
+"""
+
+import argparse
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text, bindparam
+
+from acceso_caracteristicas import INDICADORES_SEMANALES, matriz_series_cursos
+
+
+# Indicadores vigilados: columnas que se suman, sentido del deterioro (-1 = bajar)
+# y desviación estándar mínima (evita z enormes en series casi constantes)
+INDICADORES_DETECTOR = {
+    'clima_escolar': {
+        'columnas': ('clima_escolar',), 'sentido': -1.0, 'sigma_minima': 0.15, 'nombre': 'clima escolar',
+        'recomendacion': 'Revisar con el profesor jefe los cambios recientes en el curso y aplicar una actividad de clima de aula.'
+    },
+    'empatia': {
+        'columnas': ('empatia',), 'sentido': -1.0, 'sigma_minima': 0.15, 'nombre': 'empatía',
+        'recomendacion': 'Reforzar actividades de aprendizaje socioemocional centradas en la empatía.'
+    },
+    'resolucion_conflictos': {
+        'columnas': ('resolucion_conflictos',), 'sentido': -1.0, 'sigma_minima': 0.15,
+        'nombre': 'resolución de conflictos',
+        'recomendacion': 'Activar mediación escolar y trabajar estrategias de resolución pacífica de conflictos.'
+    },
+    'incidentes': {
+        'columnas': ('incidentes_bullying', 'incidentes_violencia', 'incidentes_discriminacion'),
+        'sentido': 1.0, 'sigma_minima': 0.5, 'nombre': 'incidentes de convivencia',
+        'recomendacion': 'Aplicar el protocolo de convivencia escolar y entrevistar a los estudiantes involucrados.'
+    },
+}
+INDICADORES = tuple(INDICADORES_DETECTOR)
+
+# Indicadores en escala 1-10; una fila con todos en 0 es el registro inicial de
+# un curso recién creado (api_agregar_curso) y no cuenta como semana
+INDICADORES_ESCALA = ('clima_escolar', 'empatia', 'resolucion_conflictos')
+
+LAMBDA_BASE = 0.1      # Memoria de la línea base (~10 semanas)
+LAMBDA_EWMA = 0.3      # Memoria del EWMA de desviaciones
+ANCHO_EWMA = 3.0       # Límite del EWMA en desviaciones estándar de su distribución
+K_CUSUM = 0.5          # Holgura del CUSUM (desviaciones estándar por semana)
+H_CUSUM = 5.0          # Límite del CUSUM
+SEMANAS_CALENTAMIENTO = 6  # Semanas para fijar la línea base antes de alertar
+
+LIMITE_EWMA = ANCHO_EWMA * np.sqrt(LAMBDA_EWMA / (2.0 - LAMBDA_EWMA))
+
+CAMPOS_ESTADO = ('semanas', 'media', 'varianza', 'ewma', 'cusum', 'ultimo_valor', 'alerta_activa')
+
+TIPO_ALERTA = 'temprana'
+
+
+def estado_vacio(forma):
+    """Estado inicial de un arreglo de (curso, indicador)"""
+    return {
+        'semanas': np.zeros(forma, dtype=np.int64),
+        'media': np.zeros(forma),
+        'varianza': np.zeros(forma),
+        'ewma': np.zeros(forma),
+        'cusum': np.zeros(forma),
+        'ultimo_valor': np.full(forma, np.nan),
+        'alerta_activa': np.zeros(forma, dtype=bool),
+    }
+
+
+def valores_indicadores(matriz, indicadores_matriz):
+    """
+    Convierte filas con las columnas de INDICADORES_SEMANALES en filas con
+    INDICADORES (las de incidentes se suman). NaN donde no hay dato
+    """
+    columna = {nombre: j for j, nombre in enumerate(indicadores_matriz)}
+    matriz = np.asarray(matriz, dtype=np.float64)
+    salida = np.empty((matriz.shape[0], len(INDICADORES)))
+    for j, indicador in enumerate(INDICADORES):
+        partes = matriz[:, [columna[c] for c in INDICADORES_DETECTOR[indicador]['columnas']]]
+        suma = np.nansum(partes, axis=1)
+        salida[:, j] = np.where(np.isnan(partes).all(axis=1), np.nan, suma)
+
+    escala = [INDICADORES.index(i) for i in INDICADORES_ESCALA]
+    sin_datos = np.nan_to_num(salida[:, escala], nan=0.0).max(axis=1) <= 0
+    salida[sin_datos] = np.nan
+    return salida
+
+
+def paso(estado, x):
+    """
+    Incorpora una semana a todos los (curso, indicador) a la vez
+
+    Args:
+        estado: dict de arreglos con CAMPOS_ESTADO (se modifica y se retorna)
+        x: valores de la semana, misma forma que los arreglos del estado (NaN = sin dato)
+
+    Returns:
+        (estado, senal_ewma, senal_cusum, alertas_nuevas) con arreglos booleanos
+    """
+    sentido = np.array([INDICADORES_DETECTOR[i]['sentido'] for i in INDICADORES])
+    sigma_minima = np.array([INDICADORES_DETECTOR[i]['sigma_minima'] for i in INDICADORES])
+
+    valido = ~np.isnan(x)
+    listo = valido & (estado['semanas'] >= SEMANAS_CALENTAMIENTO)
+    sigma = np.sqrt(np.maximum(estado['varianza'], sigma_minima ** 2))
+    with np.errstate(invalid='ignore'):
+        z = np.where(listo, (x - estado['media']) / sigma * sentido, 0.0)
+
+    ewma = np.where(listo, (1.0 - LAMBDA_EWMA) * estado['ewma'] + LAMBDA_EWMA * z, estado['ewma'])
+    cusum = np.where(listo, np.maximum(0.0, estado['cusum'] + z - K_CUSUM), estado['cusum'])
+    senal_ewma = listo & (ewma >= LIMITE_EWMA)
+    senal_cusum = listo & (cusum >= H_CUSUM)
+    senal = senal_ewma | senal_cusum
+
+    alertas_nuevas = senal & ~estado['alerta_activa']
+    activa = np.where(listo, senal, estado['alerta_activa'])
+
+    # La línea base solo aprende de semanas sin señal; al inicio, 1/(n+1) da la
+    # media y la varianza exactas de las semanas observadas
+    aprende = valido & ~senal
+    lam = np.maximum(LAMBDA_BASE, 1.0 / (estado['semanas'] + 1.0))
+    with np.errstate(invalid='ignore'):
+        delta = np.where(aprende, x - estado['media'], 0.0)
+    media = estado['media'] + np.where(aprende, lam * delta, 0.0)
+    varianza = np.where(aprende, (1.0 - lam) * (estado['varianza'] + lam * delta ** 2), estado['varianza'])
+
+    estado.update(
+        semanas=estado['semanas'] + valido,
+        media=media,
+        varianza=varianza,
+        ewma=ewma,
+        cusum=cusum,
+        ultimo_valor=np.where(valido, x, estado['ultimo_valor']),
+        alerta_activa=activa,
+    )
+    return estado, senal_ewma, senal_cusum, alertas_nuevas
+
+
+class DetectorTemprano:
+    """
+    Detector EWMA/CUSUM persistente de todos los cursos
+
+    Uso:
+        detector = DetectorTemprano(db)
+        detector.registrar_semana('1°A', '2025-05-12', valores)   # tras el INSERT
+        detector.sincronizar()                                    # cursos importados o modificados
+    """
+
+    def __init__(self, db_manager, crear_alertas=True):
+        self.db = db_manager
+        self.engine = db_manager.engine
+        self.crear_alertas = crear_alertas
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Estado persistido
+    # ------------------------------------------------------------------
+
+    def _leer_estado(self, conn, curso_ids=None):
+        """dict {curso_id: (registros, fecha_ultima, estado con arreglos de forma (indicadores,))}"""
+        consulta = f"""
+            SELECT curso_id, indicador, registros, fecha_ultima, {', '.join(CAMPOS_ESTADO)}
+            FROM estado_detector_temprano
+        """
+        parametros = {}
+        if curso_ids is not None:
+            consulta = text(consulta + " WHERE curso_id IN :cursos").bindparams(bindparam('cursos', expanding=True))
+            parametros['cursos'] = list(curso_ids)
+        else:
+            consulta = text(consulta)
+
+        estados = {}
+        for fila in conn.execute(consulta, parametros):
+            curso_id, indicador = fila[0], fila[1]
+            if indicador not in INDICADORES:
+                continue
+            if curso_id not in estados:
+                estados[curso_id] = [fila[2] or 0, fila[3], estado_vacio(len(INDICADORES))]
+            j = INDICADORES.index(indicador)
+            for campo, valor in zip(CAMPOS_ESTADO, fila[4:]):
+                estados[curso_id][2][campo][j] = np.nan if valor is None else valor
+        # Un curso con indicadores faltantes (indicador agregado después) se reconstruye
+        completos = conn.execute(text("""
+            SELECT curso_id FROM estado_detector_temprano GROUP BY curso_id HAVING COUNT(*) = :n
+        """), {'n': len(INDICADORES)}).scalars().all()
+        return {c: tuple(v) for c, v in estados.items() if c in set(completos)}
+
+    def _guardar_estado(self, conn, curso_ids, registros, fechas_ultimas, estado):
+        """Escribe el estado de varios cursos (arreglos de forma (cursos, indicadores))"""
+        ahora = datetime.now()
+        filas = []
+        for c, curso_id in enumerate(curso_ids):
+            for j, indicador in enumerate(INDICADORES):
+                fila = {
+                    'curso_id': curso_id, 'indicador': indicador,
+                    'registros': int(registros[c]),
+                    'fecha_ultima': fechas_ultimas[c],
+                    'fecha_actualizacion': ahora
+                }
+                for campo in CAMPOS_ESTADO:
+                    valor = estado[campo][c, j]
+                    if campo == 'alerta_activa':
+                        fila[campo] = bool(valor)
+                    elif campo == 'semanas':
+                        fila[campo] = int(valor)
+                    else:
+                        fila[campo] = None if np.isnan(valor) else float(valor)
+                filas.append(fila)
+        if not filas:
+            return
+        columnas = list(filas[0])
+        asignaciones = ', '.join(f'{c} = excluded.{c}' for c in columnas if c not in ('curso_id', 'indicador'))
+        conn.execute(text(f"""
+            INSERT INTO estado_detector_temprano ({', '.join(columnas)})
+            VALUES ({', '.join(':' + c for c in columnas)})
+            ON CONFLICT (curso_id, indicador) DO UPDATE SET {asignaciones}
+        """), filas)
+
+    def eliminar_curso(self, conn, curso_id):
+        """Borra el estado de un curso (al eliminarlo)"""
+        conn.execute(text("DELETE FROM estado_detector_temprano WHERE curso_id = :curso_id"),
+                     {'curso_id': curso_id})
+
+    # ------------------------------------------------------------------
+    # Actualización
+    # ------------------------------------------------------------------
+
+    def registrar_semana(self, curso_id, fecha, valores):
+        """
+        Incorpora la semana recién confirmada de un curso en O(indicadores)
+
+        Si el estado no corresponde al historial (semana atrasada, filas
+        agregadas o borradas por otra vía) reconstruye el curso desde cursos_temporal.
+
+        Args:
+            valores: dict {indicador: valor} con claves de INDICADORES_SEMANALES
+
+        Returns:
+            Lista de alertas creadas (dicts)
+        """
+        fecha = pd.Timestamp(fecha).to_pydatetime()
+        with self._lock, self.engine.begin() as conn:
+            previo = self._leer_estado(conn, [curso_id]).get(curso_id)
+            registros_tabla = conn.execute(
+                text("SELECT COUNT(*) FROM cursos_temporal WHERE curso_id = :curso_id"), {'curso_id': curso_id}
+            ).scalar()
+
+            if (previo is None or previo[0] + 1 != registros_tabla
+                    or (previo[1] is not None and fecha <= pd.Timestamp(previo[1]).to_pydatetime())):
+                nuevas = self._reconstruir(conn, [curso_id])
+            else:
+                registros, _, estado = previo
+                fila = np.array([[valores.get(i, np.nan) for i in INDICADORES_SEMANALES]], dtype=np.float64)
+                x = valores_indicadores(fila, list(INDICADORES_SEMANALES))[0]
+                estado, senal_ewma, senal_cusum, alertas = paso(estado, x)
+                self._guardar_estado(
+                    conn, [curso_id], [registros + 1], [fecha],
+                    {campo: arreglo[None, :] for campo, arreglo in estado.items()}
+                )
+                nuevas = [
+                    self._describir(curso_id, j, estado, senal_ewma[j], senal_cusum[j])
+                    for j in np.flatnonzero(alertas)
+                ]
+        return self._crear_alertas(nuevas)
+
+    def reconstruir(self, curso_ids=None):
+        """
+        Recalcula el estado desde el historial completo (todos los cursos por defecto)
+
+        Returns:
+            Lista de alertas creadas: indicadores en alerta en la última semana
+            que no lo estaban en el estado guardado
+        """
+        with self._lock, self.engine.begin() as conn:
+            nuevas = self._reconstruir(conn, curso_ids)
+        return self._crear_alertas(nuevas)
+
+    def sincronizar(self):
+        """
+        Reconstruye solo los cursos cuyo número de filas en cursos_temporal no
+        coincide con el estado (importaciones, cursos nuevos o eliminados)
+
+        Returns:
+            Lista de alertas creadas
+        """
+        with self._lock, self.engine.begin() as conn:
+            conteos = dict(conn.execute(text(
+                "SELECT curso_id, COUNT(*) FROM cursos_temporal GROUP BY curso_id"
+            )).fetchall())
+            estados = self._leer_estado(conn)
+            desfasados = [c for c, n in conteos.items() if c not in estados or estados[c][0] != n]
+            for curso_id in set(estados) - set(conteos):
+                self.eliminar_curso(conn, curso_id)
+            nuevas = self._reconstruir(conn, desfasados) if desfasados else []
+        return self._crear_alertas(nuevas)
+
+    def _reconstruir(self, conn, curso_ids=None):
+        """Historial de los cursos en una matriz (cursos, semanas, indicadores) y un paso por semana"""
+        datos = matriz_series_cursos(self.engine, curso_ids, dtype=np.float64)
+        cursos, offsets = list(datos['cursos']), datos['offsets']
+        if not cursos:
+            return []
+        previos = self._leer_estado(conn, cursos)
+
+        valores = valores_indicadores(datos['matriz'], datos['indicadores'])
+        largos = np.diff(offsets)
+        fila_curso = np.repeat(np.arange(len(cursos)), largos)
+        posicion = np.arange(len(valores)) - offsets[fila_curso]
+        serie = np.full((len(cursos), int(largos.max()), len(INDICADORES)), np.nan)
+        serie[fila_curso, posicion] = valores
+
+        estado = estado_vacio((len(cursos), len(INDICADORES)))
+        senal_ewma = senal_cusum = np.zeros((len(cursos), len(INDICADORES)), dtype=bool)
+        for semana in range(serie.shape[1]):
+            estado, ewma_semana, cusum_semana, _ = paso(estado, serie[:, semana])
+            # Señales de la última semana con dato de cada curso
+            hay_dato = ~np.isnan(serie[:, semana])
+            senal_ewma = np.where(hay_dato, ewma_semana, senal_ewma)
+            senal_cusum = np.where(hay_dato, cusum_semana, senal_cusum)
+
+        fechas_ultimas = [pd.Timestamp(f).to_pydatetime() for f in datos['fechas'][offsets[1:] - 1]]
+        self._guardar_estado(conn, cursos, largos, fechas_ultimas, estado)
+
+        # Alertas deduplicadas contra el estado anterior de cada curso
+        nuevas = []
+        for c, curso_id in enumerate(cursos):
+            activas_antes = previos[curso_id][2]['alerta_activa'] if curso_id in previos else \
+                np.zeros(len(INDICADORES), dtype=bool)
+            estado_curso = {campo: arreglo[c] for campo, arreglo in estado.items()}
+            for j in np.flatnonzero(estado['alerta_activa'][c] & ~activas_antes):
+                nuevas.append(self._describir(curso_id, j, estado_curso, senal_ewma[c, j], senal_cusum[c, j]))
+        return nuevas
+
+    # ------------------------------------------------------------------
+    # Alertas
+    # ------------------------------------------------------------------
+
+    def _describir(self, curso_id, j, estado, senal_ewma, senal_cusum):
+        indicador = INDICADORES[j]
+        config = INDICADORES_DETECTOR[indicador]
+        detectores = [nombre for nombre, activo in (('cambio brusco', senal_ewma), ('deterioro sostenido', senal_cusum)) if activo]
+        return {
+            'curso_id': curso_id,
+            'indicador': indicador,
+            'nivel_prioridad': 'alta' if senal_ewma and senal_cusum else 'media',
+            'mensaje': (
+                f"Alerta temprana en {curso_id}: {' y '.join(detectores)} de {config['nombre']} "
+                f"(última semana {estado['ultimo_valor'][j]:.2f}, línea base {estado['media'][j]:.2f})"
+            ),
+            'recomendacion': config['recomendacion']
+        }
+
+    def _crear_alertas(self, nuevas):
+        if not self.crear_alertas:
+            return nuevas
+        ids = self.db.crear_alertas([
+            {'tipo_alerta': TIPO_ALERTA, 'nivel_prioridad': alerta['nivel_prioridad'],
+             'mensaje': alerta['mensaje'], 'recomendacion': alerta['recomendacion'],
+             'curso_id': alerta['curso_id']}
+            for alerta in nuevas
+        ])
+        for alerta, alerta_id in zip(nuevas, ids):
+            alerta['alerta_id'] = alerta_id
+        return nuevas
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def estado(self, curso_id=None):
+        """Estado por curso e indicador, con los límites de cada detector"""
+        with self.engine.connect() as conn:
+            estados = self._leer_estado(conn, [curso_id] if curso_id else None)
+        resultado = {}
+        for curso, (registros, fecha_ultima, estado) in sorted(estados.items()):
+            resultado[curso] = {
+                'registros': registros,
+                'fecha_ultima': str(fecha_ultima) if fecha_ultima is not None else None,
+                'indicadores': {
+                    indicador: {
+                        'semanas': int(estado['semanas'][j]),
+                        'linea_base': round(float(estado['media'][j]), 3),
+                        'desviacion': round(float(np.sqrt(estado['varianza'][j])), 3),
+                        'ultimo_valor': None if np.isnan(estado['ultimo_valor'][j]) else float(estado['ultimo_valor'][j]),
+                        'ewma': round(float(estado['ewma'][j]), 3),
+                        'cusum': round(float(estado['cusum'][j]), 3),
+                        'alerta_activa': bool(estado['alerta_activa'][j])
+                    }
+                    for j, indicador in enumerate(INDICADORES)
+                }
+            }
+        return {'limite_ewma': round(float(LIMITE_EWMA), 3), 'limite_cusum': H_CUSUM, 'cursos': resultado}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Detector temprano EWMA/CUSUM de los cursos')
+    parser.add_argument('comando', choices=['reconstruir', 'sincronizar', 'estado'])
+    args = parser.parse_args()
+
+    from database import DatabaseManager
+    db = DatabaseManager('convivir_v4.db')
+    detector = DetectorTemprano(db)
+
+    if args.comando in ('reconstruir', 'sincronizar'):
+        alertas = detector.reconstruir() if args.comando == 'reconstruir' else detector.sincronizar()
+        print(f"✅ Estado reconstruido; {len(alertas)} alertas nuevas")
+        for alerta in alertas:
+            print(f"  ⚠️ {alerta['mensaje']}")
+    else:
+        for curso_id, datos in detector.estado()['cursos'].items():
+            activos = [i for i, d in datos['indicadores'].items() if d['alerta_activa']]
+            print(f"  {curso_id}: {datos['registros']} semanas, en alerta: {', '.join(activos) or 'ninguno'}")
+
+
+if __name__ == '__main__':
+    main()
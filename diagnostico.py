@@ -59,7 +59,26 @@ archivos_clave = [
     'modelo_lstm.py',
     'modelo_nlp.py',
     'modelo_gnn.py',
+    'sentimiento_onnx.py',
+    'motor_palabras_clave.py',
+    'modelo_temas.py',
+    'indice_embeddings.py',
+    'busqueda_texto.py',
+    'riesgo_estudiante.py',
+    'trayectorias_socioemocionales.py',
+    'detector_temprano.py',
+    'cache_respuestas.py',
+    'serializacion_respuestas.py',
+    'eventos.py',
+    'metricas.py',
+    'perfilador.py',
+    'inspector_consultas.py',
+    'importacion_excel.py',
+    'exportacion_columnar.py',
+    'acceso_caracteristicas.py',
+    'almacen_series.py',
     'start.py',
+    'gunicorn.conf.py',
     'requirements.txt',
     'templates/index.html',
     'templates/configurar_cursos.html',
@@ -0,0 +1,269 @@
+"""
+Módulo de Eventos en Tiempo Real para CONVIVIR v4.0
+Pub/sub que alimenta el stream Server-Sent Events (/api/eventos) con alertas
+nuevas y el progreso de los análisis de ML
+
+Los eventos se escriben en un anillo de ranuras dentro de un archivo mapeado en
+memoria (como las versiones de la caché de respuestas): lo publicado en un
+worker de gunicorn lo leen los clientes SSE conectados a cualquier otro worker
+del mismo host, incluido el progreso de un trabajo iniciado con ?trabajo=<id>
+"""
+
+import os
+import json
+import mmap
+import time
+import queue
+import uuid
+import struct
+import hashlib
+import tempfile
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+
+# Cada cuánto revisa un suscriptor si hay eventos nuevos en el anillo (segundos)
+INTERVALO_SONDEO = 0.25
+
+
+class AnilloEventos:
+    """
+    Últimos eventos publicados, en un mmap de RANURAS ranuras de tamaño fijo
+
+    La cabecera guarda el id del último evento; el evento n ocupa la ranura
+    n % RANURAS con su id, el largo y el JSON. Quien publica toma el bloqueo,
+    invalida la ranura, escribe el contenido y recién después su id y el de la
+    cabecera. Las lecturas no bloquean: leen el id de la ranura antes y después
+    del contenido y descartan la ranura si cambió (fue reemplazada por un
+    evento más nuevo).
+
+    Sin ruta (o sin fcntl) el mmap es anónimo y el anillo es local al proceso.
+    """
+
+    RANURAS = 512
+    TAMANO_RANURA = 4096
+    CABECERA = struct.Struct('<q')
+    CABECERA_RANURA = struct.Struct('<qI')
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._fd = None
+        tamano = self.CABECERA.size + self.RANURAS * self.TAMANO_RANURA
+        if ruta is None:
+            self._mmap = mmap.mmap(-1, tamano)
+            return
+        self._fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._bloqueo():
+            if os.fstat(self._fd).st_size < tamano:
+                os.ftruncate(self._fd, tamano)
+            self._mmap = mmap.mmap(self._fd, tamano)
+
+    @contextmanager
+    def _bloqueo(self):
+        # lockf es por proceso: excluye a los otros workers; el Lock, a los otros hilos
+        with self._lock:
+            if self._fd is None:
+                yield
+                return
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _posicion(self, evento_id):
+        return self.CABECERA.size + (evento_id % self.RANURAS) * self.TAMANO_RANURA
+
+    @property
+    def ultimo_id(self):
+        # Lectura alineada de 8 bytes: no requiere bloqueo
+        return self.CABECERA.unpack_from(self._mmap, 0)[0]
+
+    def agregar(self, tipo, datos):
+        """Escribe un evento en la siguiente ranura y retorna su id"""
+        limite = self.TAMANO_RANURA - self.CABECERA_RANURA.size
+        with self._bloqueo():
+            evento_id = self.ultimo_id + 1
+            contenido = json.dumps({'tipo': tipo, 'datos': datos}, ensure_ascii=False, default=str).encode('utf-8')
+            if len(contenido) > limite:
+                # Un evento que no cabe en la ranura se entrega sin datos
+                contenido = json.dumps({'tipo': tipo, 'datos': {'truncado': True}}).encode('utf-8')
+            posicion = self._posicion(evento_id)
+            self.CABECERA_RANURA.pack_into(self._mmap, posicion, -1, 0)
+            inicio = posicion + self.CABECERA_RANURA.size
+            self._mmap[inicio:inicio + len(contenido)] = contenido
+            self.CABECERA_RANURA.pack_into(self._mmap, posicion, evento_id, len(contenido))
+            self.CABECERA.pack_into(self._mmap, 0, evento_id)
+        return evento_id
+
+    def leer_desde(self, desde_id):
+        """Eventos con id mayor que desde_id que siguen en el anillo, en orden"""
+        ultimo = self.ultimo_id
+        primero = max(desde_id + 1, ultimo - self.RANURAS + 1, 1)
+
+        eventos = []
+        for evento_id in range(primero, ultimo + 1):
+            posicion = self._posicion(evento_id)
+            id_ranura, largo = self.CABECERA_RANURA.unpack_from(self._mmap, posicion)
+            inicio = posicion + self.CABECERA_RANURA.size
+            contenido = self._mmap[inicio:inicio + largo]
+            if id_ranura != evento_id or self.CABECERA_RANURA.unpack_from(self._mmap, posicion)[0] != evento_id:
+                continue
+            try:
+                evento = json.loads(contenido)
+            except ValueError:
+                continue
+            eventos.append({'id': evento_id, 'tipo': evento['tipo'], 'datos': evento['datos']})
+        return eventos
+
+
+class Suscripcion:
+    """
+    Lectura de un cliente SSE sobre el anillo, con la interfaz de una cola
+
+    get(timeout) entrega el siguiente evento o lanza queue.Empty. Un cliente que
+    se atrasa más que el tamaño del anillo pierde los eventos más antiguos en
+    lugar de frenar a quien publica.
+    """
+
+    def __init__(self, anillo, desde_id):
+        self.anillo = anillo
+        self.ultimo_id = desde_id
+        self._pendientes = deque()
+
+    def get(self, timeout=None):
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._pendientes:
+                return self._pendientes.popleft()
+            if self.anillo.ultimo_id < self.ultimo_id:
+                # El archivo se recreó y los ids volvieron a empezar
+                self.ultimo_id = 0
+            eventos = self.anillo.leer_desde(self.ultimo_id)
+            if eventos:
+                self.ultimo_id = eventos[-1]['id']
+                self._pendientes.extend(eventos)
+                continue
+            restante = None if limite is None else limite - time.monotonic()
+            if restante is not None and restante <= 0:
+                raise queue.Empty
+            time.sleep(INTERVALO_SONDEO if restante is None else min(INTERVALO_SONDEO, restante))
+
+
+class BusEventos:
+    """
+    Bus de publicación/suscripción sobre un AnilloEventos
+
+    Por defecto el anillo es local al proceso; compartir(ruta) lo mueve a un
+    archivo para que todos los workers publiquen y lean el mismo anillo.
+    """
+
+    def __init__(self, tamano_cola=100):
+        self._anillo = AnilloEventos()
+        self._suscriptores = set()
+        self._lock = threading.Lock()
+        self.tamano_cola = tamano_cola
+
+    def compartir(self, ruta):
+        """Usa el anillo del archivo indicado (compartido por los procesos del host)"""
+        if not FCNTL_AVAILABLE:
+            print("⚠️ fcntl no disponible. Eventos SSE locales a cada proceso.")
+            return
+        self._anillo = AnilloEventos(ruta)
+
+    def publicar(self, tipo, datos):
+        """
+        Publica un evento para todos los suscriptores
+
+        Args:
+            tipo: Nombre del evento SSE (ej. 'alerta', 'progreso')
+            datos: dict serializable a JSON
+
+        Returns:
+            id del evento publicado
+        """
+        return self._anillo.agregar(tipo, datos)
+
+    def suscribir(self, desde_id=None):
+        """
+        Registra un suscriptor y retorna su Suscripcion
+
+        Args:
+            desde_id: Último id recibido por el cliente (Last-Event-ID); los eventos
+                posteriores que sigan en el anillo (hasta tamano_cola) se reenvían primero
+        """
+        ultimo = self._anillo.ultimo_id
+        if desde_id is None or desde_id > ultimo:
+            desde_id = ultimo
+        suscripcion = Suscripcion(self._anillo, max(desde_id, ultimo - self.tamano_cola))
+        with self._lock:
+            self._suscriptores.add(suscripcion)
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        with self._lock:
+            self._suscriptores.discard(suscripcion)
+
+    @property
+    def total_suscriptores(self):
+        """Clientes conectados a este proceso"""
+        return len(self._suscriptores)
+
+
+def ruta_eventos_compartidos(identificador):
+    """Archivo del anillo de eventos para una base de datos (CONVIVIR_EVENTOS_ARCHIVO lo reemplaza)"""
+    ruta = os.environ.get('CONVIVIR_EVENTOS_ARCHIVO')
+    if ruta:
+        return ruta
+    sufijo = hashlib.sha1(str(identificador).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f'convivir_eventos_{sufijo}.bin')
+
+
+def formatear_sse(evento):
+    """Formatea un evento según el protocolo text/event-stream"""
+    datos = json.dumps(evento['datos'], ensure_ascii=False, default=str)
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+
+
+# Bus compartido por la aplicación y los módulos de análisis
+bus_eventos = BusEventos()
+
+
+def nuevo_trabajo_id():
+    """Genera un identificador para seguir el progreso de un análisis"""
+    return uuid.uuid4().hex[:12]
+
+
+def publicar_progreso(trabajo_id, tipo_trabajo, etapa, actual=None, total=None, **extra):
+    """
+    Publica el avance de un análisis de larga duración
+
+    Args:
+        trabajo_id: Identificador del trabajo (None desactiva la publicación)
+        tipo_trabajo: 'lstm', 'nlp' o 'red_social'
+        etapa: Nombre de la etapa actual (ej. 'entrenamiento', 'clasificacion')
+        actual, total: Avance dentro de la etapa (épocas, comentarios, etc.)
+    """
+    if trabajo_id is None:
+        return
+
+    datos = {
+        'trabajo_id': trabajo_id,
+        'tipo_trabajo': tipo_trabajo,
+        'etapa': etapa,
+        'actual': actual,
+        'total': total,
+        'porcentaje': round(actual / total * 100, 1) if actual is not None and total else None,
+        'fecha': datetime.now().isoformat()
+    }
+    datos.update(extra)
+    bus_eventos.publicar('progreso', datos)
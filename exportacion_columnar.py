@@ -0,0 +1,362 @@
+"""
+Módulo de Exportación e Importación Columnar para CONVIVIR v4.0
+Respaldo y restauración de las tablas de datos en Parquet o Arrow IPC:
+
+- La exportación recorre cada tabla con un cursor en streaming y escribe lotes
+  columnares (RecordBatch) con un esquema Arrow derivado de los modelos
+- Cada archivo lleva en los metadatos del esquema la tabla, la versión del
+  formato y los tipos SQL; el directorio incluye un manifiesto.json
+- La importación lee los archivos por lotes y los inserta con executemany de
+  SQLAlchemy Core, sin crear objetos ORM, dentro de una única transacción
+
+Uso:
+    python exportacion_columnar.py exportar respaldo/ --formato parquet
+    python exportacion_columnar.py importar respaldo/
+"""
+
+import os
+import json
+import time
+from datetime import datetime
+
+from sqlalchemy import select, delete, text, Integer, Float, Boolean, DateTime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.ipc as ipc
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    print("⚠️ pyarrow no disponible. Exportación Parquet/Arrow deshabilitada.")
+
+from database import Base
+
+
+VERSION_FORMATO = 1
+TAMANO_LOTE = 50000
+MANIFIESTO = 'manifiesto.json'
+
+# Tablas de datos en orden de dependencia (claves foráneas primero).
+# Los resúmenes materializados no se exportan: se reconstruyen al importar.
+TABLAS_COLUMNARES = (
+    'cohortes',
+    'cursos_anuales',
+    'establecimientos',
+    'docentes',
+    'estudiantes',
+    'cursos_temporal',
+    'evaluaciones_socioemocionales',
+    'comentarios',
+    'interacciones_sociales',
+    'intervenciones',
+    'predicciones',
+    'alertas',
+)
+
+EXTENSIONES = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+def _tipo_arrow(columna):
+    """Tipo Arrow equivalente al tipo SQLAlchemy de una columna"""
+    tipo = columna.type
+    if isinstance(tipo, Boolean):
+        return pa.bool_()
+    if isinstance(tipo, Integer):
+        return pa.int64()
+    if isinstance(tipo, Float):
+        return pa.float64()
+    if isinstance(tipo, DateTime):
+        return pa.timestamp('us')
+    return pa.string()
+
+
+def esquema_arrow(tabla):
+    """Esquema Arrow de una tabla, con los metadatos del formato CONVIVIR"""
+    campos = [pa.field(c.name, _tipo_arrow(c)) for c in tabla.columns]
+    metadatos = {
+        'convivir.tabla': tabla.name,
+        'convivir.version_formato': str(VERSION_FORMATO),
+        'convivir.fecha_exportacion': datetime.now().isoformat(timespec='seconds'),
+        'convivir.tipos_sql': json.dumps({c.name: str(c.type) for c in tabla.columns}, ensure_ascii=False),
+        'convivir.clave_primaria': ','.join(c.name for c in tabla.primary_key.columns)
+    }
+    return pa.schema(campos, metadata=metadatos)
+
+
+def _lote_arrow(filas, esquema):
+    """Transpone filas de un cursor a un RecordBatch con el esquema dado"""
+    columnas = list(zip(*filas)) if filas else [()] * len(esquema)
+    arreglos = []
+    for campo, valores in zip(esquema, columnas):
+        try:
+            arreglos.append(pa.array(valores, type=campo.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # SQLite admite tipos mixtos (ej. 15.0 en una columna INTEGER)
+            arreglos.append(pa.array(valores).cast(campo.type))
+    return pa.RecordBatch.from_arrays(arreglos, schema=esquema)
+
+
+def _tablas_seleccionadas(tablas):
+    if tablas is None:
+        return list(TABLAS_COLUMNARES)
+    desconocidas = [t for t in tablas if t not in TABLAS_COLUMNARES]
+    if desconocidas:
+        raise ValueError(f"Tablas no exportables: {', '.join(desconocidas)}")
+    return [t for t in TABLAS_COLUMNARES if t in tablas]
+
+
+def _archivo_tabla(directorio, tabla):
+    """Ruta del archivo de una tabla en el directorio (Parquet o Arrow), o None"""
+    for formato, extension in EXTENSIONES.items():
+        ruta = os.path.join(directorio, tabla + extension)
+        if os.path.isfile(ruta):
+            return ruta, formato
+    return None, None
+
+
+# ----------------------------------------------------------------------
+# Exportación
+# ----------------------------------------------------------------------
+
+def exportar_tabla(conn, tabla, ruta, formato='parquet', tamano_lote=TAMANO_LOTE):
+    """Escribe una tabla por lotes; retorna la cantidad de filas"""
+    esquema = esquema_arrow(tabla)
+    resultado = conn.execution_options(stream_results=True, yield_per=tamano_lote).execute(select(tabla))
+    filas_totales = 0
+
+    if formato == 'parquet':
+        escritor = pq.ParquetWriter(ruta, esquema, compression='zstd')
+    else:
+        escritor = ipc.new_file(ruta, esquema)
+
+    try:
+        for filas in resultado.partitions(tamano_lote):
+            escritor.write_batch(_lote_arrow(filas, esquema))
+            filas_totales += len(filas)
+        if filas_totales == 0:
+            # Un archivo sin lotes conserva igual el esquema
+            escritor.write_batch(_lote_arrow([], esquema))
+    finally:
+        escritor.close()
+    return filas_totales
+
+
+def exportar(db_manager, directorio, formato='parquet', tablas=None, tamano_lote=TAMANO_LOTE):
+    """
+    Exporta las tablas de datos a un directorio
+
+    Args:
+        db_manager: Instancia de DatabaseManager
+        directorio: Directorio de destino (se crea si no existe)
+        formato: 'parquet' (zstd) o 'arrow' (Arrow IPC, sin compresión)
+        tablas: Subconjunto de TABLAS_COLUMNARES (todas por defecto)
+
+    Returns:
+        dict con exito, mensaje y el detalle por tabla
+    """
+    if not PYARROW_AVAILABLE:
+        return {'exito': False, 'mensaje': 'pyarrow no está instalado'}
+    if formato not in EXTENSIONES:
+        return {'exito': False, 'mensaje': f"Formato no soportado: {formato}. Use 'parquet' o 'arrow'"}
+
+    try:
+        seleccion = _tablas_seleccionadas(tablas)
+    except ValueError as e:
+        return {'exito': False, 'mensaje': str(e)}
+
+    os.makedirs(directorio, exist_ok=True)
+    inicio = time.perf_counter()
+    detalle = {}
+
+    # Una sola instantánea de lectura: el respaldo es consistente entre tablas.
+    # En PostgreSQL se pide REPEATABLE READ; pysqlite no abre transacción para
+    # SELECT, por lo que en SQLite se emite BEGIN explícito
+    with db_manager.engine.connect() as conn:
+        if db_manager.is_postgres:
+            conn.execution_options(isolation_level='REPEATABLE READ')
+        else:
+            conn.exec_driver_sql('BEGIN')
+        for nombre in seleccion:
+            tabla = Base.metadata.tables[nombre]
+            archivo = nombre + EXTENSIONES[formato]
+            ruta = os.path.join(directorio, archivo)
+            filas = exportar_tabla(conn, tabla, ruta, formato, tamano_lote)
+            detalle[nombre] = {'archivo': archivo, 'filas': filas, 'bytes': os.path.getsize(ruta)}
+
+    manifiesto = {
+        'version_formato': VERSION_FORMATO,
+        'formato': formato,
+        'fecha_exportacion': datetime.now().isoformat(timespec='seconds'),
+        'motor': 'postgresql' if db_manager.is_postgres else 'sqlite',
+        'tablas': detalle
+    }
+    with open(os.path.join(directorio, MANIFIESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+
+    return {
+        'exito': True,
+        'mensaje': f'{len(detalle)} tablas exportadas en formato {formato}',
+        'directorio': directorio,
+        'tablas': detalle,
+        'duracion_s': round(time.perf_counter() - inicio, 3)
+    }
+
+
+# ----------------------------------------------------------------------
+# Importación
+# ----------------------------------------------------------------------
+
+def _abrir(ruta, formato):
+    """Retorna (esquema, iterador de RecordBatch)"""
+    if formato == 'parquet':
+        archivo = pq.ParquetFile(ruta)
+        return archivo.schema_arrow, archivo.iter_batches(batch_size=TAMANO_LOTE)
+    lector = ipc.open_file(ruta)
+    return lector.schema, (lector.get_batch(i) for i in range(lector.num_record_batches))
+
+
+def _validar_esquema(esquema, tabla):
+    """Verifica los metadatos y retorna las columnas del archivo que existen en la tabla"""
+    metadatos = {k.decode(): v.decode() for k, v in (esquema.metadata or {}).items()}
+    if metadatos.get('convivir.tabla') not in (None, tabla.name):
+        raise ValueError(f"El archivo de {tabla.name} contiene la tabla {metadatos['convivir.tabla']}")
+    version = int(metadatos.get('convivir.version_formato', VERSION_FORMATO))
+    if version > VERSION_FORMATO:
+        raise ValueError(f'{tabla.name}: versión de formato {version} no soportada (máximo {VERSION_FORMATO})')
+
+    columnas = [nombre for nombre in esquema.names if nombre in tabla.columns]
+    if not columnas:
+        raise ValueError(f'{tabla.name}: el archivo no tiene columnas de la tabla')
+    return columnas
+
+
+def _ajustar_secuencia(conn, tabla):
+    """En PostgreSQL, deja la secuencia de la clave primaria después del máximo importado"""
+    clave = list(tabla.primary_key.columns)
+    if len(clave) != 1 or not isinstance(clave[0].type, Integer):
+        return
+    columna = clave[0].name
+    conn.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{tabla.name}', '{columna}'), "
+        f"COALESCE((SELECT MAX({columna}) FROM {tabla.name}), 0) + 1, false)"
+    ))
+
+
+def importar(db_manager, directorio, reemplazar=True, tablas=None):
+    """
+    Importa un directorio exportado por exportar()
+
+    Args:
+        db_manager: Instancia de DatabaseManager
+        directorio: Directorio con archivos <tabla>.parquet o <tabla>.arrow
+        reemplazar: True vacía las tablas importadas y conserva los id del respaldo;
+                    False agrega las filas con id nuevos
+        tablas: Subconjunto de TABLAS_COLUMNARES (todas las presentes por defecto)
+
+    Returns:
+        dict con exito, mensaje y filas importadas por tabla
+    """
+    if not PYARROW_AVAILABLE:
+        return {'exito': False, 'mensaje': 'pyarrow no está instalado'}
+
+    try:
+        seleccion = _tablas_seleccionadas(tablas)
+    except ValueError as e:
+        return {'exito': False, 'mensaje': str(e)}
+
+    archivos = {}
+    for nombre in seleccion:
+        ruta, formato = _archivo_tabla(directorio, nombre)
+        if ruta is not None:
+            archivos[nombre] = (ruta, formato)
+    if not archivos:
+        return {'exito': False, 'mensaje': 'No se encontraron archivos .parquet ni .arrow de tablas conocidas'}
+
+    inicio = time.perf_counter()
+    detalle = {}
+    try:
+        with db_manager.engine.begin() as conn:
+            if reemplazar:
+                # Orden inverso de dependencias para no violar claves foráneas
+                for nombre in reversed(list(archivos)):
+                    conn.execute(delete(Base.metadata.tables[nombre]))
+
+            for nombre, (ruta, formato) in archivos.items():
+                tabla = Base.metadata.tables[nombre]
+                esquema, lotes = _abrir(ruta, formato)
+                columnas = _validar_esquema(esquema, tabla)
+                if not reemplazar:
+                    # Los id autogenerados se asignan de nuevo al agregar
+                    columnas = [c for c in columnas if not (tabla.c[c].primary_key and tabla.c[c].autoincrement)]
+
+                filas = 0
+                for lote in lotes:
+                    registros = lote.select(columnas).to_pylist()
+                    if registros:
+                        conn.execute(tabla.insert(), registros)
+                        filas += len(registros)
+
+                if reemplazar and db_manager.is_postgres:
+                    _ajustar_secuencia(conn, tabla)
+                detalle[nombre] = {'archivo': os.path.basename(ruta), 'filas': filas}
+
+            db_manager.reconstruir_resumenes(conn)
+
+    except Exception as e:
+        return {'exito': False, 'mensaje': f'Error al importar datos: {str(e)}'}
+
+    return {
+        'exito': True,
+        'mensaje': f'{len(detalle)} tablas importadas' + (' (reemplazando los datos existentes)' if reemplazar else ''),
+        'tablas': detalle,
+        'duracion_s': round(time.perf_counter() - inicio, 3)
+    }
+
+
+def leer_tabla(directorio, tabla, columnas=None):
+    """
+    Lee una tabla exportada directamente como DataFrame (sin pasar por la base)
+
+    Útil para alimentar los módulos de ML desde un respaldo:
+        df = leer_tabla('respaldo/', 'cursos_temporal', ['curso_id', 'fecha_registro', 'clima_escolar_promedio'])
+    """
+    ruta, formato = _archivo_tabla(directorio, tabla)
+    if ruta is None:
+        raise FileNotFoundError(f'No existe {tabla}.parquet ni {tabla}.arrow en {directorio}')
+    if formato == 'parquet':
+        return pq.read_table(ruta, columns=columnas).to_pandas()
+    tabla_arrow = ipc.open_file(ruta).read_all()
+    if columnas is not None:
+        tabla_arrow = tabla_arrow.select(columnas)
+    return tabla_arrow.to_pandas()
+
+
+def main():
+    import argparse
+    from database import DatabaseManager
+
+    parser = argparse.ArgumentParser(description='Exporta o importa las tablas de CONVIVIR en Parquet/Arrow')
+    parser.add_argument('accion', choices=['exportar', 'importar'])
+    parser.add_argument('directorio')
+    parser.add_argument('--formato', choices=list(EXTENSIONES), default='parquet')
+    parser.add_argument('--tablas', nargs='+', help='Subconjunto de tablas (todas por defecto)')
+    parser.add_argument('--agregar', action='store_true', help='Al importar, agregar en vez de reemplazar')
+    parser.add_argument('--db', default='convivir_v4.db', help='Base SQLite (se ignora si hay DATABASE_URL)')
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    if args.accion == 'exportar':
+        resultado = exportar(db, args.directorio, formato=args.formato, tablas=args.tablas)
+    else:
+        resultado = importar(db, args.directorio, reemplazar=not args.agregar, tablas=args.tablas)
+
+    print(('✅ ' if resultado['exito'] else '❌ ') + resultado['mensaje'])
+    for nombre, info in resultado.get('tablas', {}).items():
+        print(f"   {nombre}: {info['filas']} filas")
+    if 'duracion_s' in resultado:
+        print(f"   Duración: {resultado['duracion_s']} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Configuración de gunicorn para CONVIVIR v4.0
+Varios workers gthread con la aplicación precargada en el proceso maestro:
+
+- preload_app importa app.py (TensorFlow, scikit-learn, plotly) una sola vez y,
+  antes de crear los workers, carga los datos de ejemplo y los pesos de BETO;
+  los workers comparten esa memoria copy-on-write
+- DatabaseManager descarta el pool heredado en cada worker (os.register_at_fork)
+- La caché de respuestas comparte sus versiones entre workers (archivo mapeado)
+- Los eventos SSE y el progreso de los trabajos pasan por un anillo mapeado en
+  memoria que leen todos los workers
+- Cada worker escribe sus métricas en su propio archivo mapeado y /metrics suma
+  los de todos
+
+Variables de entorno:
+    PORT                 Puerto (5000)
+    WEB_CONCURRENCY      Workers (núcleos disponibles, máximo 4)
+    CONVIVIR_HILOS       Hilos por worker (4)
+    CONVIVIR_PRECARGA    '0' desactiva preload_app (cada worker carga sus modelos)
+
+Uso:
+    gunicorn start:app -c gunicorn.conf.py
+"""
+
+import os
+import multiprocessing
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 4)))
+threads = int(os.environ.get('CONVIVIR_HILOS', 4))
+worker_class = 'gthread'
+timeout = 300
+preload_app = os.environ.get('CONVIVIR_PRECARGA', '1') != '0'
+
+
+def when_ready(server):
+    """En el maestro, antes de crear los workers"""
+    if not server.cfg.preload_app:
+        return
+
+    import app as aplicacion
+
+    aplicacion.inicializar_datos()
+    aplicacion.cache.reiniciar_etags()
+    if aplicacion.precargar_modelos():
+        server.log.info('Modelo transformer precargado en el proceso maestro')
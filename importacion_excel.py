@@ -0,0 +1,439 @@
+"""
+Módulo de Importación Excel por Bloques para CONVIVIR v4.0
+Importa el formato Excel mejorado recorriendo las filas con openpyxl en modo
+read_only, de modo que la memoria no crece con el tamaño del libro:
+
+- Cada hoja se convierte en diccionarios de inserción por bloques de tamaño fijo
+- Cada bloque se inserta (executemany) y confirma en su propia transacción,
+  junto con el punto de control en importaciones_excel
+- Si la importación se interrumpe, volver a importar el mismo archivo la
+  reanuda desde el último bloque confirmado
+- El avance se publica como eventos 'progreso' (tipo_trabajo 'importacion')
+
+Uso:
+    python importacion_excel.py datos.xlsx --bloque 2000
+"""
+
+import hashlib
+from datetime import datetime, date
+
+import pandas as pd
+from openpyxl import load_workbook
+from sqlalchemy import select, update, bindparam
+
+from database import (
+    Establecimiento, CursoTemporal, Estudiante, EvaluacionSocioemocional,
+    Comentario, Interaccion, Intervencion, Docente, ImportacionExcel
+)
+from eventos import publicar_progreso
+from metricas import medir_etapa
+
+
+ESTABLECIMIENTO_POR_DEFECTO = 'EST_001'
+
+
+# ----------------------------------------------------------------------
+# Conversión de celdas
+# ----------------------------------------------------------------------
+
+def _fecha(valor):
+    if valor is None or valor == '':
+        return None
+    if isinstance(valor, datetime):
+        return valor
+    if isinstance(valor, date):
+        return datetime(valor.year, valor.month, valor.day)
+    return pd.to_datetime(valor).to_pydatetime()
+
+
+def _booleano(valor, defecto=False):
+    if valor is None or valor == '':
+        return defecto
+    if isinstance(valor, str):
+        return valor.strip().lower() in ('si', 'sí', 'true', 'verdadero', '1', 'x')
+    return bool(valor)
+
+
+def _valor(fila, columna, defecto=None):
+    valor = fila.get(columna)
+    return defecto if valor is None else valor
+
+
+# ----------------------------------------------------------------------
+# Conversión de filas por hoja (mismas columnas que cargar_desde_excel)
+# ----------------------------------------------------------------------
+
+def _fila_establecimiento(fila, ctx):
+    return {
+        'establecimiento_id': fila['establecimiento_id'],
+        'nombre': fila['nombre_establecimiento'],
+        'region': fila['region'],
+        'comuna': fila['comuna'],
+        'tipo': fila['tipo_establecimiento'],
+        'total_estudiantes': fila['total_estudiantes_establecimiento'],
+        'total_docentes': fila['total_docentes']
+    }
+
+
+def _fila_curso_temporal(fila, ctx):
+    return {
+        'establecimiento_id': ctx['establecimiento_id'],
+        'fecha_registro': _fecha(fila['fecha_registro']),
+        'periodo': fila['periodo'],
+        'curso_id': fila['curso_id'],
+        'total_estudiantes': fila['total_estudiantes'],
+        'clima_escolar_promedio': fila['clima_escolar_promedio'],
+        'apoyo_docentes_promedio': fila['apoyo_docentes_promedio'],
+        'participacion_estudiantes_promedio': fila['participacion_estudiantes_promedio'],
+        'nivel_empatia_promedio': fila['nivel_empatia_promedio'],
+        'nivel_autoestima_promedio': fila['nivel_autoestima_promedio'],
+        'nivel_resolucion_conflictos_promedio': fila['nivel_resolucion_conflictos_promedio'],
+        'incidentes_bullying': fila['incidentes_bullying'],
+        'incidentes_violencia_fisica': fila['incidentes_violencia_fisica'],
+        'incidentes_discriminacion': fila['incidentes_discriminacion'],
+        'reportes_anonimos': fila['reportes_anonimos'],
+        'asistencia_promedio_porcentaje': fila.get('asistencia_promedio_porcentaje'),
+        'promedio_notas': fila.get('promedio_notas')
+    }
+
+
+def _fila_estudiante(fila, ctx):
+    return {
+        'establecimiento_id': ctx['establecimiento_id'],
+        'estudiante_id': fila['estudiante_id'],
+        'curso_id': fila['curso_id'],
+        'genero': fila.get('genero'),
+        'edad': fila.get('edad'),
+        'tiene_nee': _booleano(fila.get('tiene_nee')),
+        'prioritario': _booleano(fila.get('prioritario')),
+        'fecha_ingreso': _fecha(fila.get('fecha_ingreso_establecimiento')),
+        'nivel_socioeconomico': fila.get('nivel_socioeconomico')
+    }
+
+
+def _fila_evaluacion(fila, ctx):
+    return {
+        'estudiante_id': fila['estudiante_id'],
+        'fecha_evaluacion': _fecha(fila['fecha_evaluacion']),
+        'periodo': fila['periodo'],
+        'empatia_score': fila['empatia_score'],
+        'autoestima_score': fila['autoestima_score'],
+        'resolucion_conflictos_score': fila['resolucion_conflictos_score'],
+        'ansiedad_score': fila.get('ansiedad_score'),
+        'bienestar_general_score': fila.get('bienestar_general_score'),
+        'instrumento_evaluacion': _valor(fila, 'instrumento_evaluacion', 'No especificado')
+    }
+
+
+def _fila_comentario(fila, ctx):
+    return {
+        'estudiante_id': fila['estudiante_id'],
+        'fecha_comentario': _fecha(fila['fecha_comentario']),
+        'periodo': fila['periodo'],
+        'tipo_comentario': _valor(fila, 'tipo_comentario', 'No especificado'),
+        'comentario_texto': fila['comentario_texto'],
+        'tema_principal': fila.get('tema_principal'),
+        'tono_percibido': fila.get('tono_percibido')
+    }
+
+
+def _fila_interaccion(fila, ctx):
+    return {
+        'fecha_interaccion': _fecha(fila['fecha_interaccion']),
+        'estudiante_origen_id': fila['estudiante_origen_id'],
+        'estudiante_destino_id': fila['estudiante_destino_id'],
+        'tipo_interaccion': fila['tipo_interaccion'],
+        'intensidad': fila['intensidad'],
+        'contexto': fila.get('contexto'),
+        'reportado_por': fila.get('reportado_por')
+    }
+
+
+def _fila_intervencion(fila, ctx):
+    return {
+        'fecha_intervencion': _fecha(fila['fecha_intervencion']),
+        'periodo': fila['periodo'],
+        'curso_id': fila.get('curso_id'),
+        'tipo_intervencion': fila['tipo_intervencion'],
+        'duracion_horas': fila.get('duracion_horas'),
+        'participantes': fila.get('participantes'),
+        'responsable': fila.get('responsable'),
+        'objetivo': fila.get('objetivo'),
+        'evaluacion_efectividad': fila.get('evaluacion_efectividad')
+    }
+
+
+def _fila_docente(fila, ctx):
+    return {
+        'docente_id': fila['docente_id'],
+        'nombre_docente': fila.get('nombre_docente'),
+        'curso_jefatura': fila.get('curso_jefatura'),
+        'asignaturas': fila.get('asignaturas'),
+        'años_experiencia': fila.get('años_experiencia'),
+        'formacion_convivencia': _booleano(fila.get('formacion_convivencia')),
+        'carga_horaria_semanal': fila.get('carga_horaria_semanal')
+    }
+
+
+# (hoja, modelo, convertir, clave de actualización o None si solo se inserta,
+#  columnas que se actualizan cuando la clave ya existe)
+HOJAS = [
+    ('Metadata_Establecimiento', Establecimiento, _fila_establecimiento, 'establecimiento_id',
+     ('nombre', 'region', 'comuna', 'tipo', 'total_estudiantes', 'total_docentes')),
+    ('Cursos_Temporal', CursoTemporal, _fila_curso_temporal, None, ()),
+    ('Estudiantes', Estudiante, _fila_estudiante, 'estudiante_id',
+     ('curso_id', 'genero', 'edad', 'tiene_nee', 'prioritario', 'nivel_socioeconomico')),
+    ('Evaluaciones_Socioemocionales', EvaluacionSocioemocional, _fila_evaluacion, None, ()),
+    ('Comentarios_Estudiantes', Comentario, _fila_comentario, None, ()),
+    ('Interacciones_Sociales', Interaccion, _fila_interaccion, None, ()),
+    ('Intervenciones_Aplicadas', Intervencion, _fila_intervencion, None, ()),
+    ('Docentes', Docente, _fila_docente, 'docente_id',
+     ('nombre_docente', 'curso_jefatura', 'asignaturas', 'años_experiencia',
+      'formacion_convivencia', 'carga_horaria_semanal')),
+]
+
+
+def huella_archivo(ruta, tamano_lectura=1 << 20):
+    """SHA-1 del archivo leído por bloques"""
+    sha1 = hashlib.sha1()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(tamano_lectura), b''):
+            sha1.update(bloque)
+    return sha1.hexdigest()
+
+
+def _filas_hoja(hoja):
+    """Itera las filas de datos de una hoja como dict {encabezado: valor}"""
+    filas = hoja.iter_rows(values_only=True)
+    encabezado = next(filas, None)
+    if encabezado is None:
+        return
+    columnas = [str(c).strip() if c is not None else None for c in encabezado]
+    for valores in filas:
+        yield {col: val for col, val in zip(columnas, valores) if col is not None}
+
+
+class ImportadorExcel:
+    """
+    Importador por bloques del formato Excel mejorado
+
+    Args:
+        db_manager: Instancia de DatabaseManager
+        tamano_bloque: Filas por transacción
+    """
+
+    def __init__(self, db_manager, tamano_bloque=1000):
+        self.db = db_manager
+        self.engine = db_manager.engine
+        self.tamano_bloque = tamano_bloque
+
+    # ------------------------------------------------------------------
+    # Puntos de control
+    # ------------------------------------------------------------------
+
+    def _obtener_punto_control(self, huella, nombre_archivo, reanudar, forzar):
+        """Retorna (id, hoja_actual, filas_hoja, filas_importadas) o un dict de error"""
+        tabla = ImportacionExcel.__table__
+        with self.engine.begin() as conn:
+            anterior = conn.execute(
+                select(tabla).where(tabla.c.huella == huella).order_by(tabla.c.id.desc()).limit(1)
+            ).mappings().first()
+
+            if anterior is not None and anterior['estado'] == 'completada' and not forzar:
+                return {
+                    'exito': False,
+                    'mensaje': 'Este archivo ya fue importado. Use forzar=True para importarlo nuevamente.',
+                    'importacion_id': anterior['id']
+                }
+
+            if anterior is not None and anterior['estado'] != 'completada' and reanudar:
+                return (anterior['id'], anterior['hoja_actual'], anterior['filas_hoja'] or 0,
+                        anterior['filas_importadas'] or 0)
+
+            resultado = conn.execute(tabla.insert().values(
+                huella=huella,
+                nombre_archivo=nombre_archivo,
+                estado='en_curso',
+                filas_hoja=0,
+                filas_importadas=0,
+                fecha_inicio=datetime.now(),
+                fecha_actualizacion=datetime.now()
+            ))
+            return (resultado.inserted_primary_key[0], None, 0, 0)
+
+    @staticmethod
+    def _guardar_punto_control(conn, importacion_id, **valores):
+        tabla = ImportacionExcel.__table__
+        valores['fecha_actualizacion'] = datetime.now()
+        conn.execute(update(tabla).where(tabla.c.id == importacion_id).values(**valores))
+
+    # ------------------------------------------------------------------
+    # Escritura de bloques
+    # ------------------------------------------------------------------
+
+    def _escribir_bloque(self, conn, modelo, clave, columnas_actualizables, filas):
+        """Inserta un bloque; con clave, actualiza las filas cuya clave ya existe"""
+        tabla = modelo.__table__
+        if clave is None:
+            conn.execute(tabla.insert(), filas)
+            return
+
+        # La última aparición de cada clave dentro del bloque prevalece
+        por_clave = {fila[clave]: fila for fila in filas}
+        existentes = set(conn.execute(
+            select(tabla.c[clave]).where(tabla.c[clave].in_(list(por_clave)))
+        ).scalars())
+
+        nuevas = [fila for valor, fila in por_clave.items() if valor not in existentes]
+        if nuevas:
+            conn.execute(tabla.insert(), nuevas)
+
+        actualizaciones = [
+            dict({col: fila[col] for col in columnas_actualizables}, _clave=valor)
+            for valor, fila in por_clave.items() if valor in existentes
+        ]
+        if actualizaciones:
+            conn.execute(
+                update(tabla)
+                .where(tabla.c[clave] == bindparam('_clave'))
+                .values({col: bindparam(col) for col in columnas_actualizables}),
+                actualizaciones
+            )
+
+    # ------------------------------------------------------------------
+    # Importación
+    # ------------------------------------------------------------------
+
+    def importar(self, excel_path, reanudar=True, forzar=False, trabajo_id=None, nombre_archivo=None):
+        """
+        Importa el archivo por bloques
+
+        Args:
+            excel_path: Ruta del archivo .xlsx
+            reanudar: Si hay una importación inconclusa del mismo archivo, continuarla
+            forzar: Importar aunque el archivo ya se haya importado completo
+            trabajo_id: Identificador para el progreso publicado por /api/eventos
+            nombre_archivo: Nombre registrado en el punto de control (excel_path por defecto)
+
+        Returns:
+            dict con exito, mensaje, importacion_id y filas_importadas
+        """
+        try:
+            huella = huella_archivo(excel_path)
+        except OSError as e:
+            return {'exito': False, 'mensaje': f'No se pudo leer el archivo: {str(e)}'}
+
+        punto_control = self._obtener_punto_control(huella, nombre_archivo or excel_path, reanudar, forzar)
+        if isinstance(punto_control, dict):
+            return punto_control
+        importacion_id, hoja_reanudar, filas_saltar, filas_importadas = punto_control
+        reanudada = hoja_reanudar is not None
+
+        libro = load_workbook(excel_path, read_only=True, data_only=True)
+        try:
+            ctx = {'establecimiento_id': ESTABLECIMIENTO_POR_DEFECTO}
+            if 'Metadata_Establecimiento' in libro.sheetnames:
+                primera = next(_filas_hoja(libro['Metadata_Establecimiento']), None)
+                if primera and primera.get('establecimiento_id'):
+                    ctx['establecimiento_id'] = primera['establecimiento_id']
+
+            nombres_hojas = [h[0] for h in HOJAS]
+            indice_inicio = nombres_hojas.index(hoja_reanudar) if hoja_reanudar in nombres_hojas else 0
+
+            for nombre_hoja, modelo, convertir, clave, actualizables in HOJAS[indice_inicio:]:
+                if nombre_hoja not in libro.sheetnames:
+                    continue
+
+                saltar = filas_saltar if nombre_hoja == hoja_reanudar else 0
+                hoja = libro[nombre_hoja]
+                total_hoja = hoja.max_row - 1 if hoja.max_row else None
+
+                with medir_etapa('importacion', nombre_hoja):
+                    filas_importadas = self._importar_hoja(
+                        importacion_id, nombre_hoja, hoja, modelo, convertir, clave, actualizables,
+                        ctx, saltar, filas_importadas, total_hoja, trabajo_id
+                    )
+
+            self.db.reconstruir_resumenes()
+            with self.engine.begin() as conn:
+                self._guardar_punto_control(conn, importacion_id, estado='completada', mensaje=None)
+
+        except Exception as e:
+            with self.engine.begin() as conn:
+                self._guardar_punto_control(conn, importacion_id, estado='error', mensaje=str(e))
+            publicar_progreso(trabajo_id, 'importacion', 'error', mensaje=str(e))
+            return {
+                'exito': False,
+                'mensaje': f'Error al cargar datos: {str(e)}. Vuelva a importar el archivo para reanudar.',
+                'importacion_id': importacion_id,
+                'filas_importadas': filas_importadas
+            }
+        finally:
+            libro.close()
+
+        publicar_progreso(trabajo_id, 'importacion', 'completado', filas_importadas=filas_importadas)
+        return {
+            'exito': True,
+            'mensaje': 'Datos cargados exitosamente a la base de datos' + (' (importación reanudada)' if reanudada else ''),
+            'importacion_id': importacion_id,
+            'filas_importadas': filas_importadas
+        }
+
+    def _importar_hoja(self, importacion_id, nombre_hoja, hoja, modelo, convertir, clave, actualizables,
+                       ctx, saltar, filas_importadas, total_hoja, trabajo_id):
+        bloque = []
+        filas_leidas = 0
+
+        def confirmar():
+            with self.engine.begin() as conn:
+                if bloque:
+                    self._escribir_bloque(conn, modelo, clave, actualizables, bloque)
+                self._guardar_punto_control(
+                    conn, importacion_id,
+                    hoja_actual=nombre_hoja,
+                    filas_hoja=filas_leidas,
+                    filas_importadas=filas_importadas + len(bloque)
+                )
+            publicar_progreso(trabajo_id, 'importacion', nombre_hoja, filas_leidas, total_hoja,
+                              filas_importadas=filas_importadas + len(bloque))
+
+        for fila in _filas_hoja(hoja):
+            filas_leidas += 1
+            if filas_leidas <= saltar:
+                continue
+            if not any(v is not None for v in fila.values()):
+                continue
+
+            bloque.append(convertir(fila, ctx))
+            if len(bloque) >= self.tamano_bloque:
+                confirmar()
+                filas_importadas += len(bloque)
+                bloque = []
+
+        confirmar()
+        return filas_importadas + len(bloque)
+
+
+def main():
+    import argparse
+    from database import DatabaseManager
+
+    parser = argparse.ArgumentParser(description='Importa un Excel CONVIVIR por bloques')
+    parser.add_argument('archivo')
+    parser.add_argument('--bloque', type=int, default=1000, help='Filas por transacción')
+    parser.add_argument('--db', default='convivir_v4.db', help='Base SQLite (se ignora si hay DATABASE_URL)')
+    parser.add_argument('--forzar', action='store_true', help='Importar aunque el archivo ya se haya importado')
+    parser.add_argument('--sin-reanudar', action='store_true', help='Empezar desde cero aunque exista un punto de control')
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    resultado = db.importar_excel_por_bloques(
+        args.archivo, tamano_bloque=args.bloque, reanudar=not args.sin_reanudar, forzar=args.forzar
+    )
+    print(('✅ ' if resultado['exito'] else '❌ ') + resultado['mensaje'])
+    if 'filas_importadas' in resultado:
+        print(f"   Filas importadas: {resultado['filas_importadas']}")
+
+
+if __name__ == '__main__':
+    main()
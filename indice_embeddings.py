@@ -0,0 +1,582 @@
+"""
+Módulo de Índice de Embeddings para CONVIVIR v4.0
+Búsqueda de observaciones pasadas similares a un comentario, en todo el establecimiento
+
+- Los comentarios se codifican por lotes con el transformer local (BETO, en CPU):
+  promedio de los estados ocultos de la última capa, normalizado. Sin
+  transformers se usa un codificador de palabras y bigramas con hashing
+- Los vectores se guardan en una matriz float16 de solo anexado (vectores.f16)
+  junto al id de cada comentario (ids.i64) y la huella CRC32 de su texto
+  (huellas.u32); meta.json registra el codificador, cuántas filas están
+  confirmadas y una suma de control de los comentarios indexados
+- Antes de agregar comentarios se compara la suma de control con la base; si
+  difiere se verifican las huellas fila a fila: los comentarios eliminados se
+  toleran, pero un id reutilizado con otro texto (base vaciada o reimportada)
+  reinicia el índice
+- Las consultas leen la matriz con np.memmap y calculan la similitud coseno por
+  bloques: la memoria usada es la de un bloque, no la del índice completo
+- Los comentarios nuevos se indexan en un hilo de fondo de cada worker
+  (programar_indexacion), que se pide al guardar observaciones, al terminar una
+  importación y cuando una búsqueda encuentra comentarios sin indexar; también
+  con "python indice_embeddings.py construir". Las búsquedas solo leen lo que
+  ya está en la matriz
+
+Variables de entorno:
+    CONVIVIR_EMBEDDINGS_DIR          Directorio del índice (indices_embeddings/)
+    CONVIVIR_EMBEDDINGS_CODIFICADOR  'transformer' (por defecto si está disponible) o 'hashing'
+
+Uso:
+    python indice_embeddings.py construir
+    python indice_embeddings.py buscar 125 --k 5
+"""
+
+import os
+import json
+import argparse
+import threading
+
+import numpy as np
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.preprocessing import normalize
+from sqlalchemy import select, func, cast, BigInteger
+
+from database import Comentario
+from acceso_caracteristicas import comentarios_para_nlp
+from modelo_temas import BloqueoArchivo, palabras_tema, huellas_textos
+
+
+ARCHIVO_VECTORES = 'vectores.f16'
+ARCHIVO_IDS = 'ids.i64'
+ARCHIVO_HUELLAS = 'huellas.u32'
+ARCHIVO_META = 'meta.json'
+
+# Filas por bloque de la búsqueda (con 768 dimensiones, ~12 MB en float32; los
+# bloques que caben en caché rinden más que los grandes)
+TAMANO_BLOQUE = 4096
+
+
+def directorio_por_defecto():
+    """Directorio del índice: CONVIVIR_EMBEDDINGS_DIR o indices_embeddings/"""
+    if os.environ.get('CONVIVIR_EMBEDDINGS_DIR'):
+        return os.environ['CONVIVIR_EMBEDDINGS_DIR']
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'indices_embeddings')
+
+
+def suma_control(ids, textos):
+    """Σ id · largo del texto: la misma cuenta que control_base() hace en SQL"""
+    return sum(int(i) * len(t) for i, t in zip(ids, textos) if isinstance(t, str))
+
+
+# ----------------------------------------------------------------------
+# Codificadores
+# ----------------------------------------------------------------------
+
+class CodificadorTransformer:
+    """
+    Embeddings de oraciones con el modelo de sentimientos ya cargado en el proceso
+
+    Usa el pipeline de PyTorch aunque el backend de clasificación sea ONNX: el
+    modelo exportado solo entrega logits, no estados ocultos.
+    """
+
+    def __init__(self, largo_maximo=128):
+        import torch
+        from modelo_nlp import obtener_pipeline_sentimiento, MODELO_SENTIMIENTO
+
+        pipeline = obtener_pipeline_sentimiento('torch')
+        if pipeline is None:
+            raise RuntimeError('Transformers no disponible')
+        self.torch = torch
+        self.modelo = pipeline.model.base_model
+        self.tokenizer = pipeline.tokenizer
+        self.largo_maximo = largo_maximo
+        self.dimension = self.modelo.config.hidden_size
+        self.nombre = f"transformer:{MODELO_SENTIMIENTO}"
+
+    def __call__(self, textos):
+        codificado = self.tokenizer(
+            [str(t or '') for t in textos], truncation=True, max_length=self.largo_maximo,
+            padding=True, return_tensors='pt'
+        )
+        with self.torch.no_grad():
+            estados = self.modelo(**codificado).last_hidden_state
+        # Promedio de los tokens reales (sin relleno)
+        mascara = codificado['attention_mask'].unsqueeze(-1).to(estados.dtype)
+        promedio = (estados * mascara).sum(dim=1) / mascara.sum(dim=1).clamp(min=1)
+        return normalize(promedio.numpy().astype(np.float32))
+
+
+class CodificadorHashing:
+    """Respaldo sin transformers: palabras de contenido y bigramas proyectados con hashing"""
+
+    def __init__(self, dimension=512):
+        self.dimension = dimension
+        self.nombre = f"hashing:{dimension}"
+        self.hasher = FeatureHasher(n_features=dimension, input_type='string')
+
+    def __call__(self, textos):
+        caracteristicas = []
+        for texto in textos:
+            palabras = palabras_tema(texto)
+            caracteristicas.append(palabras + [f"{a} {b}" for a, b in zip(palabras, palabras[1:])])
+        return normalize(self.hasher.transform(caracteristicas)).toarray().astype(np.float32)
+
+
+def crear_codificador(tipo=None):
+    """Codificador según CONVIVIR_EMBEDDINGS_CODIFICADOR; sin transformers usa hashing"""
+    tipo = (tipo or os.environ.get('CONVIVIR_EMBEDDINGS_CODIFICADOR', 'transformer')).lower()
+    if tipo == 'transformer':
+        try:
+            return CodificadorTransformer()
+        except Exception as e:
+            print(f"⚠️ Embeddings con transformer no disponibles ({e}). Usando hashing.")
+    return CodificadorHashing()
+
+
+# ----------------------------------------------------------------------
+# Índice en disco
+# ----------------------------------------------------------------------
+
+class IndiceEmbeddings:
+    """
+    Matriz de vectores float16 de solo anexado, leída con np.memmap
+
+    Uso:
+        indice = IndiceEmbeddings(directorio, codificador.nombre, codificador.dimension)
+        indice.agregar(ids, vectores, textos)
+        ids, similitudes = indice.buscar(vector, k=10, excluir={125})
+    """
+
+    def __init__(self, directorio, codificador, dimension):
+        self.directorio = directorio
+        self.codificador = codificador
+        self.dimension = dimension
+        self.ruta_vectores = os.path.join(directorio, ARCHIVO_VECTORES)
+        self.ruta_ids = os.path.join(directorio, ARCHIVO_IDS)
+        self.ruta_huellas = os.path.join(directorio, ARCHIVO_HUELLAS)
+        self.ruta_meta = os.path.join(directorio, ARCHIVO_META)
+        self.total = 0
+        self.ultimo_id = 0
+        self.control = None
+        self._mtime_meta = None
+        self._vectores = None
+        self._ids = None
+        self._huellas = None
+        self._lock = threading.Lock()
+
+        os.makedirs(directorio, exist_ok=True)
+        meta = self._meta()
+        if meta.get('total') and (meta.get('codificador'), meta.get('dimension')) != (codificador, dimension):
+            # Vectores de otro codificador no son comparables: se reconstruye
+            print("⚠️ El índice de embeddings usa otro codificador. Se reconstruirá.")
+            self.reiniciar()
+        self.recargar()
+
+    def _meta(self):
+        try:
+            with open(self.ruta_meta, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def recargar(self):
+        """Vuelve a mapear los archivos si otro proceso agregó filas (meta.json cambió)"""
+        try:
+            mtime = os.stat(self.ruta_meta).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime_meta and self._ids is not None:
+            return
+        meta = self._meta()
+        with self._lock:
+            self.total = int(meta.get('total', 0))
+            self.ultimo_id = int(meta.get('ultimo_id', 0))
+            self.control = meta.get('control')
+            self._mtime_meta = mtime
+            if self.total:
+                # Solo las filas confirmadas: un anexado interrumpido queda fuera
+                self._vectores = np.memmap(self.ruta_vectores, dtype='<f2', mode='r', shape=(self.total, self.dimension))
+                self._ids = np.memmap(self.ruta_ids, dtype='<i8', mode='r', shape=(self.total,))
+                try:
+                    self._huellas = np.memmap(self.ruta_huellas, dtype='<u4', mode='r', shape=(self.total,))
+                except (FileNotFoundError, ValueError):
+                    # Índice anterior a las huellas: no se puede verificar
+                    self._huellas = None
+            else:
+                self._vectores = np.empty((0, self.dimension), dtype='<f2')
+                self._ids = np.empty(0, dtype='<i8')
+                self._huellas = np.empty(0, dtype='<u4')
+
+    def _escribir_meta(self, total, ultimo_id, control):
+        temporal = f"{self.ruta_meta}.{os.getpid()}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({'codificador': self.codificador, 'dimension': self.dimension,
+                       'total': total, 'ultimo_id': ultimo_id, 'control': control}, f)
+        os.replace(temporal, self.ruta_meta)
+
+    def reiniciar(self):
+        """
+        Vacía el índice. Los archivos se eliminan en vez de truncarse: otros
+        procesos pueden tenerlos mapeados y conservan su copia hasta recargar.
+        """
+        with BloqueoArchivo(self.ruta_meta):
+            self._escribir_meta(0, 0, [0, 0])
+            for ruta in (self.ruta_vectores, self.ruta_ids, self.ruta_huellas):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+        self._mtime_meta = None
+        self.recargar()
+
+    def agregar(self, ids, vectores, textos):
+        """
+        Anexa vectores con ids mayores que los ya indexados
+
+        Los archivos se escriben primero y meta.json después: las lecturas
+        concurrentes solo ven filas completas. Los textos solo se usan para la
+        huella de cada fila y la suma de control.
+        """
+        ids = np.asarray(ids, dtype='<i8')
+        vectores = np.asarray(vectores, dtype='<f2').reshape(len(ids), self.dimension)
+        textos = list(textos)
+        with BloqueoArchivo(self.ruta_meta):
+            meta = self._meta()
+            total = int(meta.get('total', 0))
+            seleccion = ids > int(meta.get('ultimo_id', 0))
+            if not seleccion.any():
+                self.recargar()
+                return 0
+            ids, vectores = ids[seleccion], vectores[seleccion]
+            textos = [texto for texto, elegido in zip(textos, seleccion) if elegido]
+            huellas = huellas_textos(textos).astype('<u4')
+            cantidad, suma = meta.get('control') or (0, 0)
+            control = [cantidad + len(ids), suma + suma_control(ids, textos)]
+            for ruta, datos, ancho in ((self.ruta_vectores, vectores, self.dimension * 2), (self.ruta_ids, ids, 8),
+                                       (self.ruta_huellas, huellas, 4)):
+                with open(ruta, 'ab') as f:
+                    # Descarta filas de un anexado anterior que no llegó a confirmarse
+                    f.truncate(total * ancho)
+                    f.seek(total * ancho)
+                    datos.tofile(f)
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._escribir_meta(total + len(ids), int(ids[-1]), control)
+        self.recargar()
+        return len(ids)
+
+    def verificar(self, ids, huellas):
+        """
+        True si cada comentario (ids ordenados, con id hasta el último indexado)
+        está en el índice con la misma huella. Los indexados que ya no están en
+        la base (eliminados) no invalidan el índice.
+        """
+        self.recargar()
+        if not len(ids):
+            return True
+        if self._huellas is None or not self.total:
+            return False
+        posiciones = np.minimum(np.searchsorted(self._ids, ids), self.total - 1)
+        return bool(np.array_equal(self._ids[posiciones], ids) and np.array_equal(self._huellas[posiciones], huellas))
+
+    def confirmar_control(self, ultimo_id, control):
+        """Registra la suma de control verificada contra la base (si nadie agregó filas entretanto)"""
+        with BloqueoArchivo(self.ruta_meta):
+            meta = self._meta()
+            if int(meta.get('ultimo_id', 0)) == ultimo_id:
+                self._escribir_meta(int(meta.get('total', 0)), ultimo_id, control)
+        self.recargar()
+
+    def vector(self, comentario_id):
+        """Vector indexado de un comentario (None si no está en el índice)"""
+        self.recargar()
+        posicion = int(np.searchsorted(self._ids, comentario_id))
+        if posicion < self.total and self._ids[posicion] == comentario_id:
+            return np.asarray(self._vectores[posicion], dtype=np.float32)
+        return None
+
+    def buscar(self, consulta, k=10, excluir=(), tamano_bloque=TAMANO_BLOQUE):
+        """
+        Los k vectores de mayor similitud coseno con la consulta
+
+        Recorre la matriz mapeada por bloques: cada bloque se convierte a float32,
+        se multiplica por la consulta y aporta sus k mejores candidatos.
+
+        Returns:
+            (ids, similitudes) ordenados de mayor a menor similitud
+        """
+        self.recargar()
+        vectores, ids_indice = self._vectores, self._ids
+        consulta = np.asarray(consulta, dtype=np.float32).ravel()
+        norma = np.linalg.norm(consulta)
+        if not len(ids_indice) or not norma:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        consulta = consulta / norma
+        excluir = np.asarray(list(excluir), dtype=np.int64)
+        candidatos = k + len(excluir)
+
+        posiciones = np.empty(0, dtype=np.int64)
+        similitudes = np.empty(0, dtype=np.float32)
+        for inicio in range(0, len(ids_indice), tamano_bloque):
+            puntajes = np.asarray(vectores[inicio:inicio + tamano_bloque], dtype=np.float32) @ consulta
+            if len(puntajes) > candidatos:
+                mejores = np.argpartition(puntajes, -candidatos)[-candidatos:]
+            else:
+                mejores = np.arange(len(puntajes))
+            posiciones = np.concatenate((posiciones, mejores + inicio))
+            similitudes = np.concatenate((similitudes, puntajes[mejores]))
+            if len(posiciones) > candidatos:
+                conservar = np.argpartition(similitudes, -candidatos)[-candidatos:]
+                posiciones, similitudes = posiciones[conservar], similitudes[conservar]
+
+        encontrados = np.asarray(ids_indice[posiciones], dtype=np.int64)
+        validos = ~np.isin(encontrados, excluir)
+        encontrados, similitudes = encontrados[validos], similitudes[validos]
+        orden = np.argsort(-similitudes, kind='stable')[:k]
+        return encontrados[orden], similitudes[orden]
+
+
+# ----------------------------------------------------------------------
+# Sincronización con la base de datos y búsqueda
+# ----------------------------------------------------------------------
+
+_indice = None
+_codificador = None
+_lock_indice = threading.Lock()
+
+
+def obtener_indice(directorio=None, tipo_codificador=None):
+    """(índice, codificador) del proceso; el codificador se carga la primera vez"""
+    global _indice, _codificador
+    if _indice is None:
+        with _lock_indice:
+            if _indice is None:
+                _codificador = crear_codificador(tipo_codificador)
+                _indice = IndiceEmbeddings(directorio or directorio_por_defecto(), _codificador.nombre,
+                                           _codificador.dimension)
+    return _indice, _codificador
+
+
+def control_base(conn, hasta_id):
+    """[cantidad, Σ id · largo del texto] de los comentarios con id <= hasta_id"""
+    cantidad, suma = conn.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(
+                cast(Comentario.id, BigInteger) * func.coalesce(func.length(Comentario.comentario_texto), 0)
+            ), 0)
+        ).where(Comentario.id <= hasta_id)
+    ).one()
+    return [int(cantidad), int(suma)]
+
+
+def _indice_vigente(conn, indice):
+    """
+    True si los comentarios ya indexados siguen en la base con el mismo texto
+
+    La suma de control se compara en una sola consulta agregada; solo si
+    difiere se leen los textos para verificar las huellas fila a fila. Si la
+    diferencia se debe a comentarios eliminados, se registra el nuevo control.
+    """
+    control = control_base(conn, indice.ultimo_id)
+    if control == indice.control:
+        return True
+    filas = conn.execute(
+        select(Comentario.id, Comentario.comentario_texto)
+        .where(Comentario.id <= indice.ultimo_id).order_by(Comentario.id)
+    ).fetchall()
+    ids = np.array([fila[0] for fila in filas], dtype=np.int64)
+    if not indice.verificar(ids, huellas_textos([fila[1] for fila in filas])):
+        return False
+    indice.confirmar_control(indice.ultimo_id, control)
+    return True
+
+
+def sincronizar(engine, indice, codificador, limite=None, tamano_lote=64):
+    """
+    Codifica e indexa los comentarios con id mayor que el último indexado
+
+    Si la tabla se vació o se reimportó y los ids se reutilizaron con otros
+    textos (SQLite los reutiliza), el índice se reinicia.
+
+    Returns:
+        (agregados, pendientes): comentarios indexados ahora y los que quedan
+    """
+    indice.recargar()
+    with engine.connect() as conn:
+        if indice.total and not _indice_vigente(conn, indice):
+            print("⚠️ Los comentarios indexados cambiaron (ids reutilizados). Se reconstruirá el índice de embeddings.")
+            indice.reiniciar()
+        ultimo_id_base = conn.execute(select(func.max(Comentario.id))).scalar() or 0
+    if ultimo_id_base <= indice.ultimo_id:
+        return 0, 0
+
+    nuevos = comentarios_para_nlp(engine, desde_id=indice.ultimo_id)
+    pendientes = len(nuevos)
+    if limite is not None:
+        nuevos = nuevos.head(limite)
+
+    agregados = 0
+    for inicio in range(0, len(nuevos), tamano_lote):
+        lote = nuevos.iloc[inicio:inicio + tamano_lote]
+        textos = lote['texto'].tolist()
+        agregados += indice.agregar(lote['id'].to_numpy(), codificador(textos), textos)
+    return agregados, pendientes - len(nuevos)
+
+
+# ----------------------------------------------------------------------
+# Indexación en segundo plano
+# ----------------------------------------------------------------------
+
+# Un hilo por proceso; los pedidos que llegan mientras trabaja se atienden con otra pasada
+_hilo_indexacion = None
+_indexacion_pedida = False
+_lock_indexacion = threading.Lock()
+
+
+def _descartar_tras_fork():
+    global _hilo_indexacion, _indexacion_pedida
+    # El hilo del padre no existe en el hijo
+    _hilo_indexacion = None
+    _indexacion_pedida = False
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_descartar_tras_fork)
+
+
+def _indexar_pendientes(engine):
+    global _hilo_indexacion, _indexacion_pedida
+    while True:
+        with _lock_indexacion:
+            if not _indexacion_pedida:
+                _hilo_indexacion = None
+                return
+            _indexacion_pedida = False
+        try:
+            indice, codificador = obtener_indice()
+            agregados, _ = sincronizar(engine, indice, codificador)
+            if agregados:
+                print(f"✅ {agregados} comentarios agregados al índice de embeddings")
+        except Exception as e:
+            print(f"⚠️ No se pudo actualizar el índice de embeddings: {e}")
+
+
+def programar_indexacion(engine):
+    """
+    Pide indexar los comentarios nuevos en un hilo de fondo y retorna de
+    inmediato. Varios pedidos seguidos se resuelven con una sola pasada; entre
+    workers no se duplican filas (agregar descarta los ids ya indexados).
+    """
+    global _hilo_indexacion, _indexacion_pedida
+    with _lock_indexacion:
+        _indexacion_pedida = True
+        if _hilo_indexacion is None:
+            _hilo_indexacion = threading.Thread(
+                target=_indexar_pendientes, args=(engine,), name='indice-embeddings', daemon=True
+            )
+            _hilo_indexacion.start()
+
+
+def buscar_comentarios_similares(engine, comentario_id, k=10):
+    """
+    Comentarios más parecidos a uno dado, en todo el establecimiento
+
+    Solo lee los vectores ya indexados; si hay comentarios sin indexar se pide
+    su indexación en segundo plano y se informan en 'pendientes'.
+
+    Returns:
+        dict con 'exito', 'similares' (comentario y similitud, de mayor a menor)
+        y 'pendientes' (comentarios aún sin indexar)
+    """
+    indice, codificador = obtener_indice()
+    indice.recargar()
+    with engine.connect() as conn:
+        pendientes = conn.execute(
+            select(func.count()).select_from(Comentario).where(Comentario.id > indice.ultimo_id)
+        ).scalar() or 0
+    if pendientes:
+        programar_indexacion(engine)
+
+    consulta = indice.vector(comentario_id)
+    if consulta is None:
+        with engine.connect() as conn:
+            texto = conn.execute(
+                select(Comentario.comentario_texto).where(Comentario.id == comentario_id)
+            ).scalar()
+        if texto is None:
+            return {'exito': False, 'mensaje': f'Comentario {comentario_id} no encontrado'}
+        # Comentario aún sin indexar: se codifica solo el texto consultado
+        consulta = codificador([texto])[0]
+
+    # Algunos ids pueden ser de comentarios ya eliminados: se piden candidatos de más
+    ids, similitudes = indice.buscar(consulta, k=k * 2, excluir={comentario_id})
+    if not len(ids):
+        return {'exito': True, 'comentario_id': comentario_id, 'similares': [], 'pendientes': pendientes}
+
+    with engine.connect() as conn:
+        filas = conn.execute(
+            select(
+                Comentario.id, Comentario.estudiante_id, Comentario.fecha_comentario,
+                Comentario.tipo_comentario, Comentario.comentario_texto, Comentario.sentimiento_analizado
+            ).where(Comentario.id.in_(ids.tolist()))
+        ).fetchall()
+    por_id = {fila[0]: fila for fila in filas}
+
+    similares = []
+    for id_similar, similitud in zip(ids.tolist(), similitudes.tolist()):
+        fila = por_id.get(id_similar)
+        if fila is None:
+            continue
+        similares.append({
+            'id': fila[0],
+            'estudiante_id': fila[1],
+            'fecha': str(fila[2]),
+            'tipo': fila[3] or 'general',
+            'comentario': fila[4],
+            'sentimiento': fila[5],
+            'similitud': round(min(float(similitud), 1.0), 4)  # float16 puede pasar de 1
+        })
+        if len(similares) == k:
+            break
+
+    return {
+        'exito': True,
+        'comentario_id': comentario_id,
+        'codificador': indice.codificador,
+        'similares': similares,
+        'pendientes': pendientes
+    }
+
+
+def main():
+    from database import DatabaseManager
+
+    parser = argparse.ArgumentParser(description='Índice de embeddings de comentarios')
+    parser.add_argument('--db', default='convivir_v4.db')
+    parser.add_argument('--codificador', choices=('transformer', 'hashing'))
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    construir = subparsers.add_parser('construir', help='Indexa los comentarios nuevos')
+    construir.add_argument('--reiniciar', action='store_true', help='Vuelve a codificar todos los comentarios')
+    buscar = subparsers.add_parser('buscar', help='Comentarios similares a uno dado')
+    buscar.add_argument('comentario_id', type=int)
+    buscar.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    indice, codificador = obtener_indice(tipo_codificador=args.codificador)
+
+    if args.comando == 'construir':
+        if args.reiniciar:
+            indice.reiniciar()
+        agregados, _ = sincronizar(db.engine, indice, codificador)
+        print(f"✅ {agregados} comentarios indexados ({indice.total} en total, {codificador.nombre})")
+        return
+
+    resultado = buscar_comentarios_similares(db.engine, args.comentario_id, args.k)
+    if not resultado['exito']:
+        raise SystemExit(f"❌ {resultado['mensaje']}")
+    for similar in resultado['similares']:
+        print(f"  {similar['similitud']:.3f}  #{similar['id']}  {similar['comentario']}")
+
+
+if __name__ == '__main__':
+    main()
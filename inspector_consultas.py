@@ -0,0 +1,193 @@
+"""
+Módulo Inspector de Consultas SQL para CONVIVIR v4.0
+Registro de consultas lentas y detector de patrones N+1: cuenta las sentencias
+de cada petición, reporta las que superan un umbral de latencia (con la forma de
+sus parámetros) y detecta sentencias idénticas repetidas dentro de una petición
+
+Configuración (variables de entorno):
+    CONVIVIR_SQL_LENTO_MS   Latencia a partir de la cual una sentencia es lenta (100)
+    CONVIVIR_N1_UMBRAL      Repeticiones de la misma sentencia que se reportan como N+1 (10)
+"""
+
+import os
+import time
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import request
+from sqlalchemy import event
+
+from metricas import registro_metricas, clasificar_sentencia
+
+
+LIMITES_SENTENCIAS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+sentencias_por_peticion = registro_metricas.histograma(
+    'convivir_sql_sentencias_por_peticion',
+    'Cantidad de sentencias SQL ejecutadas por petición',
+    ('ruta',),
+    limites=LIMITES_SENTENCIAS
+)
+consultas_lentas = registro_metricas.contador(
+    'convivir_sql_lentas_total',
+    'Sentencias SQL que superaron el umbral de latencia',
+    ('operacion', 'tabla')
+)
+patrones_n_mas_1 = registro_metricas.contador(
+    'convivir_sql_n_mas_1_total',
+    'Sentencias repetidas sobre el umbral N+1 dentro de una petición',
+    ('ruta', 'operacion', 'tabla')
+)
+
+
+def forma_parametros(parametros):
+    """
+    Describe los tipos de los parámetros sin exponer sus valores
+
+    Ej: {'estudiante_id': 'str', 'fecha': 'datetime'} o ['str', 'int']
+    """
+    if parametros is None:
+        return None
+    if isinstance(parametros, dict):
+        return {clave: type(valor).__name__ for clave, valor in parametros.items()}
+    if isinstance(parametros, (list, tuple)):
+        return [type(valor).__name__ for valor in parametros]
+    return type(parametros).__name__
+
+
+def _recortar(statement, largo=300):
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= largo else statement[:largo] + '...'
+
+
+class EstadoInspeccion:
+    """Sentencias observadas durante una petición (o bloque inspeccionado)"""
+
+    def __init__(self, etiqueta):
+        self.etiqueta = etiqueta
+        self.total = 0
+        self.repeticiones = Counter()
+
+
+class InspectorConsultas:
+    """
+    Inspector de sentencias SQL por petición
+
+    Uso:
+        inspector = InspectorConsultas(db.engine, app)
+
+        # Fuera de una petición (scripts, benchmarks)
+        with inspector.inspeccionar('cargar_desde_excel'):
+            db.cargar_desde_excel(ruta)
+    """
+
+    def __init__(self, engine=None, app=None, umbral_lento_ms=None, umbral_n_mas_1=None, max_hallazgos=100):
+        self.umbral_lento = float(
+            umbral_lento_ms if umbral_lento_ms is not None else os.environ.get('CONVIVIR_SQL_LENTO_MS', 100)
+        ) / 1000
+        self.umbral_n_mas_1 = int(
+            umbral_n_mas_1 if umbral_n_mas_1 is not None else os.environ.get('CONVIVIR_N1_UMBRAL', 10)
+        )
+        self.hallazgos = deque(maxlen=max_hallazgos)
+        self._local = threading.local()
+
+        if engine is not None:
+            self.registrar_engine(engine)
+        if app is not None:
+            self.init_app(app)
+
+    def registrar_engine(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._antes)
+        event.listen(engine, 'after_cursor_execute', self._despues)
+
+    def init_app(self, app):
+        app.before_request(self._iniciar_peticion)
+        app.teardown_request(self._finalizar_peticion)
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida de la inspección
+    # ------------------------------------------------------------------
+
+    def _iniciar_peticion(self):
+        ruta = request.url_rule.rule if request.url_rule is not None else 'sin_ruta'
+        self._local.estado = EstadoInspeccion(ruta)
+
+    def _finalizar_peticion(self, excepcion=None):
+        estado = getattr(self._local, 'estado', None)
+        self._local.estado = None
+        if estado is not None:
+            self._cerrar(estado)
+
+    @contextmanager
+    def inspeccionar(self, etiqueta):
+        """Inspecciona un bloque de código fuera del ciclo de una petición"""
+        anterior = getattr(self._local, 'estado', None)
+        estado = self._local.estado = EstadoInspeccion(etiqueta)
+        try:
+            yield estado
+        finally:
+            self._local.estado = anterior
+            self._cerrar(estado)
+
+    def _cerrar(self, estado):
+        sentencias_por_peticion.observar(estado.total, estado.etiqueta)
+        for statement, veces in estado.repeticiones.items():
+            if veces < self.umbral_n_mas_1:
+                continue
+            operacion, tabla = clasificar_sentencia(statement)
+            patrones_n_mas_1.incrementar(estado.etiqueta, operacion, tabla)
+            self._reportar({
+                'tipo': 'n_mas_1',
+                'ruta': estado.etiqueta,
+                'repeticiones': veces,
+                'total_sentencias': estado.total,
+                'sentencia': _recortar(statement)
+            })
+            print(f"⚠️ Posible N+1 en {estado.etiqueta}: {veces} ejecuciones de: {_recortar(statement, 150)}")
+
+    def _reportar(self, hallazgo):
+        hallazgo['fecha'] = datetime.now().isoformat(timespec='seconds')
+        self.hallazgos.append(hallazgo)
+
+    # ------------------------------------------------------------------
+    # Eventos del engine
+    # ------------------------------------------------------------------
+
+    def _antes(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('inicio_inspector', []).append(time.perf_counter())
+
+    def _despues(self, conn, cursor, statement, parameters, context, executemany):
+        pila = conn.info.get('inicio_inspector')
+        duracion = time.perf_counter() - pila.pop() if pila else 0.0
+
+        estado = getattr(self._local, 'estado', None)
+        if estado is not None:
+            estado.total += 1
+            # Un executemany ya es un lote: no cuenta como repetición
+            if not executemany:
+                estado.repeticiones[statement] += 1
+
+        if duracion >= self.umbral_lento:
+            operacion, tabla = clasificar_sentencia(statement)
+            consultas_lentas.incrementar(operacion, tabla)
+            muestra = parameters[0] if executemany and parameters else parameters
+            self._reportar({
+                'tipo': 'lenta',
+                'ruta': estado.etiqueta if estado is not None else None,
+                'duracion_ms': round(duracion * 1000, 1),
+                'sentencia': _recortar(statement),
+                'parametros': forma_parametros(muestra),
+                'executemany': bool(executemany)
+            })
+            print(f"⚠️ Consulta lenta ({duracion * 1000:.0f} ms): {_recortar(statement, 150)} "
+                  f"parámetros={forma_parametros(muestra)}")
+
+    def resumen(self):
+        """Hallazgos recientes, del más nuevo al más antiguo"""
+        return {
+            'umbral_lento_ms': self.umbral_lento * 1000,
+            'umbral_n_mas_1': self.umbral_n_mas_1,
+            'hallazgos': list(reversed(self.hallazgos))
+        }
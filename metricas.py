@@ -0,0 +1,546 @@
+"""
+Módulo de Métricas de Rendimiento para CONVIVIR v4.0
+Histogramas de latencia por ruta HTTP, por etapa de los modelos de ML y por
+sentencia SQL, expuestos en formato de texto Prometheus en /metrics
+
+Con varios workers (RegistroMetricas.compartir) cada proceso escribe sus valores
+en su propio archivo mapeado en memoria (metricas_<pid>.db, un solo escritor,
+sin bloqueos entre procesos) y /metrics, atendido por cualquier worker, suma
+los archivos del directorio:
+
+- Contadores e histogramas: suma de todos los procesos, incluidos los workers
+  que ya terminaron (sus conteos siguen siendo parte del total). Los archivos de
+  procesos muertos se eliminan solo al registrar el directorio al iniciar, así
+  que un worker nuevo sin preload_app puede hacer retroceder un contador, lo que
+  Prometheus interpreta como un reinicio
+- Indicadores: suma del último valor de cada proceso vivo. Cada worker los
+  muestrea después de sus peticiones (como mucho una vez por segundo) y el que
+  atiende /metrics, en el momento
+"""
+
+import os
+import re
+import json
+import mmap
+import time
+import struct
+import hashlib
+import tempfile
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import request, g
+from sqlalchemy import event
+
+
+# Límites (segundos) pensados para cubrir desde consultas SQL de 1 ms hasta
+# análisis que rozan el timeout de 300 s de gunicorn
+LIMITES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Segundos mínimos entre dos muestreos de los indicadores de un worker
+INTERVALO_MUESTREO = 1.0
+
+# Archivo de valores de cada proceso dentro del directorio compartido
+PATRON_ARCHIVO_VALORES = re.compile(r'^metricas_(\d+)\.db$')
+
+# Tamaño máximo (bytes) de una respuesta que se inspecciona en busca de {"exito": false}
+TAMANO_MAXIMO_ERROR = 4096
+
+# Primer verbo SQL y tabla principal (FROM / INTO / UPDATE) de una sentencia
+PATRON_OPERACION = re.compile(r'^\s*(\w+)')
+PATRON_TABLA = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+["`]?(\w+)', re.IGNORECASE)
+
+
+def _escapar_etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatear_etiquetas(nombres, valores, extra=None):
+    pares = [f'{n}="{_escapar_etiqueta(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _formatear_numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _formatear_cantidad(valor):
+    """Conteos guardados como float64: se muestran como enteros si lo son"""
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+# ----------------------------------------------------------------------
+# Almacenamiento de valores
+# ----------------------------------------------------------------------
+# Cada valor se identifica por (métrica, valores de las etiquetas, campo); el
+# campo es el índice de la cubeta, 'suma' o 'conteo' en los histogramas y
+# 'valor' en contadores e indicadores
+
+class ValoresLocales:
+    """Valores de las métricas en la memoria del proceso (un solo proceso)"""
+
+    def __init__(self):
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def sumar(self, *pares):
+        """Suma cada (clave, cantidad)"""
+        with self._lock:
+            for clave, cantidad in pares:
+                self._valores[clave] = self._valores.get(clave, 0.0) + cantidad
+
+    def fijar(self, clave, valor):
+        with self._lock:
+            self._valores[clave] = float(valor)
+
+    def leer(self):
+        with self._lock:
+            return dict(self._valores)
+
+
+class ArchivoValores:
+    """
+    Valores float64 de un proceso en su propio archivo mapeado en memoria
+
+    Formato: [bytes usados uint32][relleno] y luego entradas
+    [largo uint32][clave JSON][relleno hasta 8 bytes][valor float64]. Solo este
+    proceso escribe: agrega la entrada completa antes de actualizar los bytes
+    usados, así que los lectores de otros procesos nunca ven una entrada a medias.
+    """
+
+    TAMANO_INICIAL = 1 << 16
+    USADO = struct.Struct('<I')
+    VALOR = struct.Struct('<d')
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._posiciones = {}
+        self._fd = os.open(ruta, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.ftruncate(self._fd, self.TAMANO_INICIAL)
+        self._mmap = mmap.mmap(self._fd, self.TAMANO_INICIAL)
+        self._usado = 8
+        self.USADO.pack_into(self._mmap, 0, self._usado)
+
+    def _posicion(self, clave):
+        posicion = self._posiciones.get(clave)
+        if posicion is not None:
+            return posicion
+
+        codificada = json.dumps(clave, ensure_ascii=False).encode('utf-8')
+        largo_clave = 4 + len(codificada)
+        largo_clave += -largo_clave % 8
+        necesario = self._usado + largo_clave + self.VALOR.size
+        if necesario > len(self._mmap):
+            tamano = len(self._mmap)
+            while tamano < necesario:
+                tamano *= 2
+            os.ftruncate(self._fd, tamano)
+            self._mmap.close()
+            self._mmap = mmap.mmap(self._fd, tamano)
+
+        self.USADO.pack_into(self._mmap, self._usado, len(codificada))
+        inicio = self._usado + 4
+        self._mmap[inicio:inicio + len(codificada)] = codificada
+        posicion = self._usado + largo_clave
+        self.VALOR.pack_into(self._mmap, posicion, 0.0)
+        self._usado = posicion + self.VALOR.size
+        self.USADO.pack_into(self._mmap, 0, self._usado)
+        self._posiciones[clave] = posicion
+        return posicion
+
+    def sumar(self, *pares):
+        """Suma cada (clave, cantidad)"""
+        with self._lock:
+            for clave, cantidad in pares:
+                posicion = self._posicion(clave)
+                self.VALOR.pack_into(self._mmap, posicion, self.VALOR.unpack_from(self._mmap, posicion)[0] + cantidad)
+
+    def fijar(self, clave, valor):
+        with self._lock:
+            self.VALOR.pack_into(self._mmap, self._posicion(clave), float(valor))
+
+    def leer(self):
+        return leer_archivo_valores(self.ruta)
+
+
+def leer_archivo_valores(ruta):
+    """{clave: valor} de un archivo escrito por ArchivoValores (de cualquier proceso)"""
+    with open(ruta, 'rb') as f:
+        datos = f.read()
+    if len(datos) < 8:
+        return {}
+    usado = min(ArchivoValores.USADO.unpack_from(datos, 0)[0], len(datos))
+    valores = {}
+    posicion = 8
+    while posicion + 4 <= usado:
+        largo = ArchivoValores.USADO.unpack_from(datos, posicion)[0]
+        largo_clave = 4 + largo
+        largo_clave += -largo_clave % 8
+        if posicion + largo_clave + 8 > usado:
+            break
+        nombre, etiquetas, campo = json.loads(datos[posicion + 4:posicion + 4 + largo])
+        valores[(nombre, tuple(etiquetas), campo)] = ArchivoValores.VALOR.unpack_from(datos, posicion + largo_clave)[0]
+        posicion += largo_clave + 8
+    return valores
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def ruta_metricas_compartidas(identificador):
+    """Directorio de los archivos de métricas de una base de datos (CONVIVIR_METRICAS_DIR lo reemplaza)"""
+    ruta = os.environ.get('CONVIVIR_METRICAS_DIR')
+    if ruta:
+        return ruta
+    sufijo = hashlib.sha1(str(identificador).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f'convivir_metricas_{sufijo}')
+
+
+# ----------------------------------------------------------------------
+# Tipos de métricas
+# ----------------------------------------------------------------------
+
+class Histograma:
+    """Histograma acumulativo con etiquetas, compatible con el tipo histogram de Prometheus"""
+
+    tipo = 'histogram'
+
+    def __init__(self, nombre, descripcion, etiquetas=(), limites=LIMITES_LATENCIA):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.etiquetas = tuple(etiquetas)
+        self.limites = tuple(limites)
+        self.registro = None
+
+    def observar(self, valor, *valores_etiquetas):
+        """Registra una observación (en segundos para las latencias)"""
+        indice = bisect_left(self.limites, valor)
+        self.registro.valores().sumar(
+            ((self.nombre, valores_etiquetas, indice), 1),
+            ((self.nombre, valores_etiquetas, 'suma'), valor),
+            ((self.nombre, valores_etiquetas, 'conteo'), 1)
+        )
+
+    def _series(self, valores):
+        series = {}
+        for (etiquetas, campo), valor in valores.items():
+            series.setdefault(etiquetas, {})[campo] = valor
+        return series
+
+    def resumen(self):
+        """dict {etiquetas: (conteo, suma)} de todos los procesos, para reportes internos"""
+        series = self._series(self.registro.valores_agregados().get(self.nombre, {}))
+        return {clave: (int(serie.get('conteo', 0)), serie.get('suma', 0.0)) for clave, serie in series.items()}
+
+    def exportar(self, valores):
+        lineas = [f'# HELP {self.nombre} {self.descripcion}', f'# TYPE {self.nombre} histogram']
+        series = self._series(valores)
+
+        for clave in sorted(series):
+            serie = series[clave]
+            acumulado = 0
+            for indice, limite in enumerate(self.limites + (float('inf'),)):
+                acumulado += serie.get(indice, 0)
+                etiquetas = _formatear_etiquetas(self.etiquetas, clave, f'le="{_formatear_numero(limite)}"')
+                lineas.append(f'{self.nombre}_bucket{etiquetas} {_formatear_cantidad(acumulado)}')
+            etiquetas = _formatear_etiquetas(self.etiquetas, clave)
+            lineas.append(f'{self.nombre}_sum{etiquetas} {float(serie.get("suma", 0.0))}')
+            lineas.append(f'{self.nombre}_count{etiquetas} {_formatear_cantidad(serie.get("conteo", 0))}')
+        return lineas
+
+
+class Contador:
+    """Contador monótono con etiquetas"""
+
+    tipo = 'counter'
+
+    def __init__(self, nombre, descripcion, etiquetas=()):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.etiquetas = tuple(etiquetas)
+        self.registro = None
+
+    def incrementar(self, *valores_etiquetas, cantidad=1):
+        self.registro.valores().sumar(((self.nombre, valores_etiquetas, 'valor'), cantidad))
+
+    def exportar(self, valores):
+        lineas = [f'# HELP {self.nombre} {self.descripcion}', f'# TYPE {self.nombre} counter']
+        for (clave, _), valor in sorted(valores.items()):
+            lineas.append(f'{self.nombre}{_formatear_etiquetas(self.etiquetas, clave)} {_formatear_cantidad(valor)}')
+        return lineas
+
+
+class Indicador:
+    """
+    Valor instantáneo (gauge) calculado por una función en cada proceso
+
+    El registro lo muestrea y lo guarda con los demás valores del proceso; el
+    valor exportado es la suma de los procesos vivos.
+    """
+
+    tipo = 'gauge'
+
+    def __init__(self, nombre, descripcion, funcion):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.funcion = funcion
+        self.registro = None
+
+    def muestrear(self):
+        try:
+            valor = self.funcion()
+        except Exception:
+            return
+        self.registro.valores().fijar((self.nombre, (), 'valor'), valor)
+
+    def exportar(self, valores):
+        if not valores:
+            return []
+        return [f'# HELP {self.nombre} {self.descripcion}', f'# TYPE {self.nombre} gauge',
+                f'{self.nombre} {_formatear_cantidad(sum(valores.values()))}']
+
+
+class RegistroMetricas:
+    """
+    Colección de métricas de la aplicación
+
+    Sin directorio compartido los valores viven en la memoria del proceso; con
+    compartir(directorio) cada proceso usa su propio ArchivoValores y la
+    exportación suma los archivos de todos.
+    """
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+        self.directorio = None
+        self._valores = ValoresLocales()
+        self._pid_valores = os.getpid()
+        self._ultimo_muestreo = 0.0
+
+    def _registrar(self, metrica):
+        with self._lock:
+            existente = self._metricas.get(metrica.nombre)
+            if existente is not None:
+                return existente
+            metrica.registro = self
+            self._metricas[metrica.nombre] = metrica
+            return metrica
+
+    def compartir(self, directorio):
+        """
+        Guarda los valores de cada proceso en directorio/metricas_<pid>.db. Los
+        archivos de procesos que ya no existen (arranques anteriores) se eliminan.
+        """
+        if os.name != 'posix':
+            print("⚠️ Métricas compartidas solo en POSIX. /metrics reporta el proceso que responde.")
+            return
+        os.makedirs(directorio, exist_ok=True)
+        for nombre in os.listdir(directorio):
+            coincidencia = PATRON_ARCHIVO_VALORES.match(nombre)
+            if coincidencia and not _proceso_vivo(int(coincidencia.group(1))):
+                try:
+                    os.remove(os.path.join(directorio, nombre))
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            self.directorio = directorio
+            self._valores = None
+
+    def valores(self):
+        """Almacén de valores del proceso actual (tras un fork, el worker abre el suyo)"""
+        if self.directorio is None:
+            return self._valores
+        pid = os.getpid()
+        if self._valores is None or self._pid_valores != pid:
+            with self._lock:
+                if self._valores is None or self._pid_valores != pid:
+                    self._valores = ArchivoValores(os.path.join(self.directorio, f'metricas_{pid}.db'))
+                    self._pid_valores = pid
+        return self._valores
+
+    def muestrear(self, forzar=False):
+        """Guarda el valor actual de los indicadores de este proceso (como mucho una vez por INTERVALO_MUESTREO)"""
+        ahora = time.monotonic()
+        if not forzar and ahora - self._ultimo_muestreo < INTERVALO_MUESTREO:
+            return
+        self._ultimo_muestreo = ahora
+        with self._lock:
+            indicadores = [m for m in self._metricas.values() if isinstance(m, Indicador)]
+        for indicador in indicadores:
+            indicador.muestrear()
+
+    def valores_agregados(self):
+        """
+        {métrica: {(etiquetas, campo): valor}} sumados entre procesos. Los
+        indicadores solo cuentan los procesos vivos.
+        """
+        with self._lock:
+            indicadores = {n for n, m in self._metricas.items() if isinstance(m, Indicador)}
+
+        if self.directorio is None:
+            fuentes = [(True, self._valores.leer())]
+        else:
+            self.valores()
+            fuentes = []
+            for nombre in os.listdir(self.directorio):
+                coincidencia = PATRON_ARCHIVO_VALORES.match(nombre)
+                if not coincidencia:
+                    continue
+                pid = int(coincidencia.group(1))
+                try:
+                    valores = leer_archivo_valores(os.path.join(self.directorio, nombre))
+                except (FileNotFoundError, ValueError):
+                    continue
+                fuentes.append((pid == os.getpid() or _proceso_vivo(pid), valores))
+
+        agregados = {}
+        for vivo, valores in fuentes:
+            for (nombre, etiquetas, campo), valor in valores.items():
+                if nombre in indicadores and not vivo:
+                    continue
+                por_metrica = agregados.setdefault(nombre, {})
+                por_metrica[(etiquetas, campo)] = por_metrica.get((etiquetas, campo), 0.0) + valor
+        return agregados
+
+    def histograma(self, nombre, descripcion, etiquetas=(), limites=LIMITES_LATENCIA):
+        return self._registrar(Histograma(nombre, descripcion, etiquetas, limites))
+
+    def contador(self, nombre, descripcion, etiquetas=()):
+        return self._registrar(Contador(nombre, descripcion, etiquetas))
+
+    def indicador(self, nombre, descripcion, funcion):
+        return self._registrar(Indicador(nombre, descripcion, funcion))
+
+    def exportar_prometheus(self):
+        """Texto en formato de exposición Prometheus 0.0.4 (agregado entre procesos)"""
+        self.muestrear(forzar=True)
+        agregados = self.valores_agregados()
+        with self._lock:
+            metricas = list(self._metricas.values())
+        lineas = []
+        for metrica in metricas:
+            lineas.extend(metrica.exportar(agregados.get(metrica.nombre, {})))
+        return '\n'.join(lineas) + '\n'
+
+
+# Registro compartido por la aplicación y los módulos de análisis
+registro_metricas = RegistroMetricas()
+
+duracion_http = registro_metricas.histograma(
+    'convivir_http_request_duration_seconds',
+    'Latencia de las peticiones HTTP por ruta',
+    ('ruta', 'metodo', 'estado')
+)
+respuestas_con_error = registro_metricas.contador(
+    'convivir_http_respuestas_error_total',
+    'Respuestas 200 con {"exito": false} en el cuerpo',
+    ('ruta',)
+)
+duracion_etapa = registro_metricas.histograma(
+    'convivir_etapa_duration_seconds',
+    'Duración de cada etapa de los análisis de ML',
+    ('modulo', 'etapa')
+)
+duracion_sql = registro_metricas.histograma(
+    'convivir_sql_duration_seconds',
+    'Duración de las sentencias SQL por operación y tabla',
+    ('operacion', 'tabla')
+)
+
+
+@contextmanager
+def medir_etapa(modulo, etapa):
+    """
+    Mide un bloque de código como etapa de un análisis
+
+    Uso:
+        with medir_etapa('lstm', 'entrenamiento'):
+            modelo.fit(...)
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion_etapa.observar(time.perf_counter() - inicio, modulo, etapa)
+
+
+def clasificar_sentencia(statement):
+    """Retorna (operacion, tabla) de una sentencia SQL para etiquetar sus métricas"""
+    operacion = PATRON_OPERACION.match(statement)
+    tabla = PATRON_TABLA.search(statement)
+    return (
+        operacion.group(1).upper() if operacion else 'OTRA',
+        tabla.group(1).lower() if tabla else '-'
+    )
+
+
+def instrumentar_engine(engine):
+    """Registra la duración de cada sentencia ejecutada por el engine"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('inicio_sentencias', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        pila = conn.info.get('inicio_sentencias')
+        if not pila:
+            return
+        duracion = time.perf_counter() - pila.pop()
+        duracion_sql.observar(duracion, *clasificar_sentencia(statement))
+
+
+class InstrumentacionFlask:
+    """
+    Temporizador por petición para una aplicación Flask
+
+    Debe instalarse antes que CompresionRespuestas: los after_request se
+    ejecutan en orden inverso, así la medición incluye la compresión.
+    """
+
+    def __init__(self, app=None, excluir=('/metrics', '/api/eventos', '/static')):
+        self.excluir = tuple(excluir)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._iniciar)
+        app.after_request(self._registrar)
+
+    def _iniciar(self):
+        g._inicio_peticion = time.perf_counter()
+
+    def _registrar(self, respuesta):
+        registro_metricas.muestrear()
+        inicio = g.pop('_inicio_peticion', None)
+        if inicio is None or request.path.startswith(self.excluir):
+            return respuesta
+
+        # La regla (/api/analisis_predictivo/<curso_id>) mantiene acotada la cardinalidad
+        ruta = request.url_rule.rule if request.url_rule is not None else 'sin_ruta'
+        duracion_http.observar(time.perf_counter() - inicio, ruta, request.method, str(respuesta.status_code))
+
+        # Los errores de la API ({'exito': False, 'mensaje': ...}) son cuerpos pequeños
+        # que nunca alcanzan el tamaño mínimo de compresión; no se parsean respuestas grandes
+        if (respuesta.status_code == 200 and respuesta.is_json and not respuesta.is_streamed
+                and 'Content-Encoding' not in respuesta.headers
+                and (respuesta.content_length or 0) <= TAMANO_MAXIMO_ERROR):
+            cuerpo = respuesta.get_json(silent=True)
+            if isinstance(cuerpo, dict) and cuerpo.get('exito') is False:
+                respuestas_con_error.incrementar(ruta)
+
+        return respuesta
@@ -4,12 +4,26 @@ Analiza dinámicas sociales y detecta patrones de interacción
 """
 
 import numpy as np
-import pandas as pd
 import networkx as nx
 from collections import Counter
 import warnings
 warnings.filterwarnings('ignore')
 
+from eventos import publicar_progreso, nuevo_trabajo_id
+from metricas import medir_etapa
+
+
+# Peso de cada tipo de interacción (por unidad de intensidad); los negativos
+# son interacciones dañinas. Los tipos desconocidos pesan PESO_INTERACCION_DEFECTO
+PESOS_INTERACCION = {
+    'Amistad': 1.0,
+    'Colaboracion': 0.8,
+    'Apoyo': 1.2,
+    'Conflicto': -0.5,
+    'Bullying': -1.5
+}
+PESO_INTERACCION_DEFECTO = 0.5
+
 
 class AnalizadorRedesSociales:
     """
@@ -53,14 +67,7 @@ class AnalizadorRedesSociales:
             intensidad = interaccion.get('intensidad', 1)
             
             # Peso según tipo de interacción
-            peso_map = {
-                'Amistad': 1.0,
-                'Colaboracion': 0.8,
-                'Apoyo': 1.2,
-                'Conflicto': -0.5,
-                'Bullying': -1.5
-            }
-            peso = peso_map.get(tipo, 0.5) * intensidad
+            peso = PESOS_INTERACCION.get(tipo, PESO_INTERACCION_DEFECTO) * intensidad
             
             # Si la arista ya existe, acumular peso
             if self.grafo.has_edge(origen, destino):
@@ -310,45 +317,55 @@ class AnalizadorRedesSociales:
             return False
 
 
-def analizar_red_social_establecimiento(db_manager):
+def analizar_red_social_establecimiento(db_manager, trabajo_id=None):
     """
     Función de alto nivel para analizar la red social del establecimiento
     
     Args:
         db_manager: Instancia de DatabaseManager
+        trabajo_id: Identificador para el progreso publicado por /api/eventos
     
     Returns:
         dict con análisis completo
     """
+    trabajo_id = trabajo_id or nuevo_trabajo_id()
+    etapas = 6
+    
     # Obtener datos
-    df_interacciones = db_manager.obtener_grafo_social()
+    publicar_progreso(trabajo_id, 'red_social', 'datos', 1, etapas)
+    with medir_etapa('red_social', 'datos'):
+        df_interacciones = db_manager.obtener_grafo_social()
     
     if len(df_interacciones) == 0:
+        publicar_progreso(trabajo_id, 'red_social', 'error', mensaje='Sin interacciones')
         return {
             'exito': False,
             'mensaje': 'No hay interacciones registradas para analizar'
         }
     
-    # Obtener estudiantes usando el método del DatabaseManager
-    from database import Estudiante
-    estudiantes = db_manager.session.query(Estudiante).all()
-    
-    df_estudiantes = pd.DataFrame([
-        {'estudiante_id': e.estudiante_id, 'curso_id': e.curso_id, 'genero': e.genero, 'edad': e.edad}
-        for e in estudiantes
-    ]) if estudiantes else None
+    # Atributos de los nodos (proyección de columnas, sin objetos ORM)
+    from acceso_caracteristicas import atributos_estudiantes
+    df_estudiantes = atributos_estudiantes(db_manager.engine)
+    if len(df_estudiantes) == 0:
+        df_estudiantes = None
     
     # Crear analizador
     analizador = AnalizadorRedesSociales()
     
     # Construir grafo
-    analizador.construir_grafo(df_interacciones, df_estudiantes)
+    publicar_progreso(trabajo_id, 'red_social', 'construccion_grafo', 2, etapas)
+    with medir_etapa('red_social', 'construccion_grafo'):
+        analizador.construir_grafo(df_interacciones, df_estudiantes)
     
     # Calcular métricas
-    metricas = analizador.calcular_metricas_centralidad()
+    publicar_progreso(trabajo_id, 'red_social', 'centralidad', 3, etapas)
+    with medir_etapa('red_social', 'centralidad'):
+        metricas = analizador.calcular_metricas_centralidad()
     
     # Detectar comunidades
-    comunidades = analizador.detectar_comunidades()
+    publicar_progreso(trabajo_id, 'red_social', 'comunidades', 4, etapas)
+    with medir_etapa('red_social', 'comunidades'):
+        comunidades = analizador.detectar_comunidades()
     
     # Identificar estudiantes aislados
     aislados = analizador.identificar_estudiantes_aislados(umbral_conexiones=2)
@@ -357,39 +374,47 @@ def analizar_red_social_establecimiento(db_manager):
     lideres = analizador.identificar_lideres(top_n=10)
     
     # Analizar bullying
-    analisis_bullying = analizador.analizar_patrones_bullying()
+    publicar_progreso(trabajo_id, 'red_social', 'patrones_bullying', 5, etapas)
+    with medir_etapa('red_social', 'patrones_bullying'):
+        analisis_bullying = analizador.analizar_patrones_bullying()
     
     # Generar reporte
     reporte_general = analizador.generar_reporte_red()
     
     # Generar alertas para estudiantes aislados
+    alertas = []
     for estudiante in aislados[:5]:  # Top 5 más aislados
         mensaje = f"El estudiante {estudiante['estudiante_id']} presenta aislamiento social con solo {estudiante['conexiones']} conexiones."
         recomendacion = "Se recomienda actividades de integración grupal y seguimiento psicosocial."
         
-        db_manager.crear_alerta(
-            tipo_alerta='social',
-            nivel_prioridad='media',
-            mensaje=mensaje,
-            recomendacion=recomendacion,
-            estudiante_id=estudiante['estudiante_id']
-        )
+        alertas.append({
+            'tipo_alerta': 'social',
+            'nivel_prioridad': 'media',
+            'mensaje': mensaje,
+            'recomendacion': recomendacion,
+            'estudiante_id': estudiante['estudiante_id']
+        })
     
     # Generar alertas para víctimas de bullying
     for victima in analisis_bullying.get('victimas_recurrentes', [])[:5]:
         mensaje = f"El estudiante {victima['estudiante_id']} ha sido víctima de bullying en {victima['veces_victima']} ocasiones."
         recomendacion = "Se requiere intervención inmediata. Contactar a familia y equipo de convivencia."
         
-        db_manager.crear_alerta(
-            tipo_alerta='social',
-            nivel_prioridad='crítica',
-            mensaje=mensaje,
-            recomendacion=recomendacion,
-            estudiante_id=victima['estudiante_id']
-        )
+        alertas.append({
+            'tipo_alerta': 'social',
+            'nivel_prioridad': 'crítica',
+            'mensaje': mensaje,
+            'recomendacion': recomendacion,
+            'estudiante_id': victima['estudiante_id']
+        })
+    
+    db_manager.crear_alertas(alertas)
+    
+    publicar_progreso(trabajo_id, 'red_social', 'completado', etapas, etapas)
     
     return {
         'exito': True,
+        'trabajo_id': trabajo_id,
         'grafo': analizador.grafo,  # Agregar el grafo NetworkX
         'reporte_general': reporte_general,
         'estudiantes_aislados': aislados,
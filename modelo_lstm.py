@@ -10,11 +10,14 @@ from sklearn.model_selection import train_test_split
 import warnings
 warnings.filterwarnings('ignore')
 
+from eventos import publicar_progreso, nuevo_trabajo_id
+from metricas import medir_etapa
+
 try:
     from tensorflow import keras
     from tensorflow.keras.models import Sequential
     from tensorflow.keras.layers import LSTM, Dense, Dropout
-    from tensorflow.keras.callbacks import EarlyStopping
+    from tensorflow.keras.callbacks import EarlyStopping, LambdaCallback
     TENSORFLOW_AVAILABLE = True
 except ImportError:
     TENSORFLOW_AVAILABLE = False
@@ -39,13 +42,15 @@ class ModeloLSTMPredictor:
         self.feature_names = []
         self.entrenado = False
     
-    def preparar_secuencias(self, data, target_col):
+    def preparar_secuencias(self, data, target_col, rango=None):
         """
         Prepara secuencias de datos para LSTM
         
         Args:
             data: DataFrame con series temporales
             target_col: Columna objetivo a predecir
+            rango: (mínimos, máximos) precalculados por característica; evita
+                   recorrer los datos para ajustar el escalador
         
         Returns:
             X, y: Arrays de secuencias de entrada y salida
@@ -55,7 +60,12 @@ class ModeloLSTMPredictor:
         self.feature_names = feature_cols
         
         # Normalizar datos
-        scaled_data = self.scaler.fit_transform(data[feature_cols])
+        if rango is not None and rango[0] is not None:
+            # Ajustar con las dos filas mínimo/máximo da los mismos parámetros que con la serie completa
+            self.scaler.fit(pd.DataFrame(np.vstack(rango), columns=feature_cols))
+            scaled_data = self.scaler.transform(data[feature_cols])
+        else:
+            scaled_data = self.scaler.fit_transform(data[feature_cols])
         
         X, y = [], []
         
@@ -87,7 +97,7 @@ class ModeloLSTMPredictor:
         model.compile(optimizer='adam', loss='mse', metrics=['mae'])
         return model
     
-    def entrenar(self, data, target_col='clima_escolar', epochs=50, validation_split=0.2):
+    def entrenar(self, data, target_col='clima_escolar', epochs=50, validation_split=0.2, trabajo_id=None, rango=None):
         """
         Entrena el modelo LSTM
         
@@ -96,6 +106,8 @@ class ModeloLSTMPredictor:
             target_col: Columna objetivo a predecir
             epochs: Número de épocas de entrenamiento
             validation_split: Proporción de datos para validación
+            trabajo_id: Si se indica, publica el avance por época en el bus de eventos
+            rango: (mínimos, máximos) precalculados por característica (ver AlmacenSeries)
         
         Returns:
             dict con métricas de entrenamiento
@@ -108,7 +120,8 @@ class ModeloLSTMPredictor:
         
         try:
             # Preparar datos
-            X, y = self.preparar_secuencias(data, target_col)
+            with medir_etapa('lstm', 'escalado'):
+                X, y = self.preparar_secuencias(data, target_col, rango=rango)
             
             if len(X) < 10:
                 return {
@@ -124,16 +137,26 @@ class ModeloLSTMPredictor:
             
             # Callbacks
             early_stop = EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True)
+            callbacks = [early_stop]
+            
+            if trabajo_id is not None:
+                callbacks.append(LambdaCallback(
+                    on_epoch_end=lambda epoch, logs: publicar_progreso(
+                        trabajo_id, 'lstm', 'entrenamiento', epoch + 1, epochs,
+                        loss=float(logs.get('loss', 0)), val_loss=float(logs.get('val_loss', 0))
+                    )
+                ))
             
             # Entrenar
-            history = self.model.fit(
-                X_train, y_train,
-                epochs=epochs,
-                batch_size=16,
-                validation_data=(X_val, y_val),
-                callbacks=[early_stop],
-                verbose=0
-            )
+            with medir_etapa('lstm', 'entrenamiento'):
+                history = self.model.fit(
+                    X_train, y_train,
+                    epochs=epochs,
+                    batch_size=16,
+                    validation_data=(X_val, y_val),
+                    callbacks=callbacks,
+                    verbose=0
+                )
             
             self.entrenado = True
             
@@ -285,7 +308,7 @@ class ModeloLSTMPredictor:
         }
 
 
-def predecir_riesgo_curso(db_manager, curso_id, horizonte_semanas=4):
+def predecir_riesgo_curso(db_manager, curso_id, horizonte_semanas=4, trabajo_id=None, almacen=None):
     """
     Función de alto nivel para predecir el riesgo de un curso
     
@@ -293,14 +316,26 @@ def predecir_riesgo_curso(db_manager, curso_id, horizonte_semanas=4):
         db_manager: Instancia de DatabaseManager
         curso_id: ID del curso a analizar
         horizonte_semanas: Número de semanas a predecir
+        trabajo_id: Identificador para el progreso publicado por /api/eventos
+        almacen: AlmacenSeries opcional; la serie y su rango se leen de memoria
     
     Returns:
         dict con predicciones y análisis
     """
+    trabajo_id = trabajo_id or nuevo_trabajo_id()
+    
     # Obtener datos históricos
-    data = db_manager.obtener_series_temporales_curso(curso_id)
+    publicar_progreso(trabajo_id, 'lstm', 'datos', curso_id=curso_id)
+    rango = None
+    with medir_etapa('lstm', 'datos'):
+        if almacen is not None:
+            data = almacen.dataframe(curso_id)
+            rango = almacen.rango(curso_id)
+        else:
+            data = db_manager.obtener_series_temporales_curso(curso_id)
     
     if len(data) < 8:
+        publicar_progreso(trabajo_id, 'lstm', 'error', mensaje='Datos insuficientes')
         return {
             'exito': False,
             'mensaje': f'Datos insuficientes para el curso {curso_id}. Se necesitan al menos 8 registros temporales.'
@@ -310,13 +345,16 @@ def predecir_riesgo_curso(db_manager, curso_id, horizonte_semanas=4):
     modelo = ModeloLSTMPredictor(sequence_length=4, horizonte_prediccion=horizonte_semanas)
     
     # Entrenar para clima escolar
-    resultado_entrenamiento = modelo.entrenar(data, target_col='clima_escolar', epochs=50)
+    resultado_entrenamiento = modelo.entrenar(data, target_col='clima_escolar', epochs=50, trabajo_id=trabajo_id, rango=rango)
     
     if not resultado_entrenamiento['exito']:
+        publicar_progreso(trabajo_id, 'lstm', 'error', mensaje=resultado_entrenamiento['mensaje'])
         return resultado_entrenamiento
     
     # Realizar predicción
-    prediccion = modelo.predecir(data, target_col='clima_escolar')
+    publicar_progreso(trabajo_id, 'lstm', 'prediccion')
+    with medir_etapa('lstm', 'inferencia'):
+        prediccion = modelo.predecir(data, target_col='clima_escolar')
     
     if not prediccion['exito']:
         return prediccion
@@ -355,8 +393,11 @@ def predecir_riesgo_curso(db_manager, curso_id, horizonte_semanas=4):
             curso_id=curso_id
         )
     
+    publicar_progreso(trabajo_id, 'lstm', 'completado')
+    
     return {
         'exito': True,
+        'trabajo_id': trabajo_id,
         'curso_id': curso_id,
         'predicciones': prediccion,
         'analisis_tendencia': analisis_tendencia,
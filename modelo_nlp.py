@@ -3,13 +3,19 @@ Módulo de Análisis NLP Avanzado con Transformers
 Análisis de sentimientos mejorado para comentarios de estudiantes
 """
 
+import os
 import numpy as np
 import pandas as pd
 from collections import Counter
-import re
+import threading
 import warnings
 warnings.filterwarnings('ignore')
 
+from eventos import publicar_progreso, nuevo_trabajo_id
+from metricas import medir_etapa
+from motor_palabras_clave import MotorPalabrasClave
+from modelo_temas import descubrir_temas
+
 # Intentar importar transformers
 try:
     from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
@@ -18,31 +24,84 @@ except ImportError:
     TRANSFORMERS_AVAILABLE = False
     print("⚠️ Transformers no disponible. Usando análisis basado en reglas.")
 
+from sentimiento_onnx import ONNXRUNTIME_AVAILABLE, obtener_clasificador
+
+
+MODELO_SENTIMIENTO = "finiteautomata/beto-sentiment-analysis"
+
+# 'torch' (pipeline de transformers) u 'onnx' (modelo cuantizado int8, ver sentimiento_onnx.py)
+BACKEND_SENTIMIENTO = os.environ.get('CONVIVIR_NLP_BACKEND', 'torch').lower()
+
+# Mapeo de etiquetas (pueden variar según el modelo)
+ETIQUETAS_SENTIMIENTO = {
+    'POS': 'positivo',
+    'NEG': 'negativo',
+    'NEU': 'neutral',
+    'POSITIVE': 'positivo',
+    'NEGATIVE': 'negativo',
+    'NEUTRAL': 'neutral'
+}
+
+# Pipeline compartido por todas las peticiones del proceso. Si se carga antes del
+# fork (preload_app de gunicorn), los workers comparten sus pesos copy-on-write.
+_pipeline_sentimiento = None
+_lock_pipeline = threading.Lock()
+
+
+def obtener_pipeline_sentimiento(backend=None):
+    """
+    Retorna el clasificador de sentimientos del proceso, cargándolo la primera vez
+    (None si no está disponible)
+
+    Args:
+        backend: 'torch' u 'onnx' (por defecto CONVIVIR_NLP_BACKEND). Si el modelo
+            ONNX no se puede preparar se usa el pipeline de torch.
+    """
+    global _pipeline_sentimiento
+    if not TRANSFORMERS_AVAILABLE:
+        return None
+    
+    if (backend or BACKEND_SENTIMIENTO) == 'onnx':
+        if ONNXRUNTIME_AVAILABLE:
+            try:
+                return obtener_clasificador(MODELO_SENTIMIENTO)
+            except Exception as e:
+                print(f"⚠️ Error al preparar el modelo ONNX: {e}. Usando PyTorch.")
+        else:
+            print("⚠️ Backend ONNX solicitado sin onnxruntime. Usando PyTorch.")
+    
+    if _pipeline_sentimiento is None:
+        with _lock_pipeline:
+            if _pipeline_sentimiento is None:
+                # Opciones: 'pysentimiento/robertuito-sentiment-analysis', 'finiteautomata/beto-sentiment-analysis'
+                _pipeline_sentimiento = pipeline(
+                    "sentiment-analysis",
+                    model=MODELO_SENTIMIENTO,
+                    truncation=True,
+                    max_length=512
+                )
+                print("✅ Modelo transformer cargado exitosamente")
+    return _pipeline_sentimiento
+
 
 class AnalizadorNLPAvanzado:
     """
     Analizador de sentimientos avanzado con soporte para modelos transformer
     """
     
-    def __init__(self, usar_transformer=True):
+    def __init__(self, usar_transformer=True, backend=None):
         """
         Args:
             usar_transformer: Si True, intenta usar modelos transformer. Si False o no disponible, usa reglas.
+            backend: 'torch' u 'onnx' para el transformer (por defecto CONVIVIR_NLP_BACKEND)
         """
         self.usar_transformer = usar_transformer and TRANSFORMERS_AVAILABLE
         self.sentiment_pipeline = None
         
         if self.usar_transformer:
             try:
-                # Intentar cargar modelo en español
-                # Opciones: 'pysentimiento/robertuito-sentiment-analysis', 'finiteautomata/beto-sentiment-analysis'
-                self.sentiment_pipeline = pipeline(
-                    "sentiment-analysis",
-                    model="finiteautomata/beto-sentiment-analysis",
-                    truncation=True,
-                    max_length=512
-                )
-                print("✅ Modelo transformer cargado exitosamente")
+                # Modelo en español, cargado una sola vez por proceso
+                self.sentiment_pipeline = obtener_pipeline_sentimiento(backend)
             except Exception as e:
                 print(f"⚠️ Error al cargar transformer: {e}. Usando análisis basado en reglas.")
                 self.usar_transformer = False
@@ -61,15 +120,25 @@ class AnalizadorNLPAvanzado:
             'odio', 'enojo', 'frustrado', 'preocupado', 'estresado'
         }
         
+        # Palabras completas sin distinguir acentos; 'x*' cubre las formas que empiezan con x
         self.temas_keywords = {
-            'bullying': ['bullying', 'acoso', 'molestan', 'insultan', 'burlan', 'amenaza'],
-            'violencia': ['violencia', 'pelea', 'golpe', 'agresión', 'física'],
+            'bullying': ['bullying', 'acoso', 'molest*', 'insult*', 'burlan', 'amenaz*'],
+            'violencia': ['violencia', 'pelea', 'golpe*', 'agresión', 'física'],
             'discriminación': ['discriminación', 'racismo', 'exclusión', 'rechazo'],
             'clima_escolar': ['ambiente', 'clima', 'escuela', 'colegio', 'institución'],
             'relaciones': ['amigos', 'compañeros', 'relación', 'grupo', 'amistad'],
             'emociones': ['siento', 'emoción', 'feliz', 'triste', 'miedo', 'ansiedad'],
             'apoyo_docente': ['profesor', 'docente', 'maestro', 'apoyo', 'ayuda']
         }
+        
+        # Un solo motor compilado con los léxicos de sentimiento y de temas: cada
+        # lote de comentarios se recorre una vez. Los términos negados ("no me
+        # siento seguro") cuentan para la polaridad opuesta.
+        self.motor_reglas = MotorPalabrasClave({
+            'positivo': self.palabras_positivas,
+            'negativo': self.palabras_negativas,
+            **self.temas_keywords
+        })
     
     def analizar_sentimiento(self, texto):
         """
@@ -95,17 +164,7 @@ class AnalizadorNLPAvanzado:
                 # Análisis con transformer
                 resultado = self.sentiment_pipeline(texto[:512])[0]  # Limitar longitud
                 
-                # Mapear etiquetas (pueden variar según el modelo)
-                label_map = {
-                    'POS': 'positivo',
-                    'NEG': 'negativo',
-                    'NEU': 'neutral',
-                    'POSITIVE': 'positivo',
-                    'NEGATIVE': 'negativo',
-                    'NEUTRAL': 'neutral'
-                }
-                
-                sentimiento = label_map.get(resultado['label'].upper(), 'neutral')
+                sentimiento = ETIQUETAS_SENTIMIENTO.get(resultado['label'].upper(), 'neutral')
                 confianza = resultado['score']
                 
                 return {
@@ -125,29 +184,36 @@ class AnalizadorNLPAvanzado:
     
     def _analizar_con_reglas(self, texto):
         """Análisis de sentimientos basado en reglas y palabras clave"""
-        palabras = set(re.findall(r'\b\w+\b', texto.lower()))
-        
-        # Contar palabras positivas y negativas
-        count_pos = len(palabras & self.palabras_positivas)
-        count_neg = len(palabras & self.palabras_negativas)
-        
-        # Determinar sentimiento
-        if count_pos > count_neg:
-            sentimiento = 'positivo'
-            confianza = min(0.6 + (count_pos - count_neg) * 0.1, 0.95)
-        elif count_neg > count_pos:
-            sentimiento = 'negativo'
-            confianza = min(0.6 + (count_neg - count_pos) * 0.1, 0.95)
-        else:
-            sentimiento = 'neutral'
-            confianza = 0.5
-        
+        sentimientos, confianzas = self._sentimientos_reglas(*self.motor_reglas.puntuar([texto]))
         return {
-            'sentimiento': sentimiento,
-            'confianza': float(confianza),
+            'sentimiento': str(sentimientos[0]),
+            'confianza': float(confianzas[0]),
             'metodo': 'reglas'
         }
     
+    def _sentimientos_reglas(self, afirmados, negados):
+        """Sentimiento y confianza de cada texto a partir de los puntajes del motor"""
+        # Un término negado cuenta para la polaridad opuesta
+        pos = afirmados[:, 0] + negados[:, 1]
+        neg = afirmados[:, 1] + negados[:, 0]
+        diferencia = np.abs(pos - neg)
+        
+        sentimientos = np.where(pos > neg, 'positivo', np.where(neg > pos, 'negativo', 'neutral'))
+        confianzas = np.where(pos == neg, 0.5, np.minimum(0.6 + diferencia * 0.1, 0.95))
+        return sentimientos, confianzas
+    
+    def _temas_desde_puntajes(self, afirmados, negados):
+        # Las columnas de temas siguen a 'positivo' y 'negativo'
+        presentes = (afirmados[:, 2:] + negados[:, 2:]) > 0
+        nombres = self.motor_reglas.categorias[2:]
+        # Cada combinación de temas se arma una sola vez (máscara de bits por fila)
+        mascaras = presentes @ (1 << np.arange(len(nombres), dtype=np.int64))
+        combinaciones = {
+            mascara: [nombre for j, nombre in enumerate(nombres) if mascara >> j & 1] or ['general']
+            for mascara in np.unique(mascaras).tolist()
+        }
+        return [list(combinaciones[mascara]) for mascara in mascaras.tolist()]
+    
     def extraer_temas(self, texto):
         """
         Extrae temas principales del texto
@@ -155,50 +221,76 @@ class AnalizadorNLPAvanzado:
         Returns:
             list de temas detectados
         """
-        texto = str(texto).lower()
-        temas_detectados = []
+        return self.extraer_temas_lote([texto])[0]
+    
+    def extraer_temas_lote(self, textos):
+        """Temas de cada texto de una secuencia, en una sola pasada del motor"""
+        return self._temas_desde_puntajes(*self.motor_reglas.puntuar(textos))
+    
+    def analizar_reglas_lote(self, textos):
+        """
+        Sentimiento por reglas y temas de una secuencia completa de textos
+        (por ejemplo, toda la tabla comentarios) en una llamada: una pasada del
+        motor, productos de matrices dispersas y operaciones de NumPy
         
-        for tema, keywords in self.temas_keywords.items():
-            for keyword in keywords:
-                if keyword in texto:
-                    temas_detectados.append(tema)
-                    break
+        Returns:
+            DataFrame con sentimiento, confianza, metodo, temas y tema_principal
+            (una fila por texto, en el mismo orden)
+        """
+        textos = pd.Series(list(textos) if not isinstance(textos, pd.Series) else textos.to_numpy(), dtype=object)
+        afirmados, negados = self.motor_reglas.puntuar(textos.tolist())
+        sentimientos, confianzas = self._sentimientos_reglas(afirmados, negados)
+        temas = self._temas_desde_puntajes(afirmados, negados)
         
-        return temas_detectados if temas_detectados else ['general']
+        vacios = textos.fillna('').astype(str).str.strip().eq('').to_numpy()
+        return pd.DataFrame({
+            'sentimiento': np.where(vacios, 'neutral', sentimientos),
+            'confianza': np.where(vacios, 0.0, confianzas),
+            'metodo': np.where(vacios, 'texto_vacio', 'reglas'),
+            'temas': temas,
+            'tema_principal': [t[0] for t in temas]
+        })
     
-    def analizar_comentarios_batch(self, df_comentarios):
+    def analizar_comentarios_batch(self, df_comentarios, trabajo_id=None):
         """
         Analiza un lote de comentarios
         
         Args:
             df_comentarios: DataFrame con columna 'texto'
+            trabajo_id: Si se indica, publica el avance en el bus de eventos
         
         Returns:
             DataFrame con análisis agregado
         """
-        resultados = []
+        total = len(df_comentarios)
+        if 'texto' in df_comentarios:
+            textos = df_comentarios['texto']
+        elif 'comentario_texto' in df_comentarios:
+            textos = df_comentarios['comentario_texto']
+        else:
+            textos = pd.Series('', index=df_comentarios.index)
         
-        for idx, row in df_comentarios.iterrows():
-            texto = row.get('texto', row.get('comentario_texto', ''))
-            
-            # Analizar sentimiento
-            analisis_sent = self.analizar_sentimiento(texto)
-            
-            # Extraer temas
-            temas = self.extraer_temas(texto)
-            
-            resultados.append({
-                'id': row.get('id', idx),
-                'estudiante_id': row.get('estudiante_id', None),
-                'texto': texto,
-                'sentimiento': analisis_sent['sentimiento'],
-                'confianza': analisis_sent['confianza'],
-                'metodo': analisis_sent['metodo'],
-                'temas': temas,
-                'tema_principal': temas[0] if temas else 'general'
-            })
+        # Reglas y temas de todo el lote en una llamada
+        analisis = self.analizar_reglas_lote(textos)
+        
+        if self.usar_transformer and self.sentiment_pipeline:
+            # Publicar cerca de 20 actualizaciones por lote, sin importar su tamaño
+            paso = max(total // 20, 1)
+            transformer = []
+            for texto in textos:
+                transformer.append(self.analizar_sentimiento(texto))
+                if len(transformer) % paso == 0 or len(transformer) == total:
+                    publicar_progreso(trabajo_id, 'nlp', 'clasificacion', len(transformer), total)
+            analisis['sentimiento'] = [a['sentimiento'] for a in transformer]
+            analisis['confianza'] = [float(a['confianza']) for a in transformer]
+            analisis['metodo'] = [a['metodo'] for a in transformer]
+        else:
+            publicar_progreso(trabajo_id, 'nlp', 'clasificacion', total, total)
         
-        return pd.DataFrame(resultados)
+        analisis.insert(0, 'id', df_comentarios['id'].to_numpy() if 'id' in df_comentarios else df_comentarios.index.to_numpy())
+        analisis.insert(1, 'estudiante_id', df_comentarios['estudiante_id'].to_numpy() if 'estudiante_id' in df_comentarios else None)
+        analisis.insert(2, 'texto', textos.to_numpy())
+        return analisis
     
     def generar_reporte_sentimientos(self, df_resultados):
         """
@@ -269,33 +361,55 @@ class AnalizadorNLPAvanzado:
         return en_riesgo.reset_index()
 
 
-def analizar_sentimientos_establecimiento(db_manager):
+def analizar_sentimientos_establecimiento(db_manager, trabajo_id=None):
     """
     Función de alto nivel para analizar sentimientos de todo el establecimiento
     
     Args:
         db_manager: Instancia de DatabaseManager
+        trabajo_id: Identificador para el progreso publicado por /api/eventos
     
     Returns:
         dict con análisis completo
     """
+    trabajo_id = trabajo_id or nuevo_trabajo_id()
+    
     # Obtener comentarios
-    df_comentarios = db_manager.obtener_comentarios_para_nlp()
+    publicar_progreso(trabajo_id, 'nlp', 'datos')
+    with medir_etapa('nlp', 'datos'):
+        df_comentarios = db_manager.obtener_comentarios_para_nlp()
     
     if len(df_comentarios) == 0:
+        publicar_progreso(trabajo_id, 'nlp', 'error', mensaje='Sin comentarios')
         return {
             'exito': False,
             'mensaje': 'No hay comentarios disponibles para analizar'
         }
     
     # Crear analizador
-    analizador = AnalizadorNLPAvanzado(usar_transformer=True)
+    publicar_progreso(trabajo_id, 'nlp', 'carga_modelo')
+    with medir_etapa('nlp', 'carga_modelo'):
+        analizador = AnalizadorNLPAvanzado(usar_transformer=True)
     
     # Analizar comentarios
-    df_resultados = analizador.analizar_comentarios_batch(df_comentarios)
+    with medir_etapa('nlp', 'inferencia'):
+        df_resultados = analizador.analizar_comentarios_batch(df_comentarios, trabajo_id=trabajo_id)
+    
+    # Temas descubiertos: el modelo incorpora solo los comentarios nuevos y
+    # asigna un tema a todos en una transformación
+    publicar_progreso(trabajo_id, 'nlp', 'temas')
+    with medir_etapa('nlp', 'temas'):
+        try:
+            asignacion_temas, temas_descubiertos = descubrir_temas(df_comentarios)
+        except Exception as e:
+            print(f"⚠️ Error en el modelo de temas: {e}")
+            asignacion_temas, temas_descubiertos = None, []
+    if asignacion_temas is not None:
+        df_resultados['tema_descubierto'] = asignacion_temas['etiqueta'].to_numpy()
     
     # Generar reporte
     reporte = analizador.generar_reporte_sentimientos(df_resultados)
+    reporte['temas_descubiertos'] = temas_descubiertos
     
     # Identificar estudiantes en riesgo
     estudiantes_riesgo = analizador.identificar_estudiantes_riesgo(df_resultados, umbral_negativos=2)
@@ -303,21 +417,26 @@ def analizar_sentimientos_establecimiento(db_manager):
     # Actualizar base de datos con resultados
     # (Implementación simplificada - los resultados ya están en df_resultados)
     
-    # Generar alertas para estudiantes en riesgo
+    # Generar alertas para estudiantes en riesgo (una sola transacción)
+    alertas = []
     for _, estudiante in estudiantes_riesgo.iterrows():
         mensaje = f"El estudiante {estudiante['estudiante_id']} ha tenido {estudiante['comentarios_negativos']} comentarios con sentimiento negativo."
         recomendacion = f"Se recomienda entrevista individual. Temas detectados: {', '.join(estudiante['temas'][:3])}"
         
-        db_manager.crear_alerta(
-            tipo_alerta='sentimiento',
-            nivel_prioridad='alta' if estudiante['comentarios_negativos'] >= 3 else 'media',
-            mensaje=mensaje,
-            recomendacion=recomendacion,
-            estudiante_id=estudiante['estudiante_id']
-        )
+        alertas.append({
+            'tipo_alerta': 'sentimiento',
+            'nivel_prioridad': 'alta' if estudiante['comentarios_negativos'] >= 3 else 'media',
+            'mensaje': mensaje,
+            'recomendacion': recomendacion,
+            'estudiante_id': estudiante['estudiante_id']
+        })
+    db_manager.crear_alertas(alertas)
+    
+    publicar_progreso(trabajo_id, 'nlp', 'completado')
     
     return {
         'exito': True,
+        'trabajo_id': trabajo_id,
         'reporte_general': reporte,
         'estudiantes_en_riesgo': estudiantes_riesgo.to_dict('records'),
         'total_estudiantes_riesgo': len(estudiantes_riesgo),
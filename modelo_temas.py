@@ -0,0 +1,547 @@
+"""
+Módulo de Descubrimiento de Temas para CONVIVIR v4.0
+Temas no supervisados sobre los comentarios de estudiantes, complementarios a los
+temas fijos de temas_keywords: una inquietud nueva (por ejemplo, acoso en una
+aplicación concreta) aparece como tema propio sin agregarla a un diccionario
+
+- TF-IDF incremental: las palabras se proyectan con FeatureHasher (sin
+  vocabulario que reentrenar) y las frecuencias de documento se acumulan con
+  cada lote, de modo que el IDF se mantiene sin recorrer el histórico
+- MiniBatchNMF: el primer ajuste usa todos los comentarios disponibles; después
+  cada lote de comentarios nuevos se incorpora con partial_fit y el factor de
+  olvido da más peso a lo reciente
+- El estado (modelo, frecuencias, palabras vistas y último comentario
+  incorporado) se guarda en disco y lo comparten los workers
+- Se guarda además la huella (CRC32) del texto de cada comentario incorporado
+  y una suma de control acumulada (cantidad y Σ id · largo del texto): si la
+  suma de los comentarios ya vistos coincide no se recalcula nada; si difiere se
+  comparan las huellas y, si la base se vació o se reimportó y los ids se
+  reutilizan con otros textos, el modelo se reinicia en vez de ignorarlos
+- La asignación de temas a todos los comentarios es una sola transformación
+  dispersa; ningún paso reentrena sobre el corpus completo
+
+Variables de entorno:
+    CONVIVIR_TEMAS_DIR     Directorio del estado del modelo (modelos_temas/)
+    CONVIVIR_TEMAS_N       Cantidad de temas (10 por defecto)
+
+Uso:
+    python modelo_temas.py actualizar
+    python modelo_temas.py temas --palabras 8
+"""
+
+import os
+import re
+import zlib
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.decomposition import MiniBatchNMF
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.preprocessing import normalize
+
+from motor_palabras_clave import NEGADORES, normalizar_texto
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+ARCHIVO_ESTADO = 'modelo_temas.joblib'
+VERSION_ESTADO = 1
+
+# Palabras de 3 o más letras, ya normalizadas sin acentos
+PALABRA_TEMA = re.compile(r'\b[^\W\d_]{3,}\b')
+
+PALABRAS_VACIAS = frozenset(NEGADORES) | frozenset((
+    'que', 'los', 'las', 'del', 'por', 'para', 'con', 'una', 'uno', 'unos', 'unas',
+    'como', 'mas', 'pero', 'sus', 'les', 'muy', 'ese', 'esa', 'eso', 'esos', 'esas',
+    'este', 'esta', 'esto', 'estos', 'estas', 'ante', 'entre', 'hasta', 'desde',
+    'sobre', 'tras', 'cuando', 'donde', 'porque', 'tambien', 'todo', 'toda', 'todos',
+    'todas', 'hay', 'han', 'has', 'hemos', 'fue', 'son', 'ser', 'era', 'eran', 'estar',
+    'estan', 'estoy', 'estamos', 'tiene', 'tienen', 'tengo', 'hace', 'hacen',
+    'mucho', 'mucha', 'muchos', 'muchas', 'poco', 'otro', 'otra', 'otros', 'otras',
+    'algo', 'alguien', 'algunos', 'algunas', 'cada', 'mismo', 'misma', 'ya', 'aun',
+    'asi', 'solo', 'bien', 'mal', 'vez', 'veces', 'siempre', 'ahora', 'entonces',
+    'aqui', 'alli', 'mis', 'nos', 'nuestro', 'nuestra', 'ellos', 'ellas', 'usted',
+    'ustedes', 'ella', 'hoy', 'dia', 'dias', 'semana', 'curso', 'estudiante',
+    'estudiantes', 'alumno', 'alumna', 'alumnos'
+))
+
+
+def directorio_por_defecto():
+    """Directorio del estado del modelo: CONVIVIR_TEMAS_DIR o modelos_temas/"""
+    if os.environ.get('CONVIVIR_TEMAS_DIR'):
+        return os.environ['CONVIVIR_TEMAS_DIR']
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modelos_temas')
+
+
+def huellas_textos(textos):
+    """CRC32 (uint32) del texto de cada comentario, 0 si es nulo"""
+    return np.fromiter(
+        (zlib.crc32(texto.encode('utf-8')) if isinstance(texto, str) else 0 for texto in textos),
+        dtype=np.uint32, count=len(textos)
+    )
+
+
+def control_comentarios(df_comentarios):
+    """(cantidad, Σ id · largo del texto) de un DataFrame con 'id' y 'texto'"""
+    largos = df_comentarios['texto'].str.len().fillna(0).to_numpy(dtype=np.int64)
+    return len(df_comentarios), int(np.dot(df_comentarios['id'].to_numpy(dtype=np.int64), largos))
+
+
+def palabras_tema(texto):
+    """Palabras de contenido de un texto (normalizadas, sin palabras vacías)"""
+    if texto is None or texto != texto:
+        return []
+    return [p for p in PALABRA_TEMA.findall(normalizar_texto(texto)) if p not in PALABRAS_VACIAS]
+
+
+class ModeloTemasIncremental:
+    """
+    TF-IDF con hashing + MiniBatchNMF actualizado por lotes
+
+    Uso:
+        modelo = ModeloTemasIncremental(n_temas=10)
+        modelo.actualizar(df_comentarios)          # solo incorpora ids nuevos
+        asignacion = modelo.asignar(df_comentarios['texto'])
+        modelo.describir_temas()
+    """
+
+    def __init__(self, n_temas=10, dimension=2 ** 16, factor_olvido=0.7, lote_minimo=200,
+                 tamano_lote=2000, minimo_tema_nuevo=40, semilla=42):
+        """
+        Args:
+            n_temas: Cantidad de temas (componentes de NMF)
+            dimension: Columnas del espacio de hashing
+            factor_olvido: Peso del estado anterior en cada partial_fit (menor = olvida más rápido)
+            lote_minimo: Comentarios nuevos necesarios para actualizar el modelo. Cada
+                partial_fit pesa lo mismo sin importar su tamaño, así que los
+                comentarios se acumulan hasta formar un lote comparable
+            tamano_lote: Tamaño de los lotes de partial_fit
+            minimo_tema_nuevo: Comentarios nuevos, similares entre sí y mal explicados
+                por los temas actuales, necesarios para abrir un tema con ellos
+            semilla: Semilla de la inicialización de NMF
+        """
+        self.n_temas = n_temas
+        self.dimension = dimension
+        self.factor_olvido = factor_olvido
+        self.lote_minimo = max(lote_minimo, n_temas)
+        self.tamano_lote = max(tamano_lote, self.lote_minimo)
+        self.minimo_tema_nuevo = minimo_tema_nuevo
+        self.semilla = semilla
+
+        self.hasher = FeatureHasher(n_features=dimension, input_type='string', alternate_sign=False)
+        self.nmf = None
+        self.frecuencia_documentos = np.zeros(dimension, dtype=np.int64)
+        self.total_documentos = 0
+        self.frecuencia_palabras = Counter()
+        self.ultimo_id = 0
+        self.ids_incorporados = np.empty(0, dtype=np.int64)
+        self.huellas_incorporadas = np.empty(0, dtype=np.uint32)
+        # Suma de control de los comentarios con id hasta ultimo_id según la última verificación
+        self.control_historial = (0, 0)
+        self.actualizaciones = 0
+        self.temas_renovados = 0
+        self.reinicios = 0
+        self.fecha_actualizacion = None
+        self._etiquetas = None
+
+    @property
+    def ajustado(self):
+        return self.nmf is not None
+
+    # ------------------------------------------------------------------
+    # Representación TF-IDF
+    # ------------------------------------------------------------------
+
+    def _conteos(self, textos):
+        """Matriz dispersa de conteos (textos, dimension) y las palabras de cada texto"""
+        palabras = [palabras_tema(texto) for texto in textos]
+        conteos = self.hasher.transform(palabras)
+        conteos.sum_duplicates()
+        return conteos, palabras
+
+    def _tfidf(self, conteos):
+        """TF-IDF suavizado (como TfidfTransformer) con las frecuencias acumuladas, filas con norma L2"""
+        idf = np.log((1 + self.total_documentos) / (1 + self.frecuencia_documentos[conteos.indices])) + 1
+        tfidf = conteos.astype(np.float64)
+        tfidf.data *= idf
+        return normalize(tfidf, copy=False)
+
+    def _acumular(self, conteos, palabras):
+        self.frecuencia_documentos += np.bincount(conteos.indices, minlength=self.dimension)
+        self.total_documentos += conteos.shape[0]
+        for lista in palabras:
+            self.frecuencia_palabras.update(lista)
+        self._etiquetas = None
+
+    # ------------------------------------------------------------------
+    # Entrenamiento incremental
+    # ------------------------------------------------------------------
+
+    def _historial_vigente(self, df_comentarios):
+        """
+        True si los comentarios con id hasta el último incorporado son los que
+        el modelo vio (los eliminados no cuentan). Un id que el modelo no vio o
+        con otro texto indica que la base se vació o reimportó y reutilizó ids.
+
+        Las huellas solo se recalculan cuando la suma de control difiere de la
+        registrada (comentarios eliminados o ids reutilizados).
+        """
+        previos = df_comentarios[df_comentarios['id'] <= self.ultimo_id]
+        if not len(previos):
+            return True
+        if not len(self.ids_incorporados):
+            return False
+        control = control_comentarios(previos)
+        if control == self.control_historial:
+            return True
+
+        ids = previos['id'].to_numpy(dtype=np.int64)
+        posiciones = np.minimum(np.searchsorted(self.ids_incorporados, ids), len(self.ids_incorporados) - 1)
+        vigente = bool(
+            np.array_equal(self.ids_incorporados[posiciones], ids)
+            and np.array_equal(self.huellas_incorporadas[posiciones], huellas_textos(previos['texto'].tolist()))
+        )
+        if vigente:
+            # Solo hubo eliminaciones: la próxima verificación parte de esta suma
+            self.control_historial = control
+        return vigente
+
+    def _reiniciar(self):
+        """Descarta lo aprendido (mismos hiperparámetros)"""
+        self.nmf = None
+        self.frecuencia_documentos = np.zeros(self.dimension, dtype=np.int64)
+        self.total_documentos = 0
+        self.frecuencia_palabras = Counter()
+        self.ultimo_id = 0
+        self.ids_incorporados = np.empty(0, dtype=np.int64)
+        self.huellas_incorporadas = np.empty(0, dtype=np.uint32)
+        self.control_historial = (0, 0)
+        self._etiquetas = None
+        self.reinicios += 1
+
+    def actualizar(self, df_comentarios):
+        """
+        Incorpora los comentarios con id mayor que el último incorporado
+
+        Si los comentarios ya incorporados cambiaron (ids reutilizados tras
+        vaciar o reimportar la base) el modelo se reinicia y se entrena con
+        todos. Para detectarlo df_comentarios debe incluir también los
+        comentarios anteriores, no solo los nuevos.
+
+        Args:
+            df_comentarios: DataFrame con 'id' y 'texto' (como comentarios_para_nlp)
+
+        Returns:
+            Cantidad de comentarios incorporados (0 si aún no forman un lote)
+        """
+        if not self._historial_vigente(df_comentarios):
+            print("⚠️ Los comentarios ya incorporados cambiaron (ids reutilizados). Se reinicia el modelo de temas.")
+            self._reiniciar()
+
+        nuevos = df_comentarios[df_comentarios['id'] > self.ultimo_id].sort_values('id')
+        if len(nuevos) < self.lote_minimo:
+            return 0
+
+        conteos, palabras = self._conteos(nuevos['texto'].tolist())
+        self._acumular(conteos, palabras)
+        tfidf = self._tfidf(conteos)
+
+        if self.nmf is None:
+            # Primer ajuste con varias pasadas sobre los comentarios disponibles
+            self.nmf = self._nuevo_nmf('nndsvda')
+            self.nmf.fit(tfidf)
+        else:
+            # Lotes de tamaño parejo: el último no queda con unos pocos comentarios
+            for filas in np.array_split(np.arange(tfidf.shape[0]), -(-tfidf.shape[0] // self.tamano_lote)):
+                self.nmf.partial_fit(tfidf[filas])
+            self._renovar_tema(tfidf)
+
+        self.ids_incorporados = np.concatenate((self.ids_incorporados, nuevos['id'].to_numpy(dtype=np.int64)))
+        self.huellas_incorporadas = np.concatenate(
+            (self.huellas_incorporadas, huellas_textos(nuevos['texto'].tolist()))
+        )
+        cantidad, suma = control_comentarios(nuevos)
+        self.control_historial = (self.control_historial[0] + cantidad, self.control_historial[1] + suma)
+        self.ultimo_id = int(nuevos['id'].iloc[-1])
+        self.actualizaciones += 1
+        self.fecha_actualizacion = datetime.now()
+        return len(nuevos)
+
+    def _nuevo_nmf(self, init):
+        return MiniBatchNMF(
+            n_components=self.n_temas, batch_size=self.tamano_lote, forget_factor=self.factor_olvido,
+            init=init, max_iter=20, random_state=self.semilla
+        )
+
+    def _renovar_tema(self, tfidf):
+        """
+        Abre un tema con los comentarios nuevos que los temas actuales no explican
+
+        Las actualizaciones multiplicativas de NMF casi no mueven un tema hacia
+        palabras que no existían al entrenarlo, así que una inquietud nueva se
+        diluiría en los temas existentes. Si un grupo coherente de comentarios
+        nuevos queda con un residuo alto, su centroide reemplaza al tema menos
+        presente en el lote.
+
+        El reemplazo se siembra con init='custom': un MiniBatchNMF nuevo parte de
+        los temas actuales (con el centroide en lugar del reemplazado) y da un
+        paso con el lote. El promedio en línea de los temas empieza de nuevo.
+
+        Returns:
+            True si se reemplazó un tema
+        """
+        H = self.nmf.components_
+        W = self.nmf.transform(tfidf)
+        # Filas con norma 1: ||x - wH||² = 1 - 2 x·(wH) + ||wH||²
+        residuo = 1 - 2 * np.einsum('ij,ij->i', tfidf @ H.T, W) + np.einsum('ij,jk,ik->i', W, H @ H.T, W)
+        no_explicados = np.flatnonzero((residuo > 0.8) & (tfidf.getnnz(axis=1) > 0))
+        if len(no_explicados) < self.minimo_tema_nuevo:
+            return False
+
+        # Se conservan los comentarios cercanos a su centroide (un grupo, no ruido disperso)
+        grupo = tfidf[no_explicados]
+        centroide = np.asarray(grupo.mean(axis=0)).ravel()
+        cercanos = (grupo @ centroide) / np.linalg.norm(centroide) >= 0.3
+        if cercanos.sum() < self.minimo_tema_nuevo:
+            return False
+        centroide = np.asarray(grupo[cercanos].mean(axis=0)).ravel()
+
+        reemplazado = int(np.argmin(W.sum(axis=0)))
+        semilla = H.copy()
+        semilla[reemplazado] = centroide
+        nmf = self._nuevo_nmf('custom')
+        nmf.partial_fit(tfidf, W=W, H=semilla)
+        self.nmf = nmf
+        self.temas_renovados += 1
+        return True
+
+    # ------------------------------------------------------------------
+    # Asignación y descripción
+    # ------------------------------------------------------------------
+
+    def asignar(self, textos):
+        """
+        Tema dominante de cada texto en una sola transformación
+
+        Returns:
+            DataFrame con tema (índice, -1 si el texto no tiene palabras conocidas),
+            etiqueta y peso (participación del tema en el texto)
+        """
+        textos = list(textos)
+        if not self.ajustado:
+            return pd.DataFrame({'tema': np.full(len(textos), -1), 'etiqueta': None, 'peso': 0.0})
+
+        conteos, _ = self._conteos(textos)
+        pesos = self.nmf.transform(self._tfidf(conteos))
+        totales = pesos.sum(axis=1)
+        temas = np.where(totales > 0, pesos.argmax(axis=1), -1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            participacion = np.where(totales > 0, pesos.max(axis=1) / totales, 0.0)
+
+        etiquetas = np.array(self.etiquetas() + [None], dtype=object)
+        return pd.DataFrame({'tema': temas, 'etiqueta': etiquetas[temas], 'peso': participacion})
+
+    def _palabras_por_indice(self):
+        """Palabra más frecuente de cada columna de hashing (para leer los temas)"""
+        palabras, frecuencias = zip(*self.frecuencia_palabras.items())
+        indices = self.hasher.transform([[p] for p in palabras]).indices
+        # Ordenadas de menor a mayor frecuencia: la más frecuente queda al final
+        return {int(indices[i]): palabras[i] for i in np.argsort(frecuencias, kind='stable')}
+
+    def describir_temas(self, n_palabras=6):
+        """Lista de temas con sus palabras principales y su peso en el modelo"""
+        if not self.ajustado or not self.frecuencia_palabras:
+            return []
+
+        por_indice = self._palabras_por_indice()
+        componentes = self.nmf.components_
+        temas = []
+        for tema, fila in enumerate(componentes):
+            principales = np.argsort(fila)[::-1]
+            palabras = []
+            for indice in principales:
+                if fila[indice] <= 0 or len(palabras) == n_palabras:
+                    break
+                if int(indice) in por_indice:
+                    palabras.append(por_indice[int(indice)])
+            temas.append({
+                'tema': tema,
+                'etiqueta': '/'.join(palabras[:3]) or f'tema_{tema}',
+                'palabras': palabras,
+                'peso': float(fila.sum() / componentes.sum()) if componentes.sum() else 0.0
+            })
+        return temas
+
+    def etiquetas(self):
+        if self._etiquetas is None:
+            self._etiquetas = [tema['etiqueta'] for tema in self.describir_temas(n_palabras=3)]
+        return self._etiquetas
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+
+    def guardar(self, ruta):
+        """Escribe el estado en un archivo temporal y lo reemplaza de forma atómica"""
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        estado = {k: v for k, v in self.__dict__.items() if k not in ('hasher', '_etiquetas')}
+        joblib.dump({'version': VERSION_ESTADO, 'estado': estado}, temporal, compress=3)
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta):
+        datos = joblib.load(ruta)
+        if datos.get('version') != VERSION_ESTADO:
+            raise ValueError(f"Versión de estado no soportada: {datos.get('version')}")
+        estado = datos['estado']
+        modelo = cls(n_temas=estado['n_temas'], dimension=estado['dimension'])
+        modelo.__dict__.update(estado)
+        return modelo
+
+
+# ----------------------------------------------------------------------
+# Modelo compartido por el proceso
+# ----------------------------------------------------------------------
+
+# Cada worker mantiene su copia y la recarga cuando otro guardó una versión más nueva
+_modelo = None
+_mtime_modelo = None
+_lock_modelo = threading.Lock()
+
+
+def ruta_estado(directorio=None):
+    return os.path.join(directorio or directorio_por_defecto(), ARCHIVO_ESTADO)
+
+
+def _mtime(ruta):
+    try:
+        return os.stat(ruta).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _recargar_si_cambio(ruta):
+    global _modelo, _mtime_modelo
+    mtime = _mtime(ruta)
+    if _modelo is not None and mtime == _mtime_modelo:
+        return
+    if mtime is not None:
+        try:
+            _modelo = ModeloTemasIncremental.cargar(ruta)
+            _mtime_modelo = mtime
+            return
+        except Exception as e:
+            print(f"⚠️ No se pudo cargar el modelo de temas ({e}). Se entrenará uno nuevo.")
+    if _modelo is None:
+        _modelo = ModeloTemasIncremental(n_temas=int(os.environ.get('CONVIVIR_TEMAS_N', 10)))
+        _mtime_modelo = None
+
+
+class BloqueoArchivo:
+    """Bloqueo exclusivo entre procesos (flock) mientras un worker actualiza el estado"""
+
+    def __init__(self, ruta):
+        self.ruta = f"{ruta}.lock"
+        self.archivo = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok=True)
+            self.archivo = open(self.ruta, 'w')
+            fcntl.flock(self.archivo, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *excepcion):
+        if self.archivo is not None:
+            fcntl.flock(self.archivo, fcntl.LOCK_UN)
+            self.archivo.close()
+
+
+def obtener_modelo_temas(df_comentarios=None, directorio=None):
+    """
+    Modelo de temas del proceso, al día con el estado guardado
+
+    Args:
+        df_comentarios: Si se indica (todos los comentarios), primero incorpora
+            (y guarda) los nuevos respecto del último id incorporado
+    """
+    global _mtime_modelo
+    ruta = ruta_estado(directorio)
+    with _lock_modelo:
+        if df_comentarios is None or len(df_comentarios) == 0:
+            _recargar_si_cambio(ruta)
+            return _modelo
+        with BloqueoArchivo(ruta):
+            _recargar_si_cambio(ruta)
+            reinicios = _modelo.reinicios
+            if _modelo.actualizar(df_comentarios) or _modelo.reinicios != reinicios:
+                _modelo.guardar(ruta)
+                _mtime_modelo = _mtime(ruta)
+        return _modelo
+
+
+def descubrir_temas(df_comentarios, directorio=None):
+    """
+    Actualiza el modelo con los comentarios nuevos y asigna un tema a cada comentario
+
+    Returns:
+        (asignacion, temas): DataFrame alineado con df_comentarios (tema, etiqueta,
+        peso) y la lista de temas con la cantidad de comentarios de cada uno,
+        ordenada de mayor a menor. (None, []) si aún no hay comentarios suficientes.
+    """
+    modelo = obtener_modelo_temas(df_comentarios, directorio)
+    if not modelo.ajustado:
+        return None, []
+
+    asignacion = modelo.asignar(df_comentarios['texto'])
+    conteo = np.bincount(asignacion['tema'][asignacion['tema'] >= 0], minlength=modelo.n_temas)
+    temas = [dict(tema, comentarios=int(conteo[tema['tema']])) for tema in modelo.describir_temas()]
+    temas.sort(key=lambda tema: tema['comentarios'], reverse=True)
+    return asignacion, temas
+
+
+def main():
+    from database import DatabaseManager
+    from acceso_caracteristicas import comentarios_para_nlp
+
+    parser = argparse.ArgumentParser(description='Modelo incremental de temas sobre los comentarios')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    subparsers.add_parser('actualizar', help='Incorpora los comentarios nuevos de la base de datos')
+    temas = subparsers.add_parser('temas', help='Muestra los temas del modelo guardado')
+    temas.add_argument('--palabras', type=int, default=6)
+    parser.add_argument('--db', default='convivir_v4.db')
+    parser.add_argument('--directorio', help='Estado del modelo (por defecto modelos_temas/ o CONVIVIR_TEMAS_DIR)')
+    args = parser.parse_args()
+
+    if args.comando == 'actualizar':
+        db = DatabaseManager(args.db)
+        anterior = obtener_modelo_temas(directorio=args.directorio)
+        # Todos los comentarios: los ya incorporados se usan para detectar ids reutilizados
+        df = comentarios_para_nlp(db.engine)
+        antes = anterior.actualizaciones
+        modelo = obtener_modelo_temas(df, args.directorio)
+        nuevos = int((df['id'] > modelo.ultimo_id).sum()) if len(df) else 0
+        if modelo.actualizaciones > antes:
+            print(f"✅ Comentarios incorporados hasta el id {modelo.ultimo_id} ({nuevos} pendientes)")
+        else:
+            print(f"⏳ {nuevos} comentarios nuevos; se necesitan {modelo.lote_minimo} para actualizar")
+        return
+
+    modelo = obtener_modelo_temas(directorio=args.directorio)
+    if not modelo.ajustado:
+        raise SystemExit("❌ El modelo de temas aún no está entrenado")
+    for tema in modelo.describir_temas(args.palabras):
+        print(f"  {tema['tema']:>2}  {tema['peso']:.1%}  {', '.join(tema['palabras'])}")
+
+
+if __name__ == '__main__':
+    main()
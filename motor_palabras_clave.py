@@ -0,0 +1,216 @@
+"""
+Módulo de Motor de Palabras Clave para CONVIVIR v4.0
+Búsqueda compilada de léxicos ponderados sobre lotes completos de comentarios,
+usada por el análisis de sentimientos basado en reglas y la extracción de temas
+
+- Normalización sin acentos (conserva la ñ) y en minúsculas con lower()/replace()
+  sobre el lote completo concatenado
+- Coincidencia por palabra completa: "solo" no coincide dentro de "consolidar".
+  Los términos terminados en '*' cubren las palabras que empiezan así
+  ('molest*' → molestan, molestaron)
+- Ventanas de negación: en "no me siento seguro" las palabras siguientes al
+  negador (sin cruzar la puntuación) quedan negadas
+- Un motor reúne varios léxicos (sentimiento y temas) y procesa un lote en una
+  pasada: el texto se divide en palabras con str.split(), cada palabra distinta
+  se resuelve una sola vez contra el vocabulario de términos y la negación se
+  calcula con NumPy
+- El resultado es una matriz dispersa de conteos (textos, términos); los
+  puntajes por categoría son su producto con la matriz de pesos (términos,
+  categorías)
+"""
+
+import re
+from itertools import chain
+
+import numpy as np
+from scipy import sparse
+
+
+NEGADORES = ('no', 'nunca', 'jamas', 'tampoco', 'ni', 'sin', 'nadie', 'nada', 'ningun', 'ninguna', 'ninguno')
+
+# Marca entre textos del lote concatenado (queda como una palabra propia)
+SEPARADOR = '\x00'
+
+# Puntuación que cierra la ventana de negación ("no. estoy bien")
+CORTE_NEGACION = '.,;:!?'
+
+# Vocales acentuadas y la ç en minúsculas; la ñ se conserva ("año" no es "ano")
+REEMPLAZOS_ACENTOS = tuple(zip('áéíóúüàèìòùâêîôûäëïöç', 'aeiouuaeiouaeiouaeioc'))
+
+PALABRA = re.compile(r'\w+')
+
+
+def normalizar_texto(texto):
+    """Minúsculas y sin acentos (conserva la ñ)"""
+    texto = str(texto).lower()
+    for acentuada, base in REEMPLAZOS_ACENTOS:
+        if acentuada in texto:
+            texto = texto.replace(acentuada, base)
+    return texto
+
+
+def palabras_lote(textos):
+    """
+    Divide un lote de textos en palabras normalizadas con una sola pasada
+
+    Returns:
+        Lista de palabras, con la puntuación de CORTE_NEGACION y un SEPARADOR
+        entre textos como palabras propias
+    """
+    textos = ['' if texto is None or texto != texto else str(texto) for texto in textos]
+    separador = f' {SEPARADOR} '
+    unido = separador.join(textos)
+    if unido.count(SEPARADOR) != max(len(textos) - 1, 0):
+        unido = separador.join(texto.replace(SEPARADOR, ' ') for texto in textos)
+    unido = normalizar_texto(unido)
+    for signo in CORTE_NEGACION:
+        if signo in unido:
+            unido = unido.replace(signo, f' {signo} ')
+
+    return unido.split()
+
+
+class MotorPalabrasClave:
+    """
+    Léxicos ponderados compilados para evaluar lotes de textos
+
+    Uso:
+        motor = MotorPalabrasClave({'positivo': {'feliz': 1.0, 'seguro': 1.0},
+                                    'negativo': ['miedo', 'molest*']})
+        afirmados, negados = motor.puntuar(serie_textos)   # (textos, categorías)
+        motor.categorias                                   # ['positivo', 'negativo']
+    """
+
+    def __init__(self, lexicos, negadores=NEGADORES, ventana_negacion=3):
+        """
+        Args:
+            lexicos: dict {categoria: términos}; los términos son palabras en una
+                lista (peso 1) o un dict {término: peso}. Un término puede estar en
+                varias categorías.
+            negadores: Palabras que niegan las siguientes (vacío = sin negación)
+            ventana_negacion: Cantidad de palabras siguientes al negador que quedan negadas
+        """
+        self.categorias = list(lexicos)
+        self.ventana_negacion = ventana_negacion
+        self.negadores = frozenset(normalizar_texto(n) for n in negadores)
+
+        # Vocabulario compartido de términos: índice de columna y pesos por categoría
+        pesos_terminos = {}
+        for columna, terminos in enumerate(lexicos.values()):
+            if not isinstance(terminos, dict):
+                terminos = {termino: 1.0 for termino in terminos}
+            for termino, peso in terminos.items():
+                termino = normalizar_texto(termino).strip()
+                pesos_terminos.setdefault(termino, np.zeros(len(self.categorias)))[columna] += peso
+
+        self.terminos = list(pesos_terminos)
+        # (términos, categorías): puntajes = matriz de conteos (textos, términos) @ pesos
+        self.pesos = np.array(list(pesos_terminos.values())).reshape(len(self.terminos), len(self.categorias))
+        self._exactos = {t: i for i, t in enumerate(self.terminos) if not t.endswith('*')}
+        self._prefijos = [(t[:-1], i) for i, t in enumerate(self.terminos) if t.endswith('*')]
+        self._tupla_prefijos = tuple(prefijo for prefijo, _ in self._prefijos)
+
+    def _resolver(self, palabra):
+        """
+        (términos, es_negador, es_corte) de una palabra; se calcula una vez por palabra distinta
+
+        Una palabra puede corresponder a varios términos (exacto y prefijos). Una
+        palabra con signos internos ("¿no", "auto-estima") reúne los términos de
+        cada parte y es negadora si alguna parte lo es.
+        """
+        if palabra == SEPARADOR or palabra in CORTE_NEGACION:
+            return [], False, True
+
+        terminos = []
+        negador = False
+        for parte in ([palabra] if palabra.isalnum() else PALABRA.findall(palabra)):
+            exacto = self._exactos.get(parte)
+            if exacto is not None:
+                terminos.append(exacto)
+            if self._tupla_prefijos and parte.startswith(self._tupla_prefijos):
+                terminos += [i for prefijo, i in self._prefijos if parte.startswith(prefijo)]
+            negador = negador or parte in self.negadores
+        return terminos, negador, False
+
+    def coincidencias(self, textos):
+        """
+        Ocurrencias de términos del léxico en el lote
+
+        Returns:
+            (documento, termino, negado): arreglos paralelos con el índice del texto,
+            el índice en self.terminos y si la ocurrencia estaba negada
+        """
+        palabras = palabras_lote(textos)
+
+        # Las palabras distintas de un lote son pocas comparadas con el total
+        vocabulario = {palabra: fila for fila, palabra in enumerate(set(palabras))}
+        vocabulario.setdefault(SEPARADOR, len(vocabulario))
+        resueltas = [self._resolver(palabra) for palabra in vocabulario]
+        # Términos de cada palabra distinta en formato CSR (inicio, cantidad)
+        cantidad_vocabulario = np.array([len(r[0]) for r in resueltas], dtype=np.int64)
+        inicio_vocabulario = np.concatenate(([0], np.cumsum(cantidad_vocabulario)[:-1]))
+        terminos_vocabulario = np.fromiter(chain.from_iterable(r[0] for r in resueltas), dtype=np.int64)
+        negador_vocabulario = np.array([r[1] for r in resueltas], dtype=bool)
+        corte_vocabulario = np.array([r[2] for r in resueltas], dtype=bool)
+
+        filas = np.fromiter(map(vocabulario.__getitem__, palabras), dtype=np.int64, count=len(palabras))
+        documento = np.cumsum(filas == vocabulario[SEPARADOR])
+
+        negadas = np.zeros(len(filas), dtype=bool)
+        if self.negadores and self.ventana_negacion > 0 and len(filas):
+            # Última posición de un negador y de un corte (puntuación o cambio de
+            # texto) hasta cada palabra: queda negada si el negador está después
+            # del corte, antes de la palabra y a lo sumo ventana_negacion atrás
+            posicion = np.arange(len(filas))
+            ultimo_negador = np.maximum.accumulate(np.where(negador_vocabulario[filas], posicion, -1))
+            ultimo_corte = np.maximum.accumulate(np.where(corte_vocabulario[filas], posicion, -1))
+            negadas = (
+                (ultimo_negador > ultimo_corte)
+                & (ultimo_negador < posicion)
+                & (posicion - ultimo_negador <= self.ventana_negacion)
+            )
+
+        # Una ocurrencia por cada término de cada palabra del texto
+        cantidad = cantidad_vocabulario[filas]
+        con_terminos = np.flatnonzero(cantidad)
+        repeticiones = cantidad[con_terminos]
+        desplazamiento = np.arange(int(repeticiones.sum())) - np.repeat(np.cumsum(repeticiones) - repeticiones, repeticiones)
+        termino = terminos_vocabulario[np.repeat(inicio_vocabulario[filas[con_terminos]], repeticiones) + desplazamiento]
+        return (
+            np.repeat(documento[con_terminos], repeticiones),
+            termino,
+            np.repeat(negadas[con_terminos], repeticiones)
+        )
+
+    def matriz(self, textos):
+        """
+        Matrices dispersas de conteos (textos, términos), como las de un
+        CountVectorizer con self.terminos como vocabulario
+
+        Returns:
+            (afirmados, negados): scipy.sparse.csr_matrix
+        """
+        documento, termino, negado = self.coincidencias(textos)
+        forma = (len(textos), len(self.terminos))
+
+        def conteos(seleccion):
+            return sparse.csr_matrix(
+                (np.ones(int(seleccion.sum())), (documento[seleccion], termino[seleccion])), shape=forma
+            )
+
+        return conteos(~negado), conteos(negado)
+
+    def puntuar(self, textos):
+        """
+        Suma de pesos por texto y categoría, separando términos afirmados y negados
+
+        Returns:
+            (afirmados, negados): arreglos float (len(textos), len(self.categorias))
+        """
+        afirmados, negados = self.matriz(textos)
+        return afirmados @ self.pesos, negados @ self.pesos
+
+    def presentes(self, textos):
+        """Matriz booleana (textos, categorías): la categoría tiene al menos un término en el texto"""
+        afirmados, negados = self.matriz(textos)
+        return ((afirmados + negados) @ (self.pesos != 0)) > 0
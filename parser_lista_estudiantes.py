@@ -1,154 +1,348 @@
 """
-Parser para archivos de listas de estudiantes en formato .txt
-Formato simplificado: N° | NOMBRE COMPLETO
+Parser para archivos de listas de estudiantes
+Formatos soportados:
+    .txt          N° | NOMBRE COMPLETO (formato simplificado)
+    .csv / .tsv   Con o sin encabezado (N°, RUN, NOMBRE COMPLETO o NOMBRES/APELLIDOS, GÉNERO, EDAD)
+    .xlsx         Primera hoja, mismas columnas que CSV
 Extrae automáticamente: número, nombre completo, género inferido
+
+El archivo se procesa línea a línea (sin cargarlo completo en memoria) y los
+errores se informan por número de línea.
 """
 
+import io
 import re
-from datetime import datetime
+import csv
+from itertools import chain
+
+
+# Nombres sin tildes: se comparan contra tokens normalizados con la misma tabla
+NOMBRES_FEMENINOS = frozenset([
+    'MARIA', 'FERNANDA', 'VALENTINA', 'SOFIA', 'CAMILA', 'JAVIERA', 'CONSTANZA',
+    'FRANCISCA', 'CATALINA', 'MARTINA', 'ISIDORA', 'FLORENCIA', 'ANTONIA',
+    'MONSERRAT', 'IGNACIA', 'AMANDA', 'CAROLINA', 'DANIELA', 'ANDREA', 'PAULA',
+    'BEATRIZ', 'EMILIA', 'RENATA', 'TRINIDAD', 'ANGELA', 'BELEN', 'PAZ',
+    'XIOMARA', 'DAMARIT', 'LUISA', 'AYELEEN', 'EMILY', 'PASCAL', 'SOL',
+    'MONSERRATT', 'LILIANA'
+])
+
+NOMBRES_MASCULINOS = frozenset([
+    'JOSE', 'JUAN', 'CARLOS', 'LUIS', 'DIEGO', 'SEBASTIAN', 'MATIAS', 'NICOLAS',
+    'FELIPE', 'JOAQUIN', 'BENJAMIN', 'VICENTE', 'TOMAS', 'CRISTOBAL', 'IGNACIO',
+    'JOSEMANUEL', 'CHRISTIANN', 'JHEYSON', 'RENATO', 'ALESSANDRO', 'LEONEL',
+    'GIANLUCAS', 'AMARO', 'MARCELO', 'ALEXIS', 'JOHAO', 'PATRICIO', 'CIARAN',
+    'DAVID', 'DEYMAR', 'AGUSTIN', 'ALFONSO', 'ENRIQUE', 'RODRIGO', 'ANTONIO'
+])
+
+# Diccionario único token -> género, construido una sola vez
+GENERO_POR_NOMBRE = dict(
+    [(nombre, 'Masculino') for nombre in NOMBRES_MASCULINOS] +
+    [(nombre, 'Femenino') for nombre in NOMBRES_FEMENINOS]
+)
+
+TABLA_SIN_TILDES = str.maketrans('ÁÉÍÓÚÜáéíóúü', 'AEIOUUaeiouu')
+
+# Formato .txt: N° seguido de NOMBRE COMPLETO (letras, espacios, acentos)
+PATRON_LINEA_TXT = re.compile(
+    r'^\s*(\d+)\s*[.|):-]?\s+([A-ZÁÉÍÓÚÑÜ\s]+?)\s*$',
+    re.IGNORECASE
+)
+
+# Encabezados reconocidos en CSV/TSV/XLSX (normalizados, sin tildes ni puntuación)
+COLUMNAS = {
+    'numero': ('N', 'NO', 'NRO', 'NUM', 'NUMERO'),
+    'run': ('RUN', 'RUT'),
+    'nombre_completo': ('NOMBRE COMPLETO', 'NOMBRE', 'ESTUDIANTE', 'ALUMNO', 'NOMBRE ESTUDIANTE'),
+    'nombres': ('NOMBRES',),
+    'apellidos': ('APELLIDOS',),
+    'apellido_paterno': ('APELLIDO PATERNO',),
+    'apellido_materno': ('APELLIDO MATERNO',),
+    'genero': ('GENERO', 'SEXO'),
+    'edad': ('EDAD',),
+}
+CAMPO_POR_ENCABEZADO = {alias: campo for campo, alias_campo in COLUMNAS.items() for alias in alias_campo}
+
+GENERO_DECLARADO = {
+    'M': 'Masculino', 'H': 'Masculino', 'MASCULINO': 'Masculino', 'HOMBRE': 'Masculino',
+    'F': 'Femenino', 'FEMENINO': 'Femenino', 'MUJER': 'Femenino',
+}
+
+MAX_ERRORES_REPORTADOS = 100
+
+
+def normalizar(texto):
+    """Mayúsculas sin tildes (conserva la Ñ)"""
+    return str(texto).upper().translate(TABLA_SIN_TILDES)
 
 
-def inferir_genero(nombre_completo):
+def inferir_genero(nombre_completo, solo_nombres=False):
     """
     Infiere el género basándose en nombres comunes chilenos
+
+    Compara tokens completos (no subcadenas), por lo que un apellido como
+    "PAZ" o "SOLAR" no determina el género. En el formato
+    APELLIDO1 APELLIDO2 NOMBRE1 NOMBRE2 solo se consideran los nombres de
+    pila; si ninguno es conocido se usa la terminación del primero.
+
+    Args:
+        nombre_completo: Nombre del estudiante
+        solo_nombres: True si el texto contiene solo nombres de pila (sin apellidos)
     """
-    nombre_completo = nombre_completo.upper()
-    
-    # Nombres femeninos comunes
-    nombres_femeninos = [
-        'MARÍA', 'FERNANDA', 'VALENTINA', 'SOFÍA', 'CAMILA', 'JAVIERA', 'CONSTANZA',
-        'FRANCISCA', 'CATALINA', 'MARTINA', 'ISIDORA', 'FLORENCIA', 'ANTONIA',
-        'MONSERRAT', 'IGNACIA', 'AMANDA', 'CAROLINA', 'DANIELA', 'ANDREA', 'PAULA',
-        'BEATRIZ', 'EMILIA', 'RENATA', 'TRINIDAD', 'ÁNGELA', 'BELÉN', 'PAZ',
-        'XIOMARA', 'DAMARIT', 'LUISA', 'AYELÉEN', 'EMILY', 'PASCAL', 'SOL',
-        'MONSERRATT', 'LILIANA'
-    ]
-    
-    # Nombres masculinos comunes
-    nombres_masculinos = [
-        'JOSÉ', 'JUAN', 'CARLOS', 'LUIS', 'DIEGO', 'SEBASTIÁN', 'MATÍAS', 'NICOLÁS',
-        'FELIPE', 'JOAQUÍN', 'BENJAMÍN', 'VICENTE', 'TOMÁS', 'CRISTÓBAL', 'IGNACIO',
-        'JOSEMANUEL', 'CHRISTIANN', 'JHEYSON', 'RENATO', 'ALESSANDRO', 'LEONEL',
-        'GIANLUCAS', 'AMARO', 'MARCELO', 'ALEXIS', 'JOHAO', 'PATRICIO', 'CIARAN',
-        'DAVID', 'DEYMAR', 'AGUSTÍN', 'ALFONSO', 'ENRIQUE', 'RODRIGO', 'ANTONIO'
-    ]
-    
-    # Buscar nombres femeninos
-    for nombre in nombres_femeninos:
-        if nombre in nombre_completo:
-            return 'Femenino'
-    
-    # Buscar nombres masculinos
-    for nombre in nombres_masculinos:
-        if nombre in nombre_completo:
-            return 'Masculino'
-    
-    # Por defecto, retornar basándose en terminaciones comunes
-    if any(term in nombre_completo for term in ['A ', ' A', 'ANA', 'INA', 'ELA']):
-        return 'Femenino'
-    
-    return 'Masculino'
+    tokens = normalizar(nombre_completo).split()
+    if not tokens:
+        return 'Masculino'
 
+    nombres_pila = tokens if solo_nombres or len(tokens) < 3 else tokens[2:]
+    for token in nombres_pila:
+        genero = GENERO_POR_NOMBRE.get(token)
+        if genero:
+            return genero
 
-def parsear_lista_estudiantes(contenido_archivo):
+    # Por defecto, terminación del primer nombre de pila
+    return 'Femenino' if nombres_pila[0].endswith('A') else 'Masculino'
+
+
+def run_ficticio(numero):
     """
-    Parsea un archivo de lista de estudiantes en formato simplificado
-    
-    Formato esperado:
-    N°  NOMBRE COMPLETO
-    1   APELLIDO1 APELLIDO2 NOMBRE1 NOMBRE2
-    2   APELLIDO1 APELLIDO2 NOMBRE1 NOMBRE2
-    ...
-    
+    Genera un RUN ficticio basado en el número (para compatibilidad)
+    Formato: 99.XXX.XXX-Y donde XXX es el número del estudiante
+    """
+    run_base = 99000000 + int(numero)
+    return f"{run_base // 1000000}.{(run_base // 1000) % 1000:03d}.{run_base % 1000:03d}-{run_base % 10}"
+
+
+class ResultadoParseo:
+    """Acumula estudiantes y errores por línea durante el parseo"""
+
+    def __init__(self):
+        self.estudiantes = []
+        self.errores = []
+        self.total_errores = 0
+
+    def agregar_estudiante(self, numero, nombre_completo, run=None, genero=None, edad=None):
+        nombre_completo = ' '.join(nombre_completo.split())
+        self.estudiantes.append({
+            'numero': int(numero),
+            'run': run or run_ficticio(numero),
+            'nombre_completo': nombre_completo.title(),
+            # Edad por defecto (14 años para enseñanza media)
+            'edad': edad if edad is not None else 14,
+            'genero': genero or inferir_genero(nombre_completo)
+        })
+
+    def agregar_error(self, numero_linea, contenido, mensaje):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES_REPORTADOS:
+            self.errores.append({
+                'linea': numero_linea,
+                'contenido': str(contenido)[:120],
+                'error': mensaje
+            })
+
+    def a_dict(self):
+        if len(self.estudiantes) == 0:
+            mensaje = 'No se encontraron estudiantes en el archivo. Verifique el formato.'
+        else:
+            mensaje = f'{len(self.estudiantes)} estudiantes procesados exitosamente'
+            if self.total_errores:
+                mensaje += f' ({self.total_errores} líneas con errores)'
+
+        return {
+            'exito': len(self.estudiantes) > 0,
+            'estudiantes': self.estudiantes,
+            'total_estudiantes': len(self.estudiantes),
+            'errores': self.errores,
+            'total_errores': self.total_errores,
+            'mensaje': mensaje
+        }
+
+
+def _lineas_texto(flujo):
+    """Decodifica un flujo binario o de texto línea a línea"""
+    for linea in flujo:
+        if isinstance(linea, bytes):
+            linea = linea.decode('utf-8', errors='ignore')
+        yield linea.lstrip('\ufeff').rstrip('\r\n')
+
+
+def _parsear_txt(lineas, resultado):
+    for numero_linea, linea in enumerate(lineas, 1):
+        # Saltar líneas vacías o de encabezado
+        if not linea.strip() or 'NOMBRE COMPLETO' in linea.upper():
+            continue
+
+        match = PATRON_LINEA_TXT.match(linea)
+        if match:
+            numero, nombre_completo = match.groups()
+            resultado.agregar_estudiante(numero, nombre_completo)
+        else:
+            resultado.agregar_error(numero_linea, linea, 'Formato no reconocido (se espera: N° NOMBRE COMPLETO)')
+
+
+def _mapear_encabezado(fila):
+    """Retorna {campo: indice} si la fila es un encabezado reconocible, o None"""
+    mapa = {}
+    for indice, celda in enumerate(fila):
+        clave = ' '.join(re.sub(r'[^\wÑ ]', ' ', normalizar(celda or '')).split())
+        campo = CAMPO_POR_ENCABEZADO.get(clave)
+        if campo and campo not in mapa:
+            mapa[campo] = indice
+    tiene_nombre = 'nombre_completo' in mapa or 'nombres' in mapa
+    return mapa if tiene_nombre else None
+
+
+def _entero(valor, mensaje_error):
+    """Convierte celdas como '15' o 15.0 (Excel) a entero; None si está vacía"""
+    if not valor:
+        return None
+    try:
+        return int(float(valor))
+    except ValueError:
+        raise ValueError(f'{mensaje_error}: {valor}')
+
+
+def _parsear_filas(filas, resultado):
+    """Procesa filas tabulares (CSV/TSV/XLSX) con o sin encabezado"""
+    mapa = None
+    correlativo = 0
+
+    for numero_linea, fila in enumerate(filas, 1):
+        celdas = ['' if c is None else str(c).strip() for c in fila]
+        if not any(celdas):
+            continue
+
+        if mapa is None:
+            encabezado = _mapear_encabezado(celdas)
+            if encabezado:
+                mapa = encabezado
+                continue
+            # Sin encabezado: [N°, NOMBRE] o [NOMBRE]
+            mapa = {'numero': 0, 'nombre_completo': 1} if celdas[0].isdigit() else {'nombre_completo': 0}
+
+        def celda(campo):
+            indice = mapa.get(campo)
+            return celdas[indice] if indice is not None and indice < len(celdas) else ''
+
+        correlativo += 1
+        try:
+            numero = _entero(celda('numero'), 'Número inválido') or correlativo
+
+            nombre_completo = celda('nombre_completo')
+            genero_inferido = None
+            if not nombre_completo:
+                # Columnas separadas: el género se infiere solo con los nombres de pila
+                apellidos = celda('apellidos') or f"{celda('apellido_paterno')} {celda('apellido_materno')}"
+                nombres = celda('nombres')
+                nombre_completo = f'{apellidos} {nombres}'
+                if nombres:
+                    genero_inferido = inferir_genero(nombres, solo_nombres=True)
+            if not nombre_completo.strip():
+                raise ValueError('Nombre vacío')
+
+            genero = GENERO_DECLARADO.get(normalizar(celda('genero'))) or genero_inferido
+            edad = _entero(celda('edad'), 'Edad inválida')
+
+            resultado.agregar_estudiante(
+                numero, nombre_completo,
+                run=celda('run') or None, genero=genero, edad=edad
+            )
+        except ValueError as e:
+            correlativo -= 1
+            resultado.agregar_error(numero_linea, ' | '.join(celdas), str(e))
+
+
+def _detectar_delimitador(primera_linea, extension):
+    if extension == '.tsv' or '\t' in primera_linea:
+        return '\t'
+    return ';' if primera_linea.count(';') > primera_linea.count(',') else ','
+
+
+def _filas_xlsx(flujo):
+    from openpyxl import load_workbook
+
+    libro = load_workbook(flujo, read_only=True, data_only=True)
+    try:
+        for fila in libro.worksheets[0].iter_rows(values_only=True):
+            yield fila
+    finally:
+        libro.close()
+
+
+def parsear_archivo_lista(flujo, nombre_archivo='lista.txt'):
+    """
+    Parsea una lista de estudiantes desde un archivo abierto, sin leerlo completo
+
     Args:
-        contenido_archivo (str): Contenido del archivo .txt
-    
+        flujo: Objeto archivo (binario o de texto), ej. request.files['archivo'].stream
+        nombre_archivo: Nombre original, usado para detectar el formato por extensión
+
     Returns:
         dict: {
             'exito': bool,
             'estudiantes': list,
             'total_estudiantes': int,
+            'errores': list de {'linea', 'contenido', 'error'},
+            'total_errores': int,
             'mensaje': str
         }
     """
+    resultado = ResultadoParseo()
+    extension = ('.' + nombre_archivo.rsplit('.', 1)[-1].lower()) if '.' in nombre_archivo else '.txt'
+
     try:
-        lineas = contenido_archivo.split('\n')
-        estudiantes = []
-        
-        # Patrón para detectar líneas de estudiantes
-        # Formato: N° seguido de NOMBRE COMPLETO (letras, espacios, acentos)
-        patron = re.compile(
-            r'^\s*(\d+)\s+([A-ZÁÉÍÓÚÑÜ\s]+)\s*$',
-            re.IGNORECASE
-        )
-        
-        for linea in lineas:
-            # Saltar líneas vacías o de encabezado
-            if not linea.strip() or 'NOMBRE COMPLETO' in linea.upper():
-                continue
-            
-            match = patron.match(linea)
-            if match:
-                numero, nombre_completo = match.groups()
-                
-                # Limpiar nombre (eliminar espacios extras)
-                nombre_completo = ' '.join(nombre_completo.split())
-                
-                # Inferir género
-                genero = inferir_genero(nombre_completo)
-                
-                # Generar un RUN ficticio basado en el número (para compatibilidad)
-                # Formato: 99.XXX.XXX-Y donde XXX es el número del estudiante
-                run_base = 99000000 + int(numero)
-                run = f"{run_base // 1000000}.{(run_base // 1000) % 1000:03d}.{run_base % 1000:03d}-{run_base % 10}"
-                
-                # Edad por defecto (14 años para enseñanza media)
-                edad = 14
-                
-                estudiante = {
-                    'numero': int(numero),
-                    'run': run,
-                    'nombre_completo': nombre_completo.title(),
-                    'edad': edad,
-                    'genero': genero
-                }
-                
-                estudiantes.append(estudiante)
-        
-        if len(estudiantes) == 0:
-            return {
-                'exito': False,
-                'mensaje': 'No se encontraron estudiantes en el archivo. Verifique el formato.',
-                'estudiantes': [],
-                'total_estudiantes': 0
-            }
-        
-        return {
-            'exito': True,
-            'estudiantes': estudiantes,
-            'total_estudiantes': len(estudiantes),
-            'mensaje': f'{len(estudiantes)} estudiantes procesados exitosamente'
-        }
-        
+        if extension == '.xlsx':
+            _parsear_filas(_filas_xlsx(flujo), resultado)
+        elif extension in ('.csv', '.tsv'):
+            lineas = _lineas_texto(flujo)
+            primera = next(lineas, '')
+            delimitador = _detectar_delimitador(primera, extension)
+            _parsear_filas(csv.reader(chain([primera], lineas), delimiter=delimitador), resultado)
+        else:
+            _parsear_txt(_lineas_texto(flujo), resultado)
     except Exception as e:
         return {
             'exito': False,
             'mensaje': f'Error al procesar archivo: {str(e)}',
             'estudiantes': [],
-            'total_estudiantes': 0
+            'total_estudiantes': 0,
+            'errores': resultado.errores,
+            'total_errores': resultado.total_errores
         }
 
+    return resultado.a_dict()
+
+
+def parsear_lista_estudiantes(contenido_archivo):
+    """
+    Parsea un archivo de lista de estudiantes en formato simplificado
+
+    Formato esperado:
+    N°  NOMBRE COMPLETO
+    1   APELLIDO1 APELLIDO2 NOMBRE1 NOMBRE2
+    2   APELLIDO1 APELLIDO2 NOMBRE1 NOMBRE2
+    ...
+
+    Args:
+        contenido_archivo (str): Contenido del archivo .txt
+
+    Returns:
+        dict con el mismo formato que parsear_archivo_lista
+    """
+    return parsear_archivo_lista(io.StringIO(contenido_archivo), 'lista.txt')
+
 
 # Función de prueba
 if __name__ == '__main__':
-    # Ejemplo de uso
-    with open('/home/ubuntu/upload/lista_1A.txt', 'r', encoding='utf-8') as f:
-        contenido = f.read()
-    
-    resultado = parsear_lista_estudiantes(contenido)
+    import sys
+
+    ruta = sys.argv[1] if len(sys.argv) > 1 else 'lista_1A.txt'
+    with open(ruta, 'rb') as f:
+        resultado = parsear_archivo_lista(f, ruta)
+
     print(f"Éxito: {resultado['exito']}")
     print(f"Total estudiantes: {resultado['total_estudiantes']}")
     print(f"\nPrimeros 5 estudiantes:")
     for est in resultado['estudiantes'][:5]:
         print(f"  {est['numero']}. {est['nombre_completo']} ({est['genero']}, {est['edad']} años) - RUN: {est['run']}")
-
+    for error in resultado['errores'][:5]:
+        print(f"  ⚠️ Línea {error['linea']}: {error['error']}")
@@ -0,0 +1,238 @@
+"""
+Módulo de Perfilado por Muestreo para CONVIVIR v4.0
+Perfilador opcional de peticiones lentas: un hilo toma muestras periódicas de la
+pila del hilo que atiende la petición y, si la petición supera el umbral de
+latencia, guarda el perfil en formato colapsado (flamegraph.pl / speedscope)
+dentro de un búfer circular en disco
+
+Configuración (variables de entorno):
+    CONVIVIR_PERFILADO               'off' (defecto), 'header' o 'on'
+    CONVIVIR_PERFILADO_TASA          Fracción de peticiones perfiladas en modo 'on' (0.1)
+    CONVIVIR_PERFILADO_UMBRAL_MS     Latencia mínima para guardar el perfil (1000)
+    CONVIVIR_PERFILADO_INTERVALO_MS  Intervalo entre muestras (5)
+    CONVIVIR_PERFILES_MAX            Perfiles conservados en disco (50)
+    CONVIVIR_PERFILES_DIR            Directorio de perfiles (perfiles/)
+
+En modo 'header' solo se perfilan las peticiones con la cabecera
+X-Convivir-Perfilar: 1 (en modo 'on' la cabecera fuerza el perfilado).
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import threading
+from collections import Counter
+from datetime import datetime
+
+from flask import request, g
+
+
+CABECERA_PERFILAR = 'X-Convivir-Perfilar'
+PROFUNDIDAD_MAXIMA = 128
+PATRON_NOMBRE = re.compile(r'^[\w.-]+$')
+
+
+class MuestreadorPila:
+    """Toma muestras de la pila de un hilo a intervalos fijos"""
+
+    def __init__(self, id_hilo, intervalo):
+        self.id_hilo = id_hilo
+        self.intervalo = intervalo
+        self.muestras = Counter()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._ejecutar, name='perfilador-muestreo', daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        self._hilo.join(timeout=1)
+
+    def _ejecutar(self):
+        while not self._detener.wait(self.intervalo):
+            frame = sys._current_frames().get(self.id_hilo)
+            if frame is None:
+                continue
+            pila = []
+            while frame is not None and len(pila) < PROFUNDIDAD_MAXIMA:
+                codigo = frame.f_code
+                pila.append(f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})')
+                frame = frame.f_back
+            pila.reverse()
+            self.muestras[tuple(pila)] += 1
+
+
+def formato_colapsado(muestras):
+    """Líneas 'marco;marco;marco conteo' (formato de flamegraph.pl y speedscope)"""
+    return ''.join(f"{';'.join(pila)} {conteo}\n" for pila, conteo in muestras.most_common())
+
+
+def formato_speedscope(muestras, nombre, intervalo_ms):
+    """Perfil 'sampled' del formato de archivo de speedscope"""
+    indices = {}
+    marcos = []
+    pilas, pesos = [], []
+    for pila, conteo in muestras.items():
+        fila = []
+        for marco in pila:
+            if marco not in indices:
+                indices[marco] = len(marcos)
+                marcos.append({'name': marco})
+            fila.append(indices[marco])
+        pilas.append(fila)
+        pesos.append(conteo * intervalo_ms)
+
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': marcos},
+        'profiles': [{
+            'type': 'sampled',
+            'name': nombre,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': sum(pesos),
+            'samples': pilas,
+            'weights': pesos
+        }],
+        'exporter': 'convivir-perfilador'
+    }
+
+
+def leer_colapsado(contenido):
+    """Reconstruye las muestras desde un archivo colapsado"""
+    muestras = Counter()
+    for linea in contenido.splitlines():
+        pila, _, conteo = linea.rpartition(' ')
+        if pila:
+            muestras[tuple(pila.split(';'))] += int(conteo)
+    return muestras
+
+
+class PerfiladorPeticiones:
+    """
+    Perfilador opcional de peticiones lentas para Flask
+
+    Uso:
+        perfilador = PerfiladorPeticiones(app)
+        perfilador.listar()  # perfiles guardados, del más reciente al más antiguo
+    """
+
+    def __init__(self, app=None, directorio=None, excluir=('/api/eventos', '/api/perfiles', '/metrics', '/static')):
+        self.modo = os.environ.get('CONVIVIR_PERFILADO', 'off').lower()
+        self.tasa = float(os.environ.get('CONVIVIR_PERFILADO_TASA', 0.1))
+        self.umbral = float(os.environ.get('CONVIVIR_PERFILADO_UMBRAL_MS', 1000)) / 1000
+        self.intervalo = float(os.environ.get('CONVIVIR_PERFILADO_INTERVALO_MS', 5)) / 1000
+        self.max_perfiles = int(os.environ.get('CONVIVIR_PERFILES_MAX', 50))
+        self.directorio = directorio or os.environ.get(
+            'CONVIVIR_PERFILES_DIR',
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perfiles')
+        )
+        self.excluir = tuple(excluir)
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    @property
+    def activo(self):
+        return self.modo in ('header', 'on')
+
+    def init_app(self, app):
+        if not self.activo:
+            return
+        app.before_request(self._iniciar)
+        app.teardown_request(self._finalizar)
+        print(f"✅ Perfilado de peticiones activo (modo {self.modo}, umbral {self.umbral * 1000:.0f} ms)")
+
+    def _debe_perfilar(self):
+        if request.path.startswith(self.excluir):
+            return False
+        if request.headers.get(CABECERA_PERFILAR) == '1':
+            return True
+        return self.modo == 'on' and random.random() < self.tasa
+
+    def _iniciar(self):
+        if not self._debe_perfilar():
+            return
+        muestreador = MuestreadorPila(threading.get_ident(), self.intervalo)
+        g._perfil = (muestreador, time.perf_counter())
+        muestreador.iniciar()
+
+    def _finalizar(self, excepcion=None):
+        perfil = g.pop('_perfil', None)
+        if perfil is None:
+            return
+        muestreador, inicio = perfil
+        duracion = time.perf_counter() - inicio
+        muestreador.detener()
+
+        if duracion >= self.umbral and muestreador.muestras:
+            try:
+                self.guardar(muestreador.muestras, request.path, request.method, duracion)
+            except OSError as e:
+                print(f"⚠️ No se pudo guardar el perfil: {e}")
+
+    def guardar(self, muestras, ruta, metodo, duracion):
+        """Escribe el perfil colapsado y sus metadatos, y descarta los más antiguos sobre el máximo"""
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta_limpia = re.sub(r'[^\w]+', '_', ruta).strip('_') or 'raiz'
+        base = f"{datetime.now().strftime('%Y%m%dT%H%M%S_%f')}_{metodo}_{ruta_limpia}"
+
+        with open(os.path.join(self.directorio, base + '.collapsed'), 'w', encoding='utf-8') as f:
+            f.write(formato_colapsado(muestras))
+        with open(os.path.join(self.directorio, base + '.meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'nombre': base + '.collapsed',
+                'fecha': datetime.now().isoformat(timespec='seconds'),
+                'metodo': metodo,
+                'ruta': ruta,
+                'duracion_ms': round(duracion * 1000, 1),
+                'muestras': sum(muestras.values()),
+                'intervalo_ms': self.intervalo * 1000
+            }, f, ensure_ascii=False)
+
+        with self._lock:
+            bases = sorted(a[:-len('.collapsed')] for a in os.listdir(self.directorio) if a.endswith('.collapsed'))
+            sobrantes = bases[:-self.max_perfiles] if len(bases) > self.max_perfiles else []
+            for antigua in sobrantes:
+                for extension in ('.collapsed', '.meta.json'):
+                    try:
+                        os.remove(os.path.join(self.directorio, antigua + extension))
+                    except OSError:
+                        pass
+        return base + '.collapsed'
+
+    def listar(self):
+        """Metadatos de los perfiles guardados, del más reciente al más antiguo"""
+        if not os.path.isdir(self.directorio):
+            return []
+        perfiles = []
+        for nombre in sorted(os.listdir(self.directorio), reverse=True):
+            if not nombre.endswith('.meta.json'):
+                continue
+            try:
+                with open(os.path.join(self.directorio, nombre), encoding='utf-8') as f:
+                    perfiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return perfiles
+
+    def ruta_perfil(self, nombre):
+        """Ruta absoluta de un perfil guardado, o None si el nombre no es válido"""
+        if not PATRON_NOMBRE.match(nombre) or not nombre.endswith('.collapsed'):
+            return None
+        ruta_archivo = os.path.join(self.directorio, nombre)
+        return ruta_archivo if os.path.isfile(ruta_archivo) else None
+
+    def exportar_speedscope(self, nombre):
+        """Convierte un perfil guardado al formato JSON de speedscope"""
+        ruta_archivo = self.ruta_perfil(nombre)
+        if ruta_archivo is None:
+            return None
+        with open(ruta_archivo, encoding='utf-8') as f:
+            muestras = leer_colapsado(f.read())
+        return formato_speedscope(muestras, nombre, self.intervalo * 1000)
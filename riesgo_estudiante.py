@@ -0,0 +1,444 @@
+"""
+Módulo de Riesgo por Estudiante para CONVIVIR v4.0
+Puntaje de riesgo (0-100) de cada estudiante, materializado en la tabla
+riesgo_estudiante y agregado por curso y establecimiento con SQL
+
+Componentes (cada uno normalizado a 0-1):
+- negatividad: proporción de comentarios negativos (sentimiento persistido o,
+  si no se ha analizado, el del análisis por reglas del NLP)
+- victimizacion: interacciones dañinas recibidas (Bullying, Conflicto),
+  ponderadas con los pesos del grafo social por la intensidad
+- aislamiento: pocos compañeros distintos con interacciones positivas
+- socioemocional: nivel de la última evaluación (bienestar, ansiedad,
+  autoestima) más la caída del bienestar por periodo (trayectorias_socioemocionales)
+- incidentes: interacciones dañinas iniciadas por el estudiante
+
+Todos los estudiantes se calculan en una pasada con operaciones agrupadas de
+pandas. La actualización es incremental: solo los comentarios con id mayor al
+último procesado pasan por el NLP (los estudiantes cuyo total no cuadra con la
+tabla comentarios, por borrados, se recuentan) y solo se escriben las filas que
+cambiaron. MotorRiesgo se actualiza solo, en la siguiente lectura, cuando
+VersionesDatos indica escrituras en las tablas de origen.
+
+Uso:
+    python riesgo_estudiante.py actualizar [--recalcular]
+    python riesgo_estudiante.py cursos
+"""
+
+import argparse
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func, text, bindparam
+
+from database import Comentario, RiesgoEstudiante
+from acceso_caracteristicas import (
+    aristas_grafo_social, atributos_estudiantes, sentimientos_comentarios, evaluaciones_estudiantes
+)
+from trayectorias_socioemocionales import construir_trayectorias
+from modelo_gnn import PESOS_INTERACCION, PESO_INTERACCION_DEFECTO
+
+
+# Tablas cuyas escrituras cambian los puntajes
+TABLAS_FUENTE = ('estudiantes', 'comentarios', 'interacciones_sociales', 'evaluaciones_socioemocionales')
+
+# Peso de cada componente en el puntaje (suman 1)
+PESOS_RIESGO = {
+    'negatividad': 0.30,
+    'victimizacion': 0.25,
+    'socioemocional': 0.20,
+    'aislamiento': 0.15,
+    'incidentes': 0.10,
+}
+COMPONENTES = tuple(PESOS_RIESGO)
+
+# Puntaje mínimo de cada nivel (0-100), de mayor a menor
+UMBRALES_NIVEL = (('alto', 50.0), ('medio', 30.0))
+
+# Comentarios "virtuales" no negativos: con pocos comentarios, uno negativo no
+# basta para una negatividad máxima
+PRIOR_COMENTARIOS = 2
+
+# Daño ponderado (|peso| x intensidad) con el que victimización/incidentes llegan a 1 - 1/e
+ESCALA_DANO = 10.0
+
+# Compañeros distintos con interacciones positivas a partir de los que el
+# aislamiento es 0 (identificar_estudiantes_aislados usa 2 conexiones)
+CONTACTOS_SIN_AISLAMIENTO = 4
+
+# Estudiantes a recontar por consulta IN; con más se recuentan todos los comentarios
+MAXIMO_RECUENTO_PARCIAL = 500
+
+ESCALA_PUNTAJE_EVALUACION = 9.0  # Puntajes de 1 a 10
+
+ACUMULADORES = ('comentarios_total', 'comentarios_negativos', 'ultimo_comentario_id')
+COLUMNAS = ('estudiante_id', 'curso_id', 'puntaje', 'nivel') + COMPONENTES + ACUMULADORES
+
+
+# ----------------------------------------------------------------------
+# Componentes (vectorizados sobre todos los estudiantes)
+# ----------------------------------------------------------------------
+
+def contar_comentarios(df, analizador=None):
+    """
+    Totales por estudiante de un lote de comentarios (sentimientos_comentarios)
+
+    Los comentarios sin sentimiento persistido se clasifican por reglas en una
+    sola llamada a analizar_reglas_lote.
+
+    Returns:
+        DataFrame indexado por estudiante_id con comentarios_total,
+        comentarios_negativos y ultimo_comentario_id
+    """
+    if df.empty:
+        return pd.DataFrame(columns=list(ACUMULADORES), index=pd.Index([], name='estudiante_id'), dtype='int64')
+
+    sentimiento = df['sentimiento'].copy()
+    pendientes = sentimiento.isna().to_numpy()
+    if pendientes.any():
+        if analizador is None:
+            from modelo_nlp import AnalizadorNLPAvanzado
+            analizador = AnalizadorNLPAvanzado(usar_transformer=False)
+        reglas = analizador.analizar_reglas_lote(df.loc[pendientes, 'texto'])
+        sentimiento[pendientes] = reglas['sentimiento'].to_numpy()
+
+    return pd.DataFrame({
+        'estudiante_id': df['estudiante_id'],
+        'negativo': sentimiento.eq('negativo').astype('int64'),
+        'id': df['id']
+    }).groupby('estudiante_id').agg(
+        comentarios_total=('id', 'size'),
+        comentarios_negativos=('negativo', 'sum'),
+        ultimo_comentario_id=('id', 'max')
+    )
+
+
+def componentes_interacciones(df_interacciones, estudiante_ids):
+    """victimizacion, incidentes y aislamiento por estudiante (DataFrame indexado por estudiante_id)"""
+    indice = pd.Index(estudiante_ids, name='estudiante_id')
+    resultado = pd.DataFrame(0.0, index=indice, columns=['victimizacion', 'incidentes', 'aislamiento'])
+    if df_interacciones.empty:
+        # Sin interacciones registradas no hay evidencia de aislamiento
+        return resultado
+
+    peso = df_interacciones['tipo'].map(PESOS_INTERACCION).fillna(PESO_INTERACCION_DEFECTO)
+    intensidad = df_interacciones['intensidad'].fillna(1).astype('float64')
+    dano = (-peso).clip(lower=0) * intensidad
+
+    recibido = dano.groupby(df_interacciones['destino']).sum().reindex(indice, fill_value=0.0)
+    causado = dano.groupby(df_interacciones['origen']).sum().reindex(indice, fill_value=0.0)
+    resultado['victimizacion'] = 1.0 - np.exp(-recibido.to_numpy() / ESCALA_DANO)
+    resultado['incidentes'] = 1.0 - np.exp(-causado.to_numpy() / ESCALA_DANO)
+
+    # Compañeros distintos con alguna interacción positiva, en cualquier sentido
+    positivas = df_interacciones.loc[peso.to_numpy() > 0, ['origen', 'destino']]
+    pares = pd.DataFrame({
+        'estudiante': np.concatenate([positivas['origen'].to_numpy(), positivas['destino'].to_numpy()]),
+        'companero': np.concatenate([positivas['destino'].to_numpy(), positivas['origen'].to_numpy()])
+    }).drop_duplicates()
+    contactos = pares.groupby('estudiante').size().reindex(indice, fill_value=0)
+    resultado['aislamiento'] = np.clip(1.0 - contactos.to_numpy() / CONTACTOS_SIN_AISLAMIENTO, 0.0, 1.0)
+    return resultado
+
+
+def componente_socioemocional(trayectorias, estudiante_ids):
+    """socioemocional por estudiante a partir de Trayectorias (Series indexada por estudiante_id)"""
+    valores = trayectorias.ultimos()[0]
+    columna = {d: j for j, d in enumerate(trayectorias.dimensiones)}
+
+    # Malestar de la última evaluación: bienestar y autoestima bajos, ansiedad alta
+    malestar = np.stack([
+        (10.0 - valores[:, columna['bienestar']]) / ESCALA_PUNTAJE_EVALUACION,
+        (valores[:, columna['ansiedad']] - 1.0) / ESCALA_PUNTAJE_EVALUACION,
+        (10.0 - valores[:, columna['autoestima']]) / ESCALA_PUNTAJE_EVALUACION,
+    ], axis=1)
+    observados = (~np.isnan(malestar)).sum(axis=1)
+    nivel = np.where(observados > 0, np.nansum(malestar, axis=1) / np.maximum(observados, 1), 0.0)
+
+    caida = np.nan_to_num(np.clip(-trayectorias.pendientes[:, columna['bienestar']], 0.0, None))
+    valor = np.clip(nivel + caida / ESCALA_PUNTAJE_EVALUACION, 0.0, 1.0)
+    return pd.Series(valor, index=pd.Index(trayectorias.estudiantes)).reindex(estudiante_ids).fillna(0.0)
+
+
+def combinar_componentes(df):
+    """Agrega 'puntaje' (0-100) y 'nivel' a un DataFrame con las columnas COMPONENTES"""
+    pesos = np.array([PESOS_RIESGO[c] for c in COMPONENTES])
+    puntaje = df[list(COMPONENTES)].to_numpy(dtype='float64') @ pesos * 100.0
+    df['puntaje'] = np.round(puntaje, 2)
+    df['nivel'] = np.select(
+        [df['puntaje'] >= minimo for _, minimo in UMBRALES_NIVEL],
+        [nivel for nivel, _ in UMBRALES_NIVEL],
+        default='bajo'
+    )
+    return df
+
+
+# ----------------------------------------------------------------------
+# Materialización
+# ----------------------------------------------------------------------
+
+class MotorRiesgo:
+    """
+    Mantiene la tabla riesgo_estudiante al día con las tablas de origen
+
+    Uso:
+        motor = MotorRiesgo(db.engine, cache.versiones)
+        motor.asegurar_vigente()        # antes de leer riesgo_estudiante
+        motor.resumen_establecimiento()
+
+    Con un MotorTrayectorias reutiliza sus trayectorias en memoria en lugar de
+    volver a leer las evaluaciones.
+    """
+
+    def __init__(self, engine, versiones=None, trayectorias=None):
+        self.engine = engine
+        self.versiones = versiones
+        self.trayectorias = trayectorias
+        self.actualizaciones = 0
+        self._lock = threading.RLock()
+        self._version_fuentes = None
+        self._analizador = None
+
+    def _version_actual(self):
+        return self.versiones.version(*TABLAS_FUENTE) if self.versiones is not None else None
+
+    def asegurar_vigente(self):
+        """
+        Actualiza riesgo_estudiante si hubo escrituras en las tablas de origen
+        desde la última actualización de este proceso
+
+        Sin VersionesDatos, solo actualiza la primera vez.
+        """
+        with self._lock:
+            version = self._version_actual()
+            if self.actualizaciones and version == self._version_fuentes:
+                return None
+            resultado = self._actualizar()
+            # Se guarda la versión leída antes de actualizar: una escritura
+            # concurrente deja la tabla pendiente para la siguiente lectura
+            self._version_fuentes = version
+            return resultado
+
+    def actualizar(self, recalcular=False):
+        """
+        Actualiza riesgo_estudiante
+
+        Args:
+            recalcular: Si True, vuelve a clasificar todos los comentarios
+
+        Returns:
+            dict con estudiantes, actualizados, eliminados, comentarios_nuevos y recontados
+        """
+        with self._lock:
+            return self._actualizar(recalcular)
+
+    def _analizador_reglas(self):
+        if self._analizador is None:
+            from modelo_nlp import AnalizadorNLPAvanzado
+            self._analizador = AnalizadorNLPAvanzado(usar_transformer=False)
+        return self._analizador
+
+    def _leer_materializado(self):
+        with self.engine.connect() as conn:
+            return pd.read_sql(select(*[getattr(RiesgoEstudiante, c) for c in COLUMNAS]), conn)
+
+    def _conteos_comentarios(self, estudiantes, materializado, recalcular):
+        """Acumuladores de comentarios por estudiante, procesando solo lo nuevo"""
+        indice = pd.Index(estudiantes['estudiante_id'], name='estudiante_id')
+        if recalcular or materializado.empty:
+            previos = pd.DataFrame(0, index=indice, columns=list(ACUMULADORES))
+            desde_id = None
+        else:
+            previos = (materializado.set_index('estudiante_id')[list(ACUMULADORES)]
+                       .reindex(indice).fillna(0).astype('int64'))
+            desde_id = int(materializado['ultimo_comentario_id'].max() or 0)
+
+        nuevos = sentimientos_comentarios(self.engine, desde_id=desde_id)
+        conteo = contar_comentarios(nuevos, self._analizador_reglas()).reindex(indice, fill_value=0)
+        acumulado = previos[['comentarios_total', 'comentarios_negativos']] + conteo[['comentarios_total', 'comentarios_negativos']]
+        acumulado['ultimo_comentario_id'] = np.maximum(previos['ultimo_comentario_id'], conteo['ultimo_comentario_id'])
+
+        # Los totales deben cuadrar con la tabla; si no (borrados), se recuentan
+        with self.engine.connect() as conn:
+            reales = pd.read_sql(
+                select(Comentario.estudiante_id, func.count().label('total')).group_by(Comentario.estudiante_id),
+                conn
+            ).set_index('estudiante_id')['total'].reindex(indice, fill_value=0)
+        descuadrados = indice[acumulado['comentarios_total'].to_numpy() != reales.to_numpy()]
+
+        if len(descuadrados):
+            ids = list(descuadrados) if len(descuadrados) <= MAXIMO_RECUENTO_PARCIAL else None
+            recuento = contar_comentarios(
+                sentimientos_comentarios(self.engine, estudiante_ids=ids), self._analizador_reglas()
+            ).reindex(descuadrados, fill_value=0)
+            acumulado.loc[descuadrados, list(ACUMULADORES)] = recuento[list(ACUMULADORES)].to_numpy()
+
+        return acumulado.astype('int64'), len(nuevos), len(descuadrados)
+
+    def _calcular(self, recalcular=False):
+        """Puntajes de todos los estudiantes (DataFrame con COLUMNAS) y estadísticas del cálculo"""
+        estudiantes = atributos_estudiantes(self.engine)
+        materializado = self._leer_materializado()
+        ids = estudiantes['estudiante_id'].to_numpy()
+
+        conteos, comentarios_nuevos, recontados = self._conteos_comentarios(estudiantes, materializado, recalcular)
+        interacciones = componentes_interacciones(aristas_grafo_social(self.engine), ids)
+        if self.trayectorias is not None:
+            trayectorias = self.trayectorias.obtener()
+        else:
+            trayectorias = construir_trayectorias(evaluaciones_estudiantes(self.engine), estudiantes)
+        socioemocional = componente_socioemocional(trayectorias, ids)
+
+        df = estudiantes[['estudiante_id', 'curso_id']].set_index('estudiante_id')
+        df = df.join(conteos).join(interacciones)
+        df['socioemocional'] = socioemocional
+        df['negatividad'] = df['comentarios_negativos'] / (df['comentarios_total'] + PRIOR_COMENTARIOS)
+        for componente in COMPONENTES:
+            df[componente] = df[componente].astype('float64').round(4)
+        df = combinar_componentes(df).reset_index()[list(COLUMNAS)]
+
+        return df, materializado, {'comentarios_nuevos': comentarios_nuevos, 'recontados': recontados}
+
+    def _actualizar(self, recalcular=False):
+        df, materializado, estadisticas = self._calcular(recalcular)
+
+        # Solo se escriben las filas nuevas o con algún valor distinto
+        if materializado.empty:
+            cambiados = df
+        else:
+            comparacion = df.merge(materializado, on='estudiante_id', how='left', suffixes=('', '_previo'))
+            distinto = np.zeros(len(df), dtype=bool)
+            for columna in COLUMNAS[1:]:
+                actual, previo = comparacion[columna], comparacion[f'{columna}_previo']
+                if columna in COMPONENTES or columna == 'puntaje':
+                    distinto |= ~np.isclose(actual.to_numpy(dtype='float64'),
+                                            previo.to_numpy(dtype='float64'), atol=1e-4, equal_nan=False)
+                else:
+                    distinto |= (actual != previo).to_numpy()
+            cambiados = df[distinto]
+        eliminados = sorted(set(materializado['estudiante_id']) - set(df['estudiante_id']))
+
+        if len(cambiados) or eliminados:
+            ahora = datetime.now()
+            filas = [
+                {**fila, 'fecha_actualizacion': ahora}
+                for fila in cambiados.astype(object).where(cambiados.notna(), None).to_dict('records')
+            ]
+            columnas = list(COLUMNAS) + ['fecha_actualizacion']
+            asignaciones = ', '.join(f'{c} = excluded.{c}' for c in columnas[1:])
+            with self.engine.begin() as conn:
+                if filas:
+                    conn.execute(text(f"""
+                        INSERT INTO riesgo_estudiante ({', '.join(columnas)})
+                        VALUES ({', '.join(':' + c for c in columnas)})
+                        ON CONFLICT (estudiante_id) DO UPDATE SET {asignaciones}
+                    """), filas)
+                for inicio in range(0, len(eliminados), MAXIMO_RECUENTO_PARCIAL):
+                    conn.execute(
+                        text("DELETE FROM riesgo_estudiante WHERE estudiante_id IN :ids")
+                        .bindparams(bindparam('ids', expanding=True)),
+                        {'ids': eliminados[inicio:inicio + MAXIMO_RECUENTO_PARCIAL]}
+                    )
+
+        self.actualizaciones += 1
+        return {
+            'estudiantes': len(df),
+            'actualizados': len(cambiados),
+            'eliminados': len(eliminados),
+            **estadisticas
+        }
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def resumen_establecimiento(self, conn=None):
+        """Puntaje promedio, máximo y estudiantes por nivel en todo el establecimiento"""
+        return self._agregados(conn)[None]
+
+    def resumen_cursos(self, conn=None):
+        """dict {curso_id: promedio, máximo y estudiantes por nivel}"""
+        return self._agregados(conn, por_curso=True)
+
+    def _agregados(self, conn=None, por_curso=False):
+        if conn is None:
+            with self.engine.connect() as conn:
+                return self._agregados(conn, por_curso)
+
+        filas = conn.execute(text(f"""
+            SELECT
+                {'curso_id' if por_curso else 'NULL'},
+                COUNT(*),
+                AVG(puntaje),
+                MAX(puntaje),
+                SUM(CASE WHEN nivel = 'alto' THEN 1 ELSE 0 END),
+                SUM(CASE WHEN nivel = 'medio' THEN 1 ELSE 0 END),
+                SUM(CASE WHEN nivel = 'bajo' THEN 1 ELSE 0 END)
+            FROM riesgo_estudiante
+            {'GROUP BY curso_id ORDER BY curso_id' if por_curso else ''}
+        """)).fetchall()
+        return {
+            fila[0]: {
+                'estudiantes': fila[1] or 0,
+                'riesgo_promedio': round(float(fila[2] or 0), 2),
+                'riesgo_maximo': round(float(fila[3] or 0), 2),
+                'alto': fila[4] or 0,
+                'medio': fila[5] or 0,
+                'bajo': fila[6] or 0
+            }
+            for fila in filas
+        }
+
+    def estudiante(self, estudiante_id, conn=None):
+        """Fila de riesgo_estudiante como dict (None si no existe)"""
+        if conn is None:
+            with self.engine.connect() as conn:
+                return self.estudiante(estudiante_id, conn)
+
+        fila = conn.execute(
+            select(*[getattr(RiesgoEstudiante, c) for c in COLUMNAS])
+            .where(RiesgoEstudiante.estudiante_id == estudiante_id)
+        ).mappings().fetchone()
+        return dict(fila) if fila is not None else None
+
+    def mayor_riesgo(self, limite=10, curso_id=None, conn=None):
+        """Estudiantes de mayor puntaje (opcionalmente de un curso), con sus componentes"""
+        if conn is None:
+            with self.engine.connect() as conn:
+                return self.mayor_riesgo(limite, curso_id, conn)
+
+        columnas = [c for c in COLUMNAS if c not in ACUMULADORES]
+        consulta = select(*[getattr(RiesgoEstudiante, c) for c in columnas])
+        if curso_id is not None:
+            consulta = consulta.where(RiesgoEstudiante.curso_id == curso_id)
+        consulta = consulta.order_by(RiesgoEstudiante.puntaje.desc(), RiesgoEstudiante.estudiante_id).limit(limite)
+        return [dict(fila) for fila in conn.execute(consulta).mappings()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Puntaje de riesgo por estudiante')
+    sub = parser.add_subparsers(dest='comando', required=True)
+    p_actualizar = sub.add_parser('actualizar', help='Actualiza la tabla riesgo_estudiante')
+    p_actualizar.add_argument('--recalcular', action='store_true', help='Vuelve a clasificar todos los comentarios')
+    sub.add_parser('cursos', help='Muestra el riesgo promedio por curso')
+    args = parser.parse_args()
+
+    from database import DatabaseManager
+    db = DatabaseManager('convivir_v4.db')
+    motor = MotorRiesgo(db.engine)
+
+    if args.comando == 'actualizar':
+        resultado = motor.actualizar(recalcular=args.recalcular)
+        print(f"✅ {resultado['estudiantes']} estudiantes, {resultado['actualizados']} actualizados, "
+              f"{resultado['eliminados']} eliminados ({resultado['comentarios_nuevos']} comentarios nuevos, "
+              f"{resultado['recontados']} recontados)")
+    else:
+        for curso_id, datos in motor.resumen_cursos().items():
+            print(f"  {curso_id}: {datos['riesgo_promedio']:.2f} "
+                  f"(alto {datos['alto']}, medio {datos['medio']}, bajo {datos['bajo']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""
+Módulo de Inferencia de Sentimientos con ONNX Runtime para CONVIVIR v4.0
+Backend opcional para el modelo BETO de AnalizadorNLPAvanzado en servidores sin GPU:
+
+- Exporta una sola vez el modelo de clasificación de secuencias a ONNX y le aplica
+  cuantización dinámica int8 (pesos de las capas lineales en int8)
+- Ejecuta el modelo cuantizado con onnxruntime y un número de hilos configurable
+- ClasificadorSentimientoONNX se invoca igual que el pipeline de transformers
+  (retorna [{'label', 'score'}]), de modo que analizar_sentimiento no cambia
+
+Variables de entorno:
+    CONVIVIR_NLP_BACKEND   'torch' (por defecto) u 'onnx'
+    CONVIVIR_ONNX_DIR      Directorio del modelo exportado (modelos_onnx/<modelo>)
+    CONVIVIR_ONNX_HILOS    Hilos intra-op de onnxruntime (0 = todos los núcleos)
+
+Uso:
+    python sentimiento_onnx.py exportar
+    python sentimiento_onnx.py exportar --modelo finiteautomata/beto-sentiment-analysis --directorio modelos_onnx/beto
+"""
+
+import os
+import argparse
+import threading
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+    print("⚠️ onnxruntime no disponible. El backend ONNX de sentimientos queda deshabilitado.")
+
+
+ARCHIVO_FP32 = 'modelo.onnx'
+ARCHIVO_INT8 = 'modelo_int8.onnx'
+LARGO_MAXIMO = 512
+OPSET = 14
+
+
+def directorio_por_defecto(modelo):
+    """Directorio del modelo exportado: CONVIVIR_ONNX_DIR o modelos_onnx/<nombre del modelo>"""
+    if os.environ.get('CONVIVIR_ONNX_DIR'):
+        return os.environ['CONVIVIR_ONNX_DIR']
+    raiz = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(raiz, 'modelos_onnx', modelo.replace('/', '__'))
+
+
+def hilos_por_defecto():
+    return int(os.environ.get('CONVIVIR_ONNX_HILOS', 0))
+
+
+def modelo_exportado(directorio):
+    """True si el directorio ya contiene el modelo cuantizado, su tokenizador y su configuración"""
+    return all(
+        os.path.exists(os.path.join(directorio, archivo))
+        for archivo in (ARCHIVO_INT8, 'config.json', 'tokenizer_config.json')
+    )
+
+
+# ----------------------------------------------------------------------
+# Exportación y cuantización
+# ----------------------------------------------------------------------
+
+def exportar_modelo(modelo, directorio, conservar_fp32=False):
+    """
+    Exporta un modelo de clasificación de secuencias a ONNX y lo cuantiza a int8
+
+    Args:
+        modelo: Nombre en el hub de Hugging Face o ruta local
+        directorio: Destino de modelo_int8.onnx, el tokenizador y config.json
+        conservar_fp32: Si True, deja también el ONNX de precisión completa
+
+    Returns:
+        Ruta del modelo cuantizado
+    """
+    # torch y transformers solo se necesitan para exportar
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(directorio, exist_ok=True)
+    ruta_fp32 = os.path.join(directorio, ARCHIVO_FP32)
+    ruta_int8 = os.path.join(directorio, ARCHIVO_INT8)
+
+    tokenizer = AutoTokenizer.from_pretrained(modelo)
+    modelo_torch = AutoModelForSequenceClassification.from_pretrained(modelo)
+    modelo_torch.eval()
+
+    ejemplo = tokenizer(["el ambiente del curso es bueno"], return_tensors='pt')
+    # Mismo orden que los argumentos de forward() del modelo
+    entradas = [nombre for nombre in ('input_ids', 'attention_mask', 'token_type_ids') if nombre in ejemplo]
+    ejes = {nombre: {0: 'lote', 1: 'secuencia'} for nombre in entradas}
+    ejes['logits'] = {0: 'lote'}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            modelo_torch,
+            tuple(ejemplo[nombre] for nombre in entradas),
+            ruta_fp32,
+            input_names=entradas,
+            output_names=['logits'],
+            dynamic_axes=ejes,
+            opset_version=OPSET,
+            do_constant_folding=True
+        )
+
+    quantize_dynamic(ruta_fp32, ruta_int8, weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(directorio)
+    modelo_torch.config.save_pretrained(directorio)
+    if not conservar_fp32:
+        os.remove(ruta_fp32)
+
+    print(f"✅ Modelo ONNX int8 exportado en {ruta_int8} ({os.path.getsize(ruta_int8) / 1024 / 1024:.1f} MB)")
+    return ruta_int8
+
+
+def preparar_modelo(modelo, directorio=None):
+    """Exporta el modelo si todavía no existe en el directorio; retorna el directorio"""
+    directorio = directorio or directorio_por_defecto(modelo)
+    if not modelo_exportado(directorio):
+        exportar_modelo(modelo, directorio)
+    return directorio
+
+
+# ----------------------------------------------------------------------
+# Inferencia
+# ----------------------------------------------------------------------
+
+class ClasificadorSentimientoONNX:
+    """
+    Clasificador de sentimientos sobre el modelo ONNX cuantizado
+
+    Se invoca como el pipeline "sentiment-analysis" de transformers:
+        clasificador("me siento solo")  ->  [{'label': 'NEG', 'score': 0.93}]
+        clasificador([texto1, texto2])  ->  [{...}, {...}]
+    """
+
+    def __init__(self, directorio, hilos=0, archivo=ARCHIVO_INT8):
+        from transformers import AutoTokenizer, AutoConfig
+
+        opciones = ort.SessionOptions()
+        opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opciones.intra_op_num_threads = hilos
+        opciones.inter_op_num_threads = 1
+
+        self.directorio = directorio
+        self.hilos = hilos
+        self.sesion = ort.InferenceSession(
+            os.path.join(directorio, archivo), opciones, providers=['CPUExecutionProvider']
+        )
+        self.entradas = {entrada.name for entrada in self.sesion.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(directorio)
+        id2label = AutoConfig.from_pretrained(directorio).id2label
+        self.etiquetas = [id2label[i] for i in range(len(id2label))]
+
+    def logits(self, textos):
+        """Logits (lote, clases) para una lista de textos"""
+        codificado = self.tokenizer(
+            list(textos), truncation=True, max_length=LARGO_MAXIMO, padding=True, return_tensors='np'
+        )
+        alimentacion = {
+            nombre: valores.astype(np.int64)
+            for nombre, valores in codificado.items() if nombre in self.entradas
+        }
+        return self.sesion.run(['logits'], alimentacion)[0]
+
+    def __call__(self, textos):
+        if isinstance(textos, str):
+            textos = [textos]
+        logits = self.logits(textos)
+        # Softmax numéricamente estable
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probabilidades = exp / exp.sum(axis=1, keepdims=True)
+        indices = probabilidades.argmax(axis=1)
+        return [
+            {'label': self.etiquetas[i], 'score': float(probabilidades[fila, i])}
+            for fila, i in enumerate(indices)
+        ]
+
+
+# Sesión compartida por los hilos del proceso. Las sesiones de onnxruntime no
+# sobreviven a un fork: cada worker de gunicorn crea la suya al primer uso.
+_clasificador = None
+_lock_clasificador = threading.Lock()
+
+
+def _descartar_tras_fork():
+    global _clasificador
+    _clasificador = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_descartar_tras_fork)
+
+
+def obtener_clasificador(modelo, directorio=None, hilos=None):
+    """Retorna el clasificador ONNX del proceso, exportando el modelo la primera vez (None si no está disponible)"""
+    global _clasificador
+    if not ONNXRUNTIME_AVAILABLE:
+        return None
+    if _clasificador is None:
+        with _lock_clasificador:
+            if _clasificador is None:
+                directorio = preparar_modelo(modelo, directorio)
+                hilos = hilos_por_defecto() if hilos is None else hilos
+                _clasificador = ClasificadorSentimientoONNX(directorio, hilos=hilos)
+                print(f"✅ Modelo ONNX int8 cargado exitosamente ({hilos or 'todos los'} hilos)")
+    return _clasificador
+
+
+def main():
+    from modelo_nlp import MODELO_SENTIMIENTO
+
+    parser = argparse.ArgumentParser(description='Exporta el modelo de sentimientos a ONNX int8')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    exportar = subparsers.add_parser('exportar', help='Exporta y cuantiza el modelo')
+    exportar.add_argument('--modelo', default=MODELO_SENTIMIENTO)
+    exportar.add_argument('--directorio', help='Destino (por defecto modelos_onnx/<modelo> o CONVIVIR_ONNX_DIR)')
+    exportar.add_argument('--conservar-fp32', action='store_true', help='Conserva también el ONNX sin cuantizar')
+
+    args = parser.parse_args()
+    if not ONNXRUNTIME_AVAILABLE:
+        raise SystemExit("❌ Instale onnxruntime para exportar el modelo")
+
+    exportar_modelo(args.modelo, args.directorio or directorio_por_defecto(args.modelo), args.conservar_fp32)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Módulo de Serialización y Compresión de Respuestas para CONVIVIR v4.0
+JSON rápido con orjson (tipos numpy/pandas/datetime) y compresión gzip/brotli
+negociada según Accept-Encoding
+"""
+
+import os
+import gzip
+import json
+import math
+from datetime import datetime, date
+
+import numpy as np
+import pandas as pd
+from flask.json.provider import JSONProvider
+
+from cache_respuestas import CacheLRU
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    print("⚠️ orjson no disponible. Usando serializador JSON estándar.")
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+
+def convertir_tipo(obj):
+    """
+    Convierte tipos que el serializador no conoce de forma nativa
+    (escalares y arreglos numpy, objetos pandas, fechas, conjuntos)
+    """
+    if isinstance(obj, (pd.Timestamp, datetime, date)):
+        return None if pd.isna(obj) else obj.isoformat()
+    if isinstance(obj, np.generic):
+        valor = obj.item()
+        if isinstance(valor, float) and not math.isfinite(valor):
+            return None
+        return valor
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, pd.DataFrame):
+        return obj.to_dict('records')
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if obj is pd.NaT:
+        return None
+    raise TypeError(f'Objeto de tipo {type(obj).__name__} no es serializable a JSON')
+
+
+def _limpiar_no_finitos(obj):
+    """Reemplaza NaN/inf por None para que el JSON estándar sea válido"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _limpiar_no_finitos(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_limpiar_no_finitos(v) for v in obj]
+    return obj
+
+
+def serializar_json(obj):
+    """Serializa a bytes JSON usando orjson si está disponible"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(
+            obj,
+            default=convertir_tipo,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(
+        _limpiar_no_finitos(obj), default=convertir_tipo, ensure_ascii=False
+    ).encode('utf-8')
+
+
+class ProveedorJSONRapido(JSONProvider):
+    """
+    Proveedor JSON de Flask respaldado por orjson
+
+    Reemplaza el serializador de jsonify() en toda la aplicación:
+        app.json = ProveedorJSONRapido(app)
+    """
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return serializar_json(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if ORJSON_AVAILABLE:
+            return orjson.loads(s)
+        return json.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(serializar_json(obj), mimetype=self.mimetype)
+
+
+class CompresionRespuestas:
+    """
+    Comprime con brotli o gzip las respuestas de texto que superan un umbral
+
+    Las respuestas con ETag se comprimen una sola vez por codificación y se
+    reutilizan desde un LRU; el ETag pasa a ser débil porque la misma versión
+    se entrega con distintas codificaciones.
+    """
+
+    TIPOS_COMPRIMIBLES = {
+        'application/json', 'text/html', 'text/plain', 'text/css',
+        'application/javascript', 'text/javascript'
+    }
+
+    def __init__(self, app=None, tamano_minimo=None, nivel_gzip=6, calidad_brotli=5):
+        """
+        Args:
+            app: Aplicación Flask
+            tamano_minimo: Bytes a partir de los cuales se comprime
+                (por defecto CONVIVIR_COMPRESION_MINIMA o 1024)
+            nivel_gzip: Nivel de compresión gzip (1-9)
+            calidad_brotli: Calidad de brotli (0-11)
+        """
+        if tamano_minimo is None:
+            tamano_minimo = int(os.environ.get('CONVIVIR_COMPRESION_MINIMA', 1024))
+
+        self.tamano_minimo = tamano_minimo
+        self.nivel_gzip = nivel_gzip
+        self.calidad_brotli = calidad_brotli
+        self.comprimidos = CacheLRU(128)
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.after_request(self.comprimir)
+
+    def _elegir_codificacion(self, request):
+        aceptadas = request.accept_encodings
+        if BROTLI_AVAILABLE and aceptadas['br']:
+            return 'br'
+        if aceptadas['gzip']:
+            return 'gzip'
+        return None
+
+    def _codificar(self, datos, codificacion):
+        if codificacion == 'br':
+            return brotli.compress(datos, quality=self.calidad_brotli)
+        return gzip.compress(datos, compresslevel=self.nivel_gzip)
+
+    def comprimir(self, response):
+        from flask import request
+
+        if (response.status_code != 200
+                or response.direct_passthrough
+                or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in self.TIPOS_COMPRIMIBLES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+
+        codificacion = self._elegir_codificacion(request)
+        if codificacion is None:
+            return response
+
+        datos = response.get_data()
+        if len(datos) < self.tamano_minimo:
+            return response
+
+        etag, _ = response.get_etag()
+        clave = (etag, codificacion) if etag else None
+        comprimido = self.comprimidos.obtener(clave) if clave else None
+
+        if comprimido is None:
+            comprimido = self._codificar(datos, codificacion)
+            if clave:
+                self.comprimidos.guardar(clave, comprimido)
+
+        response.set_data(comprimido)
+        response.headers['Content-Encoding'] = codificacion
+        if etag:
+            response.set_etag(etag, weak=True)
+
+        return response
@@ -0,0 +1,372 @@
+"""
+Módulo de Trayectorias Socioemocionales para CONVIVIR v4.0
+Análisis longitudinal de evaluaciones_socioemocionales para todo el
+establecimiento, sin recorrer estudiante por estudiante
+
+- Las evaluaciones se pivotan en un arreglo (estudiante, periodo, dimensión)
+  con NaN donde no hay evaluación (varias en un mismo periodo se promedian)
+- Con operaciones de NumPy sobre el arreglo completo se calculan:
+    pendientes: tendencia de mínimos cuadrados por estudiante y dimensión
+    (puntos por periodo)
+    z_curso / z_cohorte: desviación respecto de los compañeros del curso y de
+    la cohorte en el mismo periodo
+    caidas: empeoramientos de al menos CAIDA_MINIMA puntos respecto de la
+    evaluación anterior del estudiante
+- z y caídas están orientados: negativo = peor (en ansiedad, subir es empeorar)
+- MotorTrayectorias guarda el resultado en memoria y lo reconstruye solo
+  cuando VersionesDatos indica escrituras en las evaluaciones o los estudiantes
+
+Uso:
+    python trayectorias_socioemocionales.py [--curso 1°A]
+"""
+
+import argparse
+import threading
+
+import numpy as np
+import pandas as pd
+
+from acceso_caracteristicas import PUNTAJES_EVALUACION, atributos_estudiantes, evaluaciones_estudiantes
+
+
+TABLAS_FUENTE = ('evaluaciones_socioemocionales', 'estudiantes')
+
+DIMENSIONES = tuple(PUNTAJES_EVALUACION)
+
+# +1 si un puntaje alto es favorable, -1 si es desfavorable
+SENTIDO_DIMENSIONES = {
+    'empatia': 1.0,
+    'autoestima': 1.0,
+    'resolucion_conflictos': 1.0,
+    'ansiedad': -1.0,
+    'bienestar': 1.0,
+}
+
+# Empeoramiento mínimo (puntos en la escala 1-10) entre evaluaciones consecutivas
+CAIDA_MINIMA = 2.0
+
+# |z| desde el que un estudiante se aparta de su grupo
+UMBRAL_Z = 2.0
+
+# Pendiente desfavorable (puntos por periodo) que cuenta como alerta
+PENDIENTE_MINIMA = 1.0
+
+# Estudiantes evaluados en el periodo para que un grupo sirva de línea base
+MINIMO_GRUPO = 3
+
+
+def etiquetas_periodo(df_evaluaciones):
+    """
+    Periodo de cada evaluación incluyendo el año ("Semestre 1 2024"), para que
+    los semestres de años distintos no se mezclen. Sin periodo se usa el
+    semestre de la fecha ("2024-S1")
+    """
+    fechas = df_evaluaciones['fecha']
+    anio = fechas.dt.year.astype('Int64').astype(str)
+    semestre = pd.Series(np.where(fechas.dt.month <= 6, '-S1', '-S2'), index=df_evaluaciones.index)
+    periodo = df_evaluaciones['periodo'].fillna('').astype(str).str.strip()
+
+    # La etiqueta se arma una vez por combinación distinta de periodo, año y semestre
+    codigos, combinaciones = pd.factorize(periodo + '|' + anio + semestre)
+    etiquetas = []
+    for combinacion in combinaciones:
+        texto, anio_semestre = combinacion.rsplit('|', 1)
+        a = anio_semestre[:-3]
+        etiquetas.append((texto if a in texto else f'{texto} {a}') if texto else anio_semestre)
+    return pd.Series(np.array(etiquetas, dtype=object)[codigos], index=df_evaluaciones.index)
+
+
+class Trayectorias:
+    """
+    Resultado del análisis: arreglos alineados por estudiante (eje 0), periodo
+    (eje 1, en orden cronológico) y dimensión (último eje, en DIMENSIONES)
+    """
+
+    def __init__(self, estudiantes, cursos, periodos, valores, pendientes, z_curso, z_cohorte, caidas):
+        self.estudiantes = estudiantes
+        self.cursos = cursos
+        self.periodos = periodos
+        self.dimensiones = list(DIMENSIONES)
+        self.valores = valores
+        self.pendientes = pendientes
+        self.z_curso = z_curso
+        self.z_cohorte = z_cohorte
+        self.caidas = caidas
+        self.posiciones = {estudiante_id: i for i, estudiante_id in enumerate(estudiantes)}
+
+        # Última evaluación de cada estudiante en cada dimensión
+        observado = ~np.isnan(valores)
+        periodos_idx = np.arange(len(periodos))[None, :, None]
+        self.indice_ultimo = np.where(observado, periodos_idx, -1).max(axis=1) if len(periodos) else \
+            np.full((len(estudiantes), len(DIMENSIONES)), -1)
+        self.evaluados = observado.any(axis=2).sum(axis=1)
+
+    def _en_ultimo(self, arreglo, relleno):
+        indice = np.clip(self.indice_ultimo, 0, None)[:, None, :]
+        tomado = np.take_along_axis(arreglo, indice, axis=1)[:, 0, :] if arreglo.shape[1] else \
+            np.full(self.indice_ultimo.shape, relleno, dtype=arreglo.dtype)
+        return np.where(self.indice_ultimo >= 0, tomado, relleno)
+
+    def ultimos(self):
+        """(valores, z_curso, z_cohorte, caidas) de la última evaluación, (estudiantes, dimensiones)"""
+        return (self._en_ultimo(self.valores, np.nan), self._en_ultimo(self.z_curso, np.nan),
+                self._en_ultimo(self.z_cohorte, np.nan), self._en_ultimo(self.caidas, False))
+
+    def alertas(self):
+        """
+        Señales por estudiante y dimensión (estudiantes, dimensiones), booleanas:
+        caída reciente, z_curso bajo -UMBRAL_Z, pendiente desfavorable
+        """
+        _, z_curso, _, caidas = self.ultimos()
+        sentido = np.array([SENTIDO_DIMENSIONES[d] for d in DIMENSIONES])
+        with np.errstate(invalid='ignore'):
+            bajo_curso = z_curso <= -UMBRAL_Z
+            empeora = self.pendientes * sentido <= -PENDIENTE_MINIMA
+        return {'caida_reciente': caidas, 'bajo_curso': bajo_curso, 'tendencia_negativa': empeora}
+
+    def tamizaje(self):
+        """
+        Una fila por estudiante con su última evaluación, tendencia, z y señales
+
+        Returns:
+            DataFrame ordenado por número de alertas (mayor primero)
+        """
+        valores, z_curso, z_cohorte, _ = self.ultimos()
+        senales = self.alertas()
+        columnas = {
+            'estudiante_id': self.estudiantes,
+            'curso_id': self.cursos,
+            'periodos_evaluados': self.evaluados,
+            'ultimo_periodo': [
+                self.periodos[i] if i >= 0 else None for i in self.indice_ultimo.max(axis=1)
+            ] if len(self.estudiantes) else [],
+        }
+        for j, dimension in enumerate(DIMENSIONES):
+            columnas[f'{dimension}'] = valores[:, j]
+            columnas[f'{dimension}_pendiente'] = self.pendientes[:, j]
+            columnas[f'{dimension}_z_curso'] = z_curso[:, j]
+            columnas[f'{dimension}_z_cohorte'] = z_cohorte[:, j]
+        df = pd.DataFrame(columnas)
+        df['alertas'] = sum(senal.sum(axis=1) for senal in senales.values())
+        # Dimensiones con cada señal: la fila de bits indexa la lista precalculada
+        combinaciones = np.empty(2 ** len(DIMENSIONES), dtype=object)
+        combinaciones[:] = [
+            [d for j, d in enumerate(DIMENSIONES) if codigo >> j & 1] for codigo in range(len(combinaciones))
+        ]
+        bits = 1 << np.arange(len(DIMENSIONES))
+        for nombre, senal in senales.items():
+            df[nombre] = combinaciones[senal.astype(np.int64) @ bits]
+        return df.sort_values(['alertas', 'estudiante_id'], ascending=[False, True], kind='stable').reset_index(drop=True)
+
+    def estudiante(self, estudiante_id):
+        """Serie por periodo de un estudiante (None si no existe)"""
+        i = self.posiciones.get(estudiante_id)
+        if i is None:
+            return None
+        periodos = []
+        for p, periodo in enumerate(self.periodos):
+            if np.isnan(self.valores[i, p]).all():
+                continue
+            periodos.append({
+                'periodo': periodo,
+                'valores': _dict_dimensiones(self.valores[i, p]),
+                'z_curso': _dict_dimensiones(self.z_curso[i, p]),
+                'z_cohorte': _dict_dimensiones(self.z_cohorte[i, p]),
+                'caidas': [d for d, caida in zip(DIMENSIONES, self.caidas[i, p]) if caida]
+            })
+        return {
+            'estudiante_id': estudiante_id,
+            'curso_id': self.cursos[i],
+            'pendientes': _dict_dimensiones(self.pendientes[i]),
+            'periodos': periodos
+        }
+
+
+def _dict_dimensiones(fila):
+    return {d: (None if np.isnan(v) else round(float(v), 3)) for d, v in zip(DIMENSIONES, fila)}
+
+
+# ----------------------------------------------------------------------
+# Cálculo vectorizado
+# ----------------------------------------------------------------------
+
+def pivotar_evaluaciones(df_evaluaciones, estudiante_ids):
+    """
+    Arreglo (estudiantes, periodos, dimensiones) float64 con NaN donde no hay
+    evaluación y la lista de periodos en orden cronológico
+    """
+    n_estudiantes = len(estudiante_ids)
+    posicion = pd.Index(estudiante_ids).get_indexer(df_evaluaciones['estudiante_id'])
+    df = df_evaluaciones[posicion >= 0]
+    posicion = posicion[posicion >= 0]
+    if df.empty:
+        return np.full((n_estudiantes, 0, len(DIMENSIONES)), np.nan), []
+
+    etiquetas = etiquetas_periodo(df)
+    periodos = list(df['fecha'].groupby(etiquetas).min().sort_values(kind='stable').index)
+    periodo = pd.Index(periodos).get_indexer(etiquetas)
+
+    puntajes = df[list(DIMENSIONES)].to_numpy(dtype='float64')
+    observado = ~np.isnan(puntajes)
+    sumas = np.zeros((n_estudiantes, len(periodos), len(DIMENSIONES)))
+    conteos = np.zeros_like(sumas)
+    np.add.at(sumas, (posicion, periodo), np.where(observado, puntajes, 0.0))
+    np.add.at(conteos, (posicion, periodo), observado)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(conteos > 0, sumas / conteos, np.nan), periodos
+
+
+def pendientes_por_periodo(valores):
+    """Pendiente de mínimos cuadrados sobre el eje de periodos; NaN con menos de dos evaluaciones"""
+    observado = ~np.isnan(valores)
+    x = np.arange(valores.shape[1], dtype='float64')[None, :, None] * observado
+    y = np.where(observado, valores, 0.0)
+    n = observado.sum(axis=1)
+    sx, sy = x.sum(axis=1), y.sum(axis=1)
+    sxy, sxx = (x * y).sum(axis=1), (x * x).sum(axis=1)
+    denominador = n * sxx - sx * sx
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where((n >= 2) & (denominador > 0), (n * sxy - sx * sy) / denominador, np.nan)
+
+
+def z_por_grupo(valores, grupos):
+    """
+    Puntaje z de cada valor respecto de su grupo en el mismo periodo
+
+    Args:
+        valores: arreglo (estudiantes, periodos, dimensiones)
+        grupos: código entero del grupo de cada estudiante (estudiantes,)
+    """
+    n_grupos = int(grupos.max()) + 1 if len(grupos) else 0
+    observado = ~np.isnan(valores)
+    y = np.where(observado, valores, 0.0)
+    forma = (n_grupos,) + valores.shape[1:]
+    n, suma, suma_cuadrados = np.zeros(forma), np.zeros(forma), np.zeros(forma)
+    np.add.at(n, grupos, observado)
+    np.add.at(suma, grupos, y)
+    np.add.at(suma_cuadrados, grupos, y * y)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = suma / n
+        desviacion = np.sqrt(np.clip(suma_cuadrados / n - media * media, 0.0, None))
+        valido = (n >= MINIMO_GRUPO) & (desviacion > 1e-9)
+        z = (valores - media[grupos]) / desviacion[grupos]
+    return np.where(valido[grupos], z, np.nan)
+
+
+def caidas_recientes(valores, sentido):
+    """
+    Empeoramientos respecto de la evaluación anterior del mismo estudiante
+    (aunque haya periodos sin evaluar entre ambas), como arreglo booleano
+    """
+    observado = ~np.isnan(valores)
+    if valores.shape[1] == 0:
+        return observado
+    periodos_idx = np.arange(valores.shape[1])[None, :, None]
+    # Índice de la última evaluación hasta cada periodo (relleno hacia adelante)
+    ultimo_hasta = np.maximum.accumulate(np.where(observado, periodos_idx, -1), axis=1)
+    anterior = np.concatenate(
+        [np.full(valores.shape[:1] + (1,) + valores.shape[2:], -1), ultimo_hasta[:, :-1]], axis=1
+    )
+    valor_anterior = np.take_along_axis(valores, np.clip(anterior, 0, None), axis=1)
+    with np.errstate(invalid='ignore'):
+        cambio = (valores - valor_anterior) * sentido
+        return observado & (anterior >= 0) & (cambio <= -CAIDA_MINIMA)
+
+
+def construir_trayectorias(df_evaluaciones, df_estudiantes):
+    """
+    Args:
+        df_evaluaciones: evaluaciones_estudiantes()
+        df_estudiantes: DataFrame con estudiante_id, curso_id y cohorte_id (atributos_estudiantes)
+
+    Returns:
+        Trayectorias
+    """
+    estudiantes = df_estudiantes['estudiante_id'].to_numpy()
+    cursos = df_estudiantes['curso_id'].to_numpy()
+    valores, periodos = pivotar_evaluaciones(df_evaluaciones, estudiantes)
+    sentido = np.array([SENTIDO_DIMENSIONES[d] for d in DIMENSIONES])
+
+    grupo_curso = pd.factorize(df_estudiantes['curso_id'].fillna(''))[0]
+    # Sin cohorte asignada, la línea base es todo el establecimiento
+    cohorte = df_estudiantes['cohorte_id'] if 'cohorte_id' in df_estudiantes else pd.Series(index=df_estudiantes.index)
+    grupo_cohorte = pd.factorize(cohorte.astype('Int64').astype(str).where(cohorte.notna(), ''))[0]
+
+    return Trayectorias(
+        estudiantes, cursos, periodos, valores,
+        pendientes=pendientes_por_periodo(valores),
+        z_curso=z_por_grupo(valores, grupo_curso) * sentido,
+        z_cohorte=z_por_grupo(valores, grupo_cohorte) * sentido,
+        caidas=caidas_recientes(valores, sentido)
+    )
+
+
+# ----------------------------------------------------------------------
+# Resultado versionado
+# ----------------------------------------------------------------------
+
+class MotorTrayectorias:
+    """
+    Trayectorias de todo el establecimiento en memoria, reconstruidas cuando
+    cambian las evaluaciones o los estudiantes
+
+    Uso:
+        motor = MotorTrayectorias(db.engine, cache.versiones)
+        df = motor.obtener().tamizaje()
+    """
+
+    def __init__(self, engine, versiones=None):
+        self.engine = engine
+        self.versiones = versiones
+        self.reconstrucciones = 0
+        self._lock = threading.Lock()
+        self._version = None
+        self._trayectorias = None
+
+    def _version_actual(self):
+        return self.versiones.version(*TABLAS_FUENTE) if self.versiones is not None else None
+
+    def obtener(self):
+        """Trayectorias vigentes (las reconstruye si hubo escrituras)"""
+        with self._lock:
+            version = self._version_actual()
+            if self._trayectorias is None or version != self._version:
+                self._trayectorias = construir_trayectorias(
+                    evaluaciones_estudiantes(self.engine), atributos_estudiantes(self.engine)
+                )
+                self._version = version
+                self.reconstrucciones += 1
+            return self._trayectorias
+
+    def tamizaje(self, curso_id=None, solo_alertas=False):
+        """Tamizaje como lista de dicts (NaN → None), opcionalmente de un curso o solo con alertas"""
+        df = self.obtener().tamizaje()
+        if curso_id is not None:
+            df = df[df['curso_id'] == curso_id]
+        if solo_alertas:
+            df = df[df['alertas'] > 0]
+        return df.round(3).astype(object).where(df.notna(), None).to_dict('records')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tamizaje socioemocional del establecimiento')
+    parser.add_argument('--curso', default=None, help='Solo un curso')
+    args = parser.parse_args()
+
+    from database import DatabaseManager
+    db = DatabaseManager('convivir_v4.db')
+    trayectorias = MotorTrayectorias(db.engine).obtener()
+    df = trayectorias.tamizaje()
+    if args.curso:
+        df = df[df['curso_id'] == args.curso]
+
+    print(f"📊 {len(df)} estudiantes, {len(trayectorias.periodos)} periodos: {', '.join(trayectorias.periodos)}")
+    for _, fila in df[df['alertas'] > 0].iterrows():
+        senales = [f"{nombre}: {', '.join(fila[nombre])}"
+                   for nombre in ('caida_reciente', 'bajo_curso', 'tendencia_negativa') if fila[nombre]]
+        print(f"  ⚠️ {fila['estudiante_id']} ({fila['curso_id']}): {'; '.join(senales)}")
+
+
+if __name__ == '__main__':
+    main()